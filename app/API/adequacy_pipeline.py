@@ -0,0 +1,332 @@
+"""Adaptive content-adequacy rating: AI raters in concurrent batches with early stopping per item.
+
+Contract:
+  - A pipeline collects up to max_raters AI raters in batches of batch_size. The raters of a batch
+    are requested concurrently (one chat completion each, ADEQUACY_CONCURRENCY in flight, halved
+    on rate limits as in API/simulation.py); replies are validated on the server (every requested
+    item x facet an integer 1-5) and only malformed ones are asked again
+  - After every batch the ratings go into an AdequacySession, so the keep/revise/delete rule of
+    analyze_content_adequacy() is re-evaluated incrementally on all raters so far, including any
+    existing ratings posted with the request
+  - An item is frozen once it has at least min_raters raters and its action has been the same
+    and decisive for stable_batches consecutive batches. Decisive means the p-values that decide
+    the action lie well beyond alpha: below alpha * margin where significance is required and
+    at or above min(0.5, alpha / margin) where non-significance is. Frozen items are left out of
+    later prompts; the pipeline stops when every item is frozen or max_raters is reached
+  - The result holds the final adequacy table (same records as /analyze-anova), the generated
+    raters (ratings keyed by item id and facet name), the batch at which each item froze, and
+    the number of requests and item ratings compared with rating every item max_raters times
+
+Configuration (environment):
+  ADEQUACY_CONCURRENCY      rater requests in flight per pipeline (default 8)
+  ADEQUACY_MAX_ATTEMPTS     requests per rater when replies are malformed (default 3)
+  ADEQUACY_JOB_CONCURRENCY  pipelines running at the same time (default 4)
+"""
+
+from __future__ import annotations
+
+import asyncio, os, random, time, uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.config import env_int
+from analysis.serialization import frame_records
+from API.adequacy_sessions import AdequacySession
+from API.jobs import Job, JobManager
+from API.simulation import (SYSTEM_PROMPT, _transient, AdaptiveLimiter, JSONChat,
+                            coerce_likert, parse_reply)
+
+ADEQUACY_CONCURRENCY = max(1, env_int("ADEQUACY_CONCURRENCY", 8))
+ADEQUACY_MAX_ATTEMPTS = max(1, env_int("ADEQUACY_MAX_ATTEMPTS", 3))
+
+DEFAULTS = {"batch_size": 5, "min_raters": 10, "max_raters": 30, "stable_batches": 2, "margin": 0.2}
+RATING_MIN, RATING_MAX = 1, 5
+DEFAULT_PERSONA = "Experienced subject-matter expert"
+
+
+# ---------- prompt and validation ----------
+
+def rater_prompt(persona: str, facets: List[Dict[str, str]], items: List[Dict[str, str]]) -> str:
+    """The Step 3 rater prompt; facets and items are listed in random order."""
+    facets = random.sample(facets, len(facets))
+    items = random.sample(items, len(items))
+    facet_lines = ";\n    ".join(f"Dimensionname: {f['name']}, Definition: {f.get('definition', '')}" for f in facets)
+    item_lines = ",\n".join('{"id": "%s", "text": "%s"}' % (it["id"], str(it["text"]).replace('"', '\\"'))
+                            for it in items)
+    return f"""You are generating synthetic expert ratings for content validation following MacKenzie et al. (2011) Step 3 logic (content adequacy).
+You will role-play a single expert rater (the Persona) and rate how well each item reflects each subdimension of the construct. Return ONLY JSON as specified.
+Persona (short description): {persona}
+
+Inputs (randomized order):
+
+    Subdimensions (with concise descriptions):
+    {facet_lines}
+
+    Items (array of objects with id and text):
+    {item_lines}
+
+Rating scale (integers 1-5):
+1 = not representative / off-target
+2 = weak representation
+3 = moderate / ambiguous
+4 = strong representation
+5 = very strong / essential
+
+Generation rules:
+- Rate each item against every subdimension definition.
+- Discriminate: avoid uniformly high scores unless clearly warranted.
+- Penalize vague / broad wording (1-2). Reward precise alignment (4-5).
+- If item is clearly specific to one subdimension, keep others near midpoint or below unless justified.
+- No missing keys: every item must include every subdimension as a key.
+
+Persona influence (apply consistently):
+- Strict/skeptical -> slight downward shift, tighter variance.
+- Enthusiastic/lenient -> slight upward shift, occasional 5s.
+- High domain expertise -> more extremes (1-2 & 4-5), fewer 3s.
+- Values clarity -> penalize vague items further.
+
+Quality checks (MUST PASS):
+- Return valid JSON only.
+- Include every item id from input (even though randomized in prompt).
+- Include every subdimension name under each item.
+- All ratings are integers 1-5.
+
+Output schema (JSON only, no extra text, no markdown):
+{{
+  "ratings": {{
+    "ITEM-ID": {{
+      "SUBDIMENSION_NAME_1": ITEMRATING_NUMBER,
+      "SUBDIMENSION_NAME_2": ITEMRATING_NUMBER
+    }}
+  }}
+}}"""
+
+
+def validate_ratings(data: Optional[Dict[str, Any]], item_ids: List[str],
+                     facet_names: List[str]) -> Tuple[Optional[Dict[str, Dict[str, int]]], List[str]]:
+    """({item: {facet: rating}}, []) when every item x facet is an integer 1-5, else (None, problems)."""
+    if data is None:
+        return None, ["reply is not a JSON object"]
+    raw = data.get("ratings", data)
+    if not isinstance(raw, dict):
+        return None, ["'ratings' is not an object"]
+    by_item = {str(k).strip().lower(): v for k, v in raw.items()}
+    out: Dict[str, Dict[str, int]] = {}
+    problems: List[str] = []
+    for item_id in item_ids:
+        cells = by_item.get(item_id.lower())
+        if not isinstance(cells, dict):
+            problems.append(f"item {item_id} is missing")
+            continue
+        by_facet = {str(k).strip().lower(): v for k, v in cells.items()}
+        out[item_id] = {}
+        for facet in facet_names:
+            score = coerce_likert(by_facet.get(facet.lower()), RATING_MIN, RATING_MAX)
+            if score is None:
+                problems.append(f"{item_id} / {facet} must be an integer from 1 to 5")
+            else:
+                out[item_id][facet] = score
+    return (None, problems) if problems else (out, [])
+
+
+def decisive(row: Dict[str, Any], alpha: float, margin: float) -> bool:
+    """True when the p-values behind the row's action are well beyond alpha (see module doc)."""
+    p_om, p_c = row.get("p_omnibus"), row.get("p_contrast_one_sided")
+    if p_om is None or p_c is None or not (np.isfinite(p_om) and np.isfinite(p_c)):
+        return False
+    low, high = alpha * margin, min(0.5, alpha / margin)
+    action = row.get("action")
+    if action == "keep":
+        return p_om <= low and p_c <= low
+    if action == "revise":
+        return p_om <= low and p_c >= high
+    # "delete" / "revise/delete": omnibus clearly null, or the intended facet clearly not ahead
+    return p_om >= high or (not row.get("target_is_highest") and p_c >= high)
+
+
+def pipeline_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Validated pipeline inputs from a request payload; ValueError on bad input."""
+    items = [{"id": str(it["id"]), "text": str(it.get("text", ""))}
+             for it in payload.get("items") or [] if isinstance(it, dict) and it.get("id") not in (None, "")]
+    facets = [{"name": str(f["name"]), "definition": str(f.get("definition") or f.get("description") or "")}
+              for f in payload.get("facets") or [] if isinstance(f, dict) and f.get("name")]
+    if not items:
+        raise ValueError("'items' must be a non-empty list of {id, text}")
+    if len(facets) < 2:
+        raise ValueError("'facets' needs at least two {name, definition} entries")
+    opts = dict(DEFAULTS)
+    try:
+        for key in DEFAULTS:
+            if payload.get(key) is not None:
+                opts[key] = type(DEFAULTS[key])(payload[key])
+        first_rater = int(payload.get("first_rater_number", 1))
+        temperature = float(payload.get("temperature", 0.7))
+    except (TypeError, ValueError):
+        raise ValueError("batch_size, min_raters, max_raters, stable_batches, margin and temperature must be numbers")
+    if not 1 <= opts["max_raters"] <= 200:
+        raise ValueError("max_raters must be between 1 and 200")
+    if opts["batch_size"] < 1 or opts["stable_batches"] < 1 or not 0 < opts["margin"] <= 1:
+        raise ValueError("batch_size and stable_batches must be >= 1 and margin in (0, 1]")
+    intended = {str(k): v for k, v in (payload.get("intendedMap") or {}).items()}
+    return {**opts, "items": items, "facets": facets, "intended_map": intended,
+            "personas": [str(p) for p in payload.get("personas") or []],
+            "group_description": str(payload.get("groupDescription") or ""),
+            "first_rater_number": first_rater, "temperature": temperature,
+            "drop_incomplete": bool((payload.get("options") or {}).get("dropIncomplete", True)),
+            "model": str(payload.get("model") or os.getenv("DEFAULT_MODEL", "gpt-4.1"))}
+
+
+# ---------- pipeline ----------
+
+def _records(table: pd.DataFrame) -> List[Dict[str, Any]]:
+    # Same JSON-safe records as /analyze-anova (inf and NaN become None)
+    return frame_records(table)
+
+
+class AdequacyPipeline:
+    def __init__(self, opts: Dict[str, Any], existing: Optional[pd.DataFrame] = None):
+        self.id = uuid.uuid4().hex
+        self.opts = opts
+        self.session = AdequacySession(intended_map=opts["intended_map"], alpha=0.05, decision_mode="ternary",
+                                       sphericity="GG", require_target_highest=True,
+                                       drop_incomplete=opts["drop_incomplete"])
+        if existing is not None and not existing.empty:
+            self.session.add(existing)
+        self.raters: List[Dict[str, Any]] = []
+        self.frozen: Dict[str, Dict[str, Any]] = {}
+        self.history: Dict[str, List[Tuple[str, bool]]] = {it["id"]: [] for it in opts["items"]}
+        self.batches = 0
+        self.failed_raters = 0
+        self.item_ratings = 0
+        self.stats = {"requests": 0, "malformed": 0, "rate_limited": 0}
+        self.limiter: Optional[AdaptiveLimiter] = None
+
+    @property
+    def active(self) -> List[Dict[str, str]]:
+        return [it for it in self.opts["items"] if it["id"] not in self.frozen]
+
+    def _persona(self, k: int) -> str:
+        personas = self.opts["personas"]
+        persona = personas[k % len(personas)] if personas else DEFAULT_PERSONA
+        if self.opts["group_description"]:
+            persona += f" | Cohort context: {self.opts['group_description']}"
+        return persona
+
+    async def _rater(self, chat: JSONChat, k: int, items: List[Dict[str, str]],
+                     api_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        facet_names = [f["name"] for f in self.opts["facets"]]
+        item_ids = [it["id"] for it in items]
+        messages = [{"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": rater_prompt(self._persona(k), self.opts["facets"], items)}]
+        for _ in range(ADEQUACY_MAX_ATTEMPTS):
+            async with self.limiter:
+                try:
+                    content = await chat.complete(api_key, messages)
+                except _transient():
+                    return None
+                self.limiter.succeeded()
+            ratings, problems = validate_ratings(parse_reply(content), item_ids, facet_names)
+            if ratings is not None:
+                return {"id": str(uuid.uuid4()), "name": f"AI rater {self.opts['first_rater_number'] + k}",
+                        "ratings": ratings}
+            self.stats["malformed"] += 1
+            messages = messages[:2] + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": "That answer was invalid: " + "; ".join(problems[:10])
+                 + ". Return the complete corrected JSON object only."},
+            ]
+        return None
+
+    def _update_decisions(self) -> None:
+        opts = self.opts
+        stable = opts["stable_batches"]
+        for it in self.active:
+            row = self.session.results.get(it["id"])
+            if row is None:
+                continue
+            history = self.history[it["id"]]
+            history.append((row["action"], decisive(row, 0.05, opts["margin"])))
+            recent = history[-stable:]
+            if (len(recent) == stable and row["n_raters"] >= opts["min_raters"]
+                    and all(ok for _, ok in recent) and len({a for a, _ in recent}) == 1):
+                self.frozen[it["id"]] = {"action": row["action"], "n_raters": int(row["n_raters"]),
+                                         "batch": self.batches}
+
+    def progress(self, started: Optional[float] = None) -> Dict[str, Any]:
+        out = {"batches": self.batches, "raters": len(self.raters), "failed_raters": self.failed_raters,
+               "max_raters": self.opts["max_raters"], "items": len(self.opts["items"]),
+               "active_items": len(self.active), "frozen": dict(self.frozen),
+               "item_ratings": self.item_ratings, **self.stats}
+        if started is not None:
+            out["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return out
+
+    async def run(self, job: Job, api_key: Optional[str]) -> Dict[str, Any]:
+        opts = self.opts
+        self.limiter = AdaptiveLimiter(ADEQUACY_CONCURRENCY)
+        chat = JSONChat(opts["model"], opts["temperature"], self.limiter, self.stats)
+        started = time.perf_counter()
+        job.update(**self.progress(started))
+        attempted = 0
+        while self.active and attempted < opts["max_raters"]:
+            items = self.active
+            size = min(opts["batch_size"], opts["max_raters"] - attempted)
+            tasks = [asyncio.ensure_future(self._rater(chat, attempted + j, items, api_key)) for j in range(size)]
+            try:
+                batch = await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            attempted += size
+            self.batches += 1
+            rows = []
+            for rater in batch:
+                if rater is None:
+                    self.failed_raters += 1
+                    continue
+                self.raters.append(rater)
+                self.item_ratings += len(items)
+                for item_id, cells in rater["ratings"].items():
+                    rows.extend((item_id, rater["id"], facet, value) for facet, value in cells.items())
+            if rows:
+                await asyncio.to_thread(self.session.add,
+                                        pd.DataFrame(rows, columns=["item", "rater", "facet", "rating"]))
+            self._update_decisions()
+            job.update(**self.progress(started))
+        return self.result()
+
+    def result(self) -> Dict[str, Any]:
+        n_items, max_raters = len(self.opts["items"]), self.opts["max_raters"]
+        return {
+            "pipeline_id": self.id,
+            "table": _records(self.session.table()),
+            "raters": self.raters,
+            "frozen": self.frozen,
+            "stopped": "all_frozen" if not self.active else "max_raters",
+            "requests": self.stats["requests"],
+            "item_ratings": self.item_ratings,
+            "fixed_design_item_ratings": n_items * max_raters,
+            "saved_share": round(1 - self.item_ratings / (n_items * max_raters), 4) if n_items else None,
+        }
+
+
+class AdequacyPipelineStore:
+    def __init__(self, jobs: JobManager):
+        self.jobs = jobs
+        self._pipelines: Dict[str, AdequacyPipeline] = {}
+
+    def start(self, opts: Dict[str, Any], existing: Optional[pd.DataFrame], api_key: Optional[str]) -> Job:
+        # Pipelines of jobs the manager has already purged are dropped with them
+        self._pipelines = {pid: p for pid, p in self._pipelines.items() if self.jobs.get(pid) is not None}
+        pipeline = AdequacyPipeline(opts, existing)
+        self._pipelines[pipeline.id] = pipeline
+        return self.jobs.submit("adequacy", lambda job: pipeline.run(job, api_key), job_id=pipeline.id)
+
+    def get(self, pipeline_id: str) -> Optional[AdequacyPipeline]:
+        return self._pipelines.get(pipeline_id)
+
+
+adequacy_jobs = JobManager(max(1, env_int("ADEQUACY_JOB_CONCURRENCY", 4)))
+adequacy_pipelines = AdequacyPipelineStore(adequacy_jobs)
@@ -0,0 +1,317 @@
+"""Incremental content-adequacy analysis for rater panels that grow in waves.
+
+Contract:
+  - An AdequacySession holds every rating row posted to it; after each add() its result table
+    equals analyze_content_adequacy() on the union of all rows posted so far
+  - Per item it keeps each rater's facet cells (sum / count, duplicates averaged like
+    pivot_table) plus sufficient statistics over the complete raters: n, the facet sum vector
+    and the facet cross-product matrix. The RM-ANOVA sums of squares, the GG epsilon
+    covariance, the planned contrast and the facet means all follow from these
+  - add() touches only the raters present in the new rows (O(new data)) and returns just the
+    result rows that changed; a facet appearing for the first time on an item rebuilds that
+    item from its stored rows
+  - Items that keep incomplete raters (drop_incomplete=False) go through the per-item
+    pandas/pingouin path, as in the batched engine
+  - Sessions live in an in-process store and expire after SESSION_TTL seconds without use
+"""
+
+from __future__ import annotations
+
+import threading, time, uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from API.functions import _adequacy_row, _content_adequacy_item, _empty_row, special, stats
+
+SESSION_TTL = 60 * 60   # seconds an idle session is kept
+MAX_SESSIONS = 200
+
+
+def _gg_epsilon(S: np.ndarray) -> float:
+    """Greenhouse-Geisser epsilon from a facet covariance matrix (same formula as pingouin)."""
+    k = S.shape[0]
+    if k <= 2:
+        return 1.0
+    mean_var = np.trace(S) / k
+    S_mean = S.mean()
+    ss_mat = (S ** 2).sum()
+    ss_rows = (S.mean(1) ** 2).sum()
+    num = (k * (mean_var - S_mean)) ** 2
+    den = (k - 1) * (ss_mat - 2 * k * ss_rows + k ** 2 * S_mean ** 2)
+    return float(min(num / den, 1))
+
+
+class _ItemState:
+    """Per-item rater cells and sufficient statistics over the complete raters."""
+
+    def __init__(self):
+        self.facets: List[Any] = []
+        self.index: Dict[Any, int] = {}
+        self.rows: List[tuple] = []                  # (rater, facet, rating) as posted
+        self.cells: Dict[Any, List[np.ndarray]] = {}  # rater -> [rating sums, non-missing counts]
+        self.shift: Optional[float] = None  # origin for the moments; keeps one-pass sums well conditioned
+        self._reset_moments()
+
+    def _reset_moments(self) -> None:
+        k = len(self.facets)
+        self.n_any = 0            # raters with at least one non-missing rating
+        self.n_complete = 0       # raters with a rating on every facet of the item
+        self.s = np.zeros(k)      # sum of (cell-mean vector - shift) over complete raters
+        self.Q = np.zeros((k, k))  # sum of outer products of those shifted vectors
+        self.raw_sum = np.zeros(k)  # raw ratings of complete raters (facet means use raw rows)
+        self.raw_cnt = np.zeros(k)
+
+    def _contribute(self, rater: Any, sign: int) -> None:
+        sums, cnts = self.cells[rater]
+        if not cnts.any():
+            return
+        self.n_any += sign
+        if not cnts.all():
+            return
+        x = sums / cnts - self.shift
+        self.n_complete += sign
+        self.s += sign * x
+        self.Q += sign * np.outer(x, x)
+        self.raw_sum += sign * sums
+        self.raw_cnt += sign * cnts
+
+    def _apply(self, rater: Any, facet: Any, rating: float) -> None:
+        cell = self.cells.get(rater)
+        if cell is None:
+            cell = self.cells[rater] = [np.zeros(len(self.facets)), np.zeros(len(self.facets))]
+        if not np.isnan(rating):
+            j = self.index[facet]
+            cell[0][j] += rating
+            cell[1][j] += 1
+
+    def _rebuild(self) -> None:
+        self.facets = sorted({f for _, f, _ in self.rows}, key=lambda x: str(x))
+        self.index = {f: j for j, f in enumerate(self.facets)}
+        self.cells = {}
+        for rater, facet, rating in self.rows:
+            self._apply(rater, facet, rating)
+        self._reset_moments()
+        for rater in self.cells:
+            self._contribute(rater, +1)
+
+    def add(self, rows: Sequence[tuple]) -> None:
+        self.rows.extend(rows)
+        if self.shift is None:
+            self.shift = next((v for _, _, v in rows if not np.isnan(v)), None)
+        if any(f not in self.index for _, f, _ in rows):
+            # k changed: every rater's completeness (and the vector layout) changes with it
+            self._rebuild()
+            return
+        touched = {r for r, _, _ in rows}
+        for rater in touched:
+            if rater in self.cells:
+                self._contribute(rater, -1)
+        for rater, facet, rating in rows:
+            self._apply(rater, facet, rating)
+        for rater in touched:
+            self._contribute(rater, +1)
+
+    def frame(self, item: Any, cols: Dict[str, str]) -> pd.DataFrame:
+        return pd.DataFrame(
+            [(item, r, f, v) for r, f, v in self.rows],
+            columns=[cols["item"], cols["rater"], cols["facet"], cols["rating"]],
+        )
+
+
+class AdequacySession:
+    def __init__(
+        self,
+        intended_map: Optional[Dict[Any, Any]] = None,
+        item_col="item",
+        rater_col="rater",
+        facet_col="facet",
+        rating_col="rating",
+        alpha=0.05,
+        require_target_highest=True,
+        drop_incomplete=True,
+        decision_mode="binary",
+        sphericity="GG",
+    ):
+        if sphericity not in {"GG", "HF", "none"}:
+            raise ValueError("sphericity must be 'GG', 'HF', or 'none'")
+        if decision_mode not in {"binary", "ternary"}:
+            raise ValueError("decision_mode must be 'binary' or 'ternary'")
+        self.id = uuid.uuid4().hex
+        self.intended_map: Dict[Any, Any] = dict(intended_map or {})
+        self.cols = {"item": item_col, "rater": rater_col, "facet": facet_col, "rating": rating_col}
+        self.alpha = alpha
+        self.require_target_highest = require_target_highest
+        self.drop_incomplete = drop_incomplete
+        self.decision_mode = decision_mode
+        self.sphericity = sphericity
+        self.items: Dict[Any, _ItemState] = {}
+        self.results: Dict[Any, Dict[str, Any]] = {}
+        self.n_rows = 0
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+
+    # ---- updates ----
+    def add(self, df: pd.DataFrame, intended_map: Optional[Dict[Any, Any]] = None) -> pd.DataFrame:
+        """Merge new rating rows (and intended-facet changes); return the result rows that changed."""
+        with self._lock:
+            self.last_used = time.time()
+            dirty = set()
+            if intended_map:
+                for it, target in intended_map.items():
+                    if self.intended_map.get(it) != target:
+                        self.intended_map[it] = target
+                        if it in self.items:
+                            dirty.add(it)
+            if df is not None and not df.empty:
+                missing = set(self.cols.values()) - set(df.columns)
+                if missing:
+                    raise ValueError(f"Missing required column(s): {sorted(missing)}")
+                c = self.cols
+                ratings = pd.to_numeric(df[c["rating"]], errors="coerce").to_numpy(dtype=float)
+                by_item: Dict[Any, List[tuple]] = {}
+                for it, rater, facet, rating in zip(df[c["item"]], df[c["rater"]], df[c["facet"]], ratings):
+                    by_item.setdefault(it, []).append((rater, facet, rating))
+                for it, rows in by_item.items():
+                    self.items.setdefault(it, _ItemState()).add(rows)
+                    dirty.add(it)
+                self.n_rows += len(df)
+
+            changed = []
+            for it in sorted(dirty, key=lambda x: str(x)):
+                row = self._item_row(it)
+                if not _same_row(self.results.get(it), row):
+                    changed.append(row)
+                self.results[it] = row
+            return _frame(changed)
+
+    def table(self) -> pd.DataFrame:
+        with self._lock:
+            self.last_used = time.time()
+            return _frame([self.results[it] for it in sorted(self.results, key=lambda x: str(x))])
+
+    # ---- per-item statistics ----
+    def _item_row(self, it: Any) -> Dict[str, Any]:
+        st = self.items[it]
+        target = self.intended_map.get(it, None)
+        k = len(st.facets)
+        initial = len(st.cells)
+        if target is None:
+            return _empty_row(it, target, initial, k, notes="No intended facet provided")
+        if k < 2:
+            return _empty_row(it, target, initial, k, notes="Fewer than 2 facets")
+        if target not in st.index:
+            return _empty_row(it, target, initial, k, notes=f"Intended facet '{target}' not in observed facets")
+        n_kept = st.n_complete if self.drop_incomplete else st.n_any
+        if n_kept <= 2:
+            return _empty_row(it, target, n_kept, k, notes="Fewer than 3 raters after filtering")
+        if not self.drop_incomplete and st.n_complete != st.n_any:
+            c = self.cols
+            return _content_adequacy_item(
+                it, st.frame(it, c), target, c["rater"], c["facet"], c["rating"], self.alpha,
+                self.require_target_highest, self.drop_incomplete, self.decision_mode, self.sphericity,
+            )
+
+        note_msgs = []
+        if initial - st.n_any > 0:
+            note_msgs.append(f"dropped {initial - st.n_any} empty rater(s)")
+        if self.drop_incomplete and st.n_any - st.n_complete > 0:
+            note_msgs.append(f"dropped {st.n_any - st.n_complete} incomplete rater(s)")
+
+        n = float(st.n_complete)
+        s, Q = st.s, st.Q
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # RM-ANOVA sums of squares from n, sum vector and cross-products (all shift-invariant)
+            col_mean = s / n
+            grand = col_mean.mean()
+            ss_with = n * ((col_mean - grand) ** 2).sum()
+            C = Q - np.outer(s, s) / n                    # centred cross-products
+            ss_resall = np.trace(C)
+            ss_resbetw = k * (Q.sum() / k ** 2 - n * grand ** 2)
+            ss_reswith = ss_resall - ss_resbetw
+            df1, ddof2 = k - 1, (k - 1) * (n - 1)
+            F = (ss_with / df1) / (ss_reswith / ddof2)
+            p_unc = stats.f.sf(F, df1, ddof2)
+            eta_p2 = ss_with / (ss_with + ss_reswith)
+            eps = _gg_epsilon(C / (n - 1))
+            p_gg = stats.f.sf(F, max(df1 * eps, 1.0), max(ddof2 * eps, 1.0)) if k >= 3 else p_unc
+
+            # Planned contrast: intended facet vs mean(other facets)
+            w = np.full(k, -1.0 / (k - 1))
+            w[st.index[target]] = 1.0
+            mean_c = w @ s / n
+            sd_c = np.sqrt(max(w @ Q @ w - n * mean_c ** 2, 0.0) / (n - 1))
+            t_stat = mean_c / (sd_c / np.sqrt(n))
+            p_two = 2 * special.stdtr(n - 1, -np.abs(t_stat))
+
+        return _adequacy_row(
+            it, target, st.facets, st.n_complete, float(F), eps, float(p_unc), float(p_gg), float(eta_p2),
+            mean_c, sd_c, t_stat, p_two, st.raw_sum / st.raw_cnt, note_msgs,
+            self.alpha, self.require_target_highest, self.decision_mode, self.sphericity,
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "items": len(self.items),
+            "rows": self.n_rows,
+            "raters": len({r for st in self.items.values() for r in st.cells}),
+            "last_used": self.last_used,
+        }
+
+
+def _same_row(a: Optional[Dict[str, Any]], b: Dict[str, Any]) -> bool:
+    if a is None or a.keys() != b.keys():
+        return False
+    for key, va in a.items():
+        vb = b[key]
+        if isinstance(va, float) and isinstance(vb, float) and np.isnan(va) and np.isnan(vb):
+            continue
+        if va != vb:
+            return False
+    return True
+
+
+def _frame(rows: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    rows = list(rows)
+    if not rows:
+        return pd.DataFrame(columns=list(_empty_row(None, None, 0, 0, "").keys()))
+    return pd.DataFrame(rows).sort_values(by="item").reset_index(drop=True)
+
+
+class AdequacySessionStore:
+    def __init__(self):
+        self._sessions: "OrderedDict[str, AdequacySession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self) -> None:
+        now = time.time()
+        for sid, sess in list(self._sessions.items()):
+            if now - sess.last_used > SESSION_TTL:
+                self._sessions.pop(sid, None)
+        while len(self._sessions) > MAX_SESSIONS:
+            self._sessions.popitem(last=False)
+
+    def create(self, **kwargs: Any) -> AdequacySession:
+        sess = AdequacySession(**kwargs)
+        with self._lock:
+            self._purge()
+            self._sessions[sess.id] = sess
+        return sess
+
+    def get(self, session_id: str) -> Optional[AdequacySession]:
+        with self._lock:
+            self._purge()
+            sess = self._sessions.get(session_id)
+            if sess is not None:
+                self._sessions.move_to_end(session_id)
+            return sess
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+adequacy_sessions = AdequacySessionStore()
@@ -0,0 +1,521 @@
+"""Server-side dataset registry: upload once, reference by id.
+
+Contract:
+  - put() compacts a frame (smallest lossless numeric dtypes, integer scores with gaps as
+    nullable ints, repeated strings as categoricals) and registers it under a content hash, so
+    re-uploading the same data returns the same id. Integer columns with 3 to LIKERT_MAX_LEVELS
+    values are reported as Likert items ("likert": {"min", "max"} in the column info)
+  - read_csv_compact(stream) parses an uploaded CSV in chunks of CSV_CHUNK_ROWS rows, compacting
+    each chunk before the next one is read, so only the compact frame is ever held in full.
+    More than DATASET_UPLOAD_MAX_MB raises UploadTooLarge
+  - select(dataset_id, columns, rows) returns a frame restricted to the requested columns
+    (names, in order) and rows (list of positions or {"start", "stop"}); KeyError for an
+    unknown or expired id, ValueError for a bad selection. Nullable ints come back as floats
+    with NaN, which the analyses and the R hand-off expect
+  - page(dataset_id, offset, limit, columns) returns JSON-ready rows for table views, at most
+    DATASET_PAGE_MAX_ROWS per call
+  - Frames live in an in-process LRU bounded by DATASET_MAX_MB; evicted frames spill to
+    DATASET_SPILL_DIR (bounded by DATASET_SPILL_MAX_MB) and are loaded back on the next use.
+    Spilled files are shared by all uvicorn workers using the same directory. They are .npz
+    archives of plain arrays plus a JSON description of the dtypes, read with
+    allow_pickle=False, so a file planted in the directory cannot run code
+  - The default spill directory is private to the server's user (created 0700, and checked to
+    be a directory owned by that user that nobody else can write to); when the check fails a
+    fresh tempfile.mkdtemp() directory is used instead, which only this process sees
+  - Datasets unused for DATASET_TTL seconds are dropped from memory and disk
+  - The id is a prefix of r_transport.content_digest(frame), the hash the R result cache
+    also uses for frames
+
+Configuration (environment):
+  DATASET_MAX_MB        in-memory budget (default 256)
+  DATASET_SPILL_DIR     spill directory (default <tmp>/scalex_datasets-<uid>, empty disables spilling)
+  DATASET_SPILL_MAX_MB  spill budget (default 2048)
+  DATASET_TTL           idle seconds before a dataset expires (default 21600)
+  DATASET_UPLOAD_MAX_MB largest CSV upload (default 200, 0 for no limit)
+  DATASET_PAGE_MAX_ROWS most rows page() returns at once (default 1000)
+  CSV_CHUNK_ROWS        rows parsed per chunk (default 50000)
+"""
+
+from __future__ import annotations
+
+import io, json, os, tempfile, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from analysis.config import env_int, env_num, private_tmp_dir
+from analysis.r_transport import content_digest
+from analysis.serialization import frame_records
+
+ID_LENGTH = 32
+CATEGORY_MAX_RATIO = 0.5  # strings become categoricals when at most this share is unique
+LIKERT_MAX_LEVELS = 11    # 0-10 scales and anything coarser
+
+
+UPLOAD_MAX_BYTES = int(env_num("DATASET_UPLOAD_MAX_MB", 200) * 1024 * 1024)
+PAGE_MAX_ROWS = env_int("DATASET_PAGE_MAX_ROWS", 1000)
+CSV_CHUNK_ROWS = max(1, env_int("CSV_CHUNK_ROWS", 50000))
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+# ---------- compaction ----------
+
+def _nullable_integers(arr: np.ndarray, missing: np.ndarray) -> Optional[pd.api.extensions.ExtensionArray]:
+    present = arr[~missing]
+    if not present.size or not np.all(np.isfinite(present)) or not np.array_equal(present, np.round(present)):
+        return None
+    lo, hi = present.min(), present.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return pd.arrays.IntegerArray(np.where(missing, 0, arr).astype(dtype), missing)
+    return None
+
+
+def _compact_numeric(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(s):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        return pd.to_numeric(s, downcast="integer")
+    if pd.api.types.is_float_dtype(s):
+        arr = s.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(arr)
+        if missing.any():
+            # Integer scores with gaps (Likert items with skipped answers): 1-2 bytes instead of 4
+            ints = _nullable_integers(arr, missing)
+            if ints is not None:
+                return pd.Series(ints, index=s.index, name=s.name)
+        present = arr[~missing]
+        small = arr.astype(np.float32)
+        # float32 only when every value survives the round trip (Likert scores, small counts)
+        if np.array_equal(small.astype(np.float64), arr, equal_nan=True) and np.all(np.isfinite(present)):
+            return pd.Series(small, index=s.index, name=s.name)
+    return s
+
+
+def _compact_column(s: pd.Series) -> pd.Series:
+    if s.dtype != object:
+        return _compact_numeric(s)
+    if s.map(lambda v: v is None or isinstance(v, str) or (isinstance(v, float) and v != v)).all():
+        values = s.dropna()
+        if len(values) and values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+            return s.astype("category")
+    return s
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of df with the smallest lossless dtypes; column names become strings."""
+    index = pd.RangeIndex(len(df))
+    # positional: chunks and row selections do not start at 0
+    out = {str(col): _compact_column(df[col]).set_axis(index) for col in df.columns}
+    return pd.DataFrame(out, index=index)
+
+
+def _is_nullable_int(dtype) -> bool:
+    return pd.api.types.is_extension_array_dtype(dtype) and pd.api.types.is_integer_dtype(dtype)
+
+
+def working_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Nullable int columns as floats with NaN (float32 is exact up to Int16)."""
+    nullable = {c: (np.float32 if df[c].dtype.itemsize <= 2 else np.float64)
+                for c in df.columns if _is_nullable_int(df[c].dtype)}
+    return df.astype(nullable) if nullable else df
+
+
+def _likert_range(s: pd.Series) -> Optional[Dict[str, int]]:
+    if not pd.api.types.is_integer_dtype(s) or pd.api.types.is_bool_dtype(s):
+        return None
+    values = s.dropna()
+    if not len(values):
+        return None
+    lo, hi = int(values.min()), int(values.max())
+    if hi - lo >= LIKERT_MAX_LEVELS or not 3 <= values.nunique() <= LIKERT_MAX_LEVELS:
+        return None
+    return {"min": lo, "max": hi}
+
+
+def frame_from_payload(data: Union[pd.DataFrame, Sequence[Dict[str, Any]]]) -> pd.DataFrame:
+    if isinstance(data, pd.DataFrame):
+        return data
+    if not isinstance(data, list):
+        raise ValueError("'data' must be a list of row objects")
+    return pd.DataFrame.from_records(data)
+
+
+class _LimitedReader(io.RawIOBase):
+    """Binary stream over `raw` that raises UploadTooLarge past `limit` bytes (0: no limit)."""
+
+    def __init__(self, raw, limit: int):
+        self._raw = raw
+        self.limit = limit
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._raw.read(len(buffer))
+        n = len(data)
+        self.bytes_read += n
+        if self.limit and self.bytes_read > self.limit:
+            raise UploadTooLarge(f"CSV exceeds the upload limit of {self.limit / 2 ** 20:g} MB")
+        buffer[:n] = data
+        return n
+
+
+def _concat_compact(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    if len(parts) == 1:
+        return parts[0]
+    columns = {}
+    for col in list(parts[0].columns):
+        pieces = [p.pop(col) for p in parts]  # each chunk's column is released once joined
+        if all(isinstance(s.dtype, pd.CategoricalDtype) for s in pieces):
+            columns[col] = pd.Series(union_categoricals(pieces), name=col)
+        elif all(s.dtype == pieces[0].dtype for s in pieces):
+            columns[col] = pd.concat(pieces, ignore_index=True)
+        else:
+            # Chunks disagree (int8 vs. float32, categorical vs. strings); settle on the whole column
+            pieces = [s.astype(object) if isinstance(s.dtype, pd.CategoricalDtype) else s for s in pieces]
+            columns[col] = _compact_column(pd.concat(pieces, ignore_index=True))
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_csv_compact(stream, max_bytes: int = UPLOAD_MAX_BYTES, chunk_rows: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
+    """Parse a binary CSV stream (e.g. UploadFile.file, spooled to disk by Starlette) chunk by chunk."""
+    reader = io.BufferedReader(_LimitedReader(stream, max_bytes), buffer_size=1 << 16)
+    return _concat_compact([compact_frame(chunk) for chunk in pd.read_csv(reader, chunksize=chunk_rows)])
+
+
+def frame_from_csv(content: bytes) -> pd.DataFrame:
+    return read_csv_compact(io.BytesIO(content))
+
+
+# ---------- spill files ----------
+
+def _column_arrays(s: pd.Series, key: str, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Plain arrays for one column (added to `arrays`) and its JSON description."""
+    dtype = s.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        arrays[key] = s.cat.codes.to_numpy()
+        cats = dtype.categories
+        if cats.dtype == object:
+            return {"kind": "category", "ordered": bool(dtype.ordered), "categories": cats.tolist()}
+        arrays[key + "_categories"] = cats.to_numpy()
+        return {"kind": "category", "ordered": bool(dtype.ordered)}
+    if isinstance(s.array, pd.arrays.BooleanArray) or _is_nullable_int(dtype) \
+            or isinstance(s.array, pd.arrays.FloatingArray):
+        arrays[key] = s.array._data
+        arrays[key + "_mask"] = s.array._mask
+        return {"kind": "masked", "dtype": str(dtype)}
+    if dtype == object:
+        # str / int / float / bool / None only; anything else makes json.dumps fail and the spill skipped
+        return {"kind": "object", "values": s.tolist()}
+    arrays[key] = s.to_numpy()
+    return {"kind": "array"}
+
+
+def _column_from_arrays(meta: Dict[str, Any], key: str, archive) -> Any:
+    kind = meta["kind"]
+    if kind == "category":
+        cats = meta["categories"] if "categories" in meta else archive[key + "_categories"]
+        return pd.Categorical.from_codes(archive[key], pd.Index(cats, dtype=object if "categories" in meta else None),
+                                         ordered=meta["ordered"])
+    if kind == "masked":
+        return pd.api.types.pandas_dtype(meta["dtype"]).construct_array_type()(archive[key], archive[key + "_mask"])
+    if kind == "object":
+        return pd.Series(meta["values"], dtype=object)
+    return archive[key]
+
+
+def write_spill(path: str, frame: pd.DataFrame) -> None:
+    arrays: Dict[str, np.ndarray] = {}
+    columns = [{"name": str(name), **_column_arrays(frame[name], f"c{i}", arrays)}
+               for i, name in enumerate(frame.columns)]
+    meta = json.dumps({"n_rows": int(len(frame)), "columns": columns}).encode("utf-8")
+    with open(path, "wb") as f:
+        np.savez(f, __meta__=np.frombuffer(meta, dtype=np.uint8), **arrays)
+
+
+def read_spill(path: str) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as archive:
+        meta = json.loads(archive["__meta__"].tobytes().decode("utf-8"))
+        data = {c["name"]: _column_from_arrays(c, f"c{i}", archive) for i, c in enumerate(meta["columns"])}
+    return pd.DataFrame(data, index=pd.RangeIndex(meta["n_rows"]), copy=False)
+
+
+# ---------- store ----------
+
+class _Entry:
+    __slots__ = ("frame", "info", "nbytes", "last_used")
+
+    def __init__(self, frame: Optional[pd.DataFrame], info: Dict[str, Any], nbytes: int):
+        self.frame = frame
+        self.info = info
+        self.nbytes = nbytes
+        self.last_used = time.time()
+
+
+def _column_info(name: str, s: pd.Series) -> Dict[str, Any]:
+    info: Dict[str, Any] = {"name": name, "dtype": str(s.dtype)}
+    likert = _likert_range(s)
+    if likert is not None:
+        info["likert"] = likert
+    return info
+
+
+def _describe_frame(dataset_id: str, df: pd.DataFrame, nbytes: int) -> Dict[str, Any]:
+    return {
+        "dataset_id": dataset_id,
+        "n_rows": int(len(df)),
+        "n_cols": int(df.shape[1]),
+        "columns": [_column_info(c, df[c]) for c in df.columns],
+        "bytes": nbytes,
+    }
+
+
+def _known_columns(frame: pd.DataFrame, columns: Sequence[str]) -> List[str]:
+    columns = [str(c) for c in columns]
+    missing = [c for c in columns if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Unknown column(s): {', '.join(missing)}")
+    return columns
+
+
+class DatasetStore:
+    def __init__(self, max_bytes: int, ttl: float, spill_dir: Optional[str] = None,
+                 spill_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"uploads": 0, "dedup": 0, "hits": 0, "spilled": 0, "reloaded": 0, "expired": 0}
+        if spill_dir:
+            os.makedirs(spill_dir, mode=0o700, exist_ok=True)
+
+    # ---- spill files ----
+    def _spill_path(self, dataset_id: str) -> str:
+        return os.path.join(self.spill_dir, dataset_id + ".npz")
+
+    def _spill(self, dataset_id: str, frame: pd.DataFrame) -> bool:
+        if not self.spill_dir:
+            return False
+        path = self._spill_path(dataset_id)
+        if os.path.exists(path):
+            os.utime(path)
+            return True
+        fd, tmp = tempfile.mkstemp(dir=self.spill_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            write_spill(tmp, frame)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return False
+        self.stats["spilled"] += 1
+        self._prune_spill()
+        return True
+
+    def _load_spilled(self, dataset_id: str) -> Optional[pd.DataFrame]:
+        if not self.spill_dir or not all(c in "0123456789abcdef" for c in dataset_id):
+            return None
+        path = self._spill_path(dataset_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.unlink(path)
+                self.stats["expired"] += 1
+                return None
+            frame = read_spill(path)
+            os.utime(path)
+        except (OSError, ValueError, KeyError, EOFError):
+            return None
+        self.stats["reloaded"] += 1
+        return frame
+
+    def _prune_spill(self) -> None:
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            if not name.endswith(".npz"):
+                continue
+            p = os.path.join(self.spill_dir, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        now = time.time()
+        total = sum(e[1] for e in entries)
+        for mtime, size, p in sorted(entries):
+            if now - mtime <= self.ttl and (not self.spill_max_bytes or total <= self.spill_max_bytes):
+                break
+            try:
+                os.unlink(p)
+                total -= size
+            except OSError:
+                pass
+
+    # ---- memory tier ----
+    def _purge(self) -> None:
+        """Expire idle datasets, then spill least recently used frames over the memory budget."""
+        now = time.time()
+        for dataset_id, entry in list(self._entries.items()):
+            if now - entry.last_used > self.ttl:
+                self._forget(dataset_id)
+                self.stats["expired"] += 1
+        for dataset_id, entry in list(self._entries.items()):
+            if self._mem_bytes <= self.max_bytes:
+                break
+            if entry.frame is None:
+                continue
+            if self._spill(dataset_id, entry.frame):
+                entry.frame = None
+                self._mem_bytes -= entry.nbytes
+            else:
+                self._forget(dataset_id)
+
+    def _forget(self, dataset_id: str) -> None:
+        entry = self._entries.pop(dataset_id, None)
+        if entry is not None and entry.frame is not None:
+            self._mem_bytes -= entry.nbytes
+        if self.spill_dir:
+            try:
+                os.unlink(self._spill_path(dataset_id))
+            except OSError:
+                pass
+
+    def _frame(self, dataset_id: str) -> Optional[pd.DataFrame]:
+        entry = self._entries.get(dataset_id)
+        if entry is not None and time.time() - entry.last_used > self.ttl:
+            self._forget(dataset_id)
+            self.stats["expired"] += 1
+            entry = None
+        if entry is not None and entry.frame is not None:
+            entry.last_used = time.time()
+            self._entries.move_to_end(dataset_id)
+            self.stats["hits"] += 1
+            return entry.frame
+        frame = self._load_spilled(dataset_id)  # spilled here or by another worker
+        if frame is None:
+            if entry is not None:
+                self._entries.pop(dataset_id, None)
+            return None
+        self._insert(dataset_id, frame)
+        return frame
+
+    def _insert(self, dataset_id: str, frame: pd.DataFrame) -> _Entry:
+        nbytes = int(frame.memory_usage(index=False, deep=True).sum())
+        old = self._entries.pop(dataset_id, None)
+        if old is not None and old.frame is not None:
+            self._mem_bytes -= old.nbytes
+        entry = _Entry(frame, _describe_frame(dataset_id, frame, nbytes), nbytes)
+        self._entries[dataset_id] = entry
+        self._mem_bytes += nbytes
+        self._purge()
+        return entry
+
+    # ---- public API ----
+    def put(self, data: Union[pd.DataFrame, Sequence[Dict[str, Any]]], compacted: bool = False) -> Dict[str, Any]:
+        """Register a dataset; returns its description including "dataset_id".
+
+        compacted=True skips compact_frame() for frames that come from read_csv_compact().
+        """
+        frame = frame_from_payload(data) if compacted else compact_frame(frame_from_payload(data))
+        dataset_id = content_digest(frame)[:ID_LENGTH]
+        with self._lock:
+            self.stats["uploads"] += 1
+            entry = self._entries.get(dataset_id)
+            if entry is not None and entry.frame is not None:
+                self.stats["dedup"] += 1
+                entry.last_used = time.time()
+                self._entries.move_to_end(dataset_id)
+                return dict(entry.info)
+            return dict(self._insert(dataset_id, frame).info)
+
+    def get(self, dataset_id: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            return self._frame(dataset_id)
+
+    def info(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._frame(dataset_id) is None:
+                return None
+            return dict(self._entries[dataset_id].info)
+
+    def select(self, dataset_id: str, columns: Optional[Sequence[str]] = None,
+               rows: Union[None, Sequence[int], Dict[str, Any]] = None) -> pd.DataFrame:
+        frame = self.get(dataset_id)
+        if frame is None:
+            raise KeyError(dataset_id)
+        if columns is not None:
+            frame = frame[_known_columns(frame, columns)]
+        if rows is not None:
+            if isinstance(rows, dict):
+                frame = frame.iloc[slice(rows.get("start"), rows.get("stop"))]
+            else:
+                positions = np.asarray(rows, dtype=np.int64)
+                if positions.size and (positions.min() < -len(frame) or positions.max() >= len(frame)):
+                    raise ValueError("Row selection out of range")
+                frame = frame.iloc[positions]
+            frame = frame.reset_index(drop=True)
+        return working_frame(frame)
+
+    def page(self, dataset_id: str, offset: int = 0, limit: int = 100,
+             columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Rows [offset, offset + limit) as JSON-ready records (missing values as None)."""
+        frame = self.get(dataset_id)
+        if frame is None:
+            raise KeyError(dataset_id)
+        if offset < 0 or limit < 0:
+            raise ValueError("offset and limit must not be negative")
+        limit = min(limit, PAGE_MAX_ROWS)
+        names = _known_columns(frame, columns) if columns is not None else list(frame.columns)
+        part = frame.iloc[offset:offset + limit][names]
+        return {"dataset_id": dataset_id, "offset": offset, "limit": limit, "n_rows": int(len(frame)),
+                "columns": names, "rows": frame_records(part)}
+
+    def drop(self, dataset_id: str) -> bool:
+        with self._lock:
+            known = dataset_id in self._entries
+            spilled = self.spill_dir is not None and all(c in "0123456789abcdef" for c in dataset_id) \
+                and os.path.exists(self._spill_path(dataset_id))
+            self._forget(dataset_id)
+            return known or spilled
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge()
+            return {
+                **self.stats,
+                "datasets": len(self._entries),
+                "in_memory": sum(1 for e in self._entries.values() if e.frame is not None),
+                "memory_bytes": self._mem_bytes,
+                "memory_max_bytes": self.max_bytes,
+                "spill_dir": self.spill_dir,
+                "ttl": self.ttl,
+            }
+
+
+def _build_store() -> DatasetStore:
+    spill_dir = os.getenv("DATASET_SPILL_DIR")
+    if spill_dir is None:
+        spill_dir = private_tmp_dir("scalex_datasets")
+    return DatasetStore(
+        max_bytes=int(env_num("DATASET_MAX_MB", 256) * 1024 * 1024),
+        ttl=env_num("DATASET_TTL", 6 * 60 * 60),
+        spill_dir=spill_dir or None,
+        spill_max_bytes=int(env_num("DATASET_SPILL_MAX_MB", 2048) * 1024 * 1024),
+    )
+
+
+dataset_store = _build_store()
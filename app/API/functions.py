@@ -1,16 +1,24 @@
 import os
 import importlib
-import openai
 import json
 import pandas as pd
 import numpy as np
-from scipy import stats
-import pingouin as pg
 import re
+import asyncio
+from analysis import lazy
+
+# Imported on first use (analysis/lazy.py): pingouin alone pulls in statsmodels, matplotlib and seaborn
+stats = lazy.module("scipy.stats")
+special = lazy.module("scipy.special")
+pg = lazy.module("pingouin")
+openai = lazy.module("openai")
 
-import time
 from dotenv import load_dotenv
 load_dotenv()   # reads .env into os.environ
+from API.llm_client import llm_clients  # after load_dotenv: reads LLM_* / OPENAI_BASE_URL
+from API.llm_cache import llm_cache, key_id as llm_cache_tenant, make_key as llm_cache_key
+from analysis import metrics
+from analysis.config import env_int, env_num
 
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gpt-4.1")
 DEFAULT_SEARCH_MODEL = os.getenv("DEFAULT_SEARCH_MODEL", "gpt-4o-search-preview")
@@ -30,66 +38,111 @@ def load_questions(file_path):
 
 # Removed specific OpenAI exception imports (not available in this environment)
 
-def get_chatgpt_response(user_input, messages, temperature=0.7, model=DEFAULT_MODEL, api_key=None):
+def _use_cache(use_cache, temperature):
+    """use_cache=None caches only unsampled requests; temperature > 0 needs an explicit True."""
+    if use_cache is None:
+        return temperature is None or temperature <= 0
+    return bool(use_cache)
+
+
+async def _cached_reply(key, tenant, use_cache):
+    """Cached reply for key, or None (cache disabled, bypassed, key not yet verified or missing)."""
+    if llm_cache is None:
+        return None
+    if not use_cache:
+        llm_cache.stats["bypassed"] += 1
+        return None
+    return await asyncio.to_thread(llm_cache.get, key, tenant)
+
+
+async def _store_reply(key, tenant, reply):
+    if llm_cache is not None:
+        await asyncio.to_thread(llm_cache.put, key, tenant, reply)
+
+
+async def get_chatgpt_response(user_input, messages, temperature=0.7, model=DEFAULT_MODEL, api_key=None, use_cache=None):
     """
-    Sends a prompt to ChatGPT and retrieves the response, handling errors and retries.
+    Sends a prompt to ChatGPT and retrieves the response.
+    Uses the shared per-key client (API/llm_client.py), which retries rate limits and transient errors.
+    Identical requests are answered from the completion cache when it is enabled (API/llm_cache.py).
     """
-    client = openai.OpenAI(api_key=api_key)
     # Append user's input to the conversation history
     messages.append({"role": "user", "content": user_input})
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-        )
-    except Exception as e:
-        err_msg = str(e).lower()
-        # Retry on rate-limiting errors
-        if 'rate limit' in err_msg:
-            print("Rate limit exceeded. Retrying in 5 seconds...", e)
-            time.sleep(5)
-            return get_chatgpt_response(user_input, messages, temperature, model, api_key)
-        # Log other API errors and propagate
-        print("OpenAI API error:", e)
-        raise
-    # Extract assistant's reply
-    assistant_reply = response.choices[0].message.content
+    tenant = llm_cache_tenant(api_key)
+    cache_key = llm_cache_key(model, messages, temperature, False, tenant)
+    assistant_reply = await _cached_reply(cache_key, tenant, _use_cache(use_cache, temperature))
+    if assistant_reply is None:
+        try:
+            response = await llm_clients.chat_completion(
+                api_key,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+            )
+        except Exception as e:
+            # Log API errors (retries are exhausted at this point) and propagate
+            print("OpenAI API error:", e)
+            raise
+        # Extract assistant's reply
+        assistant_reply = response.choices[0].message.content
+        await _store_reply(cache_key, tenant, assistant_reply)
     # Append assistant's reply to history
     messages.append({"role": "assistant", "content": assistant_reply})
     return assistant_reply, messages
 
 
-def get_chatgpt_search(user_input, messages, model=DEFAULT_SEARCH_MODEL, api_key=None):
+async def get_chatgpt_search(user_input, messages, model=DEFAULT_SEARCH_MODEL, api_key=None, use_cache=None):
     """
-    Sends a prompt to ChatGPT and retrieves the response, handling errors and retries.
+    Sends a prompt to the search model and retrieves the response (same client, retries and cache as above).
     """
-    client = openai.OpenAI(api_key=api_key)
-
     # Append user's input to the conversation history
     messages.append({"role": "user", "content": user_input})
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-        )
-    except Exception as e:
-        err_msg = str(e).lower()
-        # Retry on rate-limiting errors
-        if 'rate limit' in err_msg:
-            print("Rate limit exceeded. Retrying in 5 seconds...", e)
-            time.sleep(5)
-            return get_chatgpt_search(user_input, messages, model, api_key)
-        # Log other API errors and propagate
-        print("OpenAI API error:", e)
-        raise
-    # Extract assistant's reply
-    assistant_reply = response.choices[0].message.content
+    tenant = llm_cache_tenant(api_key)
+    cache_key = llm_cache_key(model, messages, None, True, tenant)
+    assistant_reply = await _cached_reply(cache_key, tenant, _use_cache(use_cache, None))
+    if assistant_reply is None:
+        try:
+            response = await llm_clients.chat_completion(
+                api_key,
+                model=model,
+                messages=messages,
+            )
+        except Exception as e:
+            print("OpenAI API error:", e)
+            raise
+        # Extract assistant's reply
+        assistant_reply = response.choices[0].message.content
+        await _store_reply(cache_key, tenant, assistant_reply)
     # Append assistant's reply to history
     messages.append({"role": "assistant", "content": assistant_reply})
     return assistant_reply, messages
 
 
+async def stream_chatgpt_response(user_input, messages, temperature=0.7, model=DEFAULT_MODEL, api_key=None, search=False, use_cache=None):
+    """
+    Streaming twin of get_chatgpt_response / get_chatgpt_search: yields reply fragments as they
+    arrive; the full reply is appended to `messages` once the stream completes. A cached reply
+    is yielded as one fragment.
+    """
+    messages.append({"role": "user", "content": user_input})
+    params = {"model": model, "messages": messages}
+    if not search:
+        params["temperature"] = temperature
+    tenant = llm_cache_tenant(api_key)
+    cache_key = llm_cache_key(model, messages, None if search else temperature, search, tenant)
+    reply = await _cached_reply(cache_key, tenant, _use_cache(use_cache, None if search else temperature))
+    if reply is not None:
+        yield reply
+    else:
+        parts = []
+        async for delta in llm_clients.stream_chat(api_key, **params):
+            parts.append(delta)
+            yield delta
+        reply = "".join(parts)
+        await _store_reply(cache_key, tenant, reply)
+    messages.append({"role": "assistant", "content": reply})
+
+
 def analyze_content_adequacy(
     df,
     intended_map,
@@ -102,12 +155,16 @@ def analyze_content_adequacy(
     drop_incomplete=True,
     decision_mode="binary",   # "binary" or "ternary"
     sphericity="GG",          # "GG", "HF", or "none"
+    engine="pandas",          # "pandas" (per-item loop) or "numpy" (batched arrays)
 ):
     """
     MacKenzie, Podsakoff & Podsakoff (2011) / Hinkin & Tracey (1999)
     One-way RM-ANOVA per item (facet within rater) + planned contrast
     (intended facet > mean of others, one-sided). Uses GG/HF correction
     to the error term as recommended.
+
+    engine="numpy" computes all items at once from one (item, rater) x facet array;
+    results match the pandas/pingouin path to floating-point rounding.
     """
     required = {item_col, rater_col, facet_col, rating_col}
     missing = required - set(df.columns)
@@ -116,172 +173,412 @@ def analyze_content_adequacy(
     if sphericity not in {"GG", "HF", "none"}:
         raise ValueError("sphericity must be 'GG', 'HF', or 'none'")
 
+    if engine == "numpy":
+        with metrics.span("adequacy.batched"):
+            return _analyze_content_adequacy_batched(
+                df, intended_map, item_col, rater_col, facet_col, rating_col, alpha,
+                require_target_highest, drop_incomplete, decision_mode, sphericity,
+            )
+    if engine != "pandas":
+        raise ValueError("engine must be 'pandas' or 'numpy'")
+
     rows = []
     for it in sorted(df[item_col].unique(), key=lambda x: str(x)):
         target = intended_map.get(it, None)
         d = df[df[item_col] == it].copy()
+        rows.append(_content_adequacy_item(
+            it, d, target, rater_col, facet_col, rating_col, alpha,
+            require_target_highest, drop_incomplete, decision_mode, sphericity,
+        ))
 
-        facets = sorted(d[facet_col].unique(), key=lambda x: str(x))
-        k = len(facets)
-        note_msgs = []
+    return pd.DataFrame(rows).sort_values(by="item").reset_index(drop=True)
 
-        if target is None:
-            rows.append(_empty_row(it, target, d[rater_col].nunique(), k,
-                                  notes="No intended facet provided"))
-            continue
-        if k < 2:
-            rows.append(_empty_row(it, target, d[rater_col].nunique(), k,
-                                  notes="Fewer than 2 facets"))
-            continue
-        if target not in facets:
-            rows.append(_empty_row(it, target, d[rater_col].nunique(), k,
-                                  notes=f"Intended facet '{target}' not in observed facets"))
-            continue
-
-        # Remove rows with missing ratings BEFORE completeness check (treat missing as not provided)
-        # This prevents placeholder null rows from inflating n_raters.
-        d_nonmissing = d.dropna(subset=[rating_col])
-
-        # Track raters that had zero non-missing ratings (will be excluded silently)
-        initial_raters = d[rater_col].nunique()
-        raters_with_any = d_nonmissing[rater_col].nunique()
-        dropped_empty = initial_raters - raters_with_any
-        if dropped_empty > 0:
-            note_msgs.append(f"dropped {dropped_empty} empty rater(s)")
 
-        # Ensure each remaining rater contributed a complete within-subject profile (MacKenzie / Hinkin-Tracey design)
-        if drop_incomplete:
-            counts = d_nonmissing.groupby(rater_col)[facet_col].nunique()
-            keep_ids = counts[counts == k].index
-            dropped_incomplete = counts.size - keep_ids.size
-            if dropped_incomplete > 0:
-                note_msgs.append(f"dropped {dropped_incomplete} incomplete rater(s)")
-            d = d_nonmissing[d_nonmissing[rater_col].isin(keep_ids)]
+def _content_adequacy_item(it, d, target, rater_col, facet_col, rating_col, alpha,
+                           require_target_highest, drop_incomplete, decision_mode, sphericity):
+    """Result row for a single item (`d` holds only that item's long-format rows)."""
+    facets = sorted(d[facet_col].unique(), key=lambda x: str(x))
+    k = len(facets)
+    note_msgs = []
+
+    if target is None:
+        return _empty_row(it, target, d[rater_col].nunique(), k,
+                          notes="No intended facet provided")
+    if k < 2:
+        return _empty_row(it, target, d[rater_col].nunique(), k,
+                          notes="Fewer than 2 facets")
+    if target not in facets:
+        return _empty_row(it, target, d[rater_col].nunique(), k,
+                          notes=f"Intended facet '{target}' not in observed facets")
+
+    # Remove rows with missing ratings BEFORE completeness check (treat missing as not provided)
+    # This prevents placeholder null rows from inflating n_raters.
+    d_nonmissing = d.dropna(subset=[rating_col])
+
+    # Track raters that had zero non-missing ratings (will be excluded silently)
+    initial_raters = d[rater_col].nunique()
+    raters_with_any = d_nonmissing[rater_col].nunique()
+    dropped_empty = initial_raters - raters_with_any
+    if dropped_empty > 0:
+        note_msgs.append(f"dropped {dropped_empty} empty rater(s)")
+
+    # Ensure each remaining rater contributed a complete within-subject profile (MacKenzie / Hinkin-Tracey design)
+    if drop_incomplete:
+        counts = d_nonmissing.groupby(rater_col)[facet_col].nunique()
+        keep_ids = counts[counts == k].index
+        dropped_incomplete = counts.size - keep_ids.size
+        if dropped_incomplete > 0:
+            note_msgs.append(f"dropped {dropped_incomplete} incomplete rater(s)")
+        d = d_nonmissing[d_nonmissing[rater_col].isin(keep_ids)]
+    else:
+        d = d_nonmissing
+
+    n_raters = d[rater_col].nunique()
+    if n_raters <= 2:
+        return _empty_row(it, target, n_raters, k,
+                          notes="Fewer than 3 raters after filtering")
+
+    # 1) Omnibus RM-ANOVA with GG/HF correction per MacKenzie/Winer
+    try:
+        with metrics.span("adequacy.rm_anova"):
+            aov = pg.rm_anova(dv=rating_col,within=facet_col,subject=rater_col,data=d,detailed=True,correction=True,effsize="np2",  # ask pingouin for partial eta-squared
+            )
+        row = aov.loc[aov["Source"] == facet_col].iloc[0]
+
+        # Numerator df: 'DF' (pingouin); fallback to 'ddof1' if present
+        df1 = float(row["DF"] if "DF" in row else row.get("ddof1", np.nan))
+
+        # Uncorrected denominator df for within-subject one-way: (k-1)*(n-1)
+        df2_unc = (k - 1) * (n_raters - 1)
+
+        # Epsilon and corrected p-values
+        eps = float(row.get("eps", np.nan))
+        if sphericity == "GG":
+            p_omnibus = float(row.get("p-GG-corr", row["p-unc"]))
+            df2_corr = eps * df2_unc if np.isfinite(eps) else np.nan
+        elif sphericity == "HF":
+            p_omnibus = float(row.get("p-HF-corr", row["p-unc"]))
+            # HF-corrected df is approximately eps_HF * df2_unc; pingouin doesn’t return eps_HF,
+            # so report uncorrected df2 and note HF p used.
+            df2_corr = np.nan
         else:
-            d = d_nonmissing
+            p_omnibus = float(row["p-unc"])
+            df2_corr = np.nan
 
-        n_raters = d[rater_col].nunique()
-        if n_raters <= 2:
-            rows.append(_empty_row(it, target, n_raters, k,
-                                  notes="Fewer than 3 raters after filtering"))
-            continue
+        F = float(row["F"])
+        # Prefer pingouin's np2; fallback to formula with uncorrected df if needed
+        eta_p2 = float(row["np2"]) if "np2" in row else (
+            (F * df1) / (F * df1 + df2_unc) if np.isfinite(F) else np.nan
+        )
+    except Exception as e:
+        return _empty_row(it, target, n_raters, k, notes=f"ANOVA error: {e}")
+
+    # 2) Planned contrast: intended facet vs mean(other facets), one-sided (greater)
+    pivot = d.pivot_table(index=rater_col, columns=facet_col, values=rating_col)
+    pivot = pivot[facets]
+    weights = np.array([1.0 if f == target else -1.0/(k-1) for f in facets])
+    contrast_scores = pivot.values.dot(weights)
+
+    t_stat, p_two = stats.ttest_1samp(contrast_scores, 0.0)
+    mean_c = contrast_scores.mean()
+    if np.isnan(t_stat):
+        p_one = np.nan
+    else:
+        p_one = (p_two / 2.0) if mean_c > 0 else (1.0 - p_two / 2.0)
+    df_t = contrast_scores.size - 1
+    # Hedge against division by zero or non-finite std
+    if contrast_scores.size > 1:
+        denom = contrast_scores.std(ddof=1)
+        dz = mean_c / denom if np.isfinite(denom) and denom != 0 else np.nan
+    else:
+        dz = np.nan
+
+    # Descriptives and highest facet identification
+    facet_means = d.groupby(facet_col)[rating_col].mean()
+    intended_mean = float(facet_means.loc[target])
+    others_mean = float(facet_means.drop(labels=[target]).mean())
+    mean_diff = intended_mean - others_mean
+    highest_facet_name = facet_means.idxmax()
+    highest_facet_mean = float(facet_means.loc[highest_facet_name])
+    target_is_highest = highest_facet_name == target
+    item_mean = float(facet_means.mean())
+    other_facet_means = {f: float(facet_means.loc[f]) for f in facet_means.index if f != target}
+    all_facet_means = {f: float(facet_means.loc[f]) for f in facet_means.index}
+
+    # 3) Decision per MacKenzie/Hinkin-Tracey
+    keep, action = _adequacy_decision(p_omnibus, p_one, target_is_highest, alpha,
+                                      require_target_highest, decision_mode)
 
-        # 1) Omnibus RM-ANOVA with GG/HF correction per MacKenzie/Winer
-        try:
-            aov = pg.rm_anova(dv=rating_col,within=facet_col,subject=rater_col,data=d,detailed=True,correction=True,effsize="np2",  # ask pingouin for partial eta-squared
-            )
-            row = aov.loc[aov["Source"] == facet_col].iloc[0]
-
-            # Numerator df: 'DF' (pingouin); fallback to 'ddof1' if present
-            df1 = float(row["DF"] if "DF" in row else row.get("ddof1", np.nan))
-
-            # Uncorrected denominator df for within-subject one-way: (k-1)*(n-1)
-            df2_unc = (k - 1) * (n_raters - 1)
-
-            # Epsilon and corrected p-values
-            eps = float(row.get("eps", np.nan))
-            if sphericity == "GG":
-                p_omnibus = float(row.get("p-GG-corr", row["p-unc"]))
-                df2_corr = eps * df2_unc if np.isfinite(eps) else np.nan
-            elif sphericity == "HF":
-                p_omnibus = float(row.get("p-HF-corr", row["p-unc"]))
-                # HF-corrected df is approximately eps_HF * df2_unc; pingouin doesn’t return eps_HF,
-                # so report uncorrected df2 and note HF p used.
-                df2_corr = np.nan
-            else:
-                p_omnibus = float(row["p-unc"])
-                df2_corr = np.nan
-
-            F = float(row["F"])
-            # Prefer pingouin's np2; fallback to formula with uncorrected df if needed
-            eta_p2 = float(row["np2"]) if "np2" in row else (
-                (F * df1) / (F * df1 + df2_unc) if np.isfinite(F) else np.nan
-            )
-        except Exception as e:
-            rows.append(_empty_row(it, target, n_raters, k, notes=f"ANOVA error: {e}"))
-            continue
+    return {
+        "item": it,
+        "intended_facet": target,
+        "n_raters": n_raters,
+        "k_facets": k,
+        "alpha": alpha,
+        "F": F,
+        "df1": df1,
+        "df2_uncorr": df2_unc,
+        "df2_corr": df2_corr,    # GG-corrected df2 if available; else NaN
+        "epsilon": eps,          # GG epsilon (if estimated)
+        "p_omnibus": p_omnibus,  # GG/HF/uncorrected p as requested
+        "eta_p2": eta_p2,
+        "intended_mean": intended_mean,
+        "others_mean": others_mean,
+        "mean_diff": mean_diff,
+        "item_mean": item_mean,
+        "highest_facet": highest_facet_name,
+        "highest_facet_mean": highest_facet_mean,
+        "other_facet_means": other_facet_means,
+        "all_facet_means": all_facet_means,
+        "t_contrast": t_stat,
+        "df_t": df_t,
+        "p_contrast_one_sided": p_one,
+        "dz": dz,
+        "target_is_highest": target_is_highest,
+        "keep": keep,
+        "action": action,
+        "notes": "; ".join(note_msgs + [f"sphericity={sphericity}"])
+    }
 
-        # 2) Planned contrast: intended facet vs mean(other facets), one-sided (greater)
-        pivot = d.pivot_table(index=rater_col, columns=facet_col, values=rating_col)
-        pivot = pivot[facets]
-        weights = np.array([1.0 if f == target else -1.0/(k-1) for f in facets])
-        contrast_scores = pivot.values.dot(weights)
-
-        t_stat, p_two = stats.ttest_1samp(contrast_scores, 0.0)
-        mean_c = contrast_scores.mean()
-        if np.isnan(t_stat):
-            p_one = np.nan
-        else:
-            p_one = (p_two / 2.0) if mean_c > 0 else (1.0 - p_two / 2.0)
-        df_t = contrast_scores.size - 1
-        # Hedge against division by zero or non-finite std
-        if contrast_scores.size > 1:
-            denom = contrast_scores.std(ddof=1)
-            dz = mean_c / denom if np.isfinite(denom) and denom != 0 else np.nan
+
+def _adequacy_decision(p_omnibus, p_one, target_is_highest, alpha, require_target_highest, decision_mode):
+    """Keep/revise/delete rule per MacKenzie/Hinkin-Tracey; returns (keep, action)."""
+    omnibus_sig = (p_omnibus < alpha)
+    contrast_sig = (p_one < alpha)
+    keep = omnibus_sig and contrast_sig and (target_is_highest if require_target_highest else True)
+
+    if decision_mode == "binary":
+        action = "keep" if keep else "revise/delete"
+    elif decision_mode == "ternary":
+        if (not omnibus_sig) or (require_target_highest and not target_is_highest):
+            action = "delete"
+        elif omnibus_sig and (not contrast_sig):
+            action = "revise"
         else:
-            dz = np.nan
-
-        # Descriptives and highest facet identification
-        facet_means = d.groupby(facet_col)[rating_col].mean()
-        intended_mean = float(facet_means.loc[target])
-        others_mean = float(facet_means.drop(labels=[target]).mean())
-        mean_diff = intended_mean - others_mean
-        highest_facet_name = facet_means.idxmax()
-        highest_facet_mean = float(facet_means.loc[highest_facet_name])
-        target_is_highest = highest_facet_name == target
-        item_mean = float(facet_means.mean())
-        other_facet_means = {f: float(facet_means.loc[f]) for f in facet_means.index if f != target}
-        all_facet_means = {f: float(facet_means.loc[f]) for f in facet_means.index}
-
-        # 3) Decision per MacKenzie/Hinkin-Tracey
-        omnibus_sig = (p_omnibus < alpha)
-        contrast_sig = (p_one < alpha)
-        keep = omnibus_sig and contrast_sig and (target_is_highest if require_target_highest else True)
-
-        if decision_mode == "binary":
-            action = "keep" if keep else "revise/delete"
-        elif decision_mode == "ternary":
-            if (not omnibus_sig) or (require_target_highest and not target_is_highest):
-                action = "delete"
-            elif omnibus_sig and (not contrast_sig):
-                action = "revise"
-            else:
-                action = "keep"
+            action = "keep"
+    else:
+        raise ValueError("decision_mode must be 'binary' or 'ternary'")
+    return keep, action
+
+
+def _analyze_content_adequacy_batched(df, intended_map, item_col, rater_col, facet_col, rating_col, alpha,
+                                      require_target_highest, drop_incomplete, decision_mode, sphericity):
+    """
+    engine="numpy" path of analyze_content_adequacy.
+
+    The long table is collapsed once into a (item, rater) x facet cell array (duplicate
+    ratings averaged, as pivot_table does). The RM-ANOVA sums of squares, GG epsilon,
+    planned contrast and facet means are then computed for every item at once with
+    segment sums over that array. Items the batched maths does not cover (incomplete
+    raters kept with drop_incomplete=False) are delegated to the per-item pandas path.
+    """
+    # Degenerate inputs keep the exact behaviour (and errors) of the reference path
+    if (df.empty or not pd.api.types.is_numeric_dtype(df[rating_col])
+            or df[[item_col, rater_col, facet_col]].isna().any().any()):
+        return analyze_content_adequacy(
+            df, intended_map, item_col, rater_col, facet_col, rating_col, alpha,
+            require_target_highest, drop_incomplete, decision_mode, sphericity, engine="pandas",
+        )
+
+    items = sorted(df[item_col].unique(), key=lambda x: str(x))
+    facets = sorted(df[facet_col].unique(), key=lambda x: str(x))
+    n_items, n_fac = len(items), len(facets)
+    icode = pd.Categorical(df[item_col], categories=items).codes.astype(np.int64)
+    fcode = pd.Categorical(df[facet_col], categories=facets).codes.astype(np.int64)
+    rcode, rater_ids = pd.factorize(df[rater_col])
+    rcode = rcode.astype(np.int64)
+    n_rat = len(rater_ids)
+    values = df[rating_col].to_numpy(dtype=float)
+
+    # Facets observed per item (including rows whose rating is missing) and raters per item
+    item_has_facet = np.zeros((n_items, n_fac), dtype=bool)
+    item_has_facet[icode, fcode] = True
+    k_arr = item_has_facet.sum(1)
+    initial_raters = np.bincount(np.unique(icode * n_rat + rcode) // n_rat, minlength=n_items)
+
+    # (item, rater) pairs with at least one non-missing rating, and their facet cells
+    nm = ~np.isnan(values)
+    pair_keys, pair_idx = np.unique(icode[nm] * n_rat + rcode[nm], return_inverse=True)
+    pair_item = pair_keys // n_rat
+    n_pairs = len(pair_keys)
+    cell = pair_idx * n_fac + fcode[nm]
+    cell_cnt = np.bincount(cell, minlength=n_pairs * n_fac).reshape(n_pairs, n_fac)
+    cell_sum = np.bincount(cell, weights=values[nm], minlength=n_pairs * n_fac).reshape(n_pairs, n_fac)
+    present = cell_cnt > 0
+    X = np.divide(cell_sum, cell_cnt, out=np.zeros_like(cell_sum), where=present)
+
+    complete = present.sum(1) == k_arr[pair_item]
+    raters_with_any = np.bincount(pair_item, minlength=n_items)
+    n_complete = np.bincount(pair_item[complete], minlength=n_items)
+    kept = complete if drop_incomplete else np.ones(n_pairs, dtype=bool)
+    n_kept = np.bincount(pair_item[kept], minlength=n_items)
+
+    # Classify items: empty rows, per-item fallback, or batched
+    rows = {}
+    batched = np.zeros(n_items, dtype=bool)
+    targets = {}
+    for i, it in enumerate(items):
+        target = intended_map.get(it, None)
+        k = int(k_arr[i])
+        item_facets = [f for f, has in zip(facets, item_has_facet[i]) if has]
+        if target is None:
+            rows[i] = _empty_row(it, target, int(initial_raters[i]), k, notes="No intended facet provided")
+        elif k < 2:
+            rows[i] = _empty_row(it, target, int(initial_raters[i]), k, notes="Fewer than 2 facets")
+        elif target not in item_facets:
+            rows[i] = _empty_row(it, target, int(initial_raters[i]), k,
+                                 notes=f"Intended facet '{target}' not in observed facets")
+        elif n_kept[i] <= 2:
+            rows[i] = _empty_row(it, target, int(n_kept[i]), k, notes="Fewer than 3 raters after filtering")
+        elif not drop_incomplete and n_complete[i] != raters_with_any[i]:
+            rows[i] = _content_adequacy_item(
+                it, df[df[item_col] == it].copy(), target, rater_col, facet_col, rating_col, alpha,
+                require_target_highest, drop_incomplete, decision_mode, sphericity,
+            )
         else:
-            raise ValueError("decision_mode must be 'binary' or 'ternary'")
-
-        rows.append({
-            "item": it,
-            "intended_facet": target,
-            "n_raters": n_raters,
-            "k_facets": k,
-            "alpha": alpha,
-            "F": F,
-            "df1": df1,
-            "df2_uncorr": df2_unc,
-            "df2_corr": df2_corr,    # GG-corrected df2 if available; else NaN
-            "epsilon": eps,          # GG epsilon (if estimated)
-            "p_omnibus": p_omnibus,  # GG/HF/uncorrected p as requested
-            "eta_p2": eta_p2,
-            "intended_mean": intended_mean,
-            "others_mean": others_mean,
-            "mean_diff": mean_diff,
-            "item_mean": item_mean,
-            "highest_facet": highest_facet_name,
-            "highest_facet_mean": highest_facet_mean,
-            "other_facet_means": other_facet_means,
-            "all_facet_means": all_facet_means,
-            "t_contrast": t_stat,
-            "df_t": df_t,
-            "p_contrast_one_sided": p_one,
-            "dz": dz,
-            "target_is_highest": target_is_highest,
-            "keep": keep,
-            "action": action,
-            "notes": "; ".join(note_msgs + [f"sphericity={sphericity}"])
-        })
+            batched[i] = True
+            targets[i] = facets.index(target)
+
+    sel = kept & batched[pair_item]
+    q_item = pair_item[sel]
+    Xq = X[sel]
+    mask = item_has_facet.astype(float)
+    k_f = k_arr.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.bincount(q_item, minlength=n_items).astype(float)
+
+        # 1) One-way RM-ANOVA sums of squares (same decomposition as pingouin.rm_anova)
+        col_sum = np.stack([np.bincount(q_item, weights=Xq[:, f], minlength=n_items) for f in range(n_fac)], axis=1)
+        col_mean = col_sum / n[:, None]
+        grand = col_sum.sum(1) / (n * k_f)
+        ss_with = (((col_mean - grand[:, None]) ** 2) * mask).sum(1) * n
+        dev = (Xq - col_mean[q_item]) * mask[q_item]
+        ss_resall = np.bincount(q_item, weights=(dev ** 2).sum(1), minlength=n_items)
+        row_mean = Xq.sum(1) / k_f[q_item]
+        ss_resbetw = k_f * np.bincount(q_item, weights=(row_mean - grand[q_item]) ** 2, minlength=n_items)
+        ss_reswith = ss_resall - ss_resbetw
+        df1 = k_f - 1
+        ddof2 = df1 * (n - 1)
+        F = (ss_with / df1) / (ss_reswith / ddof2)
+        p_unc = stats.f.sf(F, df1, ddof2)
+        eta_p2 = ss_with / (ss_with + ss_reswith)
+
+        # Greenhouse-Geisser epsilon from the facet covariance matrix (zero-padded to all facets)
+        S = np.empty((n_items, n_fac, n_fac))
+        for a in range(n_fac):
+            for b in range(a, n_fac):
+                S[:, a, b] = S[:, b, a] = np.bincount(q_item, weights=dev[:, a] * dev[:, b], minlength=n_items)
+        S /= (n - 1)[:, None, None]
+        mean_var = np.trace(S, axis1=1, axis2=2) / k_f
+        S_mean = S.sum((1, 2)) / k_f ** 2
+        ss_mat = (S ** 2).sum((1, 2))
+        ss_rows = ((S.sum(2) / k_f[:, None]) ** 2).sum(1)
+        num = (k_f * (mean_var - S_mean)) ** 2
+        den = (k_f - 1) * (ss_mat - 2 * k_f * ss_rows + k_f ** 2 * S_mean ** 2)
+        eps = np.where(k_f <= 2, 1.0, np.minimum(num / den, 1))
+        p_gg = np.where(k_f >= 3,
+                        stats.f.sf(F, np.maximum(df1 * eps, 1.0), np.maximum(ddof2 * eps, 1.0)),
+                        p_unc)
 
-    return pd.DataFrame(rows).sort_values(by="item").reset_index(drop=True)
+        # 2) Planned contrast: intended facet vs mean(other facets), one-sided (greater)
+        W = np.zeros((n_items, n_fac))
+        for i, t in targets.items():
+            W[i] = -mask[i] / (k_f[i] - 1)
+            W[i, t] = 1.0
+        contrast = (Xq * W[q_item]).sum(1)
+        mean_c = np.bincount(q_item, weights=contrast, minlength=n_items) / n
+        sd_c = np.sqrt(np.bincount(q_item, weights=(contrast - mean_c[q_item]) ** 2, minlength=n_items) / (n - 1))
+        t_stat = mean_c / (sd_c / np.sqrt(n))
+        p_two = 2 * special.stdtr(n - 1, -np.abs(t_stat))
+
+    # Facet means over the raw (non-aggregated) ratings of the kept raters
+    row_keep = np.zeros(len(values), dtype=bool)
+    row_keep[np.flatnonzero(nm)] = sel[pair_idx]
+    fm_idx = icode[row_keep] * n_fac + fcode[row_keep]
+    fm_sum = np.bincount(fm_idx, weights=values[row_keep], minlength=n_items * n_fac).reshape(n_items, n_fac)
+    fm_cnt = np.bincount(fm_idx, minlength=n_items * n_fac).reshape(n_items, n_fac)
+
+    for i in np.flatnonzero(batched):
+        it = items[i]
+        target = facets[targets[i]]
+        cols = np.flatnonzero(item_has_facet[i])
+        note_msgs = []
+        dropped_empty = int(initial_raters[i] - raters_with_any[i])
+        if dropped_empty > 0:
+            note_msgs.append(f"dropped {dropped_empty} empty rater(s)")
+        if drop_incomplete:
+            dropped_incomplete = int(raters_with_any[i] - n_complete[i])
+            if dropped_incomplete > 0:
+                note_msgs.append(f"dropped {dropped_incomplete} incomplete rater(s)")
+
+        rows[i] = _adequacy_row(
+            it, target, [facets[c] for c in cols], int(n_kept[i]), float(F[i]), float(eps[i]),
+            float(p_unc[i]), float(p_gg[i]), float(eta_p2[i]), mean_c[i], sd_c[i], t_stat[i], p_two[i],
+            fm_sum[i, cols] / fm_cnt[i, cols], note_msgs, alpha, require_target_highest, decision_mode, sphericity,
+        )
+
+    return pd.DataFrame([rows[i] for i in range(n_items)]).sort_values(by="item").reset_index(drop=True)
+
+
+def _adequacy_row(it, target, item_facets, n_raters, F, eps, p_unc, p_gg, eta_p2, mean_c, sd_c, t_stat, p_two,
+                  means, note_msgs, alpha, require_target_highest, decision_mode, sphericity):
+    """Result row from precomputed ANOVA / contrast statistics (shared by the array-based engines)."""
+    k = len(item_facets)
+    df2_unc = (k - 1) * (n_raters - 1)
+    if sphericity == "GG":
+        p_omnibus = p_gg
+        df2_corr = eps * df2_unc if np.isfinite(eps) else np.nan
+    else:
+        # pingouin reports no HF-corrected p, so the reference path falls back to p-unc for "HF" too
+        p_omnibus = p_unc
+        df2_corr = np.nan
+
+    if np.isnan(t_stat):
+        p_one = np.nan
+    else:
+        p_one = (p_two / 2.0) if mean_c > 0 else (1.0 - p_two / 2.0)
+    dz = mean_c / sd_c if np.isfinite(sd_c) and sd_c != 0 else np.nan
+
+    t_pos = item_facets.index(target)
+    others = np.delete(means, t_pos)
+    intended_mean = float(means[t_pos])
+    others_mean = float(others.sum() / others.size)
+    highest = int(np.argmax(means))
+    highest_facet_name = item_facets[highest]
+    target_is_highest = highest_facet_name == target
+
+    keep, action = _adequacy_decision(p_omnibus, p_one, target_is_highest, alpha,
+                                      require_target_highest, decision_mode)
+    return {
+        "item": it,
+        "intended_facet": target,
+        "n_raters": n_raters,
+        "k_facets": k,
+        "alpha": alpha,
+        "F": F,
+        "df1": float(k - 1),
+        "df2_uncorr": df2_unc,
+        "df2_corr": df2_corr,
+        "epsilon": eps,
+        "p_omnibus": p_omnibus,
+        "eta_p2": eta_p2,
+        "intended_mean": intended_mean,
+        "others_mean": others_mean,
+        "mean_diff": intended_mean - others_mean,
+        "item_mean": float(means.sum() / means.size),
+        "highest_facet": highest_facet_name,
+        "highest_facet_mean": float(means[highest]),
+        "other_facet_means": {f: float(m) for f, m in zip(item_facets, means) if f != target},
+        "all_facet_means": {f: float(m) for f, m in zip(item_facets, means)},
+        "t_contrast": t_stat,
+        "df_t": n_raters - 1,
+        "p_contrast_one_sided": p_one,
+        "dz": dz,
+        "target_is_highest": target_is_highest,
+        "keep": keep,
+        "action": action,
+        "notes": "; ".join(note_msgs + [f"sphericity={sphericity}"])
+    }
 
 
 def _empty_row(it, target, n_raters, k, notes):
@@ -318,9 +615,86 @@ def _empty_row(it, target, n_raters, k, notes):
     
     
 
-def generate_persona_set(generatedPersonas, groupDescription,temperature=0.7, model=DEFAULT_MODEL, api_key=None, amount = 20):
-    messages = []
-    resultsPersonas = []
+PERSONA_START, PERSONA_END = "<startPersona>", "<endPersona>"
+
+# Structured persona generation (see generate_persona_set)
+PERSONA_SHARD_SIZE = env_int("PERSONA_SHARD_SIZE", 10)          # personas per LLM call
+PERSONA_MAX_CONCURRENCY = env_int("PERSONA_MAX_CONCURRENCY", 8)  # shards in flight per request
+PERSONA_SIMILARITY = env_num("PERSONA_SIMILARITY", 0.6)          # word-trigram Jaccard for near-duplicates
+PERSONA_TOPUP_ROUNDS = 2       # extra rounds when duplicates leave the pool short
+PERSONA_AVOID_SAMPLE = 5       # existing personas quoted (truncated) in the prompt
+PERSONA_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "persona_set",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"personas": {"type": "array", "items": {"type": "string"}}},
+            "required": ["personas"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+class PersonaStreamParser:
+    """Incremental <startPersona>…<endPersona> extraction over streamed text."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        """Append text; returns the personas whose closing tag has now arrived."""
+        self.buffer += text
+        found = []
+        while True:
+            start = self.buffer.find(PERSONA_START)
+            if start < 0:
+                # keep a tail that could be the beginning of a split start tag
+                self.buffer = self.buffer[-(len(PERSONA_START) - 1):]
+                return found
+            end = self.buffer.find(PERSONA_END, start + len(PERSONA_START))
+            if end < 0:
+                self.buffer = self.buffer[start:]
+                return found
+            found.append(self.buffer[start + len(PERSONA_START):end].strip())
+            self.buffer = self.buffer[end + len(PERSONA_END):]
+
+
+class PersonaDeduper:
+    """Drops exact (normalised text) and near-duplicate personas (word-trigram Jaccard)."""
+
+    def __init__(self, existing=(), threshold=PERSONA_SIMILARITY):
+        self.threshold = threshold
+        self.hashes = set()
+        self.shingles = []
+        for persona in existing:
+            self.add(persona)
+
+    @staticmethod
+    def _words(text):
+        return re.sub(r"[^\w\s]", " ", str(text).lower()).split()
+
+    def add(self, text):
+        """Remember text; False when it duplicates something already seen."""
+        words = self._words(text)
+        if not words:
+            return False
+        key = " ".join(words)
+        if key in self.hashes:
+            return False
+        grams = {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+        for other in self.shingles:
+            inter = len(grams & other)
+            if inter and inter / len(grams | other) >= self.threshold:
+                return False
+        self.hashes.add(key)
+        self.shingles.append(grams)
+        return True
+
+
+def _persona_prompt(generatedPersonas, groupDescription, amount):
     personasPrompt = f'''
     
     **Role**: Act as an impartial persona architect specializing in human complexity. 
@@ -336,9 +710,123 @@ def generate_persona_set(generatedPersonas, groupDescription,temperature=0.7, mo
     '''
     if len(generatedPersonas) != 0:
         personasPrompt = personasPrompt + f"These are the personas You already generated, dont repeat yourself: {generatedPersonas}. "
+    return personasPrompt
+
+
+def _structured_persona_prompt(groupDescription, amount, shard, n_shards, existing):
+    prompt = _persona_prompt([], groupDescription, amount)
+    if n_shards > 1:
+        prompt += (f"This is batch {shard + 1} of {n_shards} generated in parallel: make these personas differ "
+                   "from the other batches in age, occupation, background and life situation. ")
+    if existing:
+        sample = [p[:80] for p in existing[-PERSONA_AVOID_SAMPLE:]]
+        prompt += f"Personas like these already exist, do not repeat them or close variants: {sample}. "
+    return prompt + (f'Return a JSON object {{"personas": [...]}} with exactly {amount} strings, '
+                     'each the full description of one persona.')
+
+
+def _parse_persona_json(content):
+    try:
+        data = json.loads(content or "")
+    except ValueError:
+        return [p.strip() for p in re.findall(r'<startPersona>(.*?)<endPersona>', content or "", re.S)]
+    items = data.get("personas", []) if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return []
+    out = []
+    for item in items:
+        if isinstance(item, dict):  # json_object fallback sometimes returns {"name": ..., "description": ...}
+            item = ": ".join(str(v) for v in item.values())
+        if str(item).strip():
+            out.append(str(item).strip())
+    return out
+
+
+async def _persona_shard(groupDescription, amount, shard, n_shards, existing, temperature, model, api_key):
+    messages = [{"role": "user", "content": _structured_persona_prompt(groupDescription, amount, shard, n_shards, existing)}]
+    params = {"model": model, "messages": messages, "temperature": temperature}
+    try:
+        response = await llm_clients.chat_completion(api_key, response_format=PERSONA_SCHEMA, **params)
+    except openai.BadRequestError as e:
+        if "response_format" not in str(e) and "json_schema" not in str(e):
+            raise
+        # Models without structured outputs still support JSON mode
+        response = await llm_clients.chat_completion(api_key, response_format={"type": "json_object"}, **params)
+    return _parse_persona_json(response.choices[0].message.content)
+
+
+def _shard_sizes(amount):
+    n_shards = max(1, -(-amount // max(1, PERSONA_SHARD_SIZE)))
+    base, extra = divmod(amount, n_shards)
+    return [base + (1 if i < extra else 0) for i in range(n_shards)]
+
+
+async def _structured_personas(generatedPersonas, groupDescription, temperature, model, api_key, amount):
+    """
+    Single-pass JSON generation split into concurrent shards (at most PERSONA_MAX_CONCURRENCY in
+    flight); yields unique personas as shards finish. Duplicates are dropped locally, and short
+    pools are topped up for at most PERSONA_TOPUP_ROUNDS extra rounds.
+    """
+    existing = [str(p) for p in generatedPersonas]
+    seen = PersonaDeduper(existing)
+    limiter = asyncio.Semaphore(max(1, PERSONA_MAX_CONCURRENCY))
+    produced = 0
+
+    async def run(size, shard, n_shards):
+        async with limiter:
+            return await _persona_shard(groupDescription, size, shard, n_shards, existing, temperature, model, api_key)
+
+    for _ in range(1 + PERSONA_TOPUP_ROUNDS):
+        missing = amount - produced
+        if missing <= 0:
+            break
+        sizes = _shard_sizes(missing)
+        tasks = [asyncio.ensure_future(run(size, i, len(sizes))) for i, size in enumerate(sizes)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for persona in await finished:
+                    if produced < amount and seen.add(persona):
+                        produced += 1
+                        existing.append(persona)
+                        yield persona
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def generate_persona_set(generatedPersonas, groupDescription,temperature=0.7, model=DEFAULT_MODEL, api_key=None, amount = 20, mode="structured"):
+    """
+    mode "structured": one JSON-output pass, sharded and deduplicated locally (_structured_personas).
+    Any other mode: the original free-text generation followed by a re-formatting call.
+    """
+    if mode == "structured":
+        return [p async for p in _structured_personas(generatedPersonas, groupDescription, temperature, model, api_key, amount)]
+    messages = []
+    resultsPersonas = []
+    personasPrompt = _persona_prompt(generatedPersonas, groupDescription, amount)
     cleanPersonasPrompt = 'ok now give me the description of every Persona in this format and nothing else. I provide with you with a Template, Only alter the Placeholder in all caps. Your output should just look like this Template, no exessive whitespaces. Do this for every Persona and append them to one long string. No linebrakes or unneccary whitespaces:<startPersona>PERSONA AND THE DESCRIPTION<endPersona>'
-    rawPersonas = get_chatgpt_response(personasPrompt, [], temperature, model,api_key)
+    rawPersonas = await get_chatgpt_response(personasPrompt, [], temperature, model,api_key)
     resultsPersonas.append(rawPersonas[0])
-    results = get_chatgpt_response(cleanPersonasPrompt, rawPersonas[1], 0.3, model,api_key)
+    results = await get_chatgpt_response(cleanPersonasPrompt, rawPersonas[1], 0.3, model,api_key)
     # Use regex to extract content between <startPersona> and <endPersona>
-    return re.findall(r'<startPersona>(.*?)<endPersona>', results[0])
\ No newline at end of file
+    return re.findall(r'<startPersona>(.*?)<endPersona>', results[0])
+
+
+async def stream_persona_set(generatedPersonas, groupDescription, temperature=0.7, model=DEFAULT_MODEL, api_key=None, amount=20, mode="structured"):
+    """
+    mode "structured": yields personas as each concurrent shard completes.
+    Any other mode: a single streamed call that asks for the tagged format up front and yields
+    each persona as soon as its closing tag arrives (no second clean-up call).
+    """
+    if mode == "structured":
+        async for persona in _structured_personas(generatedPersonas, groupDescription, temperature, model, api_key, amount):
+            yield persona
+        return
+    prompt = _persona_prompt(generatedPersonas, groupDescription, amount) + (
+        f' Output the description of every Persona in this format and nothing else: {PERSONA_START}'
+        f'PERSONA AND THE DESCRIPTION{PERSONA_END}. Append them to one long string, no linebreaks or unnecessary whitespace.'
+    )
+    parser = PersonaStreamParser()
+    async for delta in stream_chatgpt_response(prompt, [], temperature, model, api_key):
+        for persona in parser.feed(delta):
+            yield persona
@@ -0,0 +1,223 @@
+"""Request metrics, per-request timings and the collectors behind GET /metrics.
+
+Contract:
+  - TimingMiddleware (plain ASGI, so streaming and disconnect detection are untouched) gives every
+    HTTP request a fresh timings dict (analysis/metrics.py) and records, per method and route
+    template, latency, request body size and response size
+  - A request sent with "?timings=1" or the header "X-Timings: 1" gets the breakdown back. A JSON
+    object response gains a "timings" block ({stage: seconds, ..., "total": seconds}); every other
+    response gets a Server-Timing header instead
+  - ProfilingMiddleware (only installed when PROFILING=1, analysis/profiling.py) profiles a request
+    sent with "?profile=1" or "X-Profile: 1": the request runs with a fresh capture, the response
+    carries its id in X-Profile-Id, and the artifacts are served under /api/profiles. With
+    PROFILING_TOKEN set, the request must also send X-Profile-Token or it is refused with 403
+  - Queue depth, running jobs, R workers, caches, datasets and LLM request/retry counts are read
+    from the owning modules' describe() at scrape time, so /metrics adds no bookkeeping to them
+"""
+
+from __future__ import annotations
+
+import json, time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from analysis import metrics, profiling
+from analysis.r_cache import r_cache
+from analysis.r_pool import get_pool
+from API.adequacy_pipeline import adequacy_jobs
+from API.datasets import dataset_store
+from API.jobs import r_jobs
+from API.llm_cache import llm_cache
+from API.llm_client import llm_clients
+from API.simulation import sim_jobs
+
+request_seconds = metrics.histogram("http_request_duration_seconds", "HTTP request latency",
+                                    ("method", "route", "status"))
+request_bytes = metrics.histogram("http_request_bytes", "HTTP request body size (Content-Length)",
+                                  ("route",), metrics.BYTES_BUCKETS)
+response_bytes = metrics.histogram("http_response_bytes", "HTTP response body size", ("route",),
+                                   metrics.BYTES_BUCKETS)
+
+
+def _route(scope: Dict[str, Any]) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path  # template, e.g. /api/r/jobs/{job_id}
+    return "/static" if scope.get("path", "").startswith("/static") else "unmatched"
+
+
+def _header(scope: Dict[str, Any], name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _flag(scope: Dict[str, Any], header: bytes, param: str) -> bool:
+    if (_header(scope, header) or "").lower() in ("1", "true", "yes"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get(param, [""])[0].lower() in ("1", "true", "yes")
+
+
+def _wants_timings(scope: Dict[str, Any]) -> bool:
+    return _flag(scope, b"x-timings", "timings")
+
+
+def _server_timing(timings: Dict[str, float], total: float) -> bytes:
+    parts = [f"{stage.replace('.', '-')};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class TimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = metrics.start_timings()
+        want = _wants_timings(scope)
+        started = time.perf_counter()
+        state = {"status": 500, "bytes": 0}
+        held: List[Any] = []  # JSON response start, then its body chunks, kept back to add the timings
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if want and _is_json(message):
+                    held.append(message)
+                    return
+                if want:
+                    message = _with_header(message, timings, started)
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+                if held:
+                    held.append(message.get("body", b""))
+                    if not message.get("more_body"):
+                        await _send_held(send, held[0], b"".join(held[1:]), timings, started)
+                    return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route(scope)
+            request_seconds.observe(time.perf_counter() - started, scope.get("method", ""), route,
+                                    state["status"])
+            length = _header(scope, b"content-length")
+            if length and length.isdigit():
+                request_bytes.observe(int(length), route)
+            response_bytes.observe(state["bytes"], route)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        store = profiling.profile_store
+        if scope["type"] != "http" or store is None or not _flag(scope, b"x-profile", "profile"):
+            return await self.app(scope, receive, send)
+        if not store.allowed(_header(scope, b"x-profile-token")):
+            body = b'{"detail":"X-Profile-Token required"}'
+            await send({"type": "http.response.start", "status": 403,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode("latin-1"))]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        capture = profiling.use(store.create(f"{scope.get('method', '')} {scope.get('path', '')}"))
+        started = time.perf_counter()
+        state = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-profile-id", capture.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            capture.update(method=scope.get("method", ""), path=scope.get("path", ""),
+                           route=_route(scope), status=state["status"],
+                           seconds=round(time.perf_counter() - started, 4))
+
+
+def _is_json(start: Dict[str, Any]) -> bool:
+    for key, value in start.get("headers", ()):
+        if key.lower() == b"content-type":
+            return value.split(b";")[0].strip().lower() == b"application/json"
+    return False
+
+
+def _with_header(start: Dict[str, Any], timings: Dict[str, float], started: float) -> Dict[str, Any]:
+    headers = list(start.get("headers", ()))
+    headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - started)))
+    return {**start, "headers": headers}
+
+
+async def _send_held(send, start: Dict[str, Any], body: bytes, timings: Dict[str, float], started: float) -> None:
+    total = time.perf_counter() - started
+    if _is_json(start):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            payload["timings"] = {**{k: round(v, 4) for k, v in timings.items()}, "total": round(total, 4)}
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = [(k, v) for k, v in start.get("headers", ()) if k.lower() != b"content-length"]
+    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    headers.append((b"server-timing", _server_timing(timings, total)))
+    await send({**start, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# ---------- scrape-time collectors ----------
+
+def _samples(values: Dict[str, Any], label: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+    return {((label, k),): v for k, v in values.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+
+def _collect() -> List[Tuple[str, str, str, Dict[Tuple[Tuple[str, str], ...], float]]]:
+    queues = {"r": r_jobs.describe(), "simulation": sim_jobs.describe(), "adequacy": adequacy_jobs.describe()}
+    out = [
+        ("jobs_queued", "gauge", "Jobs waiting in each queue",
+         {(("queue", q),): d["queued"] for q, d in queues.items()}),
+        ("jobs_running", "gauge", "Jobs running in each queue",
+         {(("queue", q),): d["running"] for q, d in queues.items()}),
+    ]
+    pool = get_pool()
+    if pool is not None:
+        d = pool.describe()
+        out.append(("r_pool_workers", "gauge", "R worker pool processes by state",
+                    {(("state", "live"),): d["live"], (("state", "idle"),): d["idle"],
+                     (("state", "spawning"),): d["spawning"]}))
+        out.append(("r_pool_events_total", "counter", "R worker pool counters",
+                    _samples({k: d[k] for k in ("jobs", "fallbacks", "recycled", "spawn_failures")}, "event")))
+    if r_cache is not None:
+        d = r_cache.describe()
+        out.append(("r_cache_events_total", "counter", "R result cache lookups and stores",
+                    _samples({k: d[k] for k in ("hits_memory", "hits_disk", "misses", "bypassed", "stores",
+                                                "evictions")}, "event")))
+        out.append(("r_cache_bytes", "gauge", "R result cache memory use", {(): d["memory_bytes"]}))
+    d = dataset_store.describe()
+    out.append(("datasets", "gauge", "Registered datasets", {(): d["datasets"]}))
+    out.append(("datasets_memory_bytes", "gauge", "Memory held by in-memory datasets", {(): d["memory_bytes"]}))
+    d = llm_clients.describe()
+    out.append(("llm_requests_total", "counter", "OpenAI request attempts", {(): d["requests"]}))
+    out.append(("llm_retries_total", "counter", "OpenAI attempts retried after a transient error", {(): d["retries"]}))
+    out.append(("llm_waiting", "gauge", "OpenAI calls waiting for a per-key slot", {(): d["waiting"]}))
+    if llm_cache is not None:
+        d = llm_cache.describe()
+        out.append(("llm_cache_events_total", "counter", "Completion cache lookups and stores",
+                    _samples({k: d[k] for k in ("hits_memory", "hits_disk", "misses", "bypassed", "stores")},
+                             "event")))
+    return out
+
+
+metrics.register_collector(_collect)
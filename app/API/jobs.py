@@ -0,0 +1,242 @@
+"""In-process job queue for long-running analyses.
+
+Contract:
+  - submit(kind, runner) enqueues a job and returns it immediately; runner is
+    `async def runner(job) -> result` and is awaited by one of N queue consumers
+  - Jobs start in FIFO order; at most `concurrency` run at the same time
+  - Runners register kill hooks (job.on_cancel) for the external processes they start, so
+    cancel() both stops the coroutine and kills the underlying Rscript
+  - Finished jobs are kept for JOB_TTL seconds so clients can poll for the result
+  - events(job) yields a snapshot whenever the job changes (used for server-sent events)
+  - Each run collects its stage timings (analysis/metrics.py spans) in job.timings, starting
+    with the time spent in the queue; snapshots include them
+  - A job submitted while a profile capture is active (analysis/profiling.py) runs with it, so
+    the profile of a request includes the R or Python work it queued
+"""
+
+from __future__ import annotations
+
+import asyncio, os, time, uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from analysis import metrics, profiling
+from analysis.config import env_int
+
+JOB_TTL = 15 * 60       # seconds a finished job stays available
+MAX_FINISHED_JOBS = 500
+
+TERMINAL_STATES = {"done", "error", "cancelled"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, runner: Callable[["Job"], Awaitable[Any]], job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+        self.profile = profiling.current()
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._runner = runner
+        self._task: Optional[asyncio.Task] = None
+        self._kill_hooks: List[Callable[[], None]] = []
+        self._cancel_requested = False  # set by JobManager.cancel(); other cancellations stop the consumer
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def on_cancel(self, hook: Callable[[], None]) -> None:
+        """Register a callback that kills external work (e.g. an Rscript process)."""
+        self._kill_hooks.append(hook)
+
+    def update(self, **progress: Any) -> None:
+        self.progress.update(progress)
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def snapshot(self, include_result: bool = True) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": self.progress,
+        }
+        if self.error is not None:
+            out["error"] = self.error
+        if self.timings:
+            out["timings"] = self.timings
+        if include_result and self.status == "done":
+            out["result"] = self.result
+        return out
+
+
+class JobManager:
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = max(1, concurrency or os.cpu_count() or 1)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._consumers: List[asyncio.Task] = []
+        self._running = 0
+
+    def _ensure_consumers(self) -> None:
+        # Created lazily so the queue binds to the server's running event loop
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._consumers = []
+        self._consumers = [t for t in self._consumers if not t.done()]
+        while len(self._consumers) < self.concurrency:
+            self._consumers.append(asyncio.create_task(self._consume()))
+
+    async def _consume(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != "queued":  # cancelled while waiting
+                    continue
+                self._running += 1
+                job.status = "running"
+                job.started = time.time()
+                job._notify()
+                job._task = asyncio.current_task()
+                # The consumer outlives requests: spans of this run go to the job, not to the
+                # request that happened to start the consumer
+                metrics.use_timings(job.timings)
+                profiling.use(job.profile)
+                metrics.record_stage("job.queue_wait", job.started - job.created)
+                try:
+                    job.result = await job._runner(job)
+                    job.status = "done"
+                except JobCancelled:
+                    job.status = "cancelled"
+                except asyncio.CancelledError:
+                    job.status = "cancelled"
+                    # Only a cancel() aimed at this job is absorbed; anything else (server
+                    # shutdown) also cancels the consumer loop
+                    task = asyncio.current_task()
+                    if not job._cancel_requested or task is None:
+                        raise
+                    task.uncancel()
+                    if task.cancelling():
+                        raise
+                except Exception as e:
+                    job.status = "error"
+                    job.error = str(e)
+                finally:
+                    job._task = None
+                    job.finished = time.time()
+                    self._running -= 1
+                    job._notify()
+            finally:
+                self._queue.task_done()
+
+    def _purge(self) -> None:
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.done]
+        overflow = len(finished) - MAX_FINISHED_JOBS
+        for job in finished:  # insertion order, oldest first
+            if overflow > 0 or now - (job.finished or now) > JOB_TTL:
+                self._jobs.pop(job.id, None)
+                overflow -= 1
+
+    def submit(self, kind: str, runner: Callable[[Job], Awaitable[Any]], job_id: Optional[str] = None) -> Job:
+        """Queue a job; job_id reuses the id of a finished job (e.g. to resume persisted work)."""
+        previous = self._jobs.get(job_id) if job_id else None
+        if previous is not None and not previous.done:
+            raise ValueError(f"Job {job_id} is still {previous.status}")
+        self._ensure_consumers()
+        self._purge()
+        job = Job(kind, runner, job_id)
+        self._jobs.pop(job.id, None)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        """1-based place in the FIFO queue for a queued job."""
+        if job.status != "queued":
+            return None
+        queued = [j for j in self._jobs.values() if j.status == "queued"]
+        return queued.index(job) + 1
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished = time.time()
+            job._notify()
+            return job
+        job._cancel_requested = True
+        for hook in job._kill_hooks:
+            try:
+                hook()
+            except Exception:
+                pass
+        if job._task is not None:
+            job._task.cancel()
+        return job
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not job.done:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(job._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return job
+
+    async def events(self, job: Job, heartbeat: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield job snapshots on every change; None is yielded as a keep-alive."""
+        changed = job._changed
+        yield self.snapshot(job)
+        while not job.done:
+            try:
+                await asyncio.wait_for(changed.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            changed = job._changed
+            yield self.snapshot(job)
+
+    def snapshot(self, job: Job, include_result: bool = True) -> Dict[str, Any]:
+        out = job.snapshot(include_result)
+        out["queue_position"] = self.position(job)
+        return out
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "running": self._running,
+            "queued": sum(1 for j in self._jobs.values() if j.status == "queued"),
+        }
+
+
+# Shared queue for R analyses; defaults to one slot per CPU core
+r_jobs = JobManager(env_int("R_JOB_CONCURRENCY", 0) or None)
@@ -0,0 +1,187 @@
+"""Completion cache for /api/chat: identical prompts are answered without calling the model.
+
+Contract:
+  - make_key(model, messages, temperature, search, tenant) hashes the canonical JSON of exactly
+    these fields. tenant is key_id(api_key), a hash of the caller's API key, so one key never
+    receives replies produced for another; the key itself is never stored
+  - get() only answers for a tenant whose key completed a real request in this process within
+    LLM_CACHE_KEY_TTL seconds (put() records that), so an invalid key never gets a hit and a
+    revoked one stops getting hits once its check expires
+  - Only the reply text is stored
+  - Tier 1: in-process LRU of LLM_CACHE_MAX_ENTRIES replies
+  - Tier 2 (optional): SQLite database at LLM_CACHE_DB, shared across uvicorn workers and
+    restarts, capped at LLM_CACHE_DB_MAX_ROWS rows
+  - Entries older than LLM_CACHE_TTL seconds are ignored and pruned in both tiers
+  - Opt-in: the cache exists only when LLM_CACHE=1. Sampled requests (temperature > 0) skip it
+    unless the caller opts in ("cache": true); "no_cache": true skips it for any request
+"""
+
+from __future__ import annotations
+
+import hashlib, json, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from analysis.config import env_flag, env_int, env_num
+
+
+MAX_VERIFIED_KEYS = 10000
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Stands in for the API key in cache keys."""
+    return hashlib.sha256(b"llm-cache-key\0" + (api_key or "").encode("utf-8")).hexdigest()
+
+
+def make_key(model: str, messages: List[Dict[str, Any]], temperature: Optional[float], search: bool,
+             tenant: str) -> str:
+    payload = {"model": model, "messages": messages, "temperature": temperature, "search": bool(search),
+               "tenant": tenant}
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCompletionCache:
+    def __init__(self, max_entries: int, ttl: float, db_path: Optional[str] = None, db_max_rows: int = 0,
+                 key_ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key_ttl = key_ttl
+        self.db_path = db_path
+        self.db_max_rows = db_max_rows
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self._verified: "OrderedDict[str, float]" = OrderedDict()  # tenant -> last successful request
+        self.stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "bypassed": 0, "unverified": 0,
+                      "stores": 0, "evictions": 0}
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS completions "
+                             "(key TEXT PRIMARY KEY, reply TEXT NOT NULL, created REAL NOT NULL)")
+
+    # ---- memory tier ----
+    def _mem_put(self, key: str, created: float, reply: str) -> None:
+        with self._lock:
+            self._mem[key] = (created, reply)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _mem_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            return entry[1]
+
+    # ---- SQLite tier ----
+    def _db_get(self, key: str) -> Optional[Tuple[float, str]]:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT created, reply FROM completions WHERE key = ? AND created >= ?",
+                                   (key, time.time() - self.ttl)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _db_put(self, key: str, created: float, reply: str) -> None:
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO completions (key, reply, created) VALUES (?, ?, ?)",
+                             (key, reply, created))
+            self._writes += 1
+            if self._writes % 100 == 1:
+                self._db_prune()
+
+    def _db_prune(self) -> None:
+        self._db.execute("DELETE FROM completions WHERE created < ?", (time.time() - self.ttl,))
+        if self.db_max_rows:
+            self._db.execute("DELETE FROM completions WHERE key IN (SELECT key FROM completions "
+                             "ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.db_max_rows,))
+
+    # ---- verified keys ----
+    def _is_verified(self, tenant: str) -> bool:
+        with self._lock:
+            at = self._verified.get(tenant)
+            return at is not None and time.time() - at <= self.key_ttl
+
+    def _mark_verified(self, tenant: str) -> None:
+        with self._lock:
+            self._verified[tenant] = time.time()
+            self._verified.move_to_end(tenant)
+            while len(self._verified) > MAX_VERIFIED_KEYS:
+                self._verified.popitem(last=False)
+
+    # ---- public API ----
+    def get(self, key: str, tenant: str) -> Optional[str]:
+        if not self._is_verified(tenant):
+            self.stats["unverified"] += 1
+            return None
+        reply = self._mem_get(key)
+        if reply is not None:
+            self.stats["hits_memory"] += 1
+            return reply
+        entry = self._db_get(key)
+        if entry is not None:
+            self.stats["hits_disk"] += 1
+            self._mem_put(key, *entry)
+            return entry[1]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, tenant: str, reply: Optional[str]) -> None:
+        """Store the reply of a request that succeeded upstream, which also verifies its key."""
+        self._mark_verified(tenant)
+        if not reply:
+            return
+        created = time.time()
+        self.stats["stores"] += 1
+        self._mem_put(key, created, reply)
+        self._db_put(key, created, reply)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM completions")
+
+    def describe(self) -> Dict[str, Any]:
+        lookups = self.stats["hits_memory"] + self.stats["hits_disk"] + self.stats["misses"]
+        hits = self.stats["hits_memory"] + self.stats["hits_disk"]
+        disk_rows = None
+        if self._db is not None:
+            with self._lock:
+                disk_rows = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {
+            **self.stats,
+            "hit_rate": (hits / lookups) if lookups else None,
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "key_ttl": self.key_ttl,
+            "verified_keys": len(self._verified),
+            "db_path": self.db_path,
+            "db_rows": disk_rows,
+        }
+
+
+def _build_cache() -> Optional[LLMCompletionCache]:
+    if not env_flag("LLM_CACHE"):
+        return None
+    return LLMCompletionCache(max_entries=max(1, env_int("LLM_CACHE_MAX_ENTRIES", 1000)),
+                              ttl=env_num("LLM_CACHE_TTL", 7 * 24 * 3600.0),
+                              db_path=os.getenv("LLM_CACHE_DB") or None,
+                              db_max_rows=env_int("LLM_CACHE_DB_MAX_ROWS", 20000),
+                              key_ttl=env_num("LLM_CACHE_KEY_TTL", 3600.0))
+
+
+llm_cache = _build_cache()
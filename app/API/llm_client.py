@@ -0,0 +1,216 @@
+"""Shared AsyncOpenAI clients with bounded retries and a per-key concurrency limit.
+
+Contract:
+  - One AsyncOpenAI client (and so one HTTP connection pool) per API key, kept in an LRU of
+    LLM_CLIENT_CACHE entries keyed by a SHA-256 of the key; the key itself is never stored
+    outside the client object
+  - At most LLM_KEY_CONCURRENCY requests per key are in flight; further calls wait their turn
+  - Rate limits (429, except exhausted quota), timeouts, connection errors and 5xx responses are
+    retried up to LLM_MAX_RETRIES times. The wait honours Retry-After / retry-after-ms, otherwise
+    it is exponential (LLM_BACKOFF_BASE * 2**attempt, capped at LLM_BACKOFF_MAX) with full jitter
+  - stream_chat() yields content deltas and records the time to the first delta
+  - Each attempt is timed as the "llm.request" stage (analysis/metrics.py), the time to the first
+    streamed delta as "llm.first_token" and each backoff wait as "llm.backoff"
+  - Other errors (authentication, bad request, ...) propagate unchanged so the routes can map
+    them to HTTP status codes
+  - OPENAI_BASE_URL points the clients at another endpoint, e.g. the local stub in
+    benchmarks/openai_stub.py
+"""
+
+from __future__ import annotations
+
+import asyncio, email.utils, hashlib, os, random, threading, time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from analysis import lazy, metrics
+from analysis.config import env_int, env_num
+
+
+MAX_CLIENTS = max(1, env_int("LLM_CLIENT_CACHE", 32))
+KEY_CONCURRENCY = max(1, env_int("LLM_KEY_CONCURRENCY", 8))
+MAX_RETRIES = max(0, env_int("LLM_MAX_RETRIES", 5))
+BACKOFF_BASE = env_num("LLM_BACKOFF_BASE", 1.0)
+BACKOFF_MAX = env_num("LLM_BACKOFF_MAX", 30.0)
+REQUEST_TIMEOUT = env_num("LLM_TIMEOUT", 120.0)
+
+openai = lazy.module("openai")  # imported on the first LLM call
+
+
+def _retryable() -> tuple:
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+            openai.InternalServerError)
+
+
+def key_id(api_key: Optional[str]) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+class _KeySlot:
+    __slots__ = ("client", "limiter")
+
+    def __init__(self, client: openai.AsyncOpenAI, limiter: asyncio.Semaphore):
+        self.client = client
+        self.limiter = limiter
+
+
+class LLMClientPool:
+    def __init__(self, max_clients: int = MAX_CLIENTS, key_concurrency: int = KEY_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, base_url: Optional[str] = None):
+        self.max_clients = max_clients
+        self.key_concurrency = key_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.base_url = base_url
+        self._slots: "OrderedDict[str, _KeySlot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "clients_created": 0, "clients_evicted": 0, "waiting": 0,
+                      "streams": 0, "first_token_seconds_total": 0.0, "first_token_seconds_last": None}
+
+    def _slot(self, api_key: Optional[str]) -> _KeySlot:
+        kid = key_id(api_key)
+        with self._lock:
+            slot = self._slots.get(kid)
+            if slot is not None:
+                self._slots.move_to_end(kid)
+                return slot
+            client = openai.AsyncOpenAI(api_key=api_key, base_url=self.base_url or None,
+                                        max_retries=0, timeout=REQUEST_TIMEOUT)
+            slot = self._slots[kid] = _KeySlot(client, asyncio.Semaphore(self.key_concurrency))
+            self.stats["clients_created"] += 1
+            while len(self._slots) > self.max_clients:
+                _, old = self._slots.popitem(last=False)
+                self.stats["clients_evicted"] += 1
+                self._close_later(old.client)
+            return slot
+
+    @staticmethod
+    def _close_later(client: openai.AsyncOpenAI) -> None:
+        try:
+            asyncio.get_running_loop().create_task(client.close())
+        except RuntimeError:
+            pass  # no loop running: the pool is garbage collected with the client
+
+    def client(self, api_key: Optional[str]) -> openai.AsyncOpenAI:
+        return self._slot(api_key).client
+
+    def _delay(self, attempt: int, exc: Exception) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def call(self, api_key: Optional[str], fn: Callable[[openai.AsyncOpenAI], Awaitable[Any]]) -> Any:
+        """Run fn(client) under the key's limiter, retrying transient failures."""
+        slot = self._slot(api_key)
+        attempt = 0
+        while True:
+            self.stats["waiting"] += 1
+            try:
+                await slot.limiter.acquire()
+            finally:
+                self.stats["waiting"] -= 1
+            try:
+                self.stats["requests"] += 1
+                with metrics.span("llm.request"):
+                    return await fn(slot.client)
+            except _retryable() as e:
+                if attempt >= self.max_retries or _quota_exhausted(e):
+                    raise
+                delay = self._delay(attempt, e)
+            finally:
+                slot.limiter.release()
+            # Sleep outside the limiter so other calls for this key can proceed meanwhile
+            self.stats["retries"] += 1
+            attempt += 1
+            with metrics.span("llm.backoff"):
+                await asyncio.sleep(delay)
+
+    async def chat_completion(self, api_key: Optional[str], **params: Any) -> Any:
+        return await self.call(api_key, lambda client: client.chat.completions.create(**params))
+
+    async def stream_chat(self, api_key: Optional[str], **params: Any) -> AsyncIterator[str]:
+        """Yield content deltas of a streamed completion.
+
+        Holds a limiter slot for the whole stream; transient failures are retried only until
+        the first delta arrives (after that the caller already has partial output).
+        """
+        slot = self._slot(api_key)
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            self.stats["waiting"] += 1
+            try:
+                await slot.limiter.acquire()
+            finally:
+                self.stats["waiting"] -= 1
+            received = False
+            try:
+                self.stats["requests"] += 1
+                stream = await slot.client.chat.completions.create(stream=True, **params)
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not received:
+                        received = True
+                        self._record_first_token(time.perf_counter() - started)
+                    yield delta
+                return
+            except _retryable() as e:
+                if received or attempt >= self.max_retries or _quota_exhausted(e):
+                    raise
+                delay = self._delay(attempt, e)
+            finally:
+                slot.limiter.release()
+            self.stats["retries"] += 1
+            attempt += 1
+            with metrics.span("llm.backoff"):
+                await asyncio.sleep(delay)
+
+    def _record_first_token(self, seconds: float) -> None:
+        self.stats["streams"] += 1
+        self.stats["first_token_seconds_total"] += seconds
+        self.stats["first_token_seconds_last"] = round(seconds, 4)
+        metrics.record_stage("llm.first_token", seconds)
+
+    def describe(self) -> Dict[str, Any]:
+        streams = self.stats["streams"]
+        avg_first = self.stats["first_token_seconds_total"] / streams if streams else None
+        return {**self.stats, "first_token_seconds_avg": avg_first,
+                "clients": len(self._slots), "max_clients": self.max_clients,
+                "key_concurrency": self.key_concurrency, "max_retries": self.max_retries}
+
+
+def _quota_exhausted(exc: Exception) -> bool:
+    # A 429 for an exhausted quota or billing issue does not clear up by waiting
+    return isinstance(exc, openai.RateLimitError) and getattr(exc, "code", None) == "insufficient_quota"
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return max(0.0, float(ms) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+llm_clients = LLMClientPool(base_url=os.getenv("OPENAI_BASE_URL") or None)
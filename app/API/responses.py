@@ -0,0 +1,19 @@
+"""JSON responses rendered by analysis/serialization.py.
+
+Returning FastJSONResponse(content) from an endpoint skips FastAPI's jsonable_encoder walk and
+json.dumps: NumPy values and NaN/inf (as null) encode directly, and RawJSON parts such as R
+output files are copied into the body without being parsed.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from analysis.serialization import dumps
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-import os, base64, openai, json
-import numpy as np
+from typing import Optional
+import os, base64, json, asyncio, time
 from API.functions import *
-from analysis.r_runner import run_r_subprocess
-from openai._exceptions import (
-    AuthenticationError,
-    PermissionDeniedError,
-    RateLimitError,
-    BadRequestError,
-    APIError,
-)
+from analysis.r_runner import run_r_subprocess_async, resolve_script_path, cached_result
+from analysis.r_cache import r_cache
+from analysis.cfa_options import (cfa_options, estimator_options, purification_options, comparison_models,
+                                  comparison_options, cfa_extra_args, run_timeout, sufficient_stats_mode,
+                                  SUFFICIENT_STATS_MIN_ROWS)
+from analysis.moments import compute_moments, model_columns, rows_required
+from analysis import efa as py_efa
+from analysis import metrics, profiling
+from analysis.profiling import profile_store
+from analysis.serialization import dumps, frame_records
+from API.responses import FastJSONResponse
+from API.jobs import r_jobs
+from API.adequacy_sessions import adequacy_sessions
+from API.datasets import dataset_store, read_csv_compact, UploadTooLarge, UPLOAD_MAX_BYTES
+from API.llm_client import llm_clients, openai
+from API.llm_cache import llm_cache
+from API.simulation import simulations, sim_jobs, likert_spec
+from API.adequacy_pipeline import adequacy_pipelines, adequacy_jobs, pipeline_options
 
 from dotenv import load_dotenv
 
@@ -51,6 +62,8 @@ class ChatRequest(BaseModel):
     temperature: float = 0.7
     keyCipher: str
     search_model: str = DEFAULT_SEARCH_MODEL 
+    no_cache: bool = False  # skip the completion cache (e.g. to get a fresh sample)
+    cache: Optional[bool] = None  # None: cache only when temperature is 0 (or a search); True opts in
 
 class PersonaGenRequest(BaseModel):
     generatedPersonas: list = []
@@ -59,6 +72,21 @@ class PersonaGenRequest(BaseModel):
     model: str = DEFAULT_MODEL
     keyCipher: str
     amount: int = 20
+    mode: str = "structured"  # single JSON pass in concurrent shards; "two_pass" = original generate + re-format
+
+class LikertSimRequest(BaseModel):
+    items: list                 # [{"id", "text", "responseType": "likert" | "open"}]
+    personas: list = []
+    n: int = 0                  # rows to simulate; 0 = one per persona
+    scale_min: int = 1
+    scale_max: int = 5
+    start_offset: int = 0       # persona used for the first row (append mode continues the cycle)
+    temperature: float = 0.7
+    model: str = DEFAULT_MODEL
+    keyCipher: str
+
+class ResumeRequest(BaseModel):
+    keyCipher: str
 
 
 
@@ -70,47 +98,282 @@ async def encrypt_key(req: EncryptKey):
     cipher = simple_encrypt(req.key)
     return {"cipher": cipher}
 
+# ---- Dataset registry (upload once, reference by dataset_id) ----
+
+def _payload_data(payload: dict):
+    """Rows of an analysis payload: inline "data", or a registered "dataset_id" narrowed by
+    optional "columns" (names) and "rows" (positions or {"start", "stop"})."""
+    dataset_id = payload.get("dataset_id")
+    if not dataset_id:
+        return payload.get("data", [])
+    try:
+        return dataset_store.select(str(dataset_id), payload.get("columns"), payload.get("rows"))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="dataset_not_found")
+    except (ValueError, TypeError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _check_upload_size(request: Request) -> None:
+    """Refuse an oversized body before it is spooled; read_csv_compact enforces the limit as well."""
+    try:
+        length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        return
+    if UPLOAD_MAX_BYTES and length > UPLOAD_MAX_BYTES + 64 * 1024:  # room for the multipart framing
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {UPLOAD_MAX_BYTES / 2 ** 20:g} MB")
+
+
+@router.post("/datasets")
+async def upload_dataset(request: Request):
+    """Register a dataset and return its id plus column types.
+
+    Accepts a multipart CSV upload (field "file") or JSON {"data": [ {...row objects...} ]}.
+    The id is derived from the content, so uploading the same data again returns the same id.
+    CSV files are parsed in chunks straight from the spooled upload; 413 past DATASET_UPLOAD_MAX_MB.
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            _check_upload_size(request)
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "read"):
+                raise HTTPException(status_code=400, detail="Expected a CSV file in field 'file'")
+            frame = await asyncio.to_thread(read_csv_compact, upload.file)
+            return await asyncio.to_thread(dataset_store.put, frame, True)
+        body = await request.json()
+        frame = body.get("data") if isinstance(body, dict) else body
+        return await asyncio.to_thread(dataset_store.put, frame)
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/datasets")
+async def dataset_stats():
+    """Registry counters, memory use and spill settings."""
+    return dataset_store.describe()
+
+
+@router.get("/datasets/{dataset_id}")
+async def get_dataset(dataset_id: str):
+    info = await asyncio.to_thread(dataset_store.info, dataset_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="dataset_not_found")
+    return info
+
+
+@router.get("/datasets/{dataset_id}/rows")
+async def get_dataset_rows(dataset_id: str, offset: int = 0, limit: int = 100, columns: str = ""):
+    """One page of rows for table views: {"offset", "limit", "n_rows", "columns", "rows"}.
+
+    "columns" is a comma-separated subset (default all); limit is capped at DATASET_PAGE_MAX_ROWS.
+    """
+    names = [c for c in columns.split(",") if c] or None
+    try:
+        page = await asyncio.to_thread(dataset_store.page, dataset_id, offset, limit, names)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="dataset_not_found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(page)
+
+
+@router.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    if not dataset_store.drop(dataset_id):
+        raise HTTPException(status_code=404, detail="dataset_not_found")
+    return {"dataset_id": dataset_id, "status": "deleted"}
+
+
+def _ratings_frame(rows) -> pd.DataFrame:
+    """Align payload field names to analyzer expectations."""
+    table_data = pd.DataFrame(rows)
+    categorical = [c for c in table_data.columns if isinstance(table_data[c].dtype, pd.CategoricalDtype)]
+    if categorical:
+        table_data = table_data.astype({c: object for c in categorical})
+    if not table_data.empty:
+        table_data = table_data.rename(columns={
+            'itemId': 'item',
+            'subdimension': 'facet',
+        })
+        # Ensure item keys match intended_map keys (frontend sends string ids)
+        if 'item' in table_data.columns:
+            table_data['item'] = table_data['item'].astype(str)
+        # Coerce rating to numeric
+        if 'rating' in table_data.columns:
+            table_data['rating'] = pd.to_numeric(table_data['rating'], errors='coerce')
+    return table_data
+
+
+def _adequacy_records(res: pd.DataFrame) -> list:
+    # JSON-friendly rows; +/-inf and NaN become None for strict JSON compliance
+    return frame_records(res)
+
+
 @router.post("/analyze-anova")
 async def analyze_endpoint(data: dict):
     try:
         intended_map = data.get('intendedMap', {})
         options = data.get('options', {}) or {}
         drop_incomplete = bool(options.get('dropIncomplete', True))
+        # Batched NumPy engine by default; "pandas" runs the per-item pingouin reference
+        engine = options.get('engine', 'numpy')
 
-        # Align payload field names to analyzer expectations
-        table_data = pd.DataFrame(data.get('data', []))
-        if not table_data.empty:
-            table_data = table_data.rename(columns={
-                'itemId': 'item',
-                'subdimension': 'facet',
-            })
-            # Ensure item keys match intended_map keys (frontend sends string ids)
-            if 'item' in table_data.columns:
-                table_data['item'] = table_data['item'].astype(str)
-            # Coerce rating to numeric
-            if 'rating' in table_data.columns:
-                table_data['rating'] = pd.to_numeric(table_data['rating'], errors='coerce')
-
-        res = analyze_content_adequacy(
-            table_data,
-            intended_map,
+        table_data = _ratings_frame(_payload_data(data))
+
+        with profiling.profile("adequacy"):
+            res = analyze_content_adequacy(
+                table_data,
+                intended_map,
+                alpha=0.05,
+                decision_mode="ternary",     # or "binary"
+                sphericity="GG",             # GG per MacKenzie/Winer; use "HF" if you prefer
+                require_target_highest=True,  # typical rule
+                drop_incomplete=drop_incomplete,
+                engine=engine
+            )
+        return FastJSONResponse({"result": _adequacy_records(res)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Surface errors to client for debugging
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ---- Incremental content adequacy (raters arriving in waves) ----
+
+@router.post("/analyze-anova/sessions")
+async def create_adequacy_session(data: dict):
+    """Open a session; optional initial `data` rows are analysed right away."""
+    try:
+        options = data.get('options', {}) or {}
+        sess = adequacy_sessions.create(
+            intended_map=data.get('intendedMap', {}),
             alpha=0.05,
-            decision_mode="ternary",     # or "binary"
-            sphericity="GG",             # GG per MacKenzie/Winer; use "HF" if you prefer
-            require_target_highest=True,  # typical rule
-            drop_incomplete=drop_incomplete
+            decision_mode="ternary",
+            sphericity="GG",
+            require_target_highest=True,
+            drop_incomplete=bool(options.get('dropIncomplete', True)),
         )
-        # Serialize DataFrame to JSON-friendly list
-        # Replace +/-inf with NaN, then convert NaN to None for strict JSON compliance
-        res = res.replace([np.inf, -np.inf], np.nan)
-        records = res.replace({np.nan: None}).to_dict(orient='records')
-        return {"result": records}
+        changed = sess.add(_ratings_frame(_payload_data(data)))
+        return FastJSONResponse({**sess.describe(), "result": _adequacy_records(changed)})
     except HTTPException:
         raise
     except Exception as e:
-        # Surface errors to client for debugging
         raise HTTPException(status_code=400, detail=str(e))
 
+
+def _get_adequacy_session(session_id: str):
+    sess = adequacy_sessions.get(session_id)
+    if sess is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return sess
+
+
+@router.post("/analyze-anova/sessions/{session_id}/ratings")
+async def add_adequacy_ratings(session_id: str, data: dict):
+    """Merge new rating rows (and intendedMap changes); returns only the rows that changed."""
+    sess = _get_adequacy_session(session_id)
+    rows = _payload_data(data)
+    try:
+        changed = sess.add(_ratings_frame(rows), data.get('intendedMap') or None)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({**sess.describe(), "changed": _adequacy_records(changed)})
+
+
+@router.get("/analyze-anova/sessions/{session_id}")
+async def get_adequacy_session(session_id: str):
+    sess = _get_adequacy_session(session_id)
+    return FastJSONResponse({**sess.describe(), "result": _adequacy_records(sess.table())})
+
+
+@router.delete("/analyze-anova/sessions/{session_id}")
+async def delete_adequacy_session(session_id: str):
+    if not adequacy_sessions.drop(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"session_id": session_id, "status": "deleted"}
+
+# ---- Adaptive content adequacy (AI raters in batches, items frozen once settled) ----
+
+@router.post("/analyze-anova/pipeline")
+async def start_adequacy_pipeline(data: dict):
+    """Start an adaptive rater pipeline; returns {"job_id", "status", ...} immediately.
+
+    Payload: items [{id, text}], facets [{name, definition}], intendedMap, personas,
+    groupDescription, model, keyCipher, optional existing rating rows in `data` / `dataset_id`
+    and batch_size, min_raters, max_raters, stable_batches, margin (see API/adequacy_pipeline.py).
+    """
+    api_key = simple_decrypt(str(data.get('keyCipher', '')))
+    try:
+        opts = pipeline_options(data)
+        existing = _ratings_frame(_payload_data(data))
+    except HTTPException:
+        raise
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = adequacy_pipelines.start(opts, existing, api_key)
+    return adequacy_jobs.snapshot(job, include_result=False)
+
+
+def _get_adequacy_pipeline(job_id: str):
+    job = adequacy_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job_not_found")
+    return job
+
+
+def _adequacy_pipeline_snapshot(job, include_result: bool = True) -> dict:
+    out = adequacy_jobs.snapshot(job, include_result)
+    pipeline = adequacy_pipelines.get(job.id)
+    if include_result and job.done and "result" not in out and pipeline is not None:
+        out["result"] = pipeline.result()  # raters collected before a cancel or failure
+    return out
+
+
+@router.get("/analyze-anova/pipeline/{job_id}")
+async def get_adequacy_pipeline(job_id: str):
+    """Progress (batches, raters, frozen items); includes "result" once finished."""
+    return _adequacy_pipeline_snapshot(_get_adequacy_pipeline(job_id))
+
+
+@router.get("/analyze-anova/pipeline/{job_id}/events")
+async def stream_adequacy_pipeline(job_id: str, request: Request):
+    """Server-sent events: "status" after every batch, then "result". Closing the stream cancels the job."""
+    job = _get_adequacy_pipeline(job_id)
+
+    async def event_stream():
+        finished = False
+        snapshots = adequacy_jobs.events(job)
+        try:
+            async for snap in snapshots:
+                if await request.is_disconnected():
+                    break
+                if snap is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                finished = snap["status"] in ("done", "error", "cancelled")
+                yield _sse("result", _adequacy_pipeline_snapshot(job)) if finished else _sse("status", snap)
+        finally:
+            await snapshots.aclose()
+            if not finished:
+                adequacy_jobs.cancel(job.id)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.delete("/analyze-anova/pipeline/{job_id}")
+async def cancel_adequacy_pipeline(job_id: str):
+    """Stop requesting raters; the result keeps the raters and decisions collected so far."""
+    job = adequacy_jobs.cancel(_get_adequacy_pipeline(job_id).id)
+    await adequacy_jobs.wait(job, timeout=5)
+    return _adequacy_pipeline_snapshot(job)
+
 @router.post("/chat")
 async def chat_endpoint(chat_req: ChatRequest):
     # decrypt user's API key cipher
@@ -120,105 +383,633 @@ async def chat_endpoint(chat_req: ChatRequest):
         if chat_req.model == "search":
             # Use user override if supplied, else default model
             effective_search_model = chat_req.search_model or DEFAULT_SEARCH_MODEL
-            reply = get_chatgpt_search(
+            reply = await get_chatgpt_search(
                 chat_req.prompt,
                 chat_req.history,
                 model=effective_search_model,
-                api_key=api_key
+                api_key=api_key,
+                use_cache=_chat_use_cache(chat_req)
             )
         else:
-            reply = get_chatgpt_response(
+            reply = await get_chatgpt_response(
                 chat_req.prompt,
                 chat_req.history,
                 temperature=chat_req.temperature,
                 model=chat_req.model,
-                api_key=api_key
+                api_key=api_key,
+                use_cache=_chat_use_cache(chat_req)
             )
-    except AuthenticationError:
+    except openai.AuthenticationError:
         raise HTTPException(status_code=401, detail="invalid_api_key")
-    except PermissionDeniedError:
+    except openai.PermissionDeniedError:
         raise HTTPException(status_code=403, detail="permission_denied")
-    except RateLimitError:
+    except openai.RateLimitError:
         raise HTTPException(status_code=429, detail="rate_limit_exceeded")
-    except BadRequestError as e:
+    except openai.BadRequestError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except APIError as e:
+    except openai.APIError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {"reply": reply[0], "history": reply[1]}
 
+def _chat_use_cache(chat_req: ChatRequest) -> Optional[bool]:
+    """no_cache wins; otherwise the explicit opt-in/out, or None for the temperature-based default."""
+    return False if chat_req.no_cache else chat_req.cache
+
+def _llm_http_error(e: Exception) -> HTTPException:
+    """Same status mapping as /chat and /personaGen."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, openai.AuthenticationError):
+        return HTTPException(status_code=401, detail="invalid_api_key")
+    if isinstance(e, openai.PermissionDeniedError):
+        return HTTPException(status_code=403, detail="permission_denied")
+    if isinstance(e, openai.RateLimitError):
+        return HTTPException(status_code=429, detail="rate_limit_exceeded")
+    if isinstance(e, openai.BadRequestError):
+        return HTTPException(status_code=400, detail=str(e))
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+async def _sse_response(request: Request, source, on_item, on_done):
+    """Stream an async generator as server-sent events.
+
+    The first item is awaited before the response starts, so errors raised while connecting
+    (bad key, unknown model, ...) still come back as normal HTTP errors. Later failures are
+    sent as an "error" event with the same status/detail mapping.
+    """
+    started = time.perf_counter()
+    try:
+        first = await source.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except Exception as e:
+        raise _llm_http_error(e)
+    first_s = time.perf_counter() - started
+
+    async def event_stream():
+        try:
+            if first is not None:
+                yield on_item(first, first_s)
+                async for item in source:
+                    if await request.is_disconnected():
+                        return
+                    yield on_item(item, time.perf_counter() - started)
+            yield _sse("done", {**on_done(), "first_result_s": round(first_s, 4) if first is not None else None,
+                                "total_s": round(time.perf_counter() - started, 4)})
+        except Exception as e:
+            err = _llm_http_error(e)
+            yield _sse("error", {"status": err.status_code, "detail": err.detail})
+        finally:
+            await source.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(chat_req: ChatRequest, request: Request):
+    """Server-sent events: "token" {"delta"} per fragment, then "done" {"reply", "history", timings}."""
+    api_key = simple_decrypt(chat_req.keyCipher)
+    history = chat_req.history
+    search = chat_req.model == "search"
+    model = (chat_req.search_model or DEFAULT_SEARCH_MODEL) if search else chat_req.model
+    source = stream_chatgpt_response(chat_req.prompt, history, chat_req.temperature, model, api_key,
+                                     search=search, use_cache=_chat_use_cache(chat_req))
+    return await _sse_response(
+        request, source,
+        lambda delta, elapsed: _sse("token", {"delta": delta}),
+        lambda: {"reply": history[-1]["content"] if history and history[-1]["role"] == "assistant" else "",
+                 "history": history},
+    )
+
+
+@router.post("/personaGen/stream")
+async def persona_stream_endpoint(gen_req: PersonaGenRequest, request: Request):
+    """Server-sent events: "persona" {"persona", "index", "elapsed_s"} as each one completes, then "done"."""
+    count = {"n": 0}
+
+    def on_persona(persona, elapsed):
+        count["n"] += 1
+        return _sse("persona", {"persona": persona, "index": count["n"] - 1, "elapsed_s": round(elapsed, 4)})
+
+    source = stream_persona_set(
+        generatedPersonas=gen_req.generatedPersonas,
+        groupDescription=gen_req.groupDescription,
+        temperature=gen_req.temperature,
+        model=gen_req.model,
+        api_key=simple_decrypt(gen_req.keyCipher),
+        amount=gen_req.amount,
+        mode=gen_req.mode,
+    )
+    return await _sse_response(request, source, on_persona, lambda: {"count": count["n"]})
+
+
+@router.get("/llm/cache")
+async def llm_cache_stats():
+    """Hit/miss counters of the completion cache (enable with LLM_CACHE=1)."""
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(llm_cache.describe)}
+
+@router.get("/llm/clients")
+async def llm_client_stats():
+    """Pooled OpenAI clients: request/retry counters and calls waiting on a per-key limit."""
+    return llm_clients.describe()
+
+# ---- Likert response simulation (background job, see API/simulation.py) ----
+
+def _get_simulation(sim_id: str):
+    sim = simulations.get(sim_id)
+    if sim is None:
+        raise HTTPException(status_code=404, detail="simulation_not_found")
+    return sim
+
+def _simulation_snapshot(sim, include_result: bool = True) -> dict:
+    job = sim_jobs.get(sim.id)
+    if job is not None:
+        out = sim_jobs.snapshot(job, include_result)
+        if include_result and job.done and "result" not in out:
+            out["result"] = sim.result()  # rows stored before the job was cancelled or failed
+        return out
+    # Stored by an earlier server process: nothing is running until it is resumed
+    out = {"job_id": sim.id, "kind": "likert", "status": "interrupted", "progress": sim.progress()}
+    if include_result:
+        out["result"] = sim.result()
+    return out
+
+@router.post("/simulate/likert")
+async def simulate_likert(sim_req: LikertSimRequest):
+    """Start a simulation job; returns {"job_id", "status", ...} immediately.
+
+    Follow it with GET /simulate/likert/{job_id}/events (a "row" event per completed respondent,
+    "status" snapshots, then "result") or poll GET /simulate/likert/{job_id}.
+    """
+    api_key = simple_decrypt(sim_req.keyCipher)
+    try:
+        spec = likert_spec(sim_req.model_dump(exclude={"keyCipher"}))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = simulations.start(spec, api_key)
+    return sim_jobs.snapshot(job, include_result=False)
+
+@router.post("/simulate/likert/{sim_id}/resume")
+async def resume_likert_simulation(sim_id: str, req: ResumeRequest):
+    """Simulate only the rows a cancelled, failed or interrupted job has not stored yet."""
+    api_key = simple_decrypt(req.keyCipher)
+    try:
+        job = simulations.resume(sim_id, api_key)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="simulation_not_found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return sim_jobs.snapshot(job, include_result=False)
+
+@router.get("/simulate/likert/{sim_id}")
+async def get_likert_simulation(sim_id: str):
+    """Status and progress; includes "result" (rows ordered by index, failed rows) when done."""
+    return _simulation_snapshot(_get_simulation(sim_id))
+
+@router.get("/simulate/likert/{sim_id}/events")
+async def stream_likert_simulation(sim_id: str, request: Request):
+    """Server-sent events: "row" per completed respondent (stored rows first), "status" on progress,
+    then "result". Closing the stream does not stop the job; DELETE does."""
+    sim = _get_simulation(sim_id)
+    job = sim_jobs.get(sim.id)
+
+    async def event_stream():
+        sent = 0
+        snapshots = sim_jobs.events(job) if job is not None else None
+        try:
+            while True:
+                snap = _simulation_snapshot(sim, include_result=False) if snapshots is None else await snapshots.__anext__()
+                if await request.is_disconnected():
+                    return
+                for index in sim.order[sent:]:
+                    yield _sse("row", sim.rows[index])
+                sent = len(sim.order)
+                if snap is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                if snap["status"] in ("done", "error", "cancelled", "interrupted"):
+                    yield _sse("result", _simulation_snapshot(sim))
+                    return
+                yield _sse("status", snap)
+        finally:
+            if snapshots is not None:
+                await snapshots.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.delete("/simulate/likert/{sim_id}")
+async def cancel_likert_simulation(sim_id: str):
+    """Cancel a running simulation; stored rows are kept and the job can be resumed."""
+    sim = _get_simulation(sim_id)
+    job = sim_jobs.cancel(sim.id)
+    if job is not None:
+        await sim_jobs.wait(job, timeout=5)
+    return _simulation_snapshot(sim, include_result=False)
+
+def _r_job_args(payload: dict, kind: str) -> dict:
+        """Map an /r/* payload onto run_r_subprocess keyword arguments.
+
+        "no_cache": true skips the result-cache lookup (the fresh result still refreshes it).
+        "dataset_id" (with optional "columns" / "rows") replaces inline "data".
+        "bootstrap" (CFA only) adds bootstrap intervals; kind "purify" runs the leave-one-out
+        purification scan instead of the Step 6 report. "estimator" / "missing" go to lavaan and
+        "sufficient_stats" picks rows or sample moments. Kind "compare" fits a list of "models"
+        (and invariance levels across "group") in one model_comparison.R run.
+        Options: analysis/cfa_options.py.
+        """
+        data = _payload_data(payload)
+        if not isinstance(data, (list, pd.DataFrame)):
+                raise HTTPException(status_code=400, detail="'data' must be a list of row objects")
+        use_cache = not bool(payload.get("no_cache", False))
+        if kind == "efa":
+                n_factors = payload.get("n_factors", "auto")
+                rotation = payload.get("rotation", "oblimin")
+                fm = payload.get("fm", "pa")
+                engine = payload.get("engine", "r")
+                if engine == "python":
+                        return {"engine": "python", "data": data, "n_factors": n_factors,
+                                "rotation": rotation, "fm": fm}
+                if engine != "r":
+                        raise HTTPException(status_code=400, detail="engine must be 'r' or 'python'")
+                return {
+                        "data": data,
+                        "script_path": payload.get("script", "analysis/scripts/efa_analysis.R"),
+                        "model_syntax": None,
+                        "extra_args": [str(n_factors), str(rotation), str(fm)],
+                        "use_cache": use_cache,
+                }
+        if kind in ("cfa", "purify"):
+                try:
+                        if kind == "cfa":
+                                options = cfa_options(payload)
+                        else:
+                                options = {"purify": purification_options(payload), **estimator_options(payload)}
+                        sufficient_stats = sufficient_stats_mode(payload)
+                except ValueError as e:
+                        raise HTTPException(status_code=400, detail=str(e))
+                return {
+                        "data": data,
+                        "script_path": payload.get("script", "analysis/scripts/custom_analysis.R"),
+                        "model_syntax": payload.get("model"),
+                        "extra_args": cfa_extra_args(options),
+                        "use_cache": use_cache,
+                        "timeout": run_timeout(options),
+                        "sufficient_stats": sufficient_stats,
+                        "options": options,
+                }
+        if kind == "compare":
+                try:
+                        models = comparison_models(payload)
+                        options = comparison_options(payload)
+                        sufficient_stats = sufficient_stats_mode(payload)
+                except ValueError as e:
+                        raise HTTPException(status_code=400, detail=str(e))
+                group = options["compare"].get("group")
+                columns = data.columns if isinstance(data, pd.DataFrame) else data[0] if data else {}
+                if group and group not in columns:
+                        raise HTTPException(status_code=400, detail=f"group column '{group}' not in data")
+                return {
+                        "data": data,
+                        "script_path": payload.get("script", "analysis/scripts/model_comparison.R"),
+                        "model_syntax": json.dumps(models, ensure_ascii=False),
+                        "extra_args": cfa_extra_args(options),
+                        "use_cache": use_cache,
+                        "timeout": run_timeout(options),
+                        "sufficient_stats": sufficient_stats,
+                        "options": options,
+                        "model_text": "\n".join(m["syntax"] for m in models),
+                }
+        raise HTTPException(status_code=400, detail=f"Unknown R job kind: {kind}")
+
+
+def _python_efa(args: dict) -> dict:
+        """In-process EFA (analysis/efa.py), wrapped like an R run so clients need no changes."""
+        try:
+                with metrics.span("efa.python"), profiling.profile("efa.python"):
+                        output = py_efa.run_efa(args["data"], args["n_factors"], args["rotation"], args["fm"])
+        except Exception as e:
+                return {"status": "error", "engine": "python", "error": str(e)}
+        return {"status": "ok", "engine": "python", "output": output}
+
+
+def _submit_r_job(kind: str, args: dict):
+        if args.get("engine") == "python":
+                async def python_runner(job):
+                        return await asyncio.to_thread(_python_efa, args)
+
+                return r_jobs.submit(kind, python_runner)
+        try:
+                resolve_script_path(args["script_path"])
+        except FileNotFoundError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+
+        async def runner(job):
+                # The output is only forwarded to the client, so it stays as the bytes R wrote
+                return await run_r_subprocess_async(**args, register_kill=job.on_cancel,
+                                                    on_progress=lambda p: job.update(**p), raw_output=True)
+
+        return r_jobs.submit(kind, runner)
+
+
+async def _with_parallel_suggestion(kind: str, args: dict) -> dict:
+        """For R EFA with n_factors "auto", pass the factor count from the stored null-eigenvalue
+        tables so efa_analysis.R skips psych::fa.parallel."""
+        if kind != "efa" or args.get("engine") == "python" or args["extra_args"][0] != "auto":
+                return args
+        try:
+                suggested = await asyncio.to_thread(py_efa.suggest_n_factors, args["data"])
+        except Exception:
+                suggested = None  # R falls back to its own parallel analysis
+        if suggested is None:
+                return args
+        return {**args, "extra_args": [*args["extra_args"], str(suggested)]}
+
+
+def _sample_moments(data, model_syntax: str):
+        columns = list(data.columns) if isinstance(data, pd.DataFrame) else list(data[0]) if data else []
+        moments = compute_moments(data, model_columns(model_syntax, columns))
+        if moments is None or moments.n_obs < 2 or not moments.names:
+                return None
+        return moments
+
+
+async def _with_sufficient_stats(kind: str, args: dict) -> dict:
+        """For CFA, purification and comparison runs, replace the rows by their covariance matrix, means and N
+        (analysis/moments.py) when the run allows it, so R never parses the raw data."""
+        if kind not in ("cfa", "purify", "compare"):
+                return args
+        args = dict(args)
+        mode, options = args.pop("sufficient_stats"), args.pop("options")
+        model_syntax = args.pop("model_text", args["model_syntax"])
+        data = args["data"]
+        if not mode or not model_syntax or rows_required(model_syntax, options) is not None:
+                return args
+        if mode == "auto" and len(data) < SUFFICIENT_STATS_MIN_ROWS:
+                return args
+        moments = await asyncio.to_thread(_sample_moments, data, model_syntax)
+        if moments is None:
+                return args  # non-numeric or too few complete cases: R gets the rows
+        return {**args, "data": moments}
+
+
+async def _prepare_r_args(kind: str, args: dict) -> dict:
+        return await _with_sufficient_stats(kind, await _with_parallel_suggestion(kind, args))
+
+
+async def _run_r_job(request: Request, kind: str, args: dict):
+        """Serve identical re-runs straight from the result cache; queue everything else.
+
+        R output and cache hits reach the response as the bytes R wrote (analysis/serialization.py).
+        """
+        if args.get("engine") == "python":
+                # Millisecond fits: no queue, no subprocess
+                return FastJSONResponse(await asyncio.to_thread(_python_efa, args))
+        args = await _prepare_r_args(kind, args)
+        if args.get("use_cache", True) and profiling.current() is None:
+                try:
+                        hit = await asyncio.to_thread(cached_result, args["data"], args["script_path"],
+                                                      args["model_syntax"], args["extra_args"], raw_output=True)
+                except FileNotFoundError as e:
+                        raise HTTPException(status_code=404, detail=str(e))
+                if hit is not None:
+                        return FastJSONResponse(hit)
+        job = _submit_r_job(kind, args)
+        return FastJSONResponse(await _await_r_job(request, job))
+
+
+async def _await_r_job(request: Request, job):
+        """Wait for a job while watching the client; a disconnect cancels the job and kills R."""
+        while not job.done:
+                await r_jobs.wait(job, timeout=0.5)
+                if not job.done and await request.is_disconnected():
+                        r_jobs.cancel(job.id)
+                        await r_jobs.wait(job)
+                        raise HTTPException(status_code=499, detail="client_disconnected")
+        metrics.merge_timings(job.timings)
+        if job.status == "error":
+                raise HTTPException(status_code=500, detail=job.error)
+        if job.status == "cancelled":
+                raise HTTPException(status_code=409, detail="job_cancelled")
+        return job.result
+
+
 @router.post("/r/run")
-async def run_r_script(payload: dict):
+async def run_r_script(payload: dict, request: Request):
         """Execute an R script with datatable + optional lavaan model.
 
         Expected JSON payload shape:
             {
                 "data": [ { ...row objects ... } ],
+                "dataset_id": "..." (instead of "data"; optional "columns" / "rows" selection),
                 "model": "latent1 =~ var1 + var2\nlatent2 =~ var3 + var4" (optional lavaan syntax),
+                "bootstrap": 1000 | {"n", "seed", "ci": "bca" | "percentile", "level", "cores"} (optional),
+                "estimator": "ML" | "MLR" | ..., "missing": "listwise" | "fiml" | ... (optional),
+                "sufficient_stats": true | false | "auto" (optional; fit from covariance, means and N),
                 "script": "analysis/scripts/custom_analysis.R" (optional override)
             }
+
+        Runs through the R job queue and waits for the result; use /r/jobs to submit and poll instead.
         """
-        data = payload.get("data", [])
-        if not isinstance(data, list):
-                raise HTTPException(status_code=400, detail="'data' must be a list of row objects")
-        model_syntax = payload.get("model")
-        script_rel = payload.get("script", "analysis/scripts/custom_analysis.R")
-        try:
-                result = run_r_subprocess(data, script_rel, model_syntax=model_syntax)
-                return result
-        except FileNotFoundError as e:
-                raise HTTPException(status_code=404, detail=str(e))
-        except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
+        return await _run_r_job(request, "cfa", _r_job_args(payload, "cfa"))
 
 @router.post("/r/efa")
-async def run_efa(payload: dict):
+async def run_efa(payload: dict, request: Request):
         """Execute the EFA R script.
 
         Payload:
             {
               "data": [ { ...row objects ... } ],
+              "dataset_id": "..." (instead of "data"; optional "columns" / "rows" selection),
               "n_factors": int | "auto" (optional),
               "rotation": "oblimin" | "varimax" | "promax" (optional),
+              "fm": "pa" | "minres" | "ml" (optional, default "pa"),
+              "engine": "r" | "python" (optional, default "r"; "python" fits in-process),
               "script": "analysis/scripts/efa_analysis.R" (optional override)
             }
         """
-        data = payload.get("data", [])
-        if not isinstance(data, list):
-            raise HTTPException(status_code=400, detail="'data' must be a list of row objects")
-        n_factors = payload.get("n_factors", "auto")
-        rotation = payload.get("rotation", "oblimin")
-        script_rel = payload.get("script", "analysis/scripts/efa_analysis.R")
-        try:
-            result = run_r_subprocess(data, script_rel, model_syntax=None, extra_args=[str(n_factors), str(rotation)])
-            return result
-        except FileNotFoundError as e:
-            raise HTTPException(status_code=404, detail=str(e))
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+        return await _run_r_job(request, "efa", _r_job_args(payload, "efa"))
+
+@router.post("/r/purify")
+async def run_purification(payload: dict, request: Request):
+        """Leave-one-indicator-out purification scan of a CFA model.
+
+        Payload: the /r/run payload ("data" or "dataset_id", "model") plus optional
+            {
+              "min_indicators": 3 (never leave a construct with fewer indicators),
+              "rank_by": "cfi" | "rmsea" | "srmr" | "chisq" | "cr" | "ave",
+              "max_steps": 0 (one scan) | n (greedy removal of up to n items),
+              "min_improvement": 0 (stop when the best drop improves rank_by by no more),
+              "stop_at_good_fit": true (stop once CFI >= .95, RMSEA <= .06, SRMR <= .08),
+              "cores": 0 (all)
+            }
+        Returns the /r/run result shape with "output.purification": ranked "candidates" (Δχ², ΔCFI,
+        ΔRMSEA, ΔSRMR, ΔCR, ΔAVE per dropped item), greedy "steps", "removed", "final_model" and
+        "stop_reason". Submit to /r/jobs with "kind": "purify" to follow progress.
+        """
+        return await _run_r_job(request, "purify", _r_job_args(payload, "purify"))
+
+@router.post("/r/compare")
+async def run_model_comparison(payload: dict, request: Request):
+        """Fit competing models and/or an invariance sequence on one dataset in a single R run.
+
+        Payload: "data" or "dataset_id" plus
+            {
+              "models": ["f =~ a + b + c", {"name": "two-factor", "syntax": "..."}],
+              "group": "country" (optional; fits every model per invariance level),
+              "invariance": ["configural", "metric", "scalar", "strict"] (default the first three),
+              "estimator", "missing", "sufficient_stats", "cores" (optional)
+            }
+        Returns the /r/run result shape with "output.comparison" (fit indices, AIC/BIC and ΔAIC/ΔBIC
+        per fit), "output.tests" (Δχ², ΔCFI, ΔRMSEA between invariance levels and between models
+        on the same variables) and "output.fits" (fit measures and loadings per fit). Submit to
+        /r/jobs with "kind": "compare" to follow progress.
+        """
+        return await _run_r_job(request, "compare", _r_job_args(payload, "compare"))
+
+@router.get("/r/efa/null-tables")
+async def efa_null_tables():
+        """Stored parallel-analysis null tables: directory, count and hit/simulation counters."""
+        from analysis.parallel_analysis import null_index
+        return null_index.describe()
+
+@router.get("/r/cache")
+async def r_cache_stats():
+        """Hit/miss counters and size of the R result cache."""
+        if r_cache is None:
+                return {"enabled": False}
+        return {"enabled": True, **r_cache.describe()}
+
+@router.post("/r/jobs")
+async def submit_r_job(payload: dict):
+        """Queue an R analysis and return immediately.
+
+        Payload: the /r/run, /r/efa, /r/purify or /r/compare payload plus
+        "kind": "cfa" (default) | "efa" | "purify" | "compare".
+        Returns {"job_id", "status", "queue_position"}; poll GET /r/jobs/{job_id}
+        or stream GET /r/jobs/{job_id}/events.
+        """
+        kind = payload.get("kind", "cfa")
+        args = await _prepare_r_args(kind, _r_job_args(payload, kind))
+        job = _submit_r_job(kind, args)
+        return r_jobs.snapshot(job, include_result=False)
+
+def _get_r_job(job_id: str):
+        job = r_jobs.get(job_id)
+        if job is None:
+                raise HTTPException(status_code=404, detail="job_not_found")
+        return job
+
+@router.get("/r/jobs/{job_id}")
+async def get_r_job(job_id: str):
+        """Job status; includes "result" (same shape as /r/run) once status is "done"."""
+        return FastJSONResponse(r_jobs.snapshot(_get_r_job(job_id)))
+
+@router.get("/r/jobs/{job_id}/events")
+async def stream_r_job(job_id: str, request: Request):
+        """Server-sent events with a job snapshot per state change; the last event carries the result.
+
+        Closing the stream before the job finishes cancels it.
+        """
+        job = _get_r_job(job_id)
+
+        async def event_stream():
+                finished = False
+                try:
+                        async for snap in r_jobs.events(job):
+                                if await request.is_disconnected():
+                                        break
+                                if snap is None:
+                                        yield ": keep-alive\n\n"
+                                        continue
+                                finished = snap["status"] in ("done", "error", "cancelled")
+                                yield _sse("result" if finished else "status", snap)
+                finally:
+                        if not finished:
+                                r_jobs.cancel(job.id)
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.delete("/r/jobs/{job_id}")
+async def cancel_r_job(job_id: str):
+        """Cancel a queued or running job; a running Rscript is killed."""
+        job = r_jobs.cancel(_get_r_job(job_id).id)
+        await r_jobs.wait(job, timeout=5)
+        return r_jobs.snapshot(job, include_result=False)
+
+
+# ---- Request profiles (?profile=1 / X-Profile: 1, see analysis/profiling.py) ----
+
+def _profiles(request: Request):
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING=1)")
+    if not profile_store.allowed(request.headers.get("x-profile-token")):
+        raise HTTPException(status_code=403, detail="X-Profile-Token required")
+    return profile_store
+
+
+@router.get("/profiles")
+async def list_profiles(request: Request):
+    """Stored profiles, newest first, with their artifacts and the retention limits."""
+    store = _profiles(request)
+    return {**store.describe(), "items": await asyncio.to_thread(store.list)}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    meta = _profiles(request).get(profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return meta
+
+
+@router.get("/profiles/{profile_id}/{name}")
+async def download_profile_file(profile_id: str, name: str, request: Request):
+    """One artifact: .pstats, .txt (top functions), .Rprof.out or .folded (flame graph input)."""
+    path = _profiles(request).file_path(profile_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile file not found")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
+
+
+@router.delete("/profiles/{profile_id}")
+async def delete_profile(profile_id: str, request: Request):
+    if not _profiles(request).delete(profile_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {"deleted": profile_id}
 
 @router.post("/personaGen")
 async def generate_personas_endpoint(gen_req: PersonaGenRequest):
     try:
-        personas = generate_persona_set(
+        personas = await generate_persona_set(
             generatedPersonas=gen_req.generatedPersonas,
             groupDescription=gen_req.groupDescription,
             temperature=gen_req.temperature,
             model=gen_req.model,
             api_key=simple_decrypt(gen_req.keyCipher),
-            amount=gen_req.amount
+            amount=gen_req.amount,
+            mode=gen_req.mode
         )
         return personas
-    except AuthenticationError:
+    except openai.AuthenticationError:
         raise HTTPException(status_code=401, detail="invalid_api_key")
-    except PermissionDeniedError:
+    except openai.PermissionDeniedError:
         raise HTTPException(status_code=403, detail="permission_denied")
-    except RateLimitError:
+    except openai.RateLimitError:
         raise HTTPException(status_code=429, detail="rate_limit_exceeded")
-    except BadRequestError as e:
+    except openai.BadRequestError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except APIError as e:
+    except openai.APIError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,459 @@
+"""Server-side Likert response simulation (Step 5) as a resumable background job.
+
+Contract:
+  - One simulated respondent is one chat completion: persona (start_offset + row) of the pool
+    answers every item in a single JSON object, with the prompt Step 5 used in the browser
+  - Rows fan out concurrently. At most SIM_CONCURRENCY rows of a job are in flight; the cap is
+    halved whenever the API answers with a rate limit and grows back by one after as many clean
+    calls as the current cap. llm_clients adds its per-key limit and Retry-After backoff on top
+  - Every reply is validated on the server: each Likert item must be present and coerce to an
+    integer in [scale_min, scale_max] ("4", 4.0, "4 - agree"), open items become strings. Only a
+    malformed row is asked again (with the problems listed), up to SIM_MAX_ATTEMPTS times; a row
+    that stays malformed or whose call fails after the pool's retries is reported as failed
+  - The spec (without the API key) and each completed row are written to SIM_JOB_DIR as soon as
+    they exist, so a job survives closed tabs and server restarts: resume() loads the stored rows
+    and simulates only the missing row indexes, under the same id
+  - Jobs run on their own JobManager (SIM_JOB_CONCURRENCY jobs at a time); errors that are not
+    transient (authentication, exhausted quota, bad request) fail the job and keep its rows
+
+Configuration (environment):
+  SIM_CONCURRENCY      rows in flight per job (default 8)
+  SIM_MAX_ATTEMPTS     requests per row when replies are malformed (default 3)
+  SIM_MAX_ROWS         largest accepted n (default 5000)
+  SIM_JOB_CONCURRENCY  simulations running at the same time (default 4)
+  SIM_JOB_DIR          spec and row files (default <tmp>/scalex_simulations-<uid>, private to this user;
+                       empty keeps them in memory)
+  SIM_JOB_TTL          seconds stored simulations are kept (default 604800)
+"""
+
+from __future__ import annotations
+
+import asyncio, json, os, random, re, tempfile, threading, time, uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from analysis import lazy
+from analysis.config import env_int, env_num, private_tmp_dir
+from API.jobs import Job, JobManager
+from API.llm_client import llm_clients
+
+openai = lazy.module("openai")  # imported on the first simulated row
+
+
+SIM_CONCURRENCY = max(1, env_int("SIM_CONCURRENCY", 8))
+SIM_MAX_ATTEMPTS = max(1, env_int("SIM_MAX_ATTEMPTS", 3))
+SIM_MAX_ROWS = max(1, env_int("SIM_MAX_ROWS", 5000))
+SIM_JOB_TTL = env_num("SIM_JOB_TTL", 7 * 24 * 3600)
+MAX_SIMULATIONS = 100  # specs kept in memory; older ones are reloaded from SIM_JOB_DIR on demand
+
+SYSTEM_PROMPT = ("You are a JSON-only output assistant. Return only valid JSON in your response. "
+                 "No markdown, no commentary, no wrappers.")
+
+
+def _transient() -> tuple:
+    """Failures the client pool already retried; anything else (auth, quota, bad request) fails the job."""
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+            openai.InternalServerError)
+
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+# ---------- spec ----------
+
+def likert_spec(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Validated simulation spec from a request payload; ValueError on bad input."""
+    items = []
+    seen = set()
+    for raw in payload.get("items") or []:
+        if not isinstance(raw, dict) or raw.get("id") in (None, ""):
+            raise ValueError("every item needs an 'id'")
+        item_id = str(raw["id"])
+        if item_id in seen:
+            raise ValueError(f"duplicate item id: {item_id}")
+        seen.add(item_id)
+        response_type = "open" if raw.get("responseType") == "open" else "likert"
+        items.append({"id": item_id, "text": str(raw.get("text", "")), "responseType": response_type})
+    if not items:
+        raise ValueError("'items' must be a non-empty list")
+    try:
+        lo, hi = int(payload.get("scale_min", 1)), int(payload.get("scale_max", 5))
+        n = int(payload.get("n", 0)) or len(payload.get("personas") or [])
+        start_offset = max(0, int(payload.get("start_offset", 0)))
+        temperature = float(payload.get("temperature", 0.7))
+    except (TypeError, ValueError):
+        raise ValueError("scale_min, scale_max, n, start_offset and temperature must be numbers")
+    if lo == hi:
+        raise ValueError("scale_min and scale_max must differ")
+    lo, hi = min(lo, hi), max(lo, hi)
+    if not 1 <= n <= SIM_MAX_ROWS:
+        raise ValueError(f"n must be between 1 and {SIM_MAX_ROWS}")
+    personas = [str(p) for p in payload.get("personas") or []]
+    order = [item["id"] for item in items]
+    random.shuffle(order)  # once per simulation, as in the browser version; resumes reuse it
+    return {"items": items, "order": order, "scale_min": lo, "scale_max": hi, "n": n,
+            "personas": personas, "start_offset": start_offset,
+            "model": str(payload.get("model") or os.getenv("DEFAULT_MODEL", "gpt-4.1")),
+            "temperature": temperature, "created": time.time()}
+
+
+def _persona_index(spec: Dict[str, Any], index: int) -> int:
+    i = spec["start_offset"] + index
+    return i % len(spec["personas"]) if spec["personas"] else i
+
+
+def likert_messages(spec: Dict[str, Any], index: int) -> List[Dict[str, str]]:
+    p = _persona_index(spec, index)
+    persona = spec["personas"][p] if spec["personas"] else f"Participant {p + 1}"
+    by_id = {item["id"]: item for item in spec["items"]}
+    ordered = [by_id[i] for i in spec["order"]]
+    likert = [{"id": it["id"], "text": it["text"]} for it in ordered if it["responseType"] != "open"]
+    open_items = [{"id": it["id"], "text": it["text"]} for it in ordered if it["responseType"] == "open"]
+    lo, hi = spec["scale_min"], spec["scale_max"]
+    open_prompt = f"Also, answer these open questions briefly in character: {json.dumps(open_items)}." if open_items else ""
+    prompt = (f"Answer each of the following statements: {json.dumps(likert)}.\n"
+              f"Use ONLY a {hi - lo + 1}-point scale: {lo}=Very Inaccurate ... {hi}=Very Accurate.\n"
+              f"{open_prompt}\nReturn JSON ONLY as {{\"ITEM-ID\": answer, ...}}")
+    return [{"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": f"This is a persona: {persona}. From now on, act fully in character."},
+            {"role": "user", "content": prompt}]
+
+
+# ---------- validation ----------
+
+def parse_reply(content: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The JSON object of a reply (fenced or surrounded by prose); None when there is none."""
+    text = (content or "").strip()
+    fenced = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end <= start:
+            return None
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+
+def coerce_likert(value: Any, lo: int, hi: int) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        x = float(value)
+    elif isinstance(value, str):
+        match = _NUMBER.search(value)
+        if match is None:
+            return None
+        x = float(match.group())
+    else:
+        return None
+    if not lo <= x <= hi or x != int(x):  # range first: NaN fails it, and int(inf) would raise
+        return None
+    return int(x)
+
+
+def validate_answers(data: Optional[Dict[str, Any]], spec: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """(answers keyed by item id, []) for a usable reply, else (None, problems)."""
+    if data is None:
+        return None, ["reply is not a JSON object"]
+    lookup = {str(k).strip().lower(): v for k, v in data.items()}
+    lo, hi = spec["scale_min"], spec["scale_max"]
+    answers: Dict[str, Any] = {}
+    problems: List[str] = []
+    for item in spec["items"]:
+        item_id = item["id"]
+        if item_id.lower() not in lookup:
+            problems.append(f"{item_id} is missing")
+            continue
+        value = lookup[item_id.lower()]
+        if item["responseType"] == "open":
+            answers[item_id] = value.strip() if isinstance(value, str) else json.dumps(value)
+            continue
+        score = coerce_likert(value, lo, hi)
+        if score is None:
+            problems.append(f"{item_id} must be an integer from {lo} to {hi} (got {json.dumps(value)[:40]})")
+        else:
+            answers[item_id] = score
+    return (None, problems) if problems else (answers, [])
+
+
+# ---------- concurrency ----------
+
+class AdaptiveLimiter:
+    """Concurrency cap that halves on a rate limit and grows by one after `limit` clean calls."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self._clean = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def rate_limited(self) -> None:
+        self.limit = max(1, self.limit // 2)
+        self._clean = 0
+
+    def succeeded(self) -> None:
+        self._clean += 1
+        if self._clean >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._clean = 0
+
+
+# ---------- persistence ----------
+
+class _SimulationFiles:
+    """<id>.json holds the spec, <id>.jsonl one completed row per line (append-only)."""
+
+    def __init__(self, directory: Optional[str], ttl: float):
+        self.directory = directory
+        self.ttl = ttl
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, sim_id: str, ext: str) -> str:
+        return os.path.join(self.directory, sim_id + ext)
+
+    def save_spec(self, sim_id: str, spec: Dict[str, Any]) -> None:
+        if not self.directory:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(spec))
+        os.replace(tmp, self._path(sim_id, ".json"))
+
+    def append_row(self, sim_id: str, row: Dict[str, Any]) -> None:
+        if not self.directory:
+            return
+        with open(self._path(sim_id, ".jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(row) + "\n")
+
+    def load(self, sim_id: str) -> Optional[Tuple[Dict[str, Any], Dict[int, Dict[str, Any]]]]:
+        if not self.directory or not all(c in "0123456789abcdef" for c in sim_id):
+            return None
+        try:
+            with open(self._path(sim_id, ".json"), encoding="utf-8") as f:
+                spec = json.load(f)
+        except (OSError, ValueError):
+            return None
+        rows: Dict[int, Dict[str, Any]] = {}
+        try:
+            with open(self._path(sim_id, ".jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:  # torn last line after a crash
+                        continue
+                    rows[int(row["index"])] = row
+        except OSError:
+            pass
+        return spec, rows
+
+    def prune(self) -> None:
+        if not self.directory:
+            return
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+
+# ---------- simulation ----------
+
+class JSONChat:
+    """Chat completions in JSON mode under an AdaptiveLimiter, shared by the LLM batch jobs.
+
+    JSON mode is dropped for the rest of the job when the model rejects response_format.
+    """
+
+    def __init__(self, model: str, temperature: float, limiter: AdaptiveLimiter, stats: Dict[str, Any]):
+        self.model = model
+        self.temperature = temperature
+        self.limiter = limiter
+        self.stats = stats
+        self.json_mode = True
+
+    async def complete(self, api_key: Optional[str], messages: List[Dict[str, str]]) -> str:
+        params: Dict[str, Any] = {"model": self.model, "messages": messages, "temperature": self.temperature}
+        if self.json_mode:
+            params["response_format"] = {"type": "json_object"}
+
+        async def create(client: openai.AsyncOpenAI) -> Any:
+            self.stats["requests"] += 1
+            try:
+                return await client.chat.completions.create(**params)
+            except openai.RateLimitError:
+                self.stats["rate_limited"] += 1
+                self.limiter.rate_limited()
+                raise
+
+        try:
+            response = await llm_clients.call(api_key, create)
+        except openai.BadRequestError as e:
+            if not self.json_mode or "response_format" not in str(e):
+                raise
+            self.json_mode = False  # model without JSON mode: rely on the prompt and validation
+            return await self.complete(api_key, messages)
+        return response.choices[0].message.content or ""
+
+
+class LikertSimulation:
+    def __init__(self, sim_id: str, spec: Dict[str, Any], files: _SimulationFiles,
+                 rows: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.id = sim_id
+        self.spec = spec
+        self.files = files
+        self.rows: Dict[int, Dict[str, Any]] = dict(rows or {})
+        self.order: List[int] = sorted(self.rows)  # completion order, for streaming new rows
+        self.failed: Dict[int, str] = {}
+        self.limiter: Optional[AdaptiveLimiter] = None
+        self.stats = {"requests": 0, "malformed": 0, "rate_limited": 0}
+
+    async def _row(self, chat: JSONChat, index: int, api_key: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+        messages = likert_messages(self.spec, index)
+        problems: List[str] = []
+        for attempt in range(1, SIM_MAX_ATTEMPTS + 1):
+            async with self.limiter:
+                try:
+                    content = await chat.complete(api_key, messages)
+                except _transient() as e:
+                    return None, f"{type(e).__name__}: {e}"
+                self.limiter.succeeded()
+            answers, problems = validate_answers(parse_reply(content), self.spec)
+            if answers is not None:
+                return {"index": index, "persona_index": _persona_index(self.spec, index),
+                        "answers": answers, "attempts": attempt}, ""
+            self.stats["malformed"] += 1
+            messages = messages[:3] + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": "That answer was invalid: " + "; ".join(problems[:10])
+                 + ". Return the complete corrected JSON object only."},
+            ]
+        return None, "malformed reply: " + "; ".join(problems[:5])
+
+    def progress(self, started: Optional[float] = None) -> Dict[str, Any]:
+        n = self.spec["n"]
+        out: Dict[str, Any] = {"total": n, "completed": len(self.rows), "failed": len(self.failed),
+                               "remaining": n - len(self.rows) - len(self.failed),
+                               "concurrency": self.limiter.limit if self.limiter else None, **self.stats}
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            out["elapsed_s"] = round(elapsed, 3)
+        return out
+
+    async def run(self, job: Job, api_key: Optional[str]) -> Dict[str, Any]:
+        pending = deque(i for i in range(self.spec["n"]) if i not in self.rows)
+        self.failed.clear()
+        self.limiter = AdaptiveLimiter(SIM_CONCURRENCY)
+        chat = JSONChat(self.spec["model"], self.spec["temperature"], self.limiter, self.stats)
+        started = time.perf_counter()
+        job.update(**self.progress(started))
+
+        async def worker() -> None:
+            while pending:
+                index = pending.popleft()
+                row, error = await self._row(chat, index, api_key)
+                if row is not None:
+                    self.rows[index] = row
+                    self.order.append(index)
+                    self.files.append_row(self.id, row)
+                else:
+                    self.failed[index] = error
+                job.update(**self.progress(started))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(SIM_CONCURRENCY, len(pending)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+        return self.result()
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "simulation_id": self.id,
+            "complete": len(self.rows) == self.spec["n"],
+            "rows": [self.rows[i] for i in sorted(self.rows)],
+            "failed": [{"index": i, "persona_index": _persona_index(self.spec, i), "error": e}
+                       for i, e in sorted(self.failed.items())],
+        }
+
+
+class SimulationStore:
+    def __init__(self, files: _SimulationFiles, jobs: JobManager):
+        self.files = files
+        self.jobs = jobs
+        self._sims: "OrderedDict[str, LikertSimulation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, sim: LikertSimulation) -> None:
+        with self._lock:
+            self._sims[sim.id] = sim
+            self._sims.move_to_end(sim.id)
+            for sim_id in list(self._sims):
+                if len(self._sims) <= MAX_SIMULATIONS:
+                    break
+                job = self.jobs.get(sim_id)
+                if job is None or job.done:
+                    self._sims.pop(sim_id)
+
+    def get(self, sim_id: str) -> Optional[LikertSimulation]:
+        with self._lock:
+            sim = self._sims.get(sim_id)
+        if sim is not None:
+            return sim
+        loaded = self.files.load(sim_id)
+        if loaded is None:
+            return None
+        sim = LikertSimulation(sim_id, loaded[0], self.files, loaded[1])
+        self._remember(sim)
+        return sim
+
+    def start(self, spec: Dict[str, Any], api_key: Optional[str]) -> Job:
+        self.files.prune()
+        sim = LikertSimulation(uuid.uuid4().hex, spec, self.files)
+        self.files.save_spec(sim.id, spec)
+        self._remember(sim)
+        return self._submit(sim, api_key)
+
+    def resume(self, sim_id: str, api_key: Optional[str]) -> Optional[Job]:
+        """Simulate the rows still missing; KeyError for an unknown id, ValueError while it runs."""
+        sim = self.get(sim_id)
+        if sim is None:
+            raise KeyError(sim_id)
+        return self._submit(sim, api_key)
+
+    def _submit(self, sim: LikertSimulation, api_key: Optional[str]) -> Job:
+        return self.jobs.submit("likert", lambda job: sim.run(job, api_key), job_id=sim.id)
+
+
+def _build_store() -> SimulationStore:
+    directory = os.getenv("SIM_JOB_DIR")
+    if directory is None:
+        directory = private_tmp_dir("scalex_simulations")
+    jobs = JobManager(max(1, env_int("SIM_JOB_CONCURRENCY", 4)))
+    return SimulationStore(_SimulationFiles(directory or None, SIM_JOB_TTL), jobs)
+
+
+simulations = _build_store()
+sim_jobs = simulations.jobs
@@ -0,0 +1,115 @@
+"""Background warm-up after the server starts, and the readiness report behind GET /ready.
+
+Contract:
+  - The server accepts requests as soon as app.main is imported. The slow parts run in
+    warm_up(), which the startup hook starts as a background task, one step after the other:
+      1. "r_preflight": Rscript and R packages are checked once (analysis/r_preflight.py)
+      2. "r_pool": the R workers spawn (analysis/r_pool.py), after the check so they find the packages
+      3. "imports": the deferred heavy imports (analysis/lazy.py: scipy, pingouin, openai)
+  - describe() reports each step ("pending" | "running" | "done" | "skipped" | "failed") with its
+    seconds, the import time of app.main and the deferred modules. "ready" turns true once every
+    step has finished. Missing R packages do not hold readiness back. They are listed under
+    "degraded", so a probe does not restart a container that cannot be fixed by restarting
+  - Requests that arrive before the warm-up finishes still work: deferred modules load on first
+    use and R runs fall back to one-shot Rscript
+
+Configuration (environment):
+  WARM_UP   0 skips the import warm-up, so heavy modules load on the first request that needs
+            them (default 1). The R steps follow R_PREFLIGHT and R_POOL_SIZE
+"""
+
+from __future__ import annotations
+
+import asyncio, os, time
+from typing import Any, Dict, Optional
+
+from analysis import lazy, r_preflight
+from analysis.r_pool import get_pool
+
+WARM_IMPORTS = os.getenv("WARM_UP", "1").lower() not in ("0", "false", "no")
+DEFERRED = ("scipy.stats", "scipy.special", "scipy.optimize", "openai", "pingouin")
+POOL_POLL_INTERVAL = 0.2
+
+_started = time.time()
+_import_seconds: Optional[float] = None
+_steps: Dict[str, Dict[str, Any]] = {
+    "r_preflight": {"status": "pending" if r_preflight.ENABLED else "skipped"},
+    "r_pool": {"status": "pending"},
+    "imports": {"status": "pending" if WARM_IMPORTS else "skipped"},
+}
+
+
+def mark_imported(seconds: float) -> None:
+    """Called at the end of app.main with the time its imports took."""
+    global _import_seconds
+    _import_seconds = round(seconds, 4)
+
+
+async def _step(name: str, fn) -> None:
+    step = _steps[name]
+    if step["status"] == "skipped":
+        return
+    step["status"] = "running"
+    started = time.perf_counter()
+    try:
+        result = await fn()
+        step["status"] = "done"
+        if result:
+            step.update(result)
+    except Exception as e:
+        step.update(status="failed", error=str(e))
+    finally:
+        step["seconds"] = round(time.perf_counter() - started, 3)
+
+
+async def _preflight() -> Dict[str, Any]:
+    report = await asyncio.to_thread(r_preflight.run_preflight)
+    return {"r_status": report["status"]}
+
+
+async def _pool() -> Optional[Dict[str, Any]]:
+    pool = get_pool()
+    if pool is None:
+        _steps["r_pool"]["status"] = "skipped"
+        return None
+    pool.warm_up()
+    # warm_up() spawns in threads; wait until every worker is up or has failed to start
+    while True:
+        d = pool.describe()
+        if d["spawning"] == 0 and (d["live"] >= d["size"] or d["spawn_failures"]):
+            return {"live": d["live"], "size": d["size"]}
+        await asyncio.sleep(POOL_POLL_INTERVAL)
+
+
+async def _imports() -> Dict[str, Any]:
+    seconds = await asyncio.to_thread(lazy.warm, DEFERRED)
+    failed = [name for name, s in seconds.items() if s is None]
+    if failed:
+        raise RuntimeError("could not import " + ", ".join(failed))
+    return {}
+
+
+async def warm_up() -> None:
+    await _step("r_preflight", _preflight)
+    await _step("r_pool", _pool)
+    await _step("imports", _imports)
+
+
+def describe() -> Dict[str, Any]:
+    ready = all(s["status"] in ("done", "skipped", "failed") for s in _steps.values())
+    degraded = []
+    if r_preflight.state["status"] not in ("ok", "skipped", "pending", "running"):
+        degraded.append({"component": "r", "status": r_preflight.state["status"],
+                         "missing": r_preflight.state.get("missing", []),
+                         "error": r_preflight.state.get("error")})
+    degraded += [{"component": name, "status": "failed", "error": s.get("error")}
+                 for name, s in _steps.items() if s["status"] == "failed"]
+    return {
+        "ready": ready,
+        "uptime_s": round(time.time() - _started, 1),
+        "import_s": _import_seconds,
+        "steps": _steps,
+        "deferred_modules": lazy.describe(),
+        "r_packages": r_preflight.state.get("packages", {}),
+        "degraded": degraded,
+    }
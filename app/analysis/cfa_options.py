@@ -0,0 +1,190 @@
+"""Run options for the CFA scripts beyond data and model, passed as one JSON argument.
+
+Contract:
+  - cfa_options(payload) validates the optional "bootstrap" entry of an /r/run or /r/jobs payload
+    and returns the options dict ({} when nothing is requested); ValueError for bad values
+  - "bootstrap" is either the number of resamples or {"n", "seed", "ci": "bca" | "percentile",
+    "level", "cores"}; a missing seed is drawn at random and returned in the result, so the run
+    can be repeated exactly
+  - purification_options(payload) validates an /r/purify payload: "min_indicators" (default 3),
+    "rank_by" (cfi | rmsea | srmr | chisq | cr | ave), "max_steps" (0 = one scan, otherwise greedy
+    removal), "min_improvement", "stop_at_good_fit" and "cores"
+  - comparison_models(payload) / comparison_options(payload) validate an /r/compare payload for
+    model_comparison.R: "models" (syntax strings or {"name", "syntax"}), "group" with "invariance"
+    levels (configural | metric | scalar | strict; default the first three) and "cores"
+  - "estimator" (lavaan name, e.g. "MLR") and "missing" ("listwise" | "fiml" | ...) are passed to
+    every lavaan fit of a CFA or purification run
+  - sufficient_stats_mode(payload) reads "sufficient_stats": true | false | "auto"; with "auto" the
+    model is fitted from the sample moments (analysis/moments.py) once the data have
+    R_SUFFICIENT_STATS_MIN_ROWS rows, and only when nothing in the run needs the raw rows
+  - cfa_extra_args(options) is the script argument list: None or [<compact JSON>]. The argument is
+    part of the R result-cache key, so a seeded bootstrap is cached like any other fit
+  - run_timeout(options) is the R timeout for the run: R_BOOT_TIMEOUT with a bootstrap,
+    R_PURIFY_TIMEOUT for a purification scan, R_COMPARE_TIMEOUT for a
+    model comparison, otherwise None (the runner default)
+
+Configuration (environment):
+  R_BOOT_MAX_RESAMPLES  upper bound for "n" (default 5000)
+  R_BOOT_CORES          cores R uses for the resamples when the payload names none (default 0 = all)
+  R_BOOT_TIMEOUT        seconds a bootstrap run may take (default 1800)
+  R_PURIFY_TIMEOUT      seconds a purification scan may take (default 900)
+  R_COMPARE_TIMEOUT     seconds a model comparison may take (default 1800)
+  R_COMPARE_MAX_MODELS  upper bound for the number of models (default 20)
+  R_SUFFICIENT_STATS    default for "sufficient_stats": auto | on | off (default auto)
+  R_SUFFICIENT_STATS_MIN_ROWS  rows from which "auto" uses the moments (default 5000)
+"""
+
+from __future__ import annotations
+
+import json, os, random
+from typing import Any, Dict, List, Optional
+
+from analysis.config import env_int, env_num
+
+BOOT_DEFAULTS = {"n": 1000, "ci": "bca", "level": 0.95}
+CI_TYPES = ("bca", "percentile")
+RANK_BY = ("cfi", "rmsea", "srmr", "chisq", "cr", "ave")
+ESTIMATORS = ("ML", "MLR", "MLM", "MLMV", "MLMVS", "MLF", "GLS", "WLS", "DWLS", "WLSMV", "ULS", "ULSMV")
+MISSING = ("listwise", "fiml", "ml", "direct", "pairwise")
+INVARIANCE_LEVELS = ("configural", "metric", "scalar", "strict")
+
+
+BOOT_MAX_RESAMPLES = max(10, env_int("R_BOOT_MAX_RESAMPLES", 5000))
+BOOT_CORES = max(0, env_int("R_BOOT_CORES", 0))
+BOOT_TIMEOUT = env_num("R_BOOT_TIMEOUT", 1800.0)
+PURIFY_TIMEOUT = env_num("R_PURIFY_TIMEOUT", 900.0)
+COMPARE_TIMEOUT = env_num("R_COMPARE_TIMEOUT", 1800.0)
+COMPARE_MAX_MODELS = max(1, env_int("R_COMPARE_MAX_MODELS", 20))
+SUFFICIENT_STATS = {"1": True, "true": True, "on": True, "0": False, "false": False, "off": False}.get(
+    os.getenv("R_SUFFICIENT_STATS", "auto").strip().lower(), "auto")
+SUFFICIENT_STATS_MIN_ROWS = max(0, env_int("R_SUFFICIENT_STATS_MIN_ROWS", 5000))
+
+
+def _int(spec: Dict[str, Any], name: str, lo: int, hi: int, prefix: str = "bootstrap.") -> int:
+    value = spec[name]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or int(value) != value:
+        raise ValueError(f"{prefix}{name} must be an integer")
+    if not lo <= int(value) <= hi:
+        raise ValueError(f"{prefix}{name} must be between {lo} and {hi}")
+    return int(value)
+
+
+def bootstrap_options(spec: Any) -> Dict[str, Any]:
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        spec = {"n": spec}
+    if not isinstance(spec, dict):
+        raise ValueError("'bootstrap' must be a number of resamples or an object")
+    spec = {**BOOT_DEFAULTS, **{k: v for k, v in spec.items() if v is not None}}
+    out = {"n": _int(spec, "n", 10, BOOT_MAX_RESAMPLES)}
+    out["seed"] = _int(spec, "seed", 0, 2**31 - 1) if "seed" in spec else random.randrange(2**31 - 1)
+    if spec["ci"] not in CI_TYPES:
+        raise ValueError(f"bootstrap.ci must be one of {', '.join(CI_TYPES)}")
+    out["ci"] = spec["ci"]
+    try:
+        out["level"] = float(spec["level"])
+    except (TypeError, ValueError):
+        raise ValueError("bootstrap.level must be a number")
+    if not 0.5 <= out["level"] < 1:
+        raise ValueError("bootstrap.level must be in [0.5, 1)")
+    out["cores"] = _int(spec, "cores", 0, 1024) if "cores" in spec else BOOT_CORES
+    return out
+
+
+def purification_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    spec = {k: payload[k] for k in ("min_indicators", "max_steps", "cores") if payload.get(k) is not None}
+    out = {
+        "min_indicators": _int(spec, "min_indicators", 1, 100, "") if "min_indicators" in spec else 3,
+        "max_steps": _int(spec, "max_steps", 0, 100, "") if "max_steps" in spec else 0,
+        "cores": _int(spec, "cores", 0, 1024, "") if "cores" in spec else BOOT_CORES,
+        "rank_by": payload.get("rank_by") or "cfi",
+        "stop_at_good_fit": bool(payload.get("stop_at_good_fit", True)),
+    }
+    if out["rank_by"] not in RANK_BY:
+        raise ValueError(f"rank_by must be one of {', '.join(RANK_BY)}")
+    try:
+        out["min_improvement"] = float(payload.get("min_improvement") or 0.0)
+    except (TypeError, ValueError):
+        raise ValueError("min_improvement must be a number")
+    return out
+
+
+def comparison_models(payload: Dict[str, Any]) -> List[Dict[str, str]]:
+    models = payload.get("models")
+    if not isinstance(models, list) or not models:
+        raise ValueError("'models' must be a non-empty list of model syntaxes")
+    if len(models) > COMPARE_MAX_MODELS:
+        raise ValueError(f"at most {COMPARE_MAX_MODELS} models per comparison")
+    out = []
+    for i, model in enumerate(models, 1):
+        if isinstance(model, str):
+            model = {"syntax": model}
+        if not isinstance(model, dict) or not isinstance(model.get("syntax"), str) or not model["syntax"].strip():
+            raise ValueError(f"model {i} must be a syntax string or {{\"name\", \"syntax\"}}")
+        out.append({"name": str(model.get("name") or f"Model {i}"), "syntax": model["syntax"]})
+    if len({m["name"] for m in out}) != len(out):
+        raise ValueError("model names must be unique")
+    return out
+
+
+def comparison_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    spec: Dict[str, Any] = {}
+    group = payload.get("group")
+    if group is not None:
+        if not isinstance(group, str) or not group:
+            raise ValueError("group must be a column name")
+        levels = payload.get("invariance") or ["configural", "metric", "scalar"]
+        if isinstance(levels, str):
+            levels = [levels]
+        if not isinstance(levels, list) or any(level not in INVARIANCE_LEVELS for level in levels):
+            raise ValueError(f"invariance levels must be among {', '.join(INVARIANCE_LEVELS)}")
+        spec["group"] = group
+        spec["invariance"] = [level for level in INVARIANCE_LEVELS if level in levels]
+    spec["cores"] = _int(payload, "cores", 0, 1024, "") if payload.get("cores") is not None else BOOT_CORES
+    return {"compare": spec, **estimator_options(payload)}
+
+
+def estimator_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    if payload.get("estimator"):
+        estimator = str(payload["estimator"]).upper()
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"estimator must be one of {', '.join(ESTIMATORS)}")
+        out["estimator"] = estimator
+    if payload.get("missing"):
+        missing = str(payload["missing"]).lower()
+        if missing not in MISSING:
+            raise ValueError(f"missing must be one of {', '.join(MISSING)}")
+        out["missing"] = missing
+    return out
+
+
+def cfa_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    options = estimator_options(payload)
+    if payload.get("bootstrap"):
+        options["bootstrap"] = bootstrap_options(payload["bootstrap"])
+    return options
+
+
+def sufficient_stats_mode(payload: Dict[str, Any]) -> Any:
+    mode = payload.get("sufficient_stats")
+    if mode is None:
+        return SUFFICIENT_STATS
+    if mode not in (True, False, "auto"):
+        raise ValueError("sufficient_stats must be true, false or \"auto\"")
+    return mode
+
+
+def cfa_extra_args(options: Dict[str, Any]) -> Optional[List[str]]:
+    if not options:
+        return None  # keeps the cache keys of plain fits unchanged
+    return [json.dumps(options, sort_keys=True, separators=(",", ":"))]
+
+
+def run_timeout(options: Dict[str, Any]) -> Optional[float]:
+    if "bootstrap" in options:
+        return BOOT_TIMEOUT
+    if "purify" in options:
+        return PURIFY_TIMEOUT
+    if "compare" in options:
+        return COMPARE_TIMEOUT
+    return None
@@ -0,0 +1,52 @@
+"""Environment settings shared by the API and analysis modules.
+
+Contract:
+  - env_num / env_int / env_flag read one variable each. An unset, empty or unparsable value gives
+    the default, so a typo in the environment never stops the server from importing
+  - Modules read their settings once, at import, into module constants or their singleton
+  - private_tmp_dir(name) is the default for directories that hold user data: <tmp>/<name>-<uid>,
+    created 0700 and used only if it is a real directory owned by us that nobody else can open,
+    otherwise a fresh mkdtemp. Another local account cannot pre-create or read it
+"""
+
+from __future__ import annotations
+
+import os, stat, tempfile
+from typing import Optional
+
+
+def env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except (TypeError, ValueError):
+        return default
+
+
+def env_int(name: str, default: int) -> int:
+    return int(env_num(name, default))
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    value = (os.getenv(name) or "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
+
+def private_dir(path: str) -> Optional[str]:
+    """`path` created 0700, or None unless it is a real directory of ours that only we can access."""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):  # lstat: a symlink is refused, not followed
+        return None
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        return None
+    return path
+
+
+def private_tmp_dir(name: str) -> str:
+    suffix = f"-{os.getuid()}" if hasattr(os, "getuid") else ""
+    return private_dir(os.path.join(tempfile.gettempdir(), name + suffix)) or tempfile.mkdtemp(prefix=name + "_")
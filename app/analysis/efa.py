@@ -0,0 +1,389 @@
+"""In-process exploratory factor analysis (NumPy / SciPy twin of scripts/efa_analysis.R).
+
+Contract:
+  - run_efa(data, n_factors="auto", rotation="oblimin", fm="pa") takes the same record list as
+    the R script and returns the dict efa_analysis.R writes to its output JSON
+    (status, n_rows, n_cols, numeric_columns, efa{...}); guards and messages are the same
+  - Follows psych::fa: pairwise correlation matrix, SMC starting communalities, extraction by
+    principal axis ("pa", the R script's choice), minimum residual ("minres") or maximum
+    likelihood ("ml"); varimax, promax (psych::Promax, m=4) or oblimin (GPArotation, gamma=0);
+    factors named by extraction (PA1, MR1, ML1), reordered by variance accounted for and
+    reflected to positive column sums after rotation
+  - n_factors="auto" uses parallel analysis on the 1-factor minres eigenvalues of the
+    reduced correlation matrix, as psych::fa.parallel(fa="fa"), against the mean of a stored,
+    seeded null table (analysis/parallel_analysis.py); R simulates afresh each run, so its
+    suggestion can differ near the cut-off
+  - NA values in the R output (e.g. criteria.parallel_suggested) are written as null
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analysis import lazy
+
+optimize = lazy.module("scipy.optimize")
+
+FM_PREFIX = {"pa": "PA", "minres": "MR", "ml": "ML"}
+ROTATIONS = ("varimax", "promax", "oblimin")
+
+MIN_ERR = 0.001   # psych::fa defaults
+MAX_ITER = 50
+
+
+# ---------- correlation helpers ----------
+
+def _smc(R: np.ndarray) -> np.ndarray:
+    """Squared multiple correlations (psych::smc), falling back to the pseudo-inverse."""
+    try:
+        inv = np.linalg.inv(R)
+    except np.linalg.LinAlgError:
+        inv = np.linalg.pinv(R)
+    smc = 1 - 1 / np.diag(inv)
+    # Impossible values fall back to the largest absolute correlation of the item
+    bad = ~np.isfinite(smc)
+    if bad.any():
+        off = np.abs(R - np.diag(np.diag(R)))
+        smc[bad] = off.max(1)[bad]
+    return np.clip(smc, 0, 1)
+
+
+def _eigh_desc(S: np.ndarray):
+    values, vectors = np.linalg.eigh(S)
+    return values[::-1], vectors[:, ::-1]
+
+
+def _top_loadings(values: np.ndarray, vectors: np.ndarray, nf: int) -> np.ndarray:
+    return vectors[:, :nf] * np.sqrt(np.maximum(values[:nf], 0))
+
+
+# ---------- extraction ----------
+
+def _fit_pa(R: np.ndarray, nf: int) -> np.ndarray:
+    r = R.copy()
+    np.fill_diagonal(r, _smc(R))
+    comm = np.trace(r)
+    err = comm
+    i = 1
+    while err > MIN_ERR:
+        values, vectors = _eigh_desc(r)
+        loadings = _top_loadings(values, vectors, nf)
+        new = (loadings ** 2).sum(1)
+        comm1 = new.sum()
+        np.fill_diagonal(r, new)
+        err = abs(comm - comm1)
+        comm = comm1
+        i += 1
+        if i > MAX_ITER or not np.isfinite(err):
+            break
+    return loadings
+
+
+def _minres_objective(psi: np.ndarray, S: np.ndarray, nf: int):
+    Sstar = S.copy()
+    np.fill_diagonal(Sstar, 1 - psi)
+    values, vectors = _eigh_desc(Sstar)
+    values = np.where(values < np.finfo(float).eps, 100 * np.finfo(float).eps, values)
+    L = _top_loadings(values, vectors, nf)
+    residual = Sstar - L @ L.T
+    np.fill_diagonal(residual, 0)
+    return (residual ** 2).sum()
+
+
+def _minres_gradient(psi: np.ndarray, S: np.ndarray, nf: int):
+    Sstar = S - np.diag(psi)
+    values, vectors = _eigh_desc(Sstar)
+    L = _top_loadings(values, vectors, nf)
+    g = L @ L.T + np.diag(psi) - S
+    return np.diag(g) / psi ** 2
+
+
+def _ml_objective(psi: np.ndarray, S: np.ndarray, nf: int):
+    sc = 1 / np.sqrt(psi)
+    values = np.linalg.eigvalsh(S * np.outer(sc, sc))[::-1]
+    e = values[nf:]
+    return -(np.sum(np.log(e) - e) - nf + S.shape[0])
+
+
+def _ml_loadings(psi: np.ndarray, S: np.ndarray, nf: int) -> np.ndarray:
+    sc = 1 / np.sqrt(psi)
+    values, vectors = _eigh_desc(S * np.outer(sc, sc))
+    load = vectors[:, :nf] * np.sqrt(np.maximum(values[:nf] - 1, 0))
+    return np.sqrt(psi)[:, None] * load
+
+
+def _ml_gradient(psi: np.ndarray, S: np.ndarray, nf: int):
+    load = _ml_loadings(psi, S, nf)
+    g = load @ load.T + np.diag(psi) - S
+    return np.diag(g) / psi ** 2
+
+
+def _fit_optim(R: np.ndarray, nf: int, fm: str) -> np.ndarray:
+    start = 1 - _smc(R)
+    objective, gradient = (_ml_objective, _ml_gradient) if fm == "ml" else (_minres_objective, _minres_gradient)
+    res = optimize.minimize(objective, start, args=(R, nf), jac=gradient, method="L-BFGS-B",
+                            bounds=[(0.005, 1.0)] * len(start))
+    psi = res.x
+    if fm == "ml":
+        return _ml_loadings(psi, R, nf)
+    values, vectors = _eigh_desc(R - np.diag(psi))
+    return _top_loadings(values, vectors, nf)
+
+
+def _extract(R: np.ndarray, nf: int, fm: str) -> np.ndarray:
+    loadings = _fit_pa(R, nf) if fm == "pa" else _fit_optim(R, nf, fm)
+    signed = np.sign(loadings.sum(0))
+    signed[signed == 0] = 1
+    return loadings * signed
+
+
+# ---------- rotation ----------
+
+def varimax(L: np.ndarray, normalize: bool = True, eps: float = 1e-5):
+    """stats::varimax; returns (rotated loadings, rotation matrix)."""
+    nc = L.shape[1]
+    if nc < 2:
+        return L, np.eye(nc)
+    x = L
+    if normalize:
+        sc = np.sqrt((x ** 2).sum(1))
+        x = x / sc[:, None]
+    p = x.shape[0]
+    TT = np.eye(nc)
+    d = 0.0
+    for _ in range(1000):
+        z = x @ TT
+        B = x.T @ (z ** 3 - z @ np.diag((z ** 2).sum(0)) / p)
+        u, s, vt = np.linalg.svd(B)
+        TT = u @ vt
+        dpast, d = d, s.sum()
+        if d < dpast * (1 + eps):
+            break
+    z = x @ TT
+    if normalize:
+        z = z * sc[:, None]
+    return z, TT
+
+
+def promax(L: np.ndarray, m: int = 4):
+    """psych::Promax; returns (loadings, rotation matrix, Phi)."""
+    x, rot = varimax(L)
+    Q = x * np.abs(x) ** (m - 1)
+    U = np.linalg.lstsq(x, Q, rcond=None)[0]
+    d = np.diag(np.linalg.inv(U.T @ U))
+    U = U @ np.diag(np.sqrt(d))
+    z = x @ U
+    U = rot @ U
+    ui = np.linalg.inv(U)
+    return z, U, ui @ ui.T
+
+
+def oblimin(A: np.ndarray, gam: float = 0.0, eps: float = 1e-5, maxit: int = 1000):
+    """GPArotation::oblimin (GPFoblq from the identity); returns (loadings, Phi)."""
+    k = A.shape[1]
+    p = A.shape[0]
+    mask = 1 - np.eye(k)
+
+    def vgq(L):
+        X = (L ** 2) @ mask
+        if gam != 0:
+            X = (np.eye(p) - gam / p) @ X
+        return L * X, (L ** 2 * X).sum() / 4
+
+    T = np.eye(k)
+    al = 1.0
+    L = A @ np.linalg.inv(T).T
+    Gq, f = vgq(L)
+    G = -(L.T @ Gq @ np.linalg.inv(T)).T
+    for _ in range(maxit + 1):
+        Gp = G - T @ np.diag((T * G).sum(0))
+        s = np.sqrt(np.trace(Gp.T @ Gp))
+        if s < eps:
+            break
+        al *= 2
+        for _ in range(11):
+            X = T - al * Gp
+            v = 1 / np.sqrt((X ** 2).sum(0))
+            Tt = X * v
+            L = A @ np.linalg.inv(Tt).T
+            Gqt, ft = vgq(L)
+            if f - ft > 0.5 * s ** 2 * al:
+                break
+            al /= 2
+        T = Tt
+        f = ft
+        G = -(L.T @ Gqt @ np.linalg.inv(Tt)).T
+    return L, T.T @ T
+
+
+def _rotate(L: np.ndarray, names: List[str], rotation: str):
+    """Rotate, reorder by variance accounted for and reflect, as psych::fa does."""
+    Phi = None
+    if L.shape[1] > 1:
+        if rotation == "varimax":
+            L, _ = varimax(L)
+        elif rotation == "promax":
+            L, _, Phi = promax(L)
+        elif rotation == "oblimin":
+            L, Phi = oblimin(L)
+        ev = np.diag(L.T @ L) if Phi is None else np.diag(Phi @ L.T @ L)
+        order = np.argsort(-ev, kind="stable")
+        L = L[:, order]
+        names = [names[i] for i in order]
+        if Phi is not None:
+            Phi = Phi[np.ix_(order, order)]
+    signed = np.sign(L.sum(0))
+    signed[signed == 0] = 1
+    L = L * signed
+    if Phi is not None:
+        Phi = Phi * np.outer(signed, signed)
+    return L, names, Phi
+
+
+def fa(R: np.ndarray, nfactors: int, fm: str = "pa", rotation: str = "oblimin") -> Dict[str, Any]:
+    """psych::fa on a correlation matrix: loadings, Phi (None if orthogonal), communalities, uniquenesses."""
+    if fm not in FM_PREFIX:
+        raise ValueError(f"fm must be one of {sorted(FM_PREFIX)}")
+    loadings = _extract(R, nfactors, fm)
+    communality = (loadings ** 2).sum(1)
+    names = [f"{FM_PREFIX[fm]}{i + 1}" for i in range(nfactors)]
+    L, names, Phi = _rotate(loadings, names, rotation)
+    return {
+        "loadings": L,
+        "factors": names,
+        "Phi": Phi,
+        "communality": communality,
+        "uniquenesses": np.diag(R) - communality,
+    }
+
+
+# ---------- parallel analysis ----------
+
+def fa_values(R: np.ndarray) -> np.ndarray:
+    """Eigenvalues of the reduced correlation matrix from a 1-factor minres fit (fa.parallel's "fa" values)."""
+    loadings = _fit_optim(R, 1, "minres")
+    r = R.copy()
+    np.fill_diagonal(r, (loadings ** 2).sum(1))
+    return np.linalg.eigvalsh(r)[::-1]
+
+
+def parallel_analysis(n_obs: int, R: np.ndarray, seed: Optional[int] = None) -> int:
+    """Suggested factor count against the stored null table for (n_obs, p) (analysis/parallel_analysis.py)."""
+    from analysis.parallel_analysis import null_index, suggest_factors  # imports this module
+    table = null_index.get(n_obs, R.shape[0], "fa", seed=seed)
+    return suggest_factors(fa_values(R), table["mean"])
+
+
+# ---------- efa_analysis.R twin ----------
+
+def _numeric_columns(df: pd.DataFrame) -> List[str]:
+    return [c for c in df.columns
+            if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+
+
+def _float_or_none(v: float) -> Optional[float]:
+    return float(v) if np.isfinite(v) else None
+
+
+def _prepare(data: Sequence[Dict[str, Any]]):
+    """Data guards of efa_analysis.R; returns (res, X, R) with X/R None when the guards stop the run."""
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(list(data))
+    numeric_cols = _numeric_columns(df)
+    res: Dict[str, Any] = {"status": "ok", "n_rows": int(len(df)), "n_cols": int(df.shape[1]),
+                           "numeric_columns": numeric_cols}
+
+    if len(numeric_cols) < 2 or len(df) < 3:
+        res.update(status="no_data", message="Need at least 2 numeric columns and 3 rows.")
+        return res, None, None
+
+    X = df[numeric_cols].astype(float)
+    X = X[X.notna().any(axis=1)]
+    if X.empty:
+        res.update(status="no_data", message="All rows are NA across numeric columns.")
+        return res, None, None
+    X = X.loc[:, X.var(skipna=True) > 0]
+    if X.shape[1] < 2:
+        res.update(status="no_data", message="All but one numeric column had zero variance.")
+        return res, None, None
+
+    R = X.corr(method="pearson").to_numpy()
+    if not np.isfinite(R).all():
+        res.update(status="cor_error", message="Correlation matrix could not be computed.")
+        return res, None, None
+    return res, X, R
+
+
+def suggest_n_factors(data: Sequence[Dict[str, Any]], seed: Optional[int] = None) -> Optional[int]:
+    """Parallel-analysis factor count for the rows efa_analysis.R would analyse (None if it would stop)."""
+    _, X, R = _prepare(data)
+    if R is None:
+        return None
+    return parallel_analysis(len(X), R, seed=seed)
+
+
+def run_efa(data: Sequence[Dict[str, Any]], n_factors: Any = "auto", rotation: str = "oblimin",
+            fm: str = "pa", seed: Optional[int] = None) -> Dict[str, Any]:
+    if rotation not in ROTATIONS:
+        rotation = "oblimin"
+    res, X, R = _prepare(data)
+    if R is None:
+        return res
+    eigen_values = np.linalg.eigvalsh(R)[::-1]
+
+    suggested_parallel = None
+    user_specified = None
+    eigen_gt1 = max(1, int((eigen_values > 1).sum()))
+    if str(n_factors) == "auto":
+        try:
+            suggested_parallel = parallel_analysis(len(X), R, seed=seed)
+        except Exception:
+            suggested_parallel = None
+    else:
+        try:
+            user_specified = int(float(n_factors))
+        except (TypeError, ValueError):
+            user_specified = None
+        if user_specified is not None and user_specified < 1:
+            user_specified = None
+
+    k_raw = user_specified if user_specified is not None else (
+        suggested_parallel if suggested_parallel is not None else eigen_gt1)
+    k = max(1, min(k_raw, X.shape[1] - 1))
+
+    try:
+        fit = fa(R, k, fm=fm, rotation=rotation)
+    except Exception:
+        res.update(status="efa_error", message="EFA failed to converge or incompatible arguments.")
+        return res
+
+    items = list(X.columns)
+    L, names, Phi = fit["loadings"], fit["factors"], fit["Phi"]
+    h2 = np.diag(L @ (Phi if Phi is not None else np.eye(k)) @ L.T)
+    if Phi is None:
+        ss = (L ** 2).sum(0)
+    else:
+        ss = np.diag(Phi @ L.T @ L)
+    prop = ss / X.shape[1]
+
+    res["efa"] = {
+        "n_factors_selected": k,
+        "criteria": {"parallel_suggested": suggested_parallel, "eigen_gt1": int((eigen_values > 1).sum()),
+                     "user_specified": user_specified},
+        "eigenvalues": [float(v) for v in eigen_values],
+        "loadings": [{"item": it, "factor": f, "loading": float(L[i, j])}
+                     for i, it in enumerate(items) for j, f in enumerate(names)],
+        "loadings_matrix": [{"item": it, **{f: float(L[i, j]) for j, f in enumerate(names)}}
+                            for i, it in enumerate(items)],
+        "communalities": {it: float(v) for it, v in zip(items, h2)},
+        "uniquenesses": {it: float(v) for it, v in zip(items, fit["uniquenesses"])},
+        "variance": [{"factor": f, "SS_loadings": float(s), "Proportion": float(pv), "Cumulative": float(c)}
+                     for f, s, pv, c in zip(names, ss, prop, np.cumsum(prop))],
+        "factor_correlation": None if Phi is None else [
+            {**{f: _float_or_none(Phi[i, j]) for j, f in enumerate(names)}, "_row": names[i]}
+            for i in range(k)
+        ],
+    }
+    return res
@@ -0,0 +1,76 @@
+"""Deferred imports for the heavy libraries that only some endpoints need.
+
+Contract:
+  - module(name) returns a stand-in that imports the real module on its first attribute access
+    (scipy.stats, pingouin with its matplotlib/seaborn stack, openai, ...), so importing
+    app.main does not pay for them. The import goes through importlib, so it is thread-safe and
+    later plain `import` statements get the same module
+  - Anything evaluated at import time must not touch the stand-in (module-level exception
+    tuples are built by a function instead)
+  - warm(names) imports modules for real, e.g. from the startup warm-up (API/startup.py);
+    describe() reports which deferred modules are loaded and how long each import took
+"""
+
+from __future__ import annotations
+
+import importlib, sys, threading, time
+from typing import Any, Dict, Iterable, Optional
+
+_lock = threading.Lock()
+_registry: Dict[str, "LazyModule"] = {}
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[Any] = None
+        self.seconds: Optional[float] = None
+
+    def load(self) -> Any:
+        if self._module is None:
+            already = self._name in sys.modules
+            started = time.perf_counter()
+            module = importlib.import_module(self._name)
+            if self.seconds is None:
+                self.seconds = 0.0 if already else round(time.perf_counter() - started, 4)
+            self._module = module
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)  # keep copy/pickle/inspect probes from importing
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "deferred"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def module(name: str) -> LazyModule:
+    with _lock:
+        stub = _registry.get(name)
+        if stub is None:
+            stub = _registry[name] = LazyModule(name)
+    return stub
+
+
+def warm(names: Optional[Iterable[str]] = None) -> Dict[str, Optional[float]]:
+    """Import the given (default: all registered) deferred modules; {name: seconds or None on failure}."""
+    out: Dict[str, Optional[float]] = {}
+    for name in list(names if names is not None else _registry):
+        try:
+            module(name).load()
+            out[name] = module(name).seconds
+        except Exception:
+            out[name] = None
+    return out
+
+
+def describe() -> Dict[str, Any]:
+    with _lock:
+        stubs = dict(_registry)
+    return {name: {"loaded": stub.loaded, "import_s": stub.seconds} for name, stub in sorted(stubs.items())}
@@ -0,0 +1,222 @@
+"""Stage timings and process metrics in the Prometheus text format, without extra dependencies.
+
+Contract:
+  - span(stage) times a block. The duration goes into the stage_seconds histogram and into the
+    active timings dict, summed per stage. start_timings() makes a fresh dict active for the
+    current context: a request, or one job run of API/jobs.py (use_timings(job.timings)). Threads started with
+    asyncio.to_thread and tasks created from that context write into the same dict
+  - record_stage(stage, seconds) adds a duration measured elsewhere, e.g. the stage timings the
+    R scripts write into their output ("timings")
+  - Counter / Gauge / Histogram register once under a name; values are kept per label tuple
+  - register_collector(fn) adds a callback that is run at scrape time and returns
+    [(name, type, help, {((label, value), ...): number})], for state other modules already count
+    (queue depth, pool size, LLM retries, ...)
+  - render() returns the text exposition format 0.0.4 for GET /metrics
+
+Configuration (environment):
+  METRICS   0 disables the request middleware and /metrics (default 1); spans still run
+"""
+
+from __future__ import annotations
+
+import contextvars, os, threading, time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+PREFIX = "scale_dev_"
+ENABLED = os.getenv("METRICS", "1").lower() not in ("0", "false", "no")
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+BYTES_BUCKETS = tuple(1024 * 4 ** k for k in range(11))  # 1 KiB .. 1 GiB
+
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+_lock = threading.Lock()
+_metrics: Dict[str, "_Metric"] = {}
+_collectors: List[Callable[[], List[Tuple[str, str, str, Dict[Tuple[str, ...], float]]]]] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, values: Sequence[Any]) -> Tuple[str, ...]:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}")
+        return tuple(str(v) for v in values)
+
+    def lines(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self) -> List[str]:
+        return [f"{self.name}{_label_text(self.labels, k)} {_num(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: Any) -> None:
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, *labels: Any, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def lines(self) -> List[str]:
+        out = []
+        for key, (counts, total, n) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, c in [*zip(self.buckets, counts), (float("inf"), 0)]:
+                cumulative = cumulative + c if bound != float("inf") else n
+                le = 'le="%s"' % _num(bound)
+                out.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_label_text(self.labels, key)} {_num(total)}")
+            out.append(f"{self.name}_count{_label_text(self.labels, key)} {n}")
+        return out
+
+
+def _register(metric: _Metric) -> Any:
+    with _lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            return existing  # module reloaded: keep the values
+        _metrics[metric.name] = metric
+    return metric
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labels, buckets))
+
+
+def register_collector(fn: Callable[[], List[Tuple[str, str, str, Dict[Tuple[str, ...], float]]]]) -> None:
+    _collectors.append(fn)
+
+
+stage_seconds = histogram("stage_seconds", "Duration of instrumented stages (Python spans and R script stages)",
+                          ("stage",))
+
+
+# ---------- timings ----------
+
+def use_timings(timings: Dict[str, float]) -> Dict[str, float]:
+    _timings.set(timings)
+    return timings
+
+
+def start_timings() -> Dict[str, float]:
+    return use_timings({})
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    return _timings.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds, 6)
+
+
+def merge_timings(other: Optional[Dict[str, float]]) -> None:
+    """Add the stages of another timings dict (a finished job) to the active one."""
+    timings = _timings.get()
+    if timings is None or not other or other is timings:
+        return
+    for stage, seconds in other.items():
+        timings[stage] = round(timings.get(stage, 0.0) + seconds, 6)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+# ---------- exposition ----------
+
+def render() -> str:
+    lines: List[str] = []
+    with _lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        with _lock:
+            lines.extend(metric.lines())
+    for collect in list(_collectors):
+        try:
+            families = collect()
+        except Exception:
+            continue  # a failing collector must not break the scrape
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {PREFIX}{name} {help}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for label_pairs, value in samples.items():
+                if value is None:
+                    continue
+                names = [k for k, _ in label_pairs]
+                values = [v for _, v in label_pairs]
+                lines.append(f"{PREFIX}{name}{_label_text(names, values)} {_num(value)}")
+    return "\n".join(lines) + "\n"
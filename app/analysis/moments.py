@@ -0,0 +1,124 @@
+"""Sufficient statistics for CFA: covariance, means and N instead of raw rows.
+
+Contract:
+  - compute_moments(data, columns) makes one chunked pass over row dicts or a DataFrame
+    (MOMENTS_CHUNK_ROWS rows at a time) and returns SampleMoments for the complete cases
+    (listwise deletion, lavaan's default for ML). Chunks are merged with the pairwise update of
+    Chan et al., so memory is O(p^2) whatever the number of rows. None when a column is not numeric
+  - The covariance uses the N-1 divisor; lavaan rescales it to the ML estimate
+    (sample.cov.rescale), so the fit matches a fit on the rows
+  - model_columns(model_syntax, columns) lists the data columns the model refers to
+  - rows_required(model_syntax, options) names the reason raw rows are needed (robust or
+    non-ML estimators, FIML, bootstrap resampling, multi-group fits, formative blocks whose
+    diagnostics use factor scores), or None when the moments suffice
+  - SampleMoments.digest() keys the R result cache; r_transport writes it as input.moments.json
+
+Configuration (environment):
+  MOMENTS_CHUNK_ROWS   rows per chunk (default 50000)
+"""
+
+from __future__ import annotations
+
+import hashlib, json, os, re
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from analysis.config import env_int
+
+MOMENT_ESTIMATORS = ("ML", "GLS", "ULS")
+_IDENT_RE = re.compile(r"[A-Za-z._][A-Za-z0-9._]*")
+_FORMATIVE_RE = re.compile(r"<~|(?<![~=])~(?!~)")
+
+
+CHUNK_ROWS = max(1000, env_int("MOMENTS_CHUNK_ROWS", 50000))
+
+
+class SampleMoments:
+    __slots__ = ("names", "n_obs", "n_rows", "means", "cov", "missing")
+
+    def __init__(self, names: List[str], n_obs: int, n_rows: int, means: np.ndarray, cov: np.ndarray,
+                 missing: Dict[str, float]):
+        self.names = names
+        self.n_obs = n_obs
+        self.n_rows = n_rows
+        self.means = means
+        self.cov = cov
+        self.missing = missing
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"names": self.names, "n_obs": self.n_obs, "n_rows": self.n_rows,
+                "means": self.means.tolist(), "cov": self.cov.tolist(), "missing": self.missing}
+
+    def digest(self) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps([self.names, self.n_obs, self.n_rows]).encode("utf-8"))
+        h.update(np.ascontiguousarray(self.means, dtype="<f8").tobytes())
+        h.update(np.ascontiguousarray(self.cov, dtype="<f8").tobytes())
+        return h.hexdigest()
+
+
+def _clean_syntax(model_syntax: str) -> str:
+    return "\n".join(line.split("#", 1)[0] for line in (model_syntax or "").splitlines())
+
+
+def model_columns(model_syntax: str, columns: Sequence[str]) -> List[str]:
+    tokens = set(_IDENT_RE.findall(_clean_syntax(model_syntax)))
+    return [c for c in columns if c in tokens]
+
+
+def rows_required(model_syntax: str, options: Dict[str, Any]) -> Optional[str]:
+    estimator = str(options.get("estimator") or "ML").upper()
+    if estimator not in MOMENT_ESTIMATORS:
+        return f"estimator {estimator} needs raw rows"
+    if str(options.get("missing") or "listwise").lower() in ("fiml", "ml", "direct"):
+        return "full-information ML needs raw rows"
+    if "bootstrap" in options:
+        return "bootstrap resamples raw rows"
+    if (options.get("compare") or {}).get("group"):
+        return "multi-group fits split the rows by group"
+    if _FORMATIVE_RE.search(_clean_syntax(model_syntax)):
+        return "formative and structural diagnostics use factor scores"
+    return None
+
+
+def _chunks(data: Union[pd.DataFrame, Sequence[Dict[str, Any]]], columns: List[str], chunk_rows: int):
+    n = len(data)
+    for start in range(0, n, chunk_rows):
+        if isinstance(data, pd.DataFrame):
+            part = data.iloc[start:start + chunk_rows][columns]
+        else:
+            part = pd.DataFrame.from_records(data[start:start + chunk_rows], columns=columns)
+        yield part.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def compute_moments(data: Union[pd.DataFrame, Sequence[Dict[str, Any]]], columns: List[str],
+                    chunk_rows: int = CHUNK_ROWS) -> Optional[SampleMoments]:
+    p = len(columns)
+    n = 0
+    rows = 0
+    mean = np.zeros(p)
+    m2 = np.zeros((p, p))
+    missing = np.zeros(p)
+    try:
+        for X in _chunks(data, columns, chunk_rows):
+            rows += len(X)
+            nan = np.isnan(X)
+            missing += nan.sum(axis=0)
+            X = X[~nan.any(axis=1)]
+            nb = len(X)
+            if not nb:
+                continue
+            mb = X.mean(axis=0)
+            D = X - mb
+            delta = mb - mean
+            total = n + nb
+            m2 += D.T @ D + np.outer(delta, delta) * (n * nb / total)
+            mean += delta * (nb / total)
+            n = total
+    except (TypeError, ValueError):
+        return None  # a non-numeric column: the script needs the rows
+    cov = m2 / (n - 1) if n > 1 else np.full((p, p), np.nan)
+    return SampleMoments(list(columns), n, rows, mean, cov,
+                         {c: float(missing[i] / rows) if rows else 0.0 for i, c in enumerate(columns)})
@@ -0,0 +1,372 @@
+"""Null-eigenvalue tables for parallel analysis, simulated once and reused.
+
+Contract:
+  - The null distribution of the eigenvalues depends only on (n rows, p items, method), so it
+    is simulated once per key and stored as quantile vectors (mean, q50, q95, q99)
+  - Methods: "fa" (1-factor minres reduced-matrix eigenvalues, psych::fa.parallel fa="fa"),
+    "smc" (reduced matrix with SMC communalities) and "pc" (plain correlation eigenvalues)
+  - simulate_null() is batched (stacked correlation matrices, batched eigvalsh) and splits the
+    iterations into fixed-size chunks with SeedSequence children, so results depend only on
+    the seed, never on the number of worker processes
+  - Request-time simulation runs in the calling thread by default. Worker processes come from one
+    long-lived pool started with the "spawn" method (never forked from the threaded server), and
+    only one simulation uses it at a time. The warm command builds tables offline with all cores
+  - NullEigenIndex.get() serves a stored table, interpolates between stored sample sizes for
+    the same (p, method, seed) when they are within PA_INTERP_RATIO of each other (linear in
+    1/sqrt(n)), and otherwise interpolates between the two points of a fixed geometric row grid
+    (10 * PA_GRID_STEP**k) around n, simulating and storing those grid tables if needed. Any n
+    therefore reuses a small, fixed set of tables
+  - Datasets are simulated in batches of at most PA_BATCH_MB of doubles, so memory stays flat for
+    large n * p
+  - Tables are JSON files under PA_TABLE_DIR, shared across processes and restarts
+
+Configuration (environment):
+  PA_TABLE_DIR      directory of stored tables (default ~/.cache/scalex/parallel_analysis)
+  PA_N_ITER         simulated datasets per table (default 100)
+  PA_SEED           base seed (default 20240601)
+  PA_WORKERS        processes used when a request has to simulate a table (default 1: in-thread)
+  PA_INTERP_RATIO   max n_hi / n_lo for interpolating between any stored tables (default 1.5)
+  PA_GRID_STEP      ratio between neighbouring grid row counts (default 1.25; 1 simulates every n)
+  PA_BATCH_MB       memory for the simulated data of one batch (default 64)
+
+Warm-up (from the app directory; --workers defaults to the CPU count, --n to the grid points
+from 50 to 2000 rows):
+  python -m analysis.parallel_analysis warm --p 4-40
+"""
+
+from __future__ import annotations
+
+import argparse, json, multiprocessing, os, tempfile, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from analysis.config import env_int, env_num
+
+from analysis.efa import fa_values
+
+METHODS = ("fa", "smc", "pc")
+QUANTILES = (0.5, 0.95, 0.99)
+CHUNK = 25  # iterations per seed child; fixed so results do not depend on the worker count
+GRID_BASE = 10  # smallest grid row count; smaller n are simulated exactly
+BATCH_BYTES = max(1.0, env_num("PA_BATCH_MB", 64)) * 1024 * 1024
+
+
+# ---------- simulation ----------
+
+def _null_correlations(rng: np.random.Generator, size: int, n: int, p: int) -> np.ndarray:
+    Z = rng.standard_normal((size, n, p))
+    Z -= Z.mean(axis=1, keepdims=True)
+    Z /= np.sqrt(np.einsum("snp,snp->sp", Z, Z))[:, None, :]  # no squared copy of Z
+    return np.matmul(Z.transpose(0, 2, 1), Z)
+
+
+def _null_eigenvalues(R: np.ndarray, method: str) -> np.ndarray:
+    if method == "pc":
+        return np.linalg.eigvalsh(R)[:, ::-1]
+    if method == "smc":
+        idx = np.arange(R.shape[1])
+        smc = 1 - 1 / np.linalg.inv(R)[:, idx, idx]
+        R[:, idx, idx] = np.clip(smc, 0, 1)
+        return np.linalg.eigvalsh(R)[:, ::-1]
+    return np.stack([fa_values(r) for r in R])
+
+
+def _simulate_chunk(n: int, p: int, method: str, size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    # Consecutive draws continue one stream, so batching does not change the result
+    rng = np.random.default_rng(seed)
+    batch = int(max(1, min(size, BATCH_BYTES // (8 * n * p))))
+    parts = [_null_eigenvalues(_null_correlations(rng, min(batch, size - start), n, p), method)
+             for start in range(0, size, batch)]
+    return np.concatenate(parts, axis=0)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pool_slot = threading.Semaphore(1)  # one simulation at a time spreads over the pool
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs other threads can copy locks in a held state
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def simulate_null(n: int, p: int, method: str = "fa", n_iter: int = 100, seed: int = 0,
+                  workers: int = 1) -> np.ndarray:
+    """(n_iter, p) array of null eigenvalues, descending within each row."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    sizes = [CHUNK] * (n_iter // CHUNK) + ([n_iter % CHUNK] if n_iter % CHUNK else [])
+    children = np.random.SeedSequence([seed, n, p, METHODS.index(method)]).spawn(len(sizes))
+    jobs = [(n, p, method, size, child) for size, child in zip(sizes, children)]
+    if workers > 1 and len(jobs) > 1:
+        try:
+            with _pool_slot:
+                return np.concatenate(list(_executor(workers).map(_simulate_chunk, *zip(*jobs))), axis=0)
+        except BrokenProcessPool:
+            shutdown_pool()  # a worker died; the next pooled run starts a fresh pool
+    parts = [_simulate_chunk(*job) for job in jobs]
+    return np.concatenate(parts, axis=0)
+
+
+def summarize(sims: np.ndarray) -> Dict[str, List[float]]:
+    out = {"mean": sims.mean(axis=0).tolist()}
+    for q in QUANTILES:
+        out[f"q{int(round(q * 100))}"] = np.quantile(sims, q, axis=0).tolist()
+    return out
+
+
+def grid_bounds(n: int, step: float) -> Tuple[int, int]:
+    """Neighbouring points of the row grid GRID_BASE * step**k around n; (n, n) on a point."""
+    lo, k = GRID_BASE, 0
+    if n <= lo or step <= 1:
+        return n, n
+    while True:
+        k += 1
+        hi = int(GRID_BASE * step ** k + 0.5)
+        if hi <= lo:
+            continue
+        if hi >= n:
+            return (n, n) if hi == n else (lo, hi)
+        lo = hi
+
+
+def grid_points(n_min: int, n_max: int, step: float) -> List[int]:
+    """Grid row counts whose tables cover n_min..n_max."""
+    out = [grid_bounds(n_min, step)[0]]
+    while out[-1] < n_max:
+        out.append(grid_bounds(out[-1] + 1, step)[1])
+    return out
+
+
+def suggest_factors(observed: Iterable[float], reference: Iterable[float]) -> int:
+    """Leading observed eigenvalues above the null reference (psych: which(!(obs > sim))[1] - 1)."""
+    observed = np.asarray(list(observed), dtype=float)
+    below = np.flatnonzero(~(observed > np.asarray(list(reference), dtype=float)))
+    return int(below[0]) if below.size else int(observed.size)
+
+
+# ---------- persistent index ----------
+
+def _blend(n: int, a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Table for n between the tables a (fewer rows) and b; null eigenvalue spread shrinks like 1/sqrt(n)."""
+    lo, hi = a["n"], b["n"]
+    w = (1 / np.sqrt(n) - 1 / np.sqrt(hi)) / (1 / np.sqrt(lo) - 1 / np.sqrt(hi))
+    out = {k: (w * np.asarray(a[k]) + (1 - w) * np.asarray(b[k])).tolist()
+           for k in a if isinstance(a[k], list)}
+    return {**out, "n": n, "p": a["p"], "method": a["method"], "seed": a["seed"],
+            "n_iter": min(a["n_iter"], b["n_iter"]), "interpolated_from": [lo, hi]}
+
+
+class NullEigenIndex:
+    def __init__(self, table_dir: Optional[str], n_iter: int = 100, seed: int = 20240601,
+                 workers: int = 1, interp_ratio: float = 1.5, grid_step: float = 1.25):
+        self.table_dir = table_dir
+        self.n_iter = n_iter
+        self.seed = seed
+        self.workers = workers
+        self.interp_ratio = interp_ratio
+        self.grid_step = grid_step
+        self._tables: Dict[Tuple[str, int, int], Dict[int, Dict[str, Any]]] = {}
+        self._scanned = False
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, int, int, int], threading.Lock] = {}
+        self.stats = {"hits": 0, "interpolated": 0, "simulated": 0}
+
+    def _path(self, method: str, p: int, n: int, seed: int) -> str:
+        return os.path.join(self.table_dir, f"{method}_p{p}_n{n}_s{seed}.json")
+
+    def _scan(self) -> None:
+        """Load every stored table once (they are small: a few vectors of length p)."""
+        if self._scanned:
+            return
+        self._scanned = True
+        if not self.table_dir or not os.path.isdir(self.table_dir):
+            return
+        for name in os.listdir(self.table_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.table_dir, name), "r", encoding="utf-8") as f:
+                    table = json.load(f)
+                self._remember(table)
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def _remember(self, table: Dict[str, Any]) -> None:
+        self._tables.setdefault((table["method"], table["p"], table["seed"]), {})[table["n"]] = table
+
+    def _store(self, table: Dict[str, Any]) -> None:
+        if not self.table_dir:
+            return
+        os.makedirs(self.table_dir, exist_ok=True)
+        path = self._path(table["method"], table["p"], table["n"], table["seed"])
+        fd, tmp = tempfile.mkstemp(dir=self.table_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(table, f)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _interpolate(self, n: int, by_n: Dict[int, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        lower = [m for m in by_n if m < n]
+        upper = [m for m in by_n if m > n]
+        if not lower or not upper:
+            return None
+        lo, hi = max(lower), min(upper)
+        if hi / lo > self.interp_ratio:
+            return None
+        return _blend(n, by_n[lo], by_n[hi])
+
+    def get(self, n: int, p: int, method: str = "fa", seed: Optional[int] = None,
+            interpolate: bool = True) -> Dict[str, Any]:
+        """Null-eigenvalue summary for (n, p, method); grid tables are simulated and stored on first use."""
+        seed = self.seed if seed is None else int(seed)
+        with self._lock:
+            self._scan()
+            by_n = self._tables.get((method, p, seed), {})
+            table = by_n.get(n)
+            if table is None and interpolate:
+                table = self._interpolate(n, by_n)
+                if table is not None:
+                    self.stats["interpolated"] += 1
+                    return table
+            if table is not None:
+                self.stats["hits"] += 1
+                return table
+        lo, hi = grid_bounds(n, self.grid_step) if interpolate else (n, n)
+        if lo == hi:
+            return self._exact(n, p, method, seed)
+        table = _blend(n, self._exact(lo, p, method, seed), self._exact(hi, p, method, seed))
+        self.stats["interpolated"] += 1
+        return table
+
+    def _exact(self, n: int, p: int, method: str, seed: int) -> Dict[str, Any]:
+        with self._lock:
+            table = self._tables.get((method, p, seed), {}).get(n)
+            if table is not None:
+                self.stats["hits"] += 1
+                return table
+            key_lock = self._key_locks.setdefault((method, p, n, seed), threading.Lock())
+        with key_lock:  # concurrent requests for the same key simulate once
+            with self._lock:
+                table = self._tables.get((method, p, seed), {}).get(n)
+            if table is not None:
+                self.stats["hits"] += 1
+                return table
+            return self.build(n, p, method, seed)
+
+    def build(self, n: int, p: int, method: str = "fa", seed: Optional[int] = None) -> Dict[str, Any]:
+        """Simulate (or re-simulate) and store one table."""
+        seed = self.seed if seed is None else int(seed)
+        started = time.perf_counter()
+        sims = simulate_null(n, p, method, self.n_iter, seed, self.workers)
+        table = {"n": n, "p": p, "method": method, "seed": seed, "n_iter": self.n_iter,
+                 "seconds": round(time.perf_counter() - started, 3), **summarize(sims)}
+        with self._lock:
+            self._remember(table)
+            self.stats["simulated"] += 1
+        self._store(table)
+        return table
+
+    def warm(self, ns: Iterable[int], ps: Iterable[int], methods: Iterable[str] = ("fa",),
+             progress=None) -> int:
+        """Make sure a table exists for every (n, p, method); returns how many were simulated."""
+        built = 0
+        for method in methods:
+            for p in ps:
+                for n in ns:
+                    with self._lock:
+                        self._scan()
+                        exists = n in self._tables.get((method, p, self.seed), {})
+                    if not exists:
+                        self.build(n, p, method)
+                        built += 1
+                    if progress:
+                        progress(method, p, n, not exists)
+        return built
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            self._scan()
+            count = sum(len(v) for v in self._tables.values())
+        return {**self.stats, "tables": count, "table_dir": self.table_dir, "n_iter": self.n_iter,
+                "seed": self.seed, "workers": self.workers, "grid_step": self.grid_step}
+
+
+def _build_index() -> NullEigenIndex:
+    default_dir = os.path.join(os.path.expanduser("~"), ".cache", "scalex", "parallel_analysis")
+    return NullEigenIndex(
+        table_dir=os.getenv("PA_TABLE_DIR", default_dir) or None,
+        n_iter=max(1, env_int("PA_N_ITER", 100)),
+        seed=env_int("PA_SEED", 20240601),
+        workers=max(1, env_int("PA_WORKERS", 1)),
+        interp_ratio=env_num("PA_INTERP_RATIO", 1.5),
+        grid_step=env_num("PA_GRID_STEP", 1.25),
+    )
+
+
+null_index = _build_index()
+
+
+# ---------- warm-up command ----------
+
+def _int_list(spec: str) -> List[int]:
+    out: List[int] = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = (int(v) for v in part.split("-"))
+            out.extend(range(lo, hi + 1))
+        elif part.strip():
+            out.append(int(part))
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m analysis.parallel_analysis",
+                                 description="Manage stored null-eigenvalue tables for parallel analysis.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    warm = sub.add_parser("warm", help="simulate tables for common sizes")
+    warm.add_argument("--n", default=None, help="rows, e.g. 100,200 or 100-120 (default: grid points for 50-2000)")
+    warm.add_argument("--p", default="4-40", help="items, e.g. 4-40")
+    warm.add_argument("--methods", default="fa", help="comma list of fa, smc, pc")
+    warm.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="simulation processes")
+    sub.add_parser("info", help="show the table directory and counts")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "info":
+        print(json.dumps(null_index.describe(), indent=2))
+        return 0
+
+    def progress(method, p, n, built):
+        if built:
+            print(f"{method} p={p} n={n} simulated", flush=True)
+
+    null_index.workers = max(1, args.workers)
+    started = time.perf_counter()
+    ns = _int_list(args.n) if args.n else grid_points(50, 2000, null_index.grid_step)
+    built = null_index.warm(ns, _int_list(args.p), args.methods.split(","), progress)
+    print(f"{built} table(s) simulated in {time.perf_counter() - started:.1f}s -> {null_index.table_dir}")
+    shutdown_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
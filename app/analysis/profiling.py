@@ -0,0 +1,263 @@
+"""Opt-in profiles of single requests: cProfile for the Python hot paths, Rprof for R runs.
+
+Contract:
+  - profile_store.create(label) starts a Capture; use(capture) makes it active for the current
+    context (one profiled request). A job submitted from that context keeps it (API/jobs.py),
+    the same way job timings are kept
+  - profile(stage) runs cProfile over a block in the current thread while a capture is active and
+    stores <stage>.pstats (pstats, snakeviz, flameprof) plus <stage>.txt (top functions by
+    cumulative time); without a capture it does nothing
+  - Capture.r_profile(script_path) reserves the Rprof output path for the next R run;
+    r_runner hands it to the pooled worker or to scripts/profile.R. add_rprof(path) then stores
+    <name>.folded next to the raw samples: one "outer;...;inner count" line per distinct stack,
+    the input format of flamegraph.pl and speedscope
+  - Profiled R runs skip the result cache lookup, so the profile always shows a real fit
+  - Captures live in PROFILE_DIR/<id>/ with a meta.json. Creating one deletes the oldest
+    captures beyond PROFILE_MAX_COUNT or PROFILE_MAX_MB in total
+
+Configuration (environment):
+  PROFILING            1 lets requests ask for a profile (default 0: profile_store is None)
+  PROFILING_TOKEN      when set, profiling a request and reading profiles need X-Profile-Token
+  PROFILE_DIR          storage directory (default <tmp>/scale_dev_profiles-<uid>, private to this user)
+  PROFILE_MAX_COUNT    captures kept (default 50)
+  PROFILE_MAX_MB       total size kept (default 200)
+  PROFILE_R_INTERVAL   Rprof sampling interval in seconds (default 0.01)
+"""
+
+from __future__ import annotations
+
+import contextvars, cProfile, hmac, io, json, os, pstats, re, shutil, threading, time, uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from analysis.config import env_flag, env_int, env_num, private_tmp_dir
+
+_capture: contextvars.ContextVar[Optional["Capture"]] = contextvars.ContextVar("profile_capture", default=None)
+_ID = re.compile(r"^[0-9a-f]{32}$")
+_FILE = re.compile(r"^[A-Za-z0-9_.-]+$")
+_RPROF_FRAME = re.compile(r'"([^"]*)"')
+
+
+def fold_rprof(path: str) -> Tuple[Counter, float]:
+    """Collapsed stacks from an Rprof file: ({"outer;...;inner": samples}, interval seconds)."""
+    stacks: Counter = Counter()
+    interval = 0.02
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        header = f.readline()
+        m = re.search(r"sample\.interval=(\d+)", header)
+        if m:
+            interval = int(m.group(1)) / 1e6
+        for line in f:
+            frames = _RPROF_FRAME.findall(line)  # innermost call first
+            if frames:
+                stacks[";".join(reversed(frames))] += 1
+    return stacks, interval
+
+
+class Capture:
+    """One profiled request: a directory of artifacts plus its meta.json."""
+
+    def __init__(self, capture_id: str, directory: str, label: str):
+        self.id = capture_id
+        self.dir = directory
+        self.meta: Dict[str, Any] = {"id": capture_id, "label": label, "created": time.time(), "files": []}
+        self._lock = threading.Lock()
+        self._write_meta()
+
+    def _name(self, stem: str, suffix: str) -> str:
+        stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", stem) or "profile"
+        name, n = f"{stem}{suffix}", 1
+        while os.path.exists(os.path.join(self.dir, name)):
+            n += 1
+            name = f"{stem}-{n}{suffix}"
+        return name
+
+    def _add(self, name: str, kind: str, stage: str, **info: Any) -> None:
+        with self._lock:
+            path = os.path.join(self.dir, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            self.meta["files"].append({"name": name, "kind": kind, "stage": stage, "bytes": size, **info})
+            self._write_meta()
+
+    def _write_meta(self) -> None:
+        tmp = os.path.join(self.dir, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.dir, "meta.json"))
+
+    def update(self, **info: Any) -> None:
+        with self._lock:
+            self.meta.update(info)
+            self._write_meta()
+
+    def add_pstats(self, stage: str, prof: cProfile.Profile, seconds: float) -> None:
+        with self._lock:
+            name = self._name(stage, ".pstats")
+            prof.dump_stats(os.path.join(self.dir, name))
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(40)
+        text = name[:-len(".pstats")] + ".txt"
+        with open(os.path.join(self.dir, text), "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+        self._add(name, "pstats", stage, seconds=round(seconds, 4))
+        self._add(text, "text", stage)
+
+    def r_profile(self, script_path: str) -> str:
+        with self._lock:
+            stem = "r." + os.path.splitext(os.path.basename(script_path))[0]
+            name = self._name(stem, ".Rprof.out")
+            open(os.path.join(self.dir, name), "w").close()  # reserve the name
+        return os.path.join(self.dir, name)
+
+    def add_rprof(self, path: str) -> None:
+        name = os.path.basename(path)
+        stage = name[:-len(".Rprof.out")]
+        try:
+            stacks, interval = fold_rprof(path)
+        except OSError:
+            return
+        folded = stage + ".folded"
+        with open(os.path.join(self.dir, folded), "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        samples = sum(stacks.values())
+        self._add(name, "rprof", stage, samples=samples, interval=interval)
+        self._add(folded, "folded", stage, seconds=round(samples * interval, 4))
+
+
+class ProfileStore:
+    def __init__(self, root: str, max_count: int, max_bytes: int, token: Optional[str], r_interval: float):
+        self.root = root
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.token = token
+        self.r_interval = r_interval
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "deleted": 0}
+        os.makedirs(root, mode=0o700, exist_ok=True)
+
+    def allowed(self, token: Optional[str]) -> bool:
+        if not self.token:
+            return True
+        return hmac.compare_digest((token or "").encode("utf-8"), self.token.encode("utf-8"))
+
+    def create(self, label: str) -> Capture:
+        capture_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, capture_id)
+        os.makedirs(directory)
+        with self._lock:
+            self.stats["created"] += 1
+        self._prune(keep=capture_id)
+        return Capture(capture_id, directory, label)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        out = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not _ID.match(name) or not os.path.isdir(path):
+                continue
+            size = 0
+            for f in os.listdir(path):
+                try:
+                    size += os.path.getsize(os.path.join(path, f))
+                except OSError:
+                    pass
+            out.append((os.path.getmtime(path), size, name))
+        return sorted(out)
+
+    def _prune(self, keep: str) -> None:
+        with self._lock:
+            entries = self._entries()
+            total = sum(e[1] for e in entries)
+            count = len(entries)
+            for _, size, name in entries:  # oldest first
+                if count <= self.max_count and total <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                self.stats["deleted"] += 1
+                count -= 1
+                total -= size
+
+    def get(self, capture_id: str) -> Optional[Dict[str, Any]]:
+        if not _ID.match(capture_id):
+            return None
+        try:
+            with open(os.path.join(self.root, capture_id, "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> List[Dict[str, Any]]:
+        metas = (self.get(name) for _, _, name in reversed(self._entries()))
+        return [m for m in metas if m is not None]
+
+    def file_path(self, capture_id: str, name: str) -> Optional[str]:
+        if not _ID.match(capture_id) or not _FILE.match(name) or name.startswith("."):
+            return None
+        path = os.path.join(self.root, capture_id, name)
+        return path if os.path.isfile(path) else None
+
+    def delete(self, capture_id: str) -> bool:
+        if not _ID.match(capture_id) or not os.path.isdir(os.path.join(self.root, capture_id)):
+            return False
+        shutil.rmtree(os.path.join(self.root, capture_id), ignore_errors=True)
+        with self._lock:
+            self.stats["deleted"] += 1
+        return True
+
+    def describe(self) -> Dict[str, Any]:
+        entries = self._entries()
+        return {
+            **self.stats,
+            "profiles": len(entries),
+            "bytes": sum(e[1] for e in entries),
+            "max_count": self.max_count,
+            "max_bytes": self.max_bytes,
+            "dir": self.root,
+            "token_required": bool(self.token),
+        }
+
+
+# ---------- active capture ----------
+
+def use(capture: Optional[Capture]) -> Optional[Capture]:
+    _capture.set(capture)
+    return capture
+
+
+def current() -> Optional[Capture]:
+    return _capture.get()
+
+
+@contextmanager
+def profile(stage: str) -> Iterator[None]:
+    capture = _capture.get()
+    if capture is None:
+        yield
+        return
+    prof = cProfile.Profile()
+    started = time.perf_counter()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        capture.add_pstats(stage, prof, time.perf_counter() - started)
+
+
+def _build_store() -> Optional[ProfileStore]:
+    if not env_flag("PROFILING"):
+        return None
+    return ProfileStore(
+        root=os.getenv("PROFILE_DIR") or private_tmp_dir("scale_dev_profiles"),
+        max_count=max(1, env_int("PROFILE_MAX_COUNT", 50)),
+        max_bytes=int(env_num("PROFILE_MAX_MB", 200) * 1024 * 1024),
+        token=os.getenv("PROFILING_TOKEN") or None,
+        r_interval=max(0.001, env_num("PROFILE_R_INTERVAL", 0.01)),
+    )
+
+
+profile_store = _build_store()
@@ -0,0 +1,247 @@
+"""Content-addressed cache for R analysis results.
+
+Contract:
+  - make_key(data, script_path, model_syntax, extra_args) hashes the canonicalised data rows
+    (keys sorted, row order kept; frames from the dataset registry by their content digest;
+    sample moments by their own digest),
+    the cleaned model syntax (same cleaning as custom_analysis.R),
+    the script path plus a digest of the script source, and the extra args
+  - Only successful runs (status "ok") are stored; values are kept as serialized JSON bytes
+    (analysis/serialization.py, so a RawJSON output is stored without being parsed).
+    get(key, raw=True) returns those bytes as RawJSON for callers that only forward them
+  - Tier 1: in-process LRU bounded by R_CACHE_MAX_MB (default 64)
+  - Tier 2 (optional): directory R_CACHE_DIR shared across uvicorn workers, bounded by
+    R_CACHE_DISK_MAX_MB (default 512); files are written atomically. Each process keeps a running
+    byte total of the tier and only walks the directory to prune when that total crosses the
+    budget (down to DISK_LOW_WATER of it) or every DISK_RESCAN_PUTS puts, which picks up what
+    other workers wrote
+  - R_CACHE_DISABLED=1 switches the cache off; callers pass use_cache=False to bypass a
+    lookup (the fresh result still refreshes the cache)
+"""
+
+from __future__ import annotations
+
+import hashlib, json, os, tempfile, threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from analysis.config import env_flag, env_num
+from analysis.moments import SampleMoments
+from analysis.r_transport import content_digest
+from analysis.serialization import RawJSON, dumps
+
+DISK_LOW_WATER = 0.9
+DISK_RESCAN_PUTS = 256
+
+
+def clean_model_syntax(model_syntax: Optional[str]) -> str:
+    """Python twin of the cleaning step in custom_analysis.R (comments, blanks, curly quotes)."""
+    if not model_syntax:
+        return ""
+    lines = model_syntax.replace("\r", "").split("\n")
+    lines = [ln.translate(str.maketrans("‘’“”", "''\"\"")) for ln in lines]
+    lines = [ln.split("#", 1)[0].strip() for ln in lines]
+    return "\n".join(ln for ln in lines if ln)
+
+
+_script_digests: Dict[str, Tuple[float, str]] = {}
+
+
+def _script_digest(script_path: str) -> str:
+    try:
+        mtime = os.path.getmtime(script_path)
+    except OSError:
+        return ""
+    cached = _script_digests.get(script_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(script_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _script_digests[script_path] = (mtime, digest)
+    return digest
+
+
+def make_key(data: List[Dict[str, Any]], script_path: str, model_syntax: Optional[str] = None,
+             extra_args: Optional[Sequence[Any]] = None) -> str:
+    h = hashlib.sha256()
+    h.update(b"script\0" + script_path.encode("utf-8") + b"\0" + _script_digest(script_path).encode())
+    h.update(b"\0model\0" + clean_model_syntax(model_syntax).encode("utf-8"))
+    h.update(b"\0args\0" + json.dumps([str(a) for a in (extra_args or [])]).encode("utf-8"))
+    h.update(b"\0data\0")
+    if isinstance(data, SampleMoments):
+        h.update(b"moments\0" + data.digest().encode())
+        return h.hexdigest()
+    if isinstance(data, pd.DataFrame):
+        h.update(b"frame\0" + content_digest(data).encode())
+        return h.hexdigest()
+    for row in data:
+        h.update(json.dumps(row, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+class RResultCache:
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk_bytes: Optional[int] = None  # running total; None until the first scan
+        self._disk_puts = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ---- memory tier ----
+    def _mem_put(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = blob
+            self._mem_bytes += len(blob)
+            while self._mem_bytes > self.max_bytes and self._mem:
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def _mem_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            blob = self._mem.get(key)
+            if blob is not None:
+                self._mem.move_to_end(key)
+            return blob
+
+    # ---- disk tier ----
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)  # LRU order on disk is by mtime
+            return blob
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, blob: bytes) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        if not self.disk_max_bytes:
+            return
+        with self._lock:
+            self._disk_puts += 1
+            rescan = self._disk_bytes is None or self._disk_puts % DISK_RESCAN_PUTS == 0
+            if not rescan:
+                self._disk_bytes += len(blob) - replaced
+                rescan = self._disk_bytes > self.disk_max_bytes
+        if rescan:
+            self._disk_prune()
+
+    def _disk_prune(self) -> None:
+        """Walk the tier, drop the least recently used files beyond the budget, resync the total."""
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    p = os.path.join(root, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, p))
+        total = sum(e[1] for e in entries)
+        target = self.disk_max_bytes * DISK_LOW_WATER if total > self.disk_max_bytes else total
+        for _, size, p in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(p)
+                total -= size
+                self.stats["evictions"] += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    # ---- public API ----
+    def get(self, key: str, count_miss: bool = True, raw: bool = False) -> Any:
+        blob = self._mem_get(key)
+        if blob is not None:
+            self.stats["hits_memory"] += 1
+            return RawJSON(blob) if raw else json.loads(blob)
+        blob = self._disk_get(key)
+        if blob is not None:
+            self.stats["hits_disk"] += 1
+            self._mem_put(key, blob)
+            return RawJSON(blob) if raw else json.loads(blob)
+        if count_miss:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        if result.get("status") != "ok" or "output" not in result:
+            return
+        blob = dumps(result)
+        self.stats["stores"] += 1
+        self._mem_put(key, blob)
+        self._disk_put(key, blob)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+
+    def describe(self) -> Dict[str, Any]:
+        lookups = self.stats["hits_memory"] + self.stats["hits_disk"] + self.stats["misses"]
+        hits = self.stats["hits_memory"] + self.stats["hits_disk"]
+        return {
+            **self.stats,
+            "hit_rate": (hits / lookups) if lookups else None,
+            "entries": len(self._mem),
+            "memory_bytes": self._mem_bytes,
+            "memory_max_bytes": self.max_bytes,
+            "disk_dir": self.disk_dir,
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes if self.disk_dir else None,
+        }
+
+
+def _build_cache() -> Optional[RResultCache]:
+    if env_flag("R_CACHE_DISABLED"):
+        return None
+    return RResultCache(
+        max_bytes=int(env_num("R_CACHE_MAX_MB", 64) * 1024 * 1024),
+        disk_dir=os.getenv("R_CACHE_DIR") or None,
+        disk_max_bytes=int(env_num("R_CACHE_DISK_MAX_MB", 512) * 1024 * 1024),
+    )
+
+
+r_cache = _build_cache()
@@ -0,0 +1,305 @@
+"""Pool of long-lived, pre-warmed Rscript workers.
+
+Contract:
+  - Each worker runs scripts/worker.R, which loads jsonlite/lavaan/psych/semTools once at spawn
+  - A job is one JSON line on the worker's stdin: {"script": <abs path>, "args": [...]}
+  - The worker sources the script unchanged (commandArgs()/quit() are shimmed) and answers
+    with one marker-prefixed JSON line holding the exit status and captured stdout/stderr
+  - run() returns a subprocess.CompletedProcess, so callers handle pool and one-shot runs alike
+  - Workers are recycled after R_POOL_MAX_JOBS jobs or when their RSS exceeds R_POOL_MAX_RSS_MB
+  - run() returns None when no worker is available in time; callers then fall back to the
+    one-shot `Rscript` path in r_runner
+  - register_kill hands the caller a callback that aborts the job by killing its worker
+
+Configuration (environment):
+  R_POOL_SIZE             number of workers (default 2, 0 disables the pool)
+  R_POOL_MAX_JOBS         jobs per worker before it is replaced (default 50)
+  R_POOL_MAX_RSS_MB       resident memory ceiling per worker in MB (default 1024, 0 disables)
+  R_POOL_ACQUIRE_TIMEOUT  seconds to wait for an idle worker before falling back (default 5)
+  R_POOL_STARTUP_TIMEOUT  seconds a new worker may take to load its packages (default 120)
+"""
+
+from __future__ import annotations
+
+import json, os, queue, shutil, subprocess, threading, time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from analysis.config import env_int, env_num
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts", "worker.R")
+MARKER = "@@RWORKER@@ "
+
+
+class RWorkerError(RuntimeError):
+    pass
+
+
+class RJobCancelled(RuntimeError):
+    """The job's worker was killed on purpose (job cancelled by the caller)."""
+
+
+class RWorker:
+    """One Rscript process running worker.R."""
+
+    def __init__(self, rscript_bin: str, startup_timeout: float):
+        self.jobs_done = 0
+        self.cancelled = False
+        self.proc = subprocess.Popen(
+            [rscript_bin, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        # Reader thread keeps the protocol portable (no select() on pipes under Windows)
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+        ready = self._next_message(startup_timeout)
+        if ready.get("event") != "ready":
+            self.kill()
+            raise RWorkerError(f"Unexpected worker handshake: {ready}")
+        self.packages: List[str] = list(ready.get("packages") or [])
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def _read_stdout(self) -> None:
+        try:
+            for line in self.proc.stdout:
+                self._lines.put(line)
+        except Exception:
+            pass
+        self._lines.put(None)  # EOF
+
+    def _next_message(self, timeout: Optional[float]) -> Dict[str, Any]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(WORKER_SCRIPT, timeout)
+            if line is None:
+                raise RWorkerError("R worker exited unexpectedly")
+            if line.startswith(MARKER):
+                return json.loads(line[len(MARKER):])
+            # Anything else on stdout is stray output outside a job; ignore it
+
+    def is_alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def rss_mb(self) -> Optional[float]:
+        """Resident set size of the worker (Linux only; None elsewhere)."""
+        try:
+            with open(f"/proc/{self.pid}/status", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024.0
+        except OSError:
+            return None
+        return None
+
+    def run(self, script_path: str, args: Sequence[str], timeout: Optional[float],
+            profile: Optional[Dict[str, Any]] = None) -> subprocess.CompletedProcess:
+        job = {"script": script_path, "args": list(map(str, args))}
+        if profile is not None:
+            job["profile"] = profile  # {"path": Rprof output, "interval": seconds}
+        job = json.dumps(job, ensure_ascii=False)
+        try:
+            self.proc.stdin.write(job + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise RWorkerError(f"R worker not accepting jobs: {e}")
+        try:
+            msg = self._next_message(timeout)
+        except RWorkerError:
+            if self.cancelled:
+                raise RJobCancelled("R job cancelled")
+            raise
+        except subprocess.TimeoutExpired:
+            # The job is stuck inside R; the only safe way out is to drop the worker
+            self.kill()
+            raise subprocess.TimeoutExpired([script_path, *args], timeout)
+        self.jobs_done += 1
+        return subprocess.CompletedProcess(
+            args=[script_path, *args],
+            returncode=int(msg.get("status", 1)),
+            stdout=msg.get("stdout") or "",
+            stderr=msg.get("stderr") or "",
+        )
+
+    def cancel(self) -> None:
+        """Abort the running job by killing the worker; run() then raises RJobCancelled."""
+        self.cancelled = True
+        self.kill()
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=5)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        try:
+            self.proc.stdin.close()  # worker loop ends on EOF
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.kill()
+
+
+class RWorkerPool:
+    def __init__(self, rscript_bin: str, size: int, max_jobs: int = 50, max_rss_mb: int = 1024,
+                 acquire_timeout: float = 5.0, startup_timeout: float = 120.0):
+        self.rscript_bin = rscript_bin
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.acquire_timeout = acquire_timeout
+        self.startup_timeout = startup_timeout
+        self._idle: "queue.Queue[RWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._spawning = 0
+        self._live = 0
+        self.stats = {"jobs": 0, "fallbacks": 0, "recycled": 0, "spawn_failures": 0}
+
+    # ---- worker lifecycle ----
+    def _spawn(self) -> None:
+        try:
+            worker = RWorker(self.rscript_bin, self.startup_timeout)
+        except Exception:
+            with self._lock:
+                self._spawning -= 1
+                self.stats["spawn_failures"] += 1
+            return
+        with self._lock:
+            self._spawning -= 1
+            self._live += 1
+        self._idle.put(worker)
+
+    def _spawn_async(self) -> None:
+        with self._lock:
+            if self._live + self._spawning >= self.size:
+                return
+            self._spawning += 1
+        threading.Thread(target=self._spawn, daemon=True).start()
+
+    def warm_up(self) -> None:
+        """Start workers up to the configured size without blocking the caller."""
+        for _ in range(self.size):
+            self._spawn_async()
+
+    def _retire(self, worker: RWorker, recycled: bool = True) -> None:
+        worker.close()
+        with self._lock:
+            self._live -= 1
+            if recycled:
+                self.stats["recycled"] += 1
+        self._spawn_async()
+
+    def _needs_recycle(self, worker: RWorker) -> bool:
+        if not worker.is_alive():
+            return True
+        if self.max_jobs and worker.jobs_done >= self.max_jobs:
+            return True
+        if self.max_rss_mb:
+            rss = worker.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                return True
+        return False
+
+    # ---- jobs ----
+    def run(self, script_path: str, args: Sequence[str], timeout: Optional[float] = None,
+            register_kill: Optional[Callable[[Callable[[], None]], None]] = None,
+            profile: Optional[Dict[str, Any]] = None) -> Optional[subprocess.CompletedProcess]:
+        self.warm_up()  # no-op while the pool is full
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            self.stats["fallbacks"] += 1
+            return None
+        if not worker.is_alive():
+            self._retire(worker, recycled=False)
+            self.stats["fallbacks"] += 1
+            return None
+        if register_kill is not None:
+            register_kill(worker.cancel)
+        try:
+            proc = worker.run(script_path, args, timeout, profile)
+        except (subprocess.TimeoutExpired, RJobCancelled):
+            self._retire(worker, recycled=False)
+            raise
+        except Exception:
+            # RWorkerError, or anything unexpected such as a corrupt marker line: the worker's state
+            # is unknown, so retire it and let the one-shot path run the job
+            self._retire(worker, recycled=False)
+            self.stats["fallbacks"] += 1
+            return None
+        self.stats["jobs"] += 1
+        if self._needs_recycle(worker):
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+        return proc
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.close()
+            with self._lock:
+                self._live -= 1
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "live": self._live,
+            "idle": self._idle.qsize(),
+            "spawning": self._spawning,
+            **self.stats,
+        }
+
+
+_pool: Optional[RWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[RWorkerPool]:
+    """Return the process-wide pool, creating it on first use; None when disabled or R is missing."""
+    global _pool
+    if _pool is not None:
+        return _pool
+    size = env_int("R_POOL_SIZE", 2)
+    if size <= 0:
+        return None
+    rscript_bin = shutil.which("Rscript")
+    if rscript_bin is None or not os.path.exists(WORKER_SCRIPT):
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = RWorkerPool(
+                rscript_bin,
+                size=size,
+                max_jobs=env_int("R_POOL_MAX_JOBS", 50),
+                max_rss_mb=env_int("R_POOL_MAX_RSS_MB", 1024),
+                acquire_timeout=env_num("R_POOL_ACQUIRE_TIMEOUT", 5.0),
+                startup_timeout=env_num("R_POOL_STARTUP_TIMEOUT", 120.0),
+            )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,73 @@
+"""One-time check of Rscript and the R packages the analysis scripts attach (scripts/preflight.R).
+
+Contract:
+  - run_preflight() runs preflight.R once and keeps the report in `state`:
+    {"status": "pending" | "running" | "ok" | "missing" | "no_rscript" | "error" | "skipped",
+     "missing": [...], "packages": {pkg: version or None}, "installed": [...], "seconds": ...}
+  - The scripts no longer install packages while serving a request: a missing package fails the
+    run with its name (quiet_pkg). This check names every missing package once, up front
+  - The server runs it in the background at startup, before the R workers spawn (API/startup.py).
+    It only checks by default; the Docker image installs the packages at build time with
+    `Rscript app/analysis/scripts/preflight.R --install`. A development setup can set
+    R_PREFLIGHT_INSTALL=1 to install what is missing at startup
+
+Configuration (environment):
+  R_PREFLIGHT           0 skips the check (default 1)
+  R_PREFLIGHT_INSTALL   1 installs missing packages from CRAN during the check (default 0)
+  R_PREFLIGHT_TIMEOUT   seconds the check (with installs) may take (default 900)
+"""
+
+from __future__ import annotations
+
+import json, os, shutil, subprocess, tempfile, time
+from typing import Any, Dict
+
+from analysis.config import env_flag, env_num
+
+PREFLIGHT_SCRIPT = os.path.join(os.path.dirname(__file__), "scripts", "preflight.R")
+
+
+ENABLED = env_flag("R_PREFLIGHT", True)
+INSTALL = env_flag("R_PREFLIGHT_INSTALL", False)
+TIMEOUT = env_num("R_PREFLIGHT_TIMEOUT", 900)
+
+state: Dict[str, Any] = {"status": "pending" if ENABLED else "skipped", "missing": [], "packages": {}}
+
+
+def run_preflight(install: bool = INSTALL, timeout: float = TIMEOUT) -> Dict[str, Any]:
+    """Blocking; call from a thread. Updates and returns `state`."""
+    rscript_bin = shutil.which("Rscript")
+    if rscript_bin is None:
+        state.update(status="no_rscript", error="Rscript executable not found in PATH; R analyses are unavailable.")
+        print("R preflight: " + state["error"], flush=True)
+        return state
+    state["status"] = "running"
+    started = time.perf_counter()
+    fd, out_path = tempfile.mkstemp(prefix="r_preflight_", suffix=".json")
+    os.close(fd)
+    proc = None
+    try:
+        cmd = [rscript_bin, PREFLIGHT_SCRIPT, *(["--install"] if install else []), out_path]
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        with open(out_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except subprocess.TimeoutExpired:
+        state.update(status="error", error=f"R preflight exceeded {timeout:g}s")
+    except (OSError, ValueError) as e:
+        stderr = proc.stderr.strip()[-2000:] if proc is not None else ""
+        state.update(status="error", error=f"R preflight produced no report: {e}", stderr=stderr)
+    else:
+        missing = list(report.get("missing") or [])
+        state.update(report, missing=missing, status="missing" if missing else "ok")
+        if missing:
+            state["error"] = ("Missing R packages: " + ", ".join(missing) +
+                              ". Install them with: Rscript app/analysis/scripts/preflight.R --install")
+    finally:
+        state["seconds"] = round(time.perf_counter() - started, 3)
+        try:
+            os.unlink(out_path)
+        except OSError:
+            pass
+    if state["status"] != "ok":
+        print("R preflight: " + state.get("error", state["status"]), flush=True)
+    return state
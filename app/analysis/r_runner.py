@@ -5,12 +5,36 @@ Contract:
     - data: list[dict] (rows coming from frontend datatable)
     - script_path: path to an R script (default provided by caller)
   Behavior:
-    - Writes input JSON to a temp file
-    - Invokes: Rscript <script_path> <input_json> <output_json>
+    - Writes the input to a temp file in the best format the script declares
+      (analysis/r_transport.py: typed binary columns, column-major JSON or JSON records)
+    - Invokes: Rscript <script_path> <input_file> <model_txt> <output_json> [extra_args...]
+      on a warm worker from analysis/r_pool.py when the pool is enabled, otherwise (or when
+      no worker is free in time) as a one-shot Rscript process
     - Captures stdout / stderr / returncode
-    - If output JSON created, loads and returns it
+    - If output JSON created, loads and returns it; with raw_output=True the file bytes are
+      returned as analysis.serialization.RawJSON instead, for callers that only pass the output
+      on to a client (the API encodes it into the response without parsing it)
     - Always removes temp files afterwards
 
+run_r_subprocess() blocks the calling thread. run_r_subprocess_async() is the event-loop
+friendly variant used by the job queue: it stages files off-loop, runs one-shot scripts as
+asyncio subprocesses and hands every started process to `register_kill` so the job can be
+cancelled. Scripts that report progress write a JSON object to <output_json>.progress; the
+async runner polls it and passes each new value to `on_progress`.
+
+Successful results are cached by content (analysis/r_cache.py); pass use_cache=False to skip
+the lookup and force a fresh fit.
+
+Timings (analysis/metrics.py): spans "r.stage_input", "r.exec" (process or pool round trip) and
+"r.read_output"; scripts that write a "timings" object to <output_json>.timings (or into a
+parsed output) get each entry recorded as "r.<stage>", and the part of "r.exec" they do not
+account for as "r.overhead" (Rscript startup, package attach before the first timer, output
+writing).
+
+Profiling (analysis/profiling.py): while a profile capture is active the run skips the cache
+lookup and executes under Rprof: pooled workers get the output path with the job, one-shot runs
+go through scripts/profile.R. The samples are added to the capture afterwards.
+
 The R script is expected (eventually) to:
   1. Read args[1] as input JSON
   2. Perform analysis
@@ -21,13 +45,29 @@ This module is resilient to an empty / placeholder R script (no output file).
 
 from __future__ import annotations
 
-import subprocess, tempfile, json, os, uuid, shutil
-from typing import List, Dict, Any, Optional, Sequence
+import asyncio, subprocess, tempfile, json, os, time, uuid, shutil
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
+
+from analysis.r_pool import get_pool, RJobCancelled
+from analysis.r_cache import r_cache, make_key
+from analysis.r_transport import choose_format, write_input
+from analysis import metrics, profiling
+from analysis.serialization import RawJSON
+
+R_TIMEOUT = 300  # 5 min safeguard
+PROGRESS_POLL_INTERVAL = 0.5
+PROFILE_SCRIPT = os.path.join(os.path.dirname(__file__), "scripts", "profile.R")
+
+r_in_flight = metrics.gauge("r_processes_in_flight", "R scripts currently executing (pooled or one-shot)")
+r_input_bytes = metrics.histogram("r_input_bytes", "Size of the input file handed to R", ("format",),
+                                  metrics.BYTES_BUCKETS)
+
 
 class RExecutionError(RuntimeError):
     pass
 
-def run_r_subprocess(data: List[Dict[str, Any]], script_path: str, model_syntax: Optional[str] = None, extra_args: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+
+def resolve_script_path(script_path: str) -> str:
     # Allow override via env var (useful for deployment / testing)
     script_path = os.getenv("R_SCRIPT_PATH", script_path)
     if not os.path.isabs(script_path):
@@ -37,67 +77,294 @@ def run_r_subprocess(data: List[Dict[str, Any]], script_path: str, model_syntax:
 
     if not os.path.exists(script_path):
         raise FileNotFoundError(f"R script not found: {script_path}")
+    return script_path
 
-    # Verify Rscript binary exists
-    rscript_bin = shutil.which("Rscript")
-    if rscript_bin is None:
-        return {
-            "status": "error",
-            "error": "Rscript executable not found in PATH. Install R or adjust PATH.",
-        }
 
+def _rscript_missing() -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "error": "Rscript executable not found in PATH. Install R or adjust PATH.",
+    }
+
+
+def _stage_job(data: List[Dict[str, Any]], script_path: str, model_syntax: Optional[str], extra_args: Optional[Sequence[str]]) -> Tuple[str, List[str], str]:
+    """Write input files into a fresh temp dir; returns (tmp_dir, script_args, out_path)."""
     tmp_dir = tempfile.mkdtemp(prefix="rjob_")
-    in_path = os.path.join(tmp_dir, "input.json")
     model_path = os.path.join(tmp_dir, "model.txt")
     out_path = os.path.join(tmp_dir, "output.json")
 
-    try:
-        with open(in_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False)
-
-        # Write model syntax (can be empty file if not provided) so R script always gets a path
-        with open(model_path, "w", encoding="utf-8") as mf:
-            if model_syntax:
-                mf.write(model_syntax)
-
-        # Updated invocation includes model path before output path
-        cmd = [rscript_bin, script_path, in_path, model_path, out_path]
-        if extra_args:
-            cmd.extend(list(map(str, extra_args)))
-        proc = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 min safeguard
-        )
-
-        result: Dict[str, Any] = {
-            "status": "ok" if proc.returncode == 0 else "r_error",
-            "returncode": proc.returncode,
-            "stdout": proc.stdout.strip(),
-            "stderr": proc.stderr.strip(),
-        }
-
-        if proc.returncode != 0:
-            return result
-
-        if os.path.exists(out_path):
-            try:
+    fmt = choose_format(script_path, data)
+    in_path = write_input(data, tmp_dir, fmt)
+    r_input_bytes.observe(os.path.getsize(in_path), fmt)
+
+    # Write model syntax (can be empty file if not provided) so R script always gets a path
+    with open(model_path, "w", encoding="utf-8") as mf:
+        if model_syntax:
+            mf.write(model_syntax)
+
+    # Updated invocation includes model path before output path
+    script_args = [in_path, model_path, out_path]
+    if extra_args:
+        script_args.extend(list(map(str, extra_args)))
+    return tmp_dir, script_args, out_path
+
+
+def _read_raw_output(path: str) -> RawJSON:
+    with open(path, "rb") as f:
+        data = f.read()
+    # The script exited cleanly, so the file is complete; only guard against an empty or non-object file
+    body = data.strip()
+    if not (body.startswith(b"{") and body.endswith(b"}")):
+        json.loads(data)  # raises with the parser's message
+        raise ValueError("R output is not a JSON object")
+    return RawJSON(body)
+
+
+def _collect_result(returncode: int, stdout: str, stderr: str, out_path: str, raw: bool = False) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        "status": "ok" if returncode == 0 else "r_error",
+        "returncode": returncode,
+        "stdout": stdout.strip(),
+        "stderr": stderr.strip(),
+    }
+
+    if returncode != 0:
+        return result
+
+    if os.path.exists(out_path):
+        try:
+            if raw:
+                result["output"] = _read_raw_output(out_path)
+            else:
                 with open(out_path, "r", encoding="utf-8") as f:
-                    output_json = json.load(f)
-                result["output"] = output_json
-            except Exception as e:
-                result["output_load_error"] = str(e)
-        else:
-            result["note"] = "R script produced no output file (placeholder script?)."
+                    result["output"] = json.load(f)
+        except Exception as e:
+            result["output_load_error"] = str(e)
+    else:
+        result["note"] = "R script produced no output file (placeholder script?)."
+
+    return result
+
+
+def _record_r_timings(result: Dict[str, Any], out_path: str, exec_seconds: float) -> None:
+    stages = _read_json_object(out_path + ".timings")
+    output = result.get("output")
+    if stages is None and isinstance(output, dict):
+        stages = output.get("timings")
+    if not isinstance(stages, dict):
+        return
+    accounted = 0.0
+    for stage, seconds in stages.items():
+        if isinstance(seconds, (int, float)) and seconds >= 0:
+            metrics.record_stage(f"r.{stage}", float(seconds))
+            accounted += float(seconds)
+    metrics.record_stage("r.overhead", max(0.0, exec_seconds - accounted))
+
+
+def _r_profile(capture: Optional[profiling.Capture], script_path: str) -> Optional[Dict[str, Any]]:
+    if capture is None:
+        return None
+    return {"path": capture.r_profile(script_path), "interval": profiling.profile_store.r_interval}
+
+
+def _command(rscript_bin: str, script_path: str, script_args: List[str], profile: Optional[Dict[str, Any]]) -> List[str]:
+    if profile is None:
+        return [rscript_bin, script_path, *script_args]
+    return [rscript_bin, PROFILE_SCRIPT, profile["path"], str(profile["interval"]), script_path, *script_args]
+
+
+def _timeout_result(timeout: float = R_TIMEOUT) -> Dict[str, Any]:
+    return {"status": "timeout", "error": f"R script exceeded {timeout:g}s time limit"}
+
+
+def _read_json_object(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+    except (OSError, ValueError):
+        return None  # not written yet, or caught mid-write
+    return value if isinstance(value, dict) else None
 
+
+async def _watch_progress(path: str, on_progress: Callable[[Dict[str, Any]], None]) -> None:
+    last = None
+    while True:
+        await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+        value = _read_json_object(path)
+        if value is not None and value != last:
+            last = value
+            on_progress(value)
+
+
+def _cache_lookup(key: Optional[str], use_cache: bool, raw: bool = False) -> Any:
+    if key is None:
+        return None
+    if not use_cache:
+        r_cache.stats["bypassed"] += 1
+        return None
+    return r_cache.get(key, raw=raw)
+
+
+def cached_result(data: List[Dict[str, Any]], script_path: str, model_syntax: Optional[str] = None, extra_args: Optional[Sequence[str]] = None, raw_output: bool = False) -> Any:
+    """Peek for a cached result of this exact run (None when absent or caching is off).
+
+    A miss is not counted here; the runner that performs the fit records it. With raw_output=True
+    a hit is the whole stored result as RawJSON.
+    """
+    if r_cache is None:
+        return None
+    return r_cache.get(make_key(data, resolve_script_path(script_path), model_syntax, extra_args), count_miss=False,
+                       raw=raw_output)
+
+
+def run_r_subprocess(data: List[Dict[str, Any]], script_path: str, model_syntax: Optional[str] = None, extra_args: Optional[Sequence[str]] = None, use_cache: bool = True, timeout: Optional[float] = None, raw_output: bool = False) -> Dict[str, Any]:
+    timeout = timeout or R_TIMEOUT
+    script_path = resolve_script_path(script_path)
+    capture = profiling.current()
+    cache_key = make_key(data, script_path, model_syntax, extra_args) if r_cache is not None else None
+    hit = _cache_lookup(cache_key, use_cache and capture is None, raw_output)
+    if hit is not None:
+        return hit
+
+    # Verify Rscript binary exists
+    rscript_bin = shutil.which("Rscript")
+    if rscript_bin is None:
+        return _rscript_missing()
+
+    tmp_dir = None
+    try:
+        with metrics.span("r.stage_input"):
+            tmp_dir, script_args, out_path = _stage_job(data, script_path, model_syntax, extra_args)
+        profile = _r_profile(capture, script_path)
+
+        # Prefer a warm pooled worker (packages already loaded); None means fall back to one-shot
+        started = time.perf_counter()
+        r_in_flight.inc()
+        try:
+            pool = get_pool()
+            proc = pool.run(script_path, script_args, timeout=timeout, profile=profile) if pool is not None else None
+            if proc is None:
+                proc = subprocess.run(
+                    _command(rscript_bin, script_path, script_args, profile),
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout
+                )
+        finally:
+            r_in_flight.dec()
+            exec_seconds = time.perf_counter() - started
+            metrics.record_stage("r.exec", exec_seconds)
+            if profile is not None:
+                capture.add_rprof(profile["path"])
+
+        with metrics.span("r.read_output"):
+            result = _collect_result(proc.returncode, proc.stdout, proc.stderr, out_path, raw_output)
+            _record_r_timings(result, out_path, exec_seconds)
+        if cache_key is not None:
+            r_cache.put(cache_key, result)
         return result
     except subprocess.TimeoutExpired:
-        return {"status": "timeout", "error": "R script exceeded 300s time limit"}
+        return _timeout_result(timeout)
     except Exception as e:
         return {"status": "error", "error": str(e)}
     finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+async def _exec_async(rscript_bin: str, script_path: str, script_args: List[str], timeout: float,
+                      register_kill: Optional[Callable[[Callable[[], None]], None]],
+                      profile: Optional[Dict[str, Any]] = None) -> Tuple[int, str, str]:
+    pool = get_pool()
+    if pool is not None:
+        try:
+            proc = await asyncio.to_thread(pool.run, script_path, script_args, timeout, register_kill, profile)
+        except RJobCancelled:
+            raise asyncio.CancelledError()
+        if proc is not None:
+            return proc.returncode, proc.stdout, proc.stderr
+    child = await asyncio.create_subprocess_exec(
+        *_command(rscript_bin, script_path, script_args, profile),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    if register_kill is not None:
+        register_kill(child.kill)
+    try:
+        out_b, err_b = await asyncio.wait_for(child.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        if child.returncode is None:
+            child.kill()
+        await child.wait()
+        raise
+    return (child.returncode, out_b.decode("utf-8", errors="replace"),
+            err_b.decode("utf-8", errors="replace"))
+
+
+async def run_r_subprocess_async(
+    data: List[Dict[str, Any]],
+    script_path: str,
+    model_syntax: Optional[str] = None,
+    extra_args: Optional[Sequence[str]] = None,
+    register_kill: Optional[Callable[[Callable[[], None]], None]] = None,
+    use_cache: bool = True,
+    timeout: Optional[float] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    raw_output: bool = False,
+) -> Dict[str, Any]:
+    """Same contract as run_r_subprocess, without blocking the event loop.
+
+    Raises asyncio.CancelledError if the job is cancelled; the R process is killed first.
+    """
+    timeout = timeout or R_TIMEOUT
+    script_path = resolve_script_path(script_path)
+    capture = profiling.current()
+    cache_key = None
+    if r_cache is not None:
+        cache_key = await asyncio.to_thread(make_key, data, script_path, model_syntax, extra_args)
+    hit = _cache_lookup(cache_key, use_cache and capture is None, raw_output)
+    if hit is not None:
+        return hit
+
+    rscript_bin = shutil.which("Rscript")
+    if rscript_bin is None:
+        return _rscript_missing()
+
+    tmp_dir = None
+    watcher = None
+    try:
+        with metrics.span("r.stage_input"):
+            tmp_dir, script_args, out_path = await asyncio.to_thread(_stage_job, data, script_path, model_syntax, extra_args)
+        if on_progress is not None:
+            watcher = asyncio.create_task(_watch_progress(out_path + ".progress", on_progress))
+        profile = _r_profile(capture, script_path)
+
+        started = time.perf_counter()
+        r_in_flight.inc()
         try:
+            returncode, stdout, stderr = await _exec_async(rscript_bin, script_path, script_args, timeout,
+                                                           register_kill, profile)
+        finally:
+            r_in_flight.dec()
+            exec_seconds = time.perf_counter() - started
+            metrics.record_stage("r.exec", exec_seconds)
+            if profile is not None:
+                capture.add_rprof(profile["path"])
+
+        with metrics.span("r.read_output"):
+            result = await asyncio.to_thread(_collect_result, returncode, stdout, stderr, out_path, raw_output)
+            await asyncio.to_thread(_record_r_timings, result, out_path, exec_seconds)
+        if cache_key is not None:
+            await asyncio.to_thread(r_cache.put, cache_key, result)
+        return result
+    except (asyncio.TimeoutError, subprocess.TimeoutExpired):
+        return _timeout_result(timeout)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if tmp_dir:
             shutil.rmtree(tmp_dir, ignore_errors=True)
-        except Exception:
-            pass
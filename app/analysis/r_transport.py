@@ -0,0 +1,202 @@
+"""Data hand-off formats between Python and the R scripts.
+
+Contract:
+  - A script declares what it can read in a header comment, in order of preference:
+        # input-formats: rbin, columns, records
+    Scripts without the line (e.g. a custom script override) get "records"
+  - records : input.json, a list of row objects (the original format)
+  - columns : input.columns.json, one JSON array per column (names written once)
+  - rbin    : input.rbin, a little-endian int32 header length, a JSON header
+              {"n_rows", "columns": [{"name", "type": "double"|"logical"|"string", "values"?}]},
+              then one float64 block per double/logical column (NaN = missing); string columns
+              travel in the header
+  - choose_format() takes the first declared format the data can be written in: rbin needs
+    flat columns of numbers, booleans or strings; columns needs flat values; records always works
+  - R_INPUT_FORMAT forces a format when the script declares it (useful for benchmarking)
+  - Data may be row dicts or a DataFrame (e.g. from the dataset registry); categoricals are
+    written as strings and content_digest() hashes a frame for the result cache
+  - moments : input.moments.json, sufficient statistics {"names", "n_obs", "n_rows", "means",
+              "cov", "missing"} (analysis/moments.py) instead of rows; only chosen when the data
+              are SampleMoments, which scripts must declare explicitly
+  - scripts/read_input.R is the matching reader
+"""
+
+from __future__ import annotations
+
+import hashlib, json, os, re, struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.moments import SampleMoments
+
+FORMATS = ("rbin", "columns", "records", "moments")
+FILE_NAMES = {"records": "input.json", "columns": "input.columns.json", "rbin": "input.rbin",
+              "moments": "input.moments.json"}
+
+_HEADER_RE = re.compile(r"^#\s*input-formats:\s*(.+)$", re.IGNORECASE)
+_script_formats: Dict[str, Tuple[float, Tuple[str, ...]]] = {}
+
+
+def script_formats(script_path: str) -> Tuple[str, ...]:
+    """Formats declared by the script header (cached by mtime); ("records",) when undeclared."""
+    try:
+        mtime = os.path.getmtime(script_path)
+    except OSError:
+        return ("records",)
+    cached = _script_formats.get(script_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    declared: Tuple[str, ...] = ("records",)
+    with open(script_path, "r", encoding="utf-8", errors="replace") as f:
+        for _, line in zip(range(40), f):
+            m = _HEADER_RE.match(line.strip())
+            if m:
+                names = tuple(v.strip().lower() for v in m.group(1).split(",") if v.strip().lower() in FORMATS)
+                declared = names or declared
+                break
+    _script_formats[script_path] = (mtime, declared)
+    return declared
+
+
+def _frame(data: Any) -> pd.DataFrame:
+    if not isinstance(data, pd.DataFrame):
+        return pd.DataFrame.from_records(list(data))
+    categorical = [c for c in data.columns if isinstance(data[c].dtype, pd.CategoricalDtype)]
+    return data.astype({c: object for c in categorical}) if categorical else data
+
+
+def content_digest(df: pd.DataFrame) -> str:
+    """Hash of column names, their order and the values (dtype independent for numbers)."""
+    h = hashlib.sha256()
+    h.update(repr(list(map(str, df.columns))).encode("utf-8"))
+    h.update(b"\0%d\0" % len(df))
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            s = s.astype(np.float64)
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(object)
+        h.update(pd.util.hash_pandas_object(s, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _column_type(s: pd.Series) -> Optional[str]:
+    """rbin type of a column, or None if it only fits the JSON formats."""
+    if pd.api.types.is_bool_dtype(s):
+        return "logical"
+    if pd.api.types.is_numeric_dtype(s):
+        return "double"
+    values = s.dropna()
+    if values.empty:
+        return "logical"  # all missing: jsonlite reads an all-null column as logical NA
+    if values.map(lambda v: isinstance(v, str)).all():
+        return "string"
+    if values.map(lambda v: isinstance(v, bool)).all():
+        return "logical"
+    return None
+
+
+def _is_flat(s: pd.Series) -> bool:
+    if s.dtype != object:
+        return True
+    return not s.map(lambda v: isinstance(v, (dict, list, tuple))).any()
+
+
+def _json_values(s: pd.Series) -> List[Any]:
+    if s.dtype == object:
+        return [None if (isinstance(v, float) and v != v) else v for v in s.tolist()]
+    if not pd.api.types.is_float_dtype(s):
+        return s.tolist()
+    arr = s.to_numpy(dtype=float)
+    missing = np.isnan(arr)
+    present = arr[~missing]
+    # Integer columns with gaps arrive as float; write them back as ints so R sees the same
+    # integer vector the records format produced
+    if present.size and np.all(present == np.round(present)) and np.all(np.abs(present) < 2 ** 31):
+        values = np.where(missing, 0, arr).astype(np.int64).tolist()
+    else:
+        values = arr.tolist()
+    for i in np.flatnonzero(missing).tolist():
+        values[i] = None
+    return values
+
+
+def _json_rows(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Row objects with missing values as null (what the browser would have posted)."""
+    columns = {str(c): _json_values(df[c]) for c in df.columns}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())] if columns else []
+
+
+def choose_format(script_path: str, data: Any) -> str:
+    declared = script_formats(script_path)
+    if isinstance(data, SampleMoments):
+        if "moments" not in declared:
+            raise ValueError(f"{os.path.basename(script_path)} does not read sample moments")
+        return "moments"
+    declared = tuple(f for f in declared if f != "moments") or ("records",)
+    forced = os.getenv("R_INPUT_FORMAT", "").strip().lower()
+    candidates = (forced,) if forced in declared else declared
+    if candidates == ("records",):
+        return "records"
+    df = _frame(data)
+    for fmt in candidates:
+        if fmt == "records":
+            return fmt
+        if not all(_is_flat(df[c]) for c in df.columns):
+            continue
+        if fmt == "columns":
+            return fmt
+        if fmt == "rbin" and all(_column_type(df[c]) is not None for c in df.columns):
+            return fmt
+    return "records"
+
+
+def write_records(data: Any, path: str) -> None:
+    rows = _json_rows(_frame(data)) if isinstance(data, pd.DataFrame) else data
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(rows, ensure_ascii=False))  # dumps uses the C encoder, dump does not
+
+
+def write_columns(data: Any, path: str) -> None:
+    df = _frame(data)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({str(c): _json_values(df[c]) for c in df.columns}, ensure_ascii=False))
+
+
+def write_rbin(data: Any, path: str) -> None:
+    df = _frame(data)
+    header: Dict[str, Any] = {"n_rows": int(len(df)), "columns": []}
+    blocks: List[bytes] = []
+    for c in df.columns:
+        s = df[c]
+        kind = _column_type(s)
+        if kind == "string":
+            header["columns"].append({"name": str(c), "type": kind, "values": _json_values(s)})
+            continue
+        if s.dtype == object:  # booleans / all-missing stored as objects
+            s = s.map(lambda v: np.nan if v is None or (isinstance(v, float) and np.isnan(v)) else float(v))
+        header["columns"].append({"name": str(c), "type": kind})
+        blocks.append(np.ascontiguousarray(s.to_numpy(dtype="<f8", na_value=np.nan)).tobytes())
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<i", len(head)))
+        f.write(head)
+        for block in blocks:
+            f.write(block)
+
+
+def write_moments(data: SampleMoments, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data.to_dict(), ensure_ascii=False))
+
+
+WRITERS = {"records": write_records, "columns": write_columns, "rbin": write_rbin, "moments": write_moments}
+
+
+def write_input(data: Any, tmp_dir: str, fmt: str) -> str:
+    """Write data in `fmt` inside tmp_dir; returns the path handed to the script."""
+    path = os.path.join(tmp_dir, FILE_NAMES[fmt])
+    WRITERS[fmt](data, path)
+    return path
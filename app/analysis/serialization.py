@@ -0,0 +1,116 @@
+"""JSON encoding for analysis results without the pandas/jsonable_encoder round trips.
+
+Contract:
+  - dumps(obj) -> bytes: compact UTF-8 JSON. NaN and +/-inf become null, NumPy arrays and
+    scalars encode as their values, datetimes as ISO strings. Uses orjson when it is installed
+    and the standard library otherwise; both produce the same document
+  - RawJSON(data) wraps bytes that are already JSON (an R output file, a cached result). dumps()
+    splices them into the document unchanged, at any depth, so they are never parsed and
+    re-encoded. A RawJSON at the top level is returned as is
+  - frame_records(df) is DataFrame.to_dict("records") with non-finite floats and missing values
+    as None, built column by column instead of two frame-wide replace() passes
+"""
+
+from __future__ import annotations
+
+import datetime, json, math, uuid
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib path is slower but equivalent
+    orjson = None
+
+# Stands in for RawJSON values during encoding; random per process, so no real string matches it
+_RAW_TOKEN = f"__raw_json_{uuid.uuid4().hex}_"
+
+
+class RawJSON:
+    """Bytes that are already a JSON value."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"<RawJSON {len(self.data)} bytes>"
+
+
+def backend() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def _scalar(obj: Any) -> Any:
+    """Types neither encoder knows natively; RawJSON is handled by the caller."""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _clean(obj: Any, default) -> Any:
+    # stdlib path: json.dumps writes NaN/Infinity, so non-finite floats are replaced first
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _clean(v, default) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_clean(v, default) for v in obj]
+    if obj is None or isinstance(obj, (str, int)):
+        return obj
+    return _clean(default(obj), default)
+
+
+def dumps(obj: Any) -> bytes:
+    if isinstance(obj, RawJSON):
+        return obj.data
+    raw: List[bytes] = []
+
+    def default(value: Any) -> Any:
+        if isinstance(value, RawJSON):
+            raw.append(value.data)
+            return f"{_RAW_TOKEN}{len(raw) - 1}"
+        return _scalar(value)
+
+    if orjson is not None:
+        out = orjson.dumps(obj, default=default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    else:
+        out = json.dumps(_clean(obj, default), ensure_ascii=False, allow_nan=False,
+                         separators=(",", ":")).encode("utf-8")
+    for i, data in enumerate(raw):
+        out = out.replace(f'"{_RAW_TOKEN}{i}"'.encode("ascii"), data, 1)
+    return out
+
+
+def frame_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    columns = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype.kind == "f":
+            values = col.to_numpy()
+            out = values.astype(object)
+            out[~np.isfinite(values)] = None
+        else:
+            out = col.to_numpy(dtype=object)
+            out[col.isna().to_numpy()] = None
+        columns.append(out.tolist())
+    if not columns:
+        return [{} for _ in range(len(df))]
+    names = list(df.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
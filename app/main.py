@@ -1,5 +1,8 @@
+import time
+_import_started = time.perf_counter()
+import asyncio
 from fastapi import FastAPI, Request, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 try:
@@ -19,10 +22,47 @@ import pandas as pd
 
 # main code
 from API.router import router as api_router
+from analysis.r_pool import shutdown_pool
+from API.datasets import dataset_store, read_csv_compact
+from API.instrumentation import TimingMiddleware, ProfilingMiddleware
+from analysis import metrics
+from analysis.profiling import profile_store
+from API import startup
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 app.include_router(api_router, prefix="/api")
+if metrics.ENABLED:
+    # Latency / size histograms per route and the opt-in "timings" block (?timings=1)
+    app.add_middleware(TimingMiddleware)
+if profile_store is not None:
+    # Opt-in per request (?profile=1 / X-Profile: 1); artifacts under /api/profiles
+    app.add_middleware(ProfilingMiddleware)
+
+_warm_up_task = None
+
+@app.on_event("startup")
+async def warm_up():
+    # R package check, R workers and heavy imports in the background; GET /ready reports progress
+    global _warm_up_task
+    _warm_up_task = asyncio.create_task(startup.warm_up())
+
+@app.on_event("shutdown")
+async def stop_r_pool():
+    shutdown_pool()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition: request latency and sizes, stage timings, queues, R, caches, LLM."""
+    if not metrics.ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def readiness():
+    """503 until the background warm-up (R preflight, R pool, deferred imports) has finished."""
+    report = startup.describe()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -42,20 +82,18 @@ async def load_step(request: Request, step_id: int):
 
 @app.post("/analyze")
 async def analyze(request: Request, file: UploadFile = File(...)):
-    # Read and process CSV in memory only (no temp files needed)
-    content = await file.read()
     try:
-        df = pd.read_csv(pd.io.common.BytesIO(content))
-        row_count = len(df)
-        col_count = len(df.columns)
-        
-        # Convert DataFrame to Python dict (not JSON string)
-        csv_data = df.to_dict(orient='records')
-        # Return success response with basic info and JSON data
+        # Parse in chunks from the spooled upload; only the compacted frame is held in memory
+        df = await asyncio.to_thread(read_csv_compact, file.file)
+
+        # Register the data server-side; the page only carries the id, and clients page rows
+        # from /api/datasets/{id}/rows
+        dataset = await asyncio.to_thread(dataset_store.put, df, True)
+        # Return success response with basic info and the dataset reference
         return templates.TemplateResponse("partials/step_2.html", {
             "request": request,
             "success": True,
-            "csv_data": csv_data
+            "dataset": dataset
         })
     except Exception as e:
         # Return error response
@@ -66,4 +104,7 @@ async def analyze(request: Request, file: UploadFile = File(...)):
         })
 
 
-# todo MAYBE: Move all OpenAI calls to frontend. Load not on server
\ No newline at end of file
+# todo MAYBE: Move all OpenAI calls to frontend. Load not on server
+
+
+startup.mark_imported(time.perf_counter() - _import_started)
@@ -110,7 +110,9 @@ function makeHxPostRequest(url, data) {
 }
 window.makeHxPostRequest = makeHxPostRequest;
 
-async function sendChat(input, history = [], model=undefined) {
+// options.noCache skips the server's completion cache (retries after a bad reply, "generate new" actions);
+// sampled replies are not cached unless options.cache is true
+async function sendChat(input, history = [], model=undefined, options = {}) {
     // Determine effective model based on user settings if not explicitly passed
     if (!model || model === undefined) {
         try { model = await window.getActiveModel(); } catch(_) {}
@@ -135,7 +137,7 @@ async function sendChat(input, history = [], model=undefined) {
     const resp = await fetch('/api/chat', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ prompt: promptText, keyCipher: cipher, history: history, model: model, search_model: searchModelOverride })
+        body: JSON.stringify({ prompt: promptText, keyCipher: cipher, history: history, model: model, search_model: searchModelOverride, no_cache: !!options.noCache, cache: options.cache })
     });
     if (resp.ok) {
         const { reply, history: updatedHistory } = await resp.json();
@@ -159,7 +161,7 @@ async function sendChat(input, history = [], model=undefined) {
             const newKey = await window.customPrompt({ title: 'Your API key appears invalid or unauthorized. Please re-enter your key.', placeholder: 'sk-...', confirmText: 'Save', cancelText: 'Cancel' });
             // Re-init API key and retry storing cipher
             window.currentAPIKey_enc = await storeAPIKey(newKey, false);
-            return await sendChat(input, history, model); // Retry with new key
+            return await sendChat(input, history, model, options); // Retry with new key
         }
     }
 }
@@ -204,6 +206,68 @@ async function genPersonaPool({generatedPersonas = [], groupDescription, amount
 
 window.genPersonaPool = genPersonaPool;
 
+// Read a fetch() response carrying server-sent events; calls onEvent(eventName, data) per event
+async function readSSE(resp, onEvent) {
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = 'message', data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+window.readSSE = readSSE;
+
+// Streaming variant of genPersonaPool: onPersona(persona) fires as soon as each one is complete.
+// Resolves to the full list; falls back to genPersonaPool when streaming is unavailable.
+async function genPersonaPoolStream({generatedPersonas = [], groupDescription, amount = 20, model, onPersona} = {}) {
+    const cipher = window.currentAPIKey_enc;
+    if (!cipher || !window.ReadableStream) {
+        const batch = await genPersonaPool({ generatedPersonas, groupDescription, amount, model });
+        (batch || []).forEach(p => onPersona && onPersona(p));
+        return batch;
+    }
+    if (!model) {
+        try { model = await window.getActiveModel(); } catch(_) {}
+    }
+    const resp = await fetch('/api/personaGen/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ generatedPersonas, groupDescription, keyCipher: cipher, amount, model })
+    });
+    if (!resp.ok) {
+        // Same error handling (invalid key prompt etc.) as the non-streaming endpoint
+        const batch = await genPersonaPool({ generatedPersonas, groupDescription, amount, model });
+        (batch || []).forEach(p => onPersona && onPersona(p));
+        return batch;
+    }
+    const personas = [];
+    await readSSE(resp, (event, data) => {
+        if (event === 'persona') {
+            personas.push(data.persona);
+            onPersona && onPersona(data.persona);
+        } else if (event === 'done') {
+            console.debug(`Personas: first after ${data.first_result_s}s, all ${data.count} after ${data.total_s}s`);
+        } else if (event === 'error') {
+            console.error('Persona stream error', data.status, data.detail);
+        }
+    });
+    return personas;
+}
+window.genPersonaPoolStream = genPersonaPoolStream;
+
 // ***********************************       Export Data         ***********************************************
 
 
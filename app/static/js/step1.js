@@ -1073,7 +1073,7 @@ Given the construct definition, return:
         }`;
     try {
         showLoading();
-        const response = await window.sendChat(prompt,[{"role": "system", "content": "You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}],"search");
+        const response = await window.sendChat(prompt,[{"role": "system", "content": "You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}],"search", { noCache: tries > 0 });
         
         try{
             const match = response[0].match(/```json\s*({[\s\S]*?})\s*```/);
@@ -1475,7 +1475,7 @@ Return your answer in **strict JSON format**:
 }`;
   try {
     showLoading();
-    const response = await window.sendChat(prompt,[{"role": "system", "content": "You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}],"search");
+    const response = await window.sendChat(prompt,[{"role": "system", "content": "You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}],"search", { noCache: tries > 0 });
     try {
         const match = response[0].match(/```json\s*({[\s\S]*?})\s*```/);
         let responseJson = null;
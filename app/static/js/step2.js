@@ -828,13 +828,13 @@ async function generateItems(indicator, forceNewItems = false, tries = 0) {
                 fakeHistory.unshift(personaList)
             }
             
-            response = await window.sendChat("Generate again 5 - 10 more items", fakeHistory, model);
+            response = await window.sendChat("Generate again 5 - 10 more items", fakeHistory, model, { noCache: tries > 0 });
         }else{ // If no history, use default system prompt
             let messages = [{"role": "system", "content": "You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}]
             if (personaList) {
                 messages.push(personaList)
             }
-            response = await window.sendChat(prompt, messages, model);
+            response = await window.sendChat(prompt, messages, model, { noCache: forceNewItems || tries > 0 });
         }
         AIResponse = window.cleanAIRespond(response[0]); // Get the reply text from the response
     } catch (err) {
@@ -85,6 +85,10 @@ async function ensureAIRaterGenModal() {
                             <textarea class="form-control small" id="aiRaterGroupDesc" rows="3" placeholder="${generalPersonaPrompt}">${generalPersonaPrompt}</textarea>
                         </div>
                         <div class="form-text small text-secondary">Context can shape persona style (e.g., senior clinical psychologists focused on ethics).</div>
+                        <div class="form-check mt-3">
+                            <input class="form-check-input" type="checkbox" id="aiRaterAdaptive" checked />
+                            <label class="form-check-label small" for="aiRaterAdaptive">Adaptive: stop rating items once their keep/revise/delete decision is settled (the number above becomes the maximum)</label>
+                        </div>
                     </div>
                     <div class="modal-footer">
                         <button type="button" class="btn btn-outline-secondary" data-bs-dismiss="modal" id="aiRaterGenCancel">Cancel</button>
@@ -138,13 +142,14 @@ async function showAIRaterGenModal() {
                     const cnt = parseInt(countInput.value, 10);
                     if (!(Number.isInteger(cnt) && cnt >= 1 && cnt <= 30)) return;
                     const desc = (descInput.value || generalPrompt || "").trim();
+                    const adaptive = !!document.getElementById('aiRaterAdaptive')?.checked;
                     // Update persisted value and save immediately
                     persistedGroupDescription = desc || persistedGroupDescription;
                     // Fire and forget persistence
                     saveStep3Data();
                     cleanup();
                     bsModal.hide();
-                        resolve({ count: cnt, groupDescription: desc });
+                        resolve({ count: cnt, groupDescription: desc, adaptive });
                 };
                 cancelBtn.onclick = () => {
                         cleanup();
@@ -537,7 +542,7 @@ function wireRaterUI() {
         // Open modal for count + optional context
         const params = await showAIRaterGenModal();
         if (!params) return; // cancelled
-        const { count, groupDescription } = params;
+        const { count, groupDescription, adaptive } = params;
 
         // Persist current rater before generating
         const currentIdx = raters.findIndex(rr => rr.id === activeRaterId);
@@ -568,7 +573,10 @@ function wireRaterUI() {
             if (count && aiPersonas.length < 1) {
                 await generatePersonas(count, groupDescription || '');
             }
-            for (let i = 1; i <= count; i++) {
+            if (adaptive) {
+                successCount = await runAdaptiveRaterPipeline(count, groupDescription, baseNum);
+            }
+            for (let i = 1; i <= (adaptive ? 0 : count); i++) {
                 if (aiGenAbortRequested) {
                     window.displayInfo && window.displayInfo('info', `Abort acknowledged. Stopping at ${i-1}/${count}.`);
                     break;
@@ -723,6 +731,84 @@ Output schema (JSON only, no extra text, no markdown):
     };
 })();
 
+// Adaptive variant: the server requests raters in concurrent batches, re-runs the adequacy
+// analysis after each batch and stops rating items whose decision has settled
+// (POST /api/analyze-anova/pipeline). Adds the generated raters and renders the final analysis.
+async function runAdaptiveRaterPipeline(maxRaters, groupDescription, baseNum) {
+    const subdimensionNameById = new Map(subdimensions.map(sd => [sd.id, sd.name]));
+    const facets = subdimensions.map(sd => ({ name: sd.name, definition: sd.definition || '' }))
+        .concat((extraColumns || []).map(c => ({ name: c.name, definition: c.description || '' })));
+    const intendedMap = Object.fromEntries(items.map(it => [String(it.id), subdimensionNameById.get(it.subdimensionId) || null]));
+    let model;
+    try { model = await window.getActiveModel(); } catch(_) {}
+    const resp = await fetch('/api/analyze-anova/pipeline', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            items: items.map(it => ({ id: String(it.id), text: it.text })),
+            facets, intendedMap, model,
+            personas: aiPersonas, groupDescription,
+            data: buildAnovaLongDataset().rows, // existing raters count towards the decisions
+            max_raters: maxRaters, first_rater_number: baseNum,
+            keyCipher: window.currentAPIKey_enc
+        })
+    });
+    if (!resp.ok) {
+        const text = await resp.text().catch(() => '');
+        throw new Error(text || `Rater pipeline failed (${resp.status})`);
+    }
+    const { job_id } = await resp.json();
+    const abortTimer = setInterval(() => {
+        if (!aiGenAbortRequested) return;
+        clearInterval(abortTimer);
+        fetch(`/api/analyze-anova/pipeline/${job_id}`, { method: 'DELETE' }).catch(() => {});
+    }, 300);
+    let final = null;
+    try {
+        const events = await fetch(`/api/analyze-anova/pipeline/${job_id}/events`);
+        await window.readSSE(events, (event, data) => {
+            if (event === 'result') { final = data; return; }
+            const p = data.progress || {};
+            if (p.batches) {
+                const settled = Object.keys(p.frozen || {}).length;
+                window.displayInfo && window.displayInfo('info', `Batch ${p.batches}: ${p.raters}/${p.max_raters} raters, ${settled}/${p.items} items settled`);
+            }
+        });
+    } finally {
+        clearInterval(abortTimer);
+    }
+    const result = final && final.result;
+    if (!result) throw new Error((final && final.error) || 'Rater pipeline returned no result');
+    const nameToId = Object.fromEntries(subdimensions.map(sd => [sd.name, sd.id]));
+    for (const r of result.raters || []) {
+        const transformed = {};
+        for (const [itemId, subObj] of Object.entries(r.ratings || {})) {
+            transformed[itemId] = {};
+            for (const [subName, val] of Object.entries(subObj)) transformed[itemId][nameToId[subName] || subName] = val;
+        }
+        raters.push({ id: r.id, name: r.name, ratings: transformed });
+    }
+    if (!activeRaterId && raters.length) {
+        activeRaterId = raters[0].id;
+        ratings = raters[0].ratings || {};
+    }
+    await saveStep3Data();
+    wireRaterUI();
+    renderRatingTable();
+    if (final.status === 'done' && Array.isArray(result.table)) {
+        lastAnovaResults = result.table;
+        renderAnovaResults(result.table);
+        persistAnovaResults(result.table);
+        const exportBtn = document.getElementById('exportAnovaBtn');
+        if (exportBtn) exportBtn.disabled = result.table.length === 0;
+        const saved = Math.round((result.saved_share || 0) * 100);
+        window.displayInfo && window.displayInfo('success', `${Object.keys(result.frozen || {}).length}/${items.length} items settled early; ${saved}% fewer item ratings than rating every item ${maxRaters} times.`);
+    } else if (final.status === 'error') {
+        window.displayInfo && window.displayInfo('danger', `Rater pipeline stopped: ${final.error}`);
+    }
+    return (result.raters || []).length;
+}
+
 function getPersona(id){
     const len = aiPersonas.length;
     const wrapped = ((id % len) + len) % len;
@@ -735,16 +821,17 @@ async function generatePersonas(targetCount,groupDescription){
     let currentPersonas = [];
     try {
         while (iteration < maxIterations && currentPersonas.length < targetCount) {
-            const amount = Math.min(targetCount - currentPersonas.length, 20);
-            const batch = await window.genPersonaPool({ generatedPersonas: currentPersonas, groupDescription, amount });
-            if (Array.isArray(batch) && batch.length){
-                // Merge unique (avoid duplicates just in case)
-                for (const p of batch){
-                    if (currentPersonas.length >= targetCount) break;
-                    if (!currentPersonas.includes(p)) currentPersonas.push(p);
+            // The server shards large requests into concurrent calls, so ask for the whole remainder
+            const amount = Math.min(targetCount - currentPersonas.length, 200);
+            // Personas arrive one by one; merge unique ones as they come (avoid duplicates just in case)
+            await window.genPersonaPoolStream({
+                generatedPersonas: [...currentPersonas], groupDescription, amount,
+                onPersona: (p) => {
+                    if (currentPersonas.length >= targetCount || currentPersonas.includes(p)) return;
+                    currentPersonas.push(p);
+                    displayInfo('info', `Generated ${currentPersonas.length}/${targetCount}`);
                 }
-            }
-            displayInfo('info', `Generated ${currentPersonas.length}/${targetCount}`);
+            });
             iteration++;
         }
         if (currentPersonas.length >= targetCount){
@@ -1494,7 +1494,7 @@ Output format (strict JSON, no markdown or commentary):
     // Send prompt to chat API and retrieve JSON text
     try {
         showLoading();
-		let response = await window.sendChat(prompt,[{"role": "system", "content": "You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}]);
+		let response = await window.sendChat(prompt,[{"role": "system", "content": "You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}], undefined, { noCache: tries > 0 });
         AIResponse = window.cleanAIRespond(response[0]); // Get the reply text from the response
 		
 
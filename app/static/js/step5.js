@@ -433,6 +433,32 @@ let personas = [];
 	// Expose so external render / handlers can persist edits
 	window.saveLikertAnswers = saveLikertAnswers;
 
+	// Server-side simulation job of the current run ({id, baseCount, questionnaireHash}); null once complete
+	async function saveLikertSimJob(job){
+		try {
+			const existing = await window.dataStorage.getData(STORAGE_KEY) || {};
+			const likertSimJob = job ? { ...job, questionnaireHash: computeQuestionnaireHash() } : null;
+			await window.dataStorage.storeData(STORAGE_KEY, { ...existing, likertSimJob }, false);
+		} catch(e){ console.warn('[Step5] Failed to save simulation job', e); }
+	}
+	window.saveLikertSimJob = saveLikertSimJob;
+
+	// Stored job that still has rows to simulate (cancelled, failed, interrupted by a restart, or still running)
+	async function findResumableLikertJob(){
+		try {
+			const existing = await window.dataStorage.getData(STORAGE_KEY) || {};
+			const job = existing.likertSimJob;
+			if (!job || !job.id) return null;
+			if (job.questionnaireHash && job.questionnaireHash !== computeQuestionnaireHash()) { await saveLikertSimJob(null); return null; }
+			const resp = await fetch(`/api/simulate/likert/${encodeURIComponent(job.id)}`);
+			if (!resp.ok) { await saveLikertSimJob(null); return null; }
+			const snap = await resp.json();
+			const progress = snap.progress || {};
+			if (snap.status === 'done' && progress.completed >= progress.total) { await saveLikertSimJob(null); return null; }
+			return { ...job, status: snap.status, completed: progress.completed || 0, total: progress.total || 0 };
+		} catch(e){ console.warn('[Step5] Failed to check simulation job', e); return null; }
+	}
+
 	async function loadLikertAnswers(){
 		try {
 			if (document.getElementById("numLikertRows")) {
@@ -698,11 +724,23 @@ let personas = [];
 			}
 		});
 		likertSimBtn.addEventListener('click', async () => {
+			if (window._likertSimRunning) { return; }
+			// Offer to finish a simulation that stopped early (only its missing rows are requested)
+			let resumeJob = await findResumableLikertJob();
+			if (resumeJob) {
+				const resume = await (window.customConfirm ? window.customConfirm({
+					title: 'Unfinished simulation',
+					message: `A previous simulation ${resumeJob.status === 'running' || resumeJob.status === 'queued' ? 'is still running' : 'stopped'} with ${resumeJob.completed}/${resumeJob.total} rows. Continue it instead of starting a new one?`,
+					confirmText: 'Continue',
+					cancelText: 'Start new'
+				}) : Promise.resolve(confirm('Continue the unfinished simulation?')));
+				if (!resume) { await saveLikertSimJob(null); resumeJob = null; }
+			}
 			// If existing simulated data present, confirm before proceeding
 			try {
 				const existingCount = (window.answersTable && typeof window.answersTable.getData === 'function') ? window.answersTable.getData().length : 0;
 				const appendMode = appendLikertRowsCheckbox && appendLikertRowsCheckbox.checked && !document.getElementById('likertMismatchWarning') && !window.step5QuestionnaireMismatch;
-				if (existingCount > 0 && !window._likertSimRunning && !appendMode) {
+				if (existingCount > 0 && !window._likertSimRunning && !appendMode && !resumeJob) {
 					const proceed = await (window.customConfirm ? window.customConfirm({
 						title: 'Simulated data exists',
 						message: `There are already ${existingCount} simulated response rows. Run another simulation? (New simulation replaces table view but previously stored data will be updated.)`,
@@ -713,7 +751,6 @@ let personas = [];
 				}
 			} catch(e){ console.warn('[Step5] pre-sim confirm failed', e); }
 			// Simulate Likert scale responses
-			if (window._likertSimRunning) { return; }
 			window._likertSimCancelled = false; // reset cancel flag
 			window._likertSimRunning = true;
 			// UI state adjustments
@@ -725,14 +762,24 @@ let personas = [];
 			const codeById = Object.fromEntries((window.step5QuestionnaireItems || []).map(it => [String(it.id), it.code]));
 			const requestedRows = Math.max(1, Math.min(2000, parseInt(numLikertRows?.value,10) || personas.length || 1));
 			const existingCount = (window.answersTable && typeof window.answersTable.getData === 'function') ? window.answersTable.getData().length : 0;
-			const appendMode = appendLikertRowsCheckbox && appendLikertRowsCheckbox.checked && !appendLikertRowsCheckbox.disabled && !document.getElementById('likertMismatchWarning') && !window.step5QuestionnaireMismatch;
+			// A resumed job appends to the rows that existed when it started (baseCount)
+			const appendMode = resumeJob ? resumeJob.baseCount > 0 : (appendLikertRowsCheckbox && appendLikertRowsCheckbox.checked && !appendLikertRowsCheckbox.disabled && !document.getElementById('likertMismatchWarning') && !window.step5QuestionnaireMismatch);
 			const startOffset = appendMode ? (personas.length ? (existingCount % personas.length) : 0) : 0;
 			// Capture existing rows (raw) before simulation for append persistence
 			let existingRawRows = [];
 			if (appendMode && window.answersTable && typeof window.answersTable.getData === 'function') {
 				try { existingRawRows = window.answersTable.getData().map(r=>{ const { _idx, ...rest } = r; return rest; }); } catch(e){ existingRawRows=[]; }
+				if (resumeJob) existingRawRows = existingRawRows.slice(0, resumeJob.baseCount);
+			}
+			const answers = await likertSimulation(minLikertScale.value,maxLikertScale.value, codeById, requestedRows, startOffset, existingRawRows, appendMode, resumeJob && resumeJob.id);
+			if (answers === undefined) {
+				// Nothing started (single-point scale, declined warning, missing key)
+				likertSimBtn.disabled = false;
+				if (likertCancelBtn){ likertCancelBtn.classList.add('d-none'); }
+				window._likertSimRunning = false;
+				restoreLikertCancelButton();
+				return;
 			}
-			const answers = await likertSimulation(minLikertScale.value,maxLikertScale.value, codeById, requestedRows, startOffset, existingRawRows, appendMode);
 			// answers already ID-keyed; convert once more defensively
 			const newData = (answers || []).map(row => { const conv={}; Object.entries(row).forEach(([id,val])=>{ const c=codeById[id]||id; conv[c]=val; }); return conv; });
 			let tableData = newData;
@@ -776,7 +823,7 @@ let personas = [];
 				if (!window._likertSimRunning) return;
 				window._likertSimCancelled = true;
 				likertCancelBtn.disabled = true;
-				window.displayInfo && window.displayInfo('warning','Stopping early after current persona...');
+				window.displayInfo && window.displayInfo('warning','Stopping early; rows already simulated are kept...');
 			});
 		}
 	}
@@ -791,14 +838,16 @@ let personas = [];
 // todo MAYBE Option to load personas from text
 
 
-async function likertSimulation(min=1,max=5, codeMap, requestedRows=0, startOffset=0, existingRowsBefore=[], appendMode=false) {
+// Runs the simulation as a server-side job (POST /api/simulate/likert): rows are requested
+// concurrently, validated on the server and streamed back as "row" events. The job keeps
+// running if the tab closes; resumeJobId continues a stored job with only its missing rows.
+async function likertSimulation(min=1,max=5, codeMap, requestedRows=0, startOffset=0, existingRowsBefore=[], appendMode=false, resumeJobId=null) {
 	if (min == max) { displayInfo("info",`Only one point scale selected: ${min}.`); return }
 	if (min > max) { const tmp = max; max = min; min = tmp; }
 	const generatedPersonas = personas || [];
 	if (!generatedPersonas.length && (!requestedRows || requestedRows < 1)) { displayInfo('warning','No personas available to simulate.'); return []; }
-	const likerRange = max - min + 1;
 	const questionnaire = (window.step5QuestionnaireItems||[]).map(item => ({ id: item.id, text: item.text, responseType: item.responseType||'likert' }));
-	if (questionnaire.length > 100) { 
+	if (questionnaire.length > 100 && !resumeJobId) { 
 		const confirmItemLength = await window.customConfirm({
 			title: 'Warning, a lot of items in questionnaire',
 			message: `You have ${questionnaire.length} items in the questionnaire. 
@@ -808,67 +857,99 @@ async function likertSimulation(min=1,max=5, codeMap, requestedRows=0, startOffs
 		});
 		if (!confirmItemLength) return;	
 	}
-	const randomizedQuestionaire = shuffle(questionnaire);
-	const simulationItems = randomizedQuestionaire.filter(q => q.responseType !== 'open').map(q=>({id:q.id,text:q.text}));
-	const openItems = randomizedQuestionaire.filter(q => q.responseType === 'open').map(q=>({id:q.id,text:q.text}));
-	const totalRows = requestedRows && requestedRows>0 ? requestedRows : generatedPersonas.length;
-	const results = [];
+	const cipher = window.currentAPIKey_enc;
+	if (!cipher) {
+		alert('API key is not set. Please enter your OpenAI API key first.');
+		window.currentAPIKey_enc = await window.initAPIKey();
+		return;
+	}
+	let totalRows = requestedRows && requestedRows>0 ? requestedRows : generatedPersonas.length;
+	const byIndex = new Map(); // row index -> answers keyed by item id
+	const orderedResults = () => Array.from(byIndex.keys()).sort((a,b)=>a-b).map(i => byIndex.get(i));
+	const persistRows = async () => {
+		if (!codeMap) return;
+		const mappedNew = mapResultsToCodes(orderedResults(), codeMap);
+		const toStore = appendMode ? (existingRowsBefore.concat(mappedNew)) : mappedNew;
+		await (window.saveLikertAnswers && window.saveLikertAnswers(toStore));
+	};
+	let jobId = resumeJobId;
+	let cancelTimer = null;
 	try {
 		window.showLoading && window.showLoading();
-		let rowCount=0; let personaIndex=startOffset||0;
-		while (rowCount < totalRows) {
-			const persona = generatedPersonas.length ? generatedPersonas[personaIndex % generatedPersonas.length] : `Participant ${personaIndex+1}`;
-			if (window._likertSimCancelled) {
-				displayInfo('warning', `Cancelled. Generated ${results.length}/${totalRows} so far.`);
-				try {
-					if (codeMap){
-						const mappedNew = mapResultsToCodes(results, codeMap);
-						const toStore = appendMode ? (existingRowsBefore.concat(mappedNew)) : mappedNew;
-						await (window.saveLikertAnswers && window.saveLikertAnswers(toStore));
-					}
-				} catch(e){ console.warn('[Step5] Incremental save (cancel) failed', e); }
-				break;
-			}
-			const messages = [
-				{ role: 'system', content: 'You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers.' },
-				{ role: 'system', content: `This is a persona: ${persona}. From now on, act fully in character.` }
-			];
-			const openItemsPrompt = openItems.length ? `Also, answer these open questions briefly in character: ${JSON.stringify(openItems)}.` : '';
-			const prompt = `Answer each of the following statements: ${JSON.stringify(simulationItems)}.\nUse ONLY a ${likerRange}-point scale: ${min}=Very Inaccurate ... ${max}=Very Accurate.\n${openItemsPrompt}\nReturn JSON ONLY as {"ITEM-ID": answer, ...}`;
-			const allAnswers = await window.sendChat(prompt, messages);
-			const data = cleanAIRespond(allAnswers[0]);
-			results.push(data);
-			try {
-				if (results.length === 1 || results.length % 3 === 0){
-					if (codeMap){
-						const mappedNew = mapResultsToCodes(results, codeMap); // all new rows so far (new only)
-						const toStore = appendMode ? (existingRowsBefore.concat(mappedNew)) : mappedNew;
-						await (window.saveLikertAnswers && window.saveLikertAnswers(toStore));
-					}
+		let resp;
+		if (resumeJobId) {
+			resp = await fetch(`/api/simulate/likert/${encodeURIComponent(resumeJobId)}/resume`, {
+				method: 'POST',
+				headers: { 'Content-Type': 'application/json' },
+				body: JSON.stringify({ keyCipher: cipher })
+			});
+		} else {
+			let model;
+			try { model = await window.getActiveModel(); } catch(_) {}
+			resp = await fetch('/api/simulate/likert', {
+				method: 'POST',
+				headers: { 'Content-Type': 'application/json' },
+				body: JSON.stringify({ items: questionnaire, personas: generatedPersonas, n: totalRows, scale_min: Number(min), scale_max: Number(max), start_offset: startOffset, model, keyCipher: cipher })
+			});
+		}
+		// 409: the job is still running (e.g. started before a reload), so just follow it
+		if (!resp.ok && !(resumeJobId && resp.status === 409)) {
+			let detail;
+			try { detail = (await resp.json()).detail; } catch(_) { detail = resp.statusText; }
+			throw new Error(detail);
+		}
+		if (!resumeJobId) {
+			jobId = (await resp.json()).job_id;
+			await (window.saveLikertSimJob && window.saveLikertSimJob({ id: jobId, baseCount: appendMode ? existingRowsBefore.length : 0 }));
+		}
+		cancelTimer = setInterval(() => {
+			if (!window._likertSimCancelled) return;
+			clearInterval(cancelTimer); cancelTimer = null;
+			fetch(`/api/simulate/likert/${encodeURIComponent(jobId)}`, { method: 'DELETE' }).catch(()=>{});
+		}, 300);
+		let final = null;
+		const events = await fetch(`/api/simulate/likert/${encodeURIComponent(jobId)}/events`);
+		if (!events.ok) throw new Error(events.statusText);
+		await window.readSSE(events, (event, data) => {
+			if (event === 'row') {
+				byIndex.set(data.index, data.answers);
+				const done = byIndex.size;
+				if (done === 1 || done % 3 === 0) {
+					persistRows().catch(e => console.warn('[Step5] Incremental save failed', e));
 				}
-			} catch(e){ console.warn('[Step5] Incremental save failed', e); }
-			if (!window._likertSimCancelled && (results.length === 1 || (results.length % 5 === 0 && results.length < totalRows))) {
-					displayInfo('info', `Simulated ${results.length}/${totalRows} rows...`);
+				if (!window._likertSimCancelled && (done === 1 || (done % 5 === 0 && done < totalRows))) {
+					displayInfo('info', `Simulated ${done}/${totalRows} rows...`);
+				}
+			} else if (event === 'status') {
+				if (data.progress && data.progress.total) totalRows = data.progress.total;
+			} else if (event === 'result') {
+				final = data;
 			}
-			rowCount++; personaIndex++;
-		}
-		if (!window._likertSimCancelled) {
-			displayInfo('success', `Simulated ${results.length} rows.`);
+		});
+		const result = (final && final.result) || {};
+		(result.rows || []).forEach(r => byIndex.set(r.index, r.answers));
+		const failed = (result.failed || []).length;
+		if (result.complete) await (window.saveLikertSimJob && window.saveLikertSimJob(null));
+		if (window._likertSimCancelled || (final && final.status === 'cancelled')) {
+			displayInfo('warning', `Cancelled. Generated ${byIndex.size}/${totalRows} so far.`);
+		} else if (final && final.status === 'error') {
+			displayInfo('danger', `Simulation stopped after ${byIndex.size}/${totalRows} rows: ${final.error}. Run it again to continue.`);
+		} else if (failed) {
+			displayInfo('warning', `Simulated ${byIndex.size} rows; ${failed} replies stayed invalid. Run it again to retry them.`);
+		} else {
+			displayInfo('success', `Simulated ${byIndex.size} rows.`);
 		}
 	} catch(err) {
 		console.error('Generate AI responses error', err);
 		window.displayInfo && window.displayInfo('danger', 'Could not generate AI responses.');
 	} finally {
+		if (cancelTimer) clearInterval(cancelTimer);
 		window.hideLoading && window.hideLoading();
 		try {
-			if (codeMap){
-				const mappedNew = mapResultsToCodes(results, codeMap);
-				const toStore = appendMode ? (existingRowsBefore.concat(mappedNew)) : mappedNew;
-				await (window.saveLikertAnswers && window.saveLikertAnswers(toStore));
-			}
+			await persistRows();
 		} catch(e){ console.warn('[Step5] Final save failed', e); }
 	}
-	return results;
+	return orderedResults();
 }
 
 function mapResultsToCodes(resultRows, codeMap){
@@ -218,6 +218,7 @@ let rawData = []; // current working data (may be reversed)
   cfaStatusEl = id('cfaStatus');
   cfaResultsEl = id('cfaResults');
   analyzeBtn && analyzeBtn.addEventListener('click', runCFAAnalysis);
+  id('btnRunPurify')?.addEventListener('click', runPurificationScan);
 
   // EFA elements
   const efaBtn = id('btnRunEFA');
@@ -273,7 +274,7 @@ Output format (strict JSON):
     btn && (btn.disabled = true);
     try {
       window.showLoading()
-      const resp = await window.sendChat(prompt,[{"role":"system","content":"You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}]);
+      const resp = await window.sendChat(prompt,[{"role":"system","content":"You are a JSON-only output assistant. Return only valid JSON in your response. No markdown, no commentary, no wrappers."}], undefined, { noCache: retry > 0 });
       card && card.classList.remove('d-none');
       let raw = window.cleanAIRespond ? window.cleanAIRespond(resp[0]) : (resp[0]?.content || resp[0] || '');
       let parsed = null;
@@ -807,6 +808,41 @@ Output format (strict JSON):
     } catch(e){ return 'na'; }
   }
 
+  // Server-side dataset registry: the rows are posted once per distinct table and the
+  // analyses refer to them by id (a 404 means the server expired it, so register again)
+  let datasetRef = { key: null, id: null };
+  async function ensureDataset(rows, refresh){
+    const json = JSON.stringify(rows||[]);
+    let h=0; for (let i=0;i<json.length;i++){ h = (h*31 + json.charCodeAt(i)) >>> 0; }
+    const key = `${(rows||[]).length}:${json.length}:${h.toString(16)}`;
+    if (!refresh && datasetRef.key === key && datasetRef.id) return datasetRef.id;
+    const res = await fetch('/api/datasets', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: `{"data":${json}}`
+    });
+    const info = await res.json().catch(()=>({}));
+    if (!res.ok || !info.dataset_id) throw new Error(info.detail || `Dataset upload failed (HTTP ${res.status})`);
+    datasetRef = { key, id: info.dataset_id };
+    return info.dataset_id;
+  }
+
+  async function postWithDataset(url, rows, payload){
+    for (let attempt=0; attempt<2; attempt++){
+      const dataset_id = await ensureDataset(rows, attempt>0);
+      const res = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...payload, dataset_id })
+      });
+      if (res.status === 404 && attempt === 0){
+        const json = await res.clone().json().catch(()=>({}));
+        if (json.detail === 'dataset_not_found') continue;
+      }
+      return res;
+    }
+  }
+
   function updateOutdatedNotices(){
     // --- EFA Outdated Notice ---
     const efaOut = id('efaResults');
@@ -908,6 +944,7 @@ Output format (strict JSON):
   const activeModel = (lavaanActiveView==='edited' ? lavaanEdited : lavaanOriginalSnapshot) || '';
   const modelText = activeModel.trim();
     analyzeBtn.disabled = !(hasData && modelText);
+    id('btnRunPurify') && (id('btnRunPurify').disabled = analyzeBtn.disabled);
     if (cfaStatusEl){
       if (analyzeBtn.disabled){
         cfaStatusEl.textContent = hasData ? 'Provide model syntax.' : 'Load data first.';
@@ -930,15 +967,16 @@ Output format (strict JSON):
     if (cfaResultsEl) cfaResultsEl.innerHTML = '<span class="text-muted">Submitting to backend…</span>';
     try {
       // Use current view (rawData) so user sees exactly what is analyzed
-      const payload = { data: rawData, model: modelText };
-      const res = await fetch('/api/r/run', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(payload)
-      });
-      const json = await res.json().catch(()=>({ status:'client_parse_error'}));
-      if (!res.ok){
-        throw new Error(json.detail || `HTTP ${res.status}`);
+      const bootstrap = bootstrapRequest();
+      let json;
+      if (bootstrap){
+        json = await runCFABootstrapJob(modelText, bootstrap);
+      } else {
+        const res = await postWithDataset('/api/r/run', rawData, { model: modelText });
+        json = await res.json().catch(()=>({ status:'client_parse_error'}));
+        if (!res.ok){
+          throw new Error(json.detail || `HTTP ${res.status}`);
+        }
       }
       renderCFAResults(json);
       try {
@@ -960,13 +998,110 @@ Output format (strict JSON):
 
 
 
+  function bootstrapRequest(){
+    if (!id('cfaBootstrap')?.checked) return null;
+    const n = parseInt(id('cfaBootstrapN')?.value, 10) || 1000;
+    const seedTxt = (id('cfaBootstrapSeed')?.value || '').trim();
+    return seedTxt === '' ? { n } : { n, seed: parseInt(seedTxt, 10) };
+  }
+
+  // Long R runs (bootstrap, purification): submit as an R job and show its progress in statusEl
+  async function runRJobWithProgress(payload, statusEl){
+    const res = await postWithDataset('/api/r/jobs', rawData, payload);
+    const submitted = await res.json().catch(()=>({}));
+    if (!res.ok) throw new Error(submitted.detail || `HTTP ${res.status}`);
+    let final = null;
+    const events = await fetch(`/api/r/jobs/${submitted.job_id}/events`);
+    await window.readSSE(events, (event, data)=>{
+      if (event === 'result'){ final = data; return; }
+      const p = data.progress || {};
+      if (!statusEl) return;
+      if (p.total){
+        const stage = p.stage === 'jackknife' ? 'Jackknife' : p.stage === 'purify' ? `Scan ${p.step}` : 'Bootstrap';
+        statusEl.textContent = `${stage}: ${p.done}/${p.total} fits (${formatNum(p.elapsed_s)} s)…`;
+      } else if (data.status === 'running'){
+        statusEl.textContent = 'Fitting model…';
+      }
+    });
+    if (!final || final.status !== 'done') throw new Error((final && final.error) || 'R job did not finish');
+    return final.result;
+  }
+
+  async function runCFABootstrapJob(modelText, bootstrap){
+    return runRJobWithProgress({ model: modelText, bootstrap }, cfaStatusEl);
+  }
+
+  async function runPurificationScan(){
+    const btn = id('btnRunPurify');
+    const statusEl = id('purifyStatus');
+    const outEl = id('purifyResults');
+    const activeModel = (lavaanActiveView==='edited' ? lavaanEdited : lavaanOriginalSnapshot) || '';
+    const modelText = activeModel.trim();
+    if (!btn || btn.disabled || !modelText) return;
+    const maxSteps = Math.max(0, parseInt(id('purifyMaxSteps')?.value, 10) || 0);
+    btn.disabled = true;
+    statusEl && (statusEl.textContent = 'Submitting…');
+    try {
+      const result = await runRJobWithProgress({ kind: 'purify', model: modelText, max_steps: maxSteps }, statusEl);
+      const out = result.output || {};
+      if (out.error || !out.purification) throw new Error(out.error || result.stderr || result.error || 'No purification result');
+      renderPurification(out.purification, out.fit_measures || {});
+      statusEl && (statusEl.textContent = `Done (${formatNum(out.purification.elapsed_s)} s)`);
+    } catch(err){
+      outEl && (outEl.innerHTML = `<span class="text-danger">Error: ${escapeHtml(err.message||err)}</span>`);
+      statusEl && (statusEl.textContent = 'Error');
+    } finally {
+      btn.disabled = false;
+    }
+  }
+
+  function renderPurification(pur, baseFit){
+    const outEl = id('purifyResults');
+    if (!outEl) return;
+    const f = v => (v==null || !isFinite(v)) ? '<span class="text-muted">NA</span>' : formatNum(v);
+    const signed = (v, betterUp) => {
+      if (v==null || !isFinite(v)) return '<span class="text-muted">NA</span>';
+      const good = betterUp ? v > 0 : v < 0;
+      return `<span class="${good ? 'text-success' : 'text-danger'}">${v>0?'+':''}${formatNum(v)}</span>`;
+    };
+    const rows = pur.candidates || [];
+    let html = `<div class="small text-muted mb-1">Full model: CFI ${f(baseFit.cfi)}, RMSEA ${f(baseFit.rmsea)}, SRMR ${f(baseFit.srmr)} · ranked by Δ${escapeHtml(String(pur.rank_by).toUpperCase())} · constructs keep ≥ ${pur.min_indicators} indicators</div>`;
+    if (!rows.length){
+      html += '<div class="text-muted small">No candidates: every construct is at the minimum number of indicators.</div>';
+    } else {
+      html += '<div class="table-responsive"><table class="table table-sm table-bordered align-middle mb-2"><thead><tr>'
+        + ['#','Item','Construct','λ','Δχ²','ΔCFI','ΔRMSEA','ΔSRMR','ΔCR','ΔAVE'].map(h=> `<th class="text-nowrap">${h}</th>`).join('')
+        + '</tr></thead><tbody>'
+        + rows.map(r=> r.error ? `<tr><td>${r.rank}</td><td>${escapeHtml(r.item)}</td><td>${escapeHtml(r.factor)}</td><td>${f(r.loading)}</td><td colspan="6" class="text-warning">${escapeHtml(r.error)}</td></tr>`
+          : `<tr><td>${r.rank}</td><td>${escapeHtml(r.item)}</td><td>${escapeHtml(r.factor)}</td><td>${f(r.loading)}</td><td>${signed(r.delta_chisq,false)}</td><td>${signed(r.delta_cfi,true)}</td><td>${signed(r.delta_rmsea,false)}</td><td>${signed(r.delta_srmr,false)}</td><td>${signed(r.delta_CR,true)}</td><td>${signed(r.delta_AVE,true)}</td></tr>`).join('')
+        + '</tbody></table></div>';
+    }
+    if (pur.greedy){
+      const steps = pur.steps || [];
+      html += `<div class="fw-bold small mt-2">Greedy removal (${steps.length} step(s), stopped: ${escapeHtml(pur.stop_reason)})</div>`;
+      if (steps.length){
+        html += '<ol class="small mb-2">' + steps.map(s=> `<li>Drop <code>${escapeHtml(s.dropped)}</code> (${escapeHtml(s.factor)}) → CFI ${f(s.fit.cfi)}, RMSEA ${f(s.fit.rmsea)}, SRMR ${f(s.fit.srmr)}</li>`).join('') + '</ol>';
+      }
+      if (pur.final_model){
+        html += '<button id="btnUsePurifiedModel" class="btn btn-sm btn-outline-primary">Use purified model as edited syntax</button>';
+      }
+    }
+    outEl.innerHTML = html;
+    id('btnUsePurifiedModel')?.addEventListener('click', ()=>{
+      lavaanEdited = pur.final_model;
+      applyLavaanView('edited');
+      persistState();
+    });
+  }
+
   async function runEFA(){
     const btn = id('btnRunEFA');
     const statusEl = id('efaStatus');
     const outEl = id('efaResults');
     if (!btn || btn.disabled) return;
     if (!Array.isArray(rawData) || !rawData.length){ return; }
-    let inputData = [...rawData]; // shallow copy to avoid mutation
+    // Column selection is applied server-side on the registered dataset
+    let inputColumns = Object.keys(rawData[0]||{});
 
     const onlyIncludeRef = id("checkOnlyIncludeRef");
 
@@ -975,46 +1110,24 @@ Output format (strict JSON):
       const reflectiveItems = step4.indicators.filter(i=>i.direction=="out").map(i=>i.itemId)
       const refWithoutGlobals = reflectiveItems.map(i=>step4.itemCustomIds[i]).filter(i=>i!=undefined) 
 
-      let colToDel = []
-      if(inputData.length>0){
-        colToDel = Object.keys(inputData[0]).filter(col => !refWithoutGlobals.includes(col))
-      }
-
+      const colToDel = inputColumns.filter(col => !refWithoutGlobals.includes(col))
       console.log("columns removed, because not reflective:", colToDel);
-
-      const delFrom = (arr,col) => {
-        if (!Array.isArray(arr)) return;
-        for (const row of arr){
-          if (row && Object.prototype.hasOwnProperty.call(row,col)){
-            delete row[col];
-          }
-        }
-      };
-
-      if(colToDel.length>0){
-        colToDel.forEach(col => {
-          delFrom(inputData,col);
-        });
-      }
-
+      inputColumns = inputColumns.filter(col => refWithoutGlobals.includes(col))
     }
 
     const nFactorsVal = (id('efaNFactors')?.value || 'auto').trim() || 'auto';
     const rotation = (id('efaRotation')?.value || 'oblimin');
+    const engine = (id('efaEngine')?.value || 'r');
     btn.disabled = true;
     statusEl && (statusEl.textContent = 'Running…');
     outEl && (outEl.innerHTML = '<span class="text-muted">Submitting...</span>');
     try {
-      const res = await fetch('/api/r/efa', {
-        method:'POST',
-        headers:{'Content-Type':'application/json'},
-        body: JSON.stringify({ data: inputData, n_factors: nFactorsVal, rotation })
-      });
+      const res = await postWithDataset('/api/r/efa', rawData, { columns: inputColumns, n_factors: nFactorsVal, rotation, engine });
       const json = await res.json().catch(()=>({status:'client_parse_error'}));
       if (!res.ok){ throw new Error(json.detail || ('HTTP '+res.status)); }
       renderEFAResults(json);
       try {
-        const dataSig = computeDataSignature(rawData, Object.keys(inputData[0]||{}));
+        const dataSig = computeDataSignature(rawData, inputColumns);
         json._meta = { dataSig, nFactorsValUsed: nFactorsVal, rotationUsed: rotation, storedAt: Date.now() };
       } catch(e){ /* ignore */ }
       lastEFAResult = json;
@@ -1508,6 +1621,25 @@ Output format (strict JSON):
         } catch(err){ section2 += `<div class='text-warning small'>HTMT parse error: ${escapeHtml(err.message||err)}</div>`; }
       }
     }
+    // Bootstrap intervals (optional run mode)
+    const boot = step6.bootstrap;
+    if (boot && boot.error){
+      section2 += `<div class="text-warning small mt-2">Bootstrap skipped: ${escapeHtml(boot.error)}</div>`;
+    } else if (boot && Array.isArray(boot.intervals) && boot.intervals.length){
+      const pct = Math.round((boot.level || 0.95) * 100);
+      section2 += `<div class="fw-bold mt-2">Bootstrap ${pct}% Intervals (${escapeHtml(boot.ci === 'percentile' ? 'percentile' : 'BCa')})</div>`;
+      section2 += `<div class="small text-muted mb-1">${boot.converged}/${boot.resamples} resamples converged · seed ${boot.seed} · ${boot.cores} core(s) · ${formatNum(boot.elapsed_s)} s</div>`;
+      const statLabel = { CR:'CR', AVE:'AVE', HTMT:'HTMT', FL_r:'Latent r', FL_margin:'FL margin (min √AVE − |r|)' };
+      const verdictBadge = v => v==='pass'? badge('Pass','bg-success') : v==='fail'? badge('Fail','bg-danger') : v==='uncertain'? badge('Uncertain','bg-warning text-dark') : '';
+      section2 += table([
+        { key:'statistic', label:'Statistic', tooltip:'Validity statistic', render:r=> escapeHtml(statLabel[r.statistic] || r.statistic) },
+        { key:'construct', label:'Construct(s)', tooltip:'Construct or construct pair', render:r=> escapeHtml(r.construct_b ? `${r.construct}–${r.construct_b}` : r.construct) },
+        { key:'estimate', label:'Estimate', tooltip:'Point estimate from the original fit', render:r=> fmt(r.estimate) },
+        { key:'lower', label:'CI', tooltip:'Bootstrap confidence interval', render:r=> (r.lower==null||r.upper==null)? '' : `[${fmt(r.lower)}, ${fmt(r.upper)}]` },
+        { key:'se', label:'SE', tooltip:'Bootstrap standard error', render:r=> fmt(r.se) },
+        { key:'verdict', label:'Verdict', tooltip:'Pass/Fail when the whole interval is on one side of the threshold (CR .70, AVE .50, HTMT .85, FL margin 0)', render:r=> r.threshold==null? '' : `${verdictBadge(r.verdict)} <span class="text-muted small">vs ${fmt(r.threshold)}</span>` }
+      ], boot.intervals);
+    }
     if (formBlocks.length){
   section2 += '<div class="fw-bold mt-2">Formative Blocks (Collinearity & Variance)</div>';
       section2 += table([
@@ -1657,6 +1789,12 @@ Output format (strict JSON):
     const revisionRows = [];
     // Helper to push unique keys
     const pushRev = (key, row) => { if (!row || !key) return; revisionRows.push(row); };
+    // Bootstrap interval for a statistic/pair, appended to the issue text when available
+    const bootIntervals = (step6.bootstrap && Array.isArray(step6.bootstrap.intervals)) ? step6.bootstrap.intervals : [];
+    const bootCI = (stat, a, b) => {
+      const r = bootIntervals.find(x=> x.statistic===stat && ((x.construct===a && x.construct_b===b) || (x.construct===b && x.construct_b===a)));
+      return (r && r.lower!=null && r.upper!=null) ? `; CI [${fmt(r.lower)}, ${fmt(r.upper)}] ${r.verdict||''}` : '';
+    };
     const fmtP = v => (v==null||v==='')? 'NA' : Number(v).toFixed(3);
     // Reflective weak items
     (reflItems||[]).forEach(r=>{
@@ -1734,13 +1872,13 @@ Output format (strict JSON):
             if (!isFinite(r_ab)) continue; const sa=diagMap[a]; const sb=diagMap[b];
             if (isFinite(sa)&&isFinite(sb)){
               const pass = (sa > Math.abs(r_ab)) && (sb > Math.abs(r_ab));
-              if (!pass){ pushRev('FLPAIR:'+a+'-'+b, { type:'Discriminant (FL)', factor: a+'–'+b, target:'Pair', issues:`|r|=${fmt(Math.abs(r_ab))} ≥ sqrtAVE for one/both`, suggestion:'Refine items to sharpen conceptual boundaries; consider merging constructs only if theory supports.' }); }
+              if (!pass){ pushRev('FLPAIR:'+a+'-'+b, { type:'Discriminant (FL)', factor: a+'–'+b, target:'Pair', issues:`|r|=${fmt(Math.abs(r_ab))} ≥ sqrtAVE for one/both${bootCI('FL_margin', a, b)}`, suggestion:'Refine items to sharpen conceptual boundaries; consider merging constructs only if theory supports.' }); }
             }
           }
         }
       }
       if (htmtMatrix && typeof htmtMatrix==='object'){
-        Object.keys(htmtMatrix).forEach(a=>{ Object.keys(htmtMatrix[a]||{}).forEach(b=>{ if (a<b){ const v=htmtMatrix[a][b]; if (isFinite(v) && v>0.85){ pushRev('HTMT:'+a+'-'+b, { type:'Discriminant (HTMT)', factor:a+'–'+b, target:'Pair', issues:`HTMT=${fmt(v)}`, suggestion:'Revise or remove overlapping indicators; ensure constructs are theoretically distinct.' }); } } }); });
+        Object.keys(htmtMatrix).forEach(a=>{ Object.keys(htmtMatrix[a]||{}).forEach(b=>{ if (a<b){ const v=htmtMatrix[a][b]; if (isFinite(v) && v>0.85){ pushRev('HTMT:'+a+'-'+b, { type:'Discriminant (HTMT)', factor:a+'–'+b, target:'Pair', issues:`HTMT=${fmt(v)}${bootCI('HTMT', a, b)}`, suggestion:'Revise or remove overlapping indicators; ensure constructs are theoretically distinct.' }); } } }); });
       }
     } catch(e){ /* silent */ }
 
@@ -0,0 +1,111 @@
+"""Seeded synthetic datasets shaped like the ones the app analyses, for benchmarks and load runs.
+
+Usage (from the repository root):
+    python benchmarks/datasets.py ratings --items 40 --raters 30 --facets 4 > ratings.csv
+    python benchmarks/datasets.py likert --n 1000 --items 20 --factors 4 > likert.csv
+    python benchmarks/datasets.py likert --n 1000 --items 20 --factors 4 --model
+
+ratings: long-format content-adequacy ratings (item, rater, facet, rating on a 1-5 scale). Every
+  item is written for one facet. Raters rate it high on that facet, low elsewhere, with rater
+  leniency and noise. A --weak share of items has no clear target, like the items the ANOVA should
+  reject.
+likert: respondents x items with a simple factor structure (loadings .45-.80, factor correlations
+  .30), discretised to --levels categories, with --missing cells blanked at random. --model prints
+  the matching lavaan CFA syntax instead of the data.
+The same seed always gives the same data.
+"""
+
+from __future__ import annotations
+
+import argparse, io, sys
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def rating_frame(items: int, raters: int, facets: int, seed: int = 0,
+                 weak: float = 0.2) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """Long-format ratings plus the intended item -> facet map."""
+    rng = np.random.default_rng(seed)
+    item_ids = [f"item{i + 1}" for i in range(items)]
+    facet_ids = [f"facet{f + 1}" for f in range(facets)]
+    target = np.arange(items) % facets
+    clarity = np.where(rng.random(items) < weak, 0.0, rng.uniform(1.5, 2.8, items))
+    leniency = rng.normal(0, 0.4, raters)
+    # (item, rater, facet) grid, item-major like the frontend export
+    base = 1.6 + np.zeros((items, 1, facets))
+    base[np.arange(items), 0, target] += clarity
+    score = base + leniency[None, :, None] + rng.normal(0, 0.7, (items, raters, facets))
+    rating = np.clip(np.rint(score), 1, 5).astype(np.int64)
+    ii, rr, ff = np.meshgrid(np.arange(items), np.arange(raters), np.arange(facets), indexing="ij")
+    df = pd.DataFrame({
+        "item": np.asarray(item_ids)[ii.ravel()],
+        "rater": np.char.add("r", (rr.ravel() + 1).astype(str)),
+        "facet": np.asarray(facet_ids)[ff.ravel()],
+        "rating": rating.ravel(),
+    })
+    return df, {item_ids[i]: facet_ids[target[i]] for i in range(items)}
+
+
+def likert_frame(n: int, items: int, factors: int = 2, seed: int = 0, levels: int = 5,
+                 missing: float = 0.0) -> pd.DataFrame:
+    """Respondents x items, item j loading on factor j % factors."""
+    rng = np.random.default_rng(seed)
+    phi = np.full((factors, factors), 0.3) + 0.7 * np.eye(factors)
+    F = rng.standard_normal((n, factors)) @ np.linalg.cholesky(phi).T
+    L = np.zeros((items, factors))
+    L[np.arange(items), np.arange(items) % factors] = rng.uniform(0.45, 0.8, items)
+    X = F @ L.T + rng.standard_normal((n, items)) * np.sqrt(1 - (L ** 2).sum(1))
+    # Equal-probability cut points of the standard normal, shifted per item for skew
+    cuts = np.quantile(rng.standard_normal(100_000), np.linspace(0, 1, levels + 1)[1:-1])
+    X = 1 + (X[..., None] - rng.normal(0, 0.3, items)[None, :, None] > cuts).sum(-1).astype(float)
+    if missing:
+        X[rng.random(X.shape) < missing] = np.nan
+    return pd.DataFrame(X, columns=[f"item{j + 1}" for j in range(items)])
+
+
+def likert_model(items: int, factors: int = 2) -> str:
+    """lavaan syntax matching likert_frame's structure."""
+    return "\n".join(
+        f"F{f + 1} =~ " + " + ".join(f"item{j + 1}" for j in range(f, items, factors)) for f in range(factors)
+    )
+
+
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue().encode("utf-8")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="kind", required=True)
+    r = sub.add_parser("ratings")
+    r.add_argument("--items", type=int, default=40)
+    r.add_argument("--raters", type=int, default=30)
+    r.add_argument("--facets", type=int, default=4)
+    r.add_argument("--weak", type=float, default=0.2)
+    l = sub.add_parser("likert")
+    l.add_argument("--n", type=int, default=1000)
+    l.add_argument("--items", type=int, default=20)
+    l.add_argument("--factors", type=int, default=2)
+    l.add_argument("--levels", type=int, default=5)
+    l.add_argument("--missing", type=float, default=0.0)
+    l.add_argument("--model", action="store_true")
+    for p in (r, l):
+        p.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if args.kind == "ratings":
+        df, _ = rating_frame(args.items, args.raters, args.facets, args.seed, args.weak)
+    elif args.model:
+        print(likert_model(args.items, args.factors))
+        return 0
+    else:
+        df = likert_frame(args.n, args.items, args.factors, args.seed, args.levels, args.missing)
+    sys.stdout.write(csv_bytes(df).decode("utf-8"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
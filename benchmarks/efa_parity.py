@@ -0,0 +1,156 @@
+"""Parity check: in-process EFA (app/analysis/efa.py) against scripts/efa_analysis.R.
+
+Usage (from the repository root):
+    python benchmarks/efa_parity.py [--tol 1e-3] [--sizes 300x12,500x20]
+    python benchmarks/efa_parity.py --write-fixtures tests/fixtures/efa_psych.json
+
+For every synthetic dataset and every extraction x rotation combination, both engines are run
+with a fixed number of factors and compared on eigenvalues, loadings (matched by factor name),
+communalities, uniquenesses, variance accounted for and factor correlations. Wall times are
+reported as well. Exits 1 if any difference exceeds the tolerance; without Rscript only the
+Python timings are printed.
+
+--write-fixtures stores the R side instead: the datasets plus psych::fa's loadings, uniquenesses,
+communalities and factor correlations for every combination, which tests/test_efa.py checks the
+Python engine against without R.
+"""
+
+from __future__ import annotations
+
+import argparse, datetime, json, os, shutil, subprocess, sys, time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from analysis.efa import run_efa  # noqa: E402
+from analysis.r_runner import run_r_subprocess  # noqa: E402
+
+SCRIPT = "analysis/scripts/efa_analysis.R"
+FIXTURE_KEYS = ("loadings_matrix", "uniquenesses", "communalities", "factor_correlation")
+
+
+def synthetic_rows(n: int, p: int, n_factors: int = 2, seed: int = 0):
+    """Likert-style items with a simple structure and correlated factors."""
+    rng = np.random.default_rng(seed)
+    phi = np.full((n_factors, n_factors), 0.3) + 0.7 * np.eye(n_factors)
+    F = rng.standard_normal((n, n_factors)) @ np.linalg.cholesky(phi).T
+    L = np.zeros((p, n_factors))
+    for j in range(p):
+        L[j, j % n_factors] = rng.uniform(0.45, 0.8)
+    X = F @ L.T + rng.standard_normal((n, p)) * np.sqrt(1 - (L ** 2).sum(1))
+    X = np.clip(np.round(X * 1.2 + 3), 1, 5)
+    return [{f"item{j + 1}": float(X[i, j]) for j in range(p)} for i in range(n)]
+
+
+def _max_diff(py, r, path=""):
+    """Largest absolute numeric difference between two JSON-like structures (None if shapes differ)."""
+    if isinstance(py, dict) and isinstance(r, dict):
+        keys = set(py) | set(r)
+        diffs = [_max_diff(py.get(k), r.get(k), f"{path}.{k}") for k in keys]
+    elif isinstance(py, list) and isinstance(r, list) and len(py) == len(r):
+        diffs = [_max_diff(a, b, f"{path}[{i}]") for i, (a, b) in enumerate(zip(py, r))]
+    elif isinstance(py, (int, float)) and isinstance(r, (int, float)):
+        return abs(float(py) - float(r)), path
+    elif py == r:
+        return 0.0, path
+    else:
+        return float("inf"), path
+    diffs = [d for d in diffs if d is not None]
+    return max(diffs, default=(0.0, path))
+
+
+def compare(py_efa: dict, r_efa: dict):
+    """Per-section max abs difference; list-of-row sections are keyed so row order does not matter."""
+    out = {}
+    for key in ("eigenvalues", "communalities", "uniquenesses"):
+        out[key] = _max_diff(py_efa.get(key), r_efa.get(key))
+    by_item = lambda rows: {row["item"]: row for row in rows or []}
+    by_factor = lambda rows: {row["factor"]: row for row in rows or []}
+    by_row = lambda rows: {row.get("_row"): row for row in rows or []}
+    out["loadings_matrix"] = _max_diff(by_item(py_efa.get("loadings_matrix")), by_item(r_efa.get("loadings_matrix")))
+    out["variance"] = _max_diff(by_factor(py_efa.get("variance")), by_factor(r_efa.get("variance")))
+    out["factor_correlation"] = _max_diff(by_row(py_efa.get("factor_correlation")),
+                                          by_row(r_efa.get("factor_correlation")))
+    return out
+
+
+def r_versions() -> str:
+    out = subprocess.run(["Rscript", "-e", 'cat(R.version.string, "/ psych", as.character(packageVersion("psych")))'],
+                         capture_output=True, text=True, timeout=120)
+    return out.stdout.strip()
+
+
+def write_fixtures(path: str, sizes, n_factors: int) -> int:
+    """psych::fa output (through efa_analysis.R) for each dataset and combination, for tests/test_efa.py."""
+    if shutil.which("Rscript") is None:
+        print("Rscript not found: the fixtures need psych::fa")
+        return 1
+    datasets, cases = {}, []
+    for n, p in sizes:
+        name = f"{n}x{p}"
+        rows = synthetic_rows(n, p, n_factors)
+        columns = list(rows[0])
+        datasets[name] = {"columns": columns, "values": [[int(r[c]) for c in columns] for r in rows]}
+        for fm in ("pa", "minres", "ml"):
+            for rotation in ("varimax", "promax", "oblimin"):
+                r = run_r_subprocess(rows, SCRIPT, extra_args=[n_factors, rotation, fm], use_cache=False)
+                efa = (r.get("output") or {}).get("efa")
+                if r.get("status") != "ok" or efa is None:
+                    print(f"{name} {fm} {rotation}: R failed: {r.get('error') or r.get('stderr')}")
+                    return 1
+                cases.append({"dataset": name, "n_factors": n_factors, "fm": fm, "rotation": rotation,
+                              "efa": {k: efa.get(k) for k in FIXTURE_KEYS}})
+    fixture = {"source": f"psych::fa via {SCRIPT}", "r": r_versions(),
+               "date": datetime.date.today().isoformat(), "datasets": datasets, "cases": cases}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, indent=1)
+    print(f"wrote {len(cases)} cases to {path}")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tol", type=float, default=1e-3)
+    ap.add_argument("--sizes", default="300x12,500x20")
+    ap.add_argument("--factors", type=int, default=2)
+    ap.add_argument("--write-fixtures", default="", metavar="PATH")
+    args = ap.parse_args()
+    if args.write_fixtures:
+        sizes = [tuple(int(v) for v in size.lower().split("x")) for size in args.sizes.split(",")]
+        return write_fixtures(args.write_fixtures, sizes, args.factors)
+
+    have_r = shutil.which("Rscript") is not None
+    if not have_r:
+        print("Rscript not found: timing the Python engine only")
+    failures = 0
+    for size in args.sizes.split(","):
+        n, p = (int(v) for v in size.lower().split("x"))
+        rows = synthetic_rows(n, p, args.factors)
+        for fm in ("pa", "minres", "ml"):
+            for rotation in ("varimax", "promax", "oblimin"):
+                t0 = time.perf_counter()
+                py = run_efa(rows, args.factors, rotation, fm)
+                t_py = time.perf_counter() - t0
+                line = f"{n:>5}x{p:<3} {fm:<6} {rotation:<8} python {t_py * 1000:7.1f} ms"
+                if have_r:
+                    t0 = time.perf_counter()
+                    r = run_r_subprocess(rows, SCRIPT, extra_args=[args.factors, rotation, fm], use_cache=False)
+                    t_r = time.perf_counter() - t0
+                    r_out = r.get("output") or {}
+                    if r.get("status") != "ok" or "efa" not in r_out:
+                        print(f"{line}  R failed: {r.get('error') or r.get('stderr') or r_out.get('message')}")
+                        failures += 1
+                        continue
+                    diffs = compare(py["efa"], r_out["efa"])
+                    worst_key, (worst, where) = max(diffs.items(), key=lambda kv: kv[1][0])
+                    ok = worst <= args.tol
+                    failures += not ok
+                    line += f"  R {t_r * 1000:7.1f} ms  max|diff| {worst:.2e} ({worst_key}{where})  {'ok' if ok else 'FAIL'}"
+                print(line)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
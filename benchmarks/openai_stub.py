@@ -0,0 +1,178 @@
+"""Local stand-in for the OpenAI chat completions API, for tests and load runs without a key.
+
+Usage (from the repository root):
+    python benchmarks/openai_stub.py [--port 8777] [--latency 0.2] [--rate-limit-every 0] [--retry-after 1]
+                                     [--chunk-delay 0.01] [--malformed-every 0] [--quota-exhausted]
+    OPENAI_BASE_URL=http://127.0.0.1:8777/v1 uvicorn app.main:app
+
+POST /v1/chat/completions answers after --latency seconds with a deterministic reply that echoes
+the last user message; prompts asking for personas get "generate N" tagged personas instead, and
+Likert simulation prompts get a JSON object with one in-range answer per item (with
+--malformed-every N every N-th of those replies drops an item and puts a word in another).
+Content-adequacy rater prompts get 1-5 ratings per item and facet: high for the facet an item's
+text names, low elsewhere, and uniform noise for items that name no facet.
+"stream": true sends the reply as SSE chunks, --chunk-delay seconds apart, after the same initial
+latency. With --rate-limit-every N every N-th request gets a 429 with a Retry-After header;
+--quota-exhausted answers every request with the 429 "insufficient_quota" error, which waiting
+does not clear. GET /stats returns request counts and the peak number of concurrent requests.
+"""
+
+from __future__ import annotations
+
+import argparse, asyncio, hashlib, json, random, re, time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHUNK_CHARS = 24
+NAMES = ["Ana", "Ben", "Chen", "Dara", "Emil", "Fatma", "Goran", "Hana", "Ivo", "Jun", "Kemal", "Lea"]
+JOBS = ["nurse", "bus driver", "accountant", "farmer", "student", "retired teacher", "plumber",
+        "shop owner", "software tester", "cook", "warehouse clerk", "social worker"]
+TRAITS = ["patient", "impulsive", "generous", "stubborn", "curious", "anxious", "loyal", "cynical",
+          "organised", "forgetful", "outgoing", "withdrawn"]
+PLACES = ["a small town", "a large city", "the suburbs", "a rural village", "a coastal town"]
+
+
+def stub_personas(prompt: str, n: int) -> list:
+    """n varied persona texts, deterministic per prompt (batch hints change the prompt)."""
+    out = []
+    for i in range(n):
+        h = int(hashlib.sha1(f"{prompt}|{i}".encode()).hexdigest(), 16)
+        pick = lambda seq, k: seq[(h >> (8 * k)) % len(seq)]
+        age = 18 + (h >> 48) % 60
+        out.append(f"{pick(NAMES, 0)}, {age}, works as a {pick(JOBS, 1)} in {pick(PLACES, 2)}. "
+                   f"{pick(NAMES, 0)} is {pick(TRAITS, 3)} but also {pick(TRAITS, 4)}, which shapes "
+                   f"how they handle money and family decisions (profile {h % 10007}).")
+    return out
+
+
+def stub_likert(prompt: str, malformed: bool) -> str:
+    items = json.loads(re.search(r"statements: (\[.*?\])\.\n", prompt).group(1))
+    m = re.search(r"(\d+)-point scale: (-?\d+)=", prompt)
+    k, lo = (int(m.group(1)), int(m.group(2))) if m else (5, 1)
+    open_m = re.search(r"open questions briefly in character: (\[.*?\])\.", prompt)
+    answers = {}
+    for item in items:
+        h = int(hashlib.sha1(f"{prompt}|{item['id']}|{time.time_ns()}".encode()).hexdigest(), 16)
+        answers[item["id"]] = lo + h % k
+    for item in json.loads(open_m.group(1)) if open_m else []:
+        answers[item["id"]] = "It depends on the day, honestly."
+    if malformed and answers:
+        first = next(iter(answers))
+        answers.pop(first)
+        if answers:
+            answers[next(iter(answers))] = "somewhat"
+    return json.dumps(answers)
+
+
+def stub_ratings(prompt: str) -> str:
+    facets = re.findall(r"Dimensionname: (.*?), Definition:", prompt)
+    items = re.findall(r'\{"id": "(.*?)", "text": "(.*?)"\}', prompt)
+    rng = random.Random(time.time_ns())
+    ratings = {}
+    for item_id, text in items:
+        named = [f for f in facets if f.lower() in text.lower()]
+        ratings[item_id] = {f: (rng.choice([4, 5, 5]) if f in named else rng.choice([1, 2, 2, 3])) if named
+                            else rng.randint(1, 5) for f in facets}
+    return json.dumps({"ratings": ratings})
+
+
+def build_app(latency: float = 0.2, rate_limit_every: int = 0, retry_after: float = 1.0,
+              chunk_delay: float = 0.01, malformed_every: int = 0, quota_exhausted: bool = False) -> FastAPI:
+    app = FastAPI()
+    state = {"requests": 0, "rate_limited": 0, "in_flight": 0, "peak_in_flight": 0, "likert": 0}
+
+    def completion(body: dict, content: str) -> dict:
+        return {
+            "id": "chatcmpl-stub-" + hashlib.sha1(content.encode()).hexdigest()[:12],
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def reply_text(body: dict) -> str:
+        messages = body.get("messages") or []
+        last = str(next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""))
+        rating = next((str(m.get("content", "")) for m in messages if m.get("role") == "user"
+                       and "content adequacy" in str(m.get("content", ""))), None)
+        if rating is not None:
+            return stub_ratings(rating)
+        likert = next((str(m.get("content", "")) for m in messages if m.get("role") == "user"
+                       and "point scale" in str(m.get("content", ""))), None)
+        if likert is not None:  # includes follow-ups asking to correct an invalid answer
+            state["likert"] += 1
+            return stub_likert(likert, bool(malformed_every) and state["likert"] % malformed_every == 0)
+        if "persona" in last.lower():
+            m = re.search(r"generate (\d+)", last)
+            personas = stub_personas(last, int(m.group(1)) if m else 5)
+            if body.get("response_format"):
+                return json.dumps({"personas": personas})
+            return "".join(f"<startPersona>{p}<endPersona>" for p in personas)
+        return f"stub reply to: {last[:200]}"
+
+    async def stream_chunks(body: dict, content: str):
+        base = completion(body, "")
+        for i in range(0, len(content), CHUNK_CHARS):
+            if i:
+                await asyncio.sleep(chunk_delay)
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": content[i:i + CHUNK_CHARS]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        done = {**base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        state["requests"] += 1
+        if quota_exhausted:
+            state["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "You exceeded your current quota (stub)",
+                                           "type": "insufficient_quota", "code": "insufficient_quota"}},
+                                status_code=429)
+        if rate_limit_every and state["requests"] % rate_limit_every == 0:
+            state["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "Rate limit reached (stub)", "type": "requests",
+                                           "code": "rate_limit_exceeded"}},
+                                status_code=429, headers={"retry-after": str(retry_after)})
+        state["in_flight"] += 1
+        state["peak_in_flight"] = max(state["peak_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(latency)
+            if body.get("stream"):
+                return StreamingResponse(stream_chunks(body, reply_text(body)), media_type="text/event-stream")
+            return completion(body, reply_text(body))
+        finally:
+            state["in_flight"] -= 1
+
+    @app.get("/stats")
+    async def stats():
+        return state
+
+    return app
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8777)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds per completion")
+    ap.add_argument("--rate-limit-every", type=int, default=0, help="429 every N-th request (0 = never)")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    ap.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between streamed chunks")
+    ap.add_argument("--malformed-every", type=int, default=0, help="malformed Likert reply every N-th (0 = never)")
+    ap.add_argument("--quota-exhausted", action="store_true", help="answer every request with insufficient_quota")
+    args = ap.parse_args()
+    uvicorn.run(build_app(args.latency, args.rate_limit_every, args.retry_after, args.chunk_delay,
+                          args.malformed_every, args.quota_exhausted),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
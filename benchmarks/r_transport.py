@@ -0,0 +1,109 @@
+"""Benchmark the Python -> R data hand-off formats (app/analysis/r_transport.py).
+
+Usage (from the repository root):
+    python benchmarks/r_transport.py [--sizes 1000x20,10000x100] [--repeat 3]
+
+For every dataset size and format (records, columns, rbin) it reports:
+  - bytes written and Python write time (best of --repeat) with peak Python allocation
+  - with Rscript on PATH: R parse time (read_input.R -> data.frame, best of --repeat) and the
+    peak R heap reported by gc() while parsing
+The data are Likert-style numeric items with ~2% missing values plus one id string column.
+"""
+
+from __future__ import annotations
+
+import argparse, json, os, shutil, subprocess, sys, tempfile, time, tracemalloc
+
+import numpy as np
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+from analysis.r_transport import FORMATS, write_input  # noqa: E402
+
+READER = os.path.abspath(os.path.join(APP_DIR, "analysis", "scripts", "read_input.R"))
+
+R_PARSE = r"""
+suppressPackageStartupMessages(library(jsonlite))
+source(commandArgs(trailingOnly = TRUE)[1])
+path <- commandArgs(trailingOnly = TRUE)[2]
+reps <- as.integer(commandArgs(trailingOnly = TRUE)[3])
+best <- Inf
+invisible(gc(reset = TRUE))
+for (i in seq_len(reps)) {
+  t <- system.time(df <- read_input_frame(path))[["elapsed"]]
+  best <- min(best, t)
+}
+peak <- sum(gc()[, 6])
+cat(jsonlite::toJSON(list(seconds = best, peak_mb = peak, rows = nrow(df), cols = ncol(df)), auto_unbox = TRUE))
+"""
+
+
+def make_rows(n: int, p: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.integers(1, 8, size=(n, p)).astype(float)
+    X[rng.random((n, p)) < 0.02] = np.nan
+    rows = []
+    for i in range(n):
+        row = {"id": f"r{i}"}
+        row.update({f"item{j + 1}": (None if np.isnan(v) else int(v)) for j, v in enumerate(X[i])})
+        rows.append(row)
+    return rows
+
+
+def time_write(rows, fmt: str, repeat: int):
+    """Best write time over `repeat` runs, then one traced run for peak memory (tracemalloc
+    slows allocation-heavy code a lot, so it is kept out of the timed runs)."""
+    best = float("inf")
+    for _ in range(repeat):
+        tmp = tempfile.mkdtemp(prefix="rtransport_")
+        t0 = time.perf_counter()
+        write_input(rows, tmp, fmt)
+        best = min(best, time.perf_counter() - t0)
+        shutil.rmtree(tmp, ignore_errors=True)
+    tmp = tempfile.mkdtemp(prefix="rtransport_")
+    tracemalloc.start()
+    path = write_input(rows, tmp, fmt)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, os.path.getsize(path), path
+
+
+def time_r_parse(path: str, repeat: int):
+    proc = subprocess.run(["Rscript", "-e", R_PARSE, READER, path, str(repeat)],
+                          capture_output=True, text=True, timeout=600)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip()[-300:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="1000x20,10000x100")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    have_r = shutil.which("Rscript") is not None
+    if not have_r:
+        print("Rscript not found: reporting the Python side only")
+
+    print(f"{'size':>12} {'format':<8} {'bytes':>12} {'write ms':>9} {'py peak MB':>10}"
+          + (f" {'R parse ms':>10} {'R peak MB':>9}" if have_r else ""))
+    for size in args.sizes.split(","):
+        n, p = (int(v) for v in size.lower().split("x"))
+        rows = make_rows(n, p)
+        for fmt in [f for f in FORMATS if f != "moments"][::-1]:  # records (baseline) first
+            seconds, peak, nbytes, path = time_write(rows, fmt, args.repeat)
+            line = f"{size:>12} {fmt:<8} {nbytes:>12,} {seconds * 1000:>9.1f} {peak / 2 ** 20:>10.1f}"
+            if have_r:
+                r = time_r_parse(path, args.repeat)
+                if "error" in r:
+                    line += f"  R error: {r['error']}"
+                else:
+                    line += f" {r['seconds'] * 1000:>10.1f} {r['peak_mb']:>9.1f}"
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            print(line, flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Benchmark the response encoding of analysis results (app/analysis/serialization.py).
+
+Usage (from the repository root):
+    python benchmarks/serialization.py [--r-sizes 1000,20000,200000] [--items 100,1000] [--repeat 5]
+
+Each case is timed from the in-memory result (or the file R wrote) to the response body bytes,
+best of --repeat, for the previous path and the current one:
+  r_output   an R output file of --r-sizes factor-score rows plus loadings and modification indices
+             legacy: json.load -> jsonable_encoder -> json.dumps (FastAPI's JSONResponse)
+             raw:    file bytes spliced into the result envelope (RawJSON), never parsed
+  r_cache    the same result served from the R result cache
+             legacy: json.loads of the stored blob -> jsonable_encoder -> json.dumps
+             raw:    the stored blob as is
+  adequacy   the /analyze-anova table for --items items (30 raters, 4 facets, numpy engine)
+             legacy: replace(inf) -> replace(NaN) -> to_dict -> jsonable_encoder -> json.dumps
+             fast:   frame_records -> dumps
+The fast paths run with orjson when it is installed and with the stdlib fallback (column
+"encoder"); the documents are compared for equality before timing.
+"""
+
+from __future__ import annotations
+
+import argparse, json, os, shutil, sys, tempfile, time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+sys.path.insert(0, HERE)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from analysis import serialization  # noqa: E402
+from analysis.serialization import RawJSON, dumps, frame_records  # noqa: E402
+from API.functions import analyze_content_adequacy  # noqa: E402
+from datasets import rating_frame  # noqa: E402
+
+
+def legacy_render(content) -> bytes:
+    # fastapi.routing.serialize_response + starlette JSONResponse.render
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def r_output(n: int, seed: int = 0) -> dict:
+    """Shape of a custom_analysis.R result with factor scores (the large part grows with n)."""
+    rng = np.random.default_rng(seed)
+    items = [f"item{i + 1}" for i in range(24)]
+    factors = ["F1", "F2", "F3", "F4"]
+    return {
+        "fit": {k: round(float(v), 4) for k, v in zip(["chisq", "df", "cfi", "tli", "rmsea", "srmr"],
+                                                      rng.random(6))},
+        "loadings": [{"lhs": factors[i // 6], "op": "=~", "rhs": it, "est": float(rng.random()),
+                      "se": float(rng.random() / 10), "pvalue": float(rng.random()), "std_all": float(rng.random())}
+                     for i, it in enumerate(items)],
+        "modindices": [{"lhs": a, "op": "~~", "rhs": b, "mi": float(rng.random() * 20), "epc": float(rng.normal())}
+                       for a in items for b in items if a < b],
+        "factor_scores": [dict(zip(factors, map(float, row))) for row in rng.normal(size=(n, len(factors)))],
+        "timings": {"packages": 0.41, "read_input": 0.02, "fit": 1.3},
+    }
+
+
+def envelope(output) -> dict:
+    return {"status": "ok", "returncode": 0, "stdout": "", "stderr": "", "output": output}
+
+
+def cases(r_sizes, item_counts):
+    tmp = tempfile.mkdtemp(prefix="serialization_")
+    try:
+        for n in r_sizes:
+            path = os.path.join(tmp, f"output_{n}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(r_output(n), f)  # jsonlite writes compact JSON as well
+
+            def legacy_file(path=path):
+                with open(path, "r", encoding="utf-8") as f:
+                    return legacy_render(envelope(json.load(f)))
+
+            def raw_file(path=path):
+                with open(path, "rb") as f:
+                    return dumps(envelope(RawJSON(f.read())))
+
+            yield "r_output", f"{n} rows", legacy_file, raw_file
+            blob = raw_file()
+            yield "r_cache", f"{n} rows", lambda blob=blob: legacy_render(json.loads(blob)), lambda blob=blob: dumps(RawJSON(blob))
+        for items in item_counts:
+            ratings, imap = rating_frame(items, 30, 4, seed=1)
+            table = analyze_content_adequacy(ratings, imap, engine="numpy")
+            table.loc[table.index[:: max(1, items // 10)], "F"] = np.inf  # the non-finite values the chain removes
+
+            def legacy_table(table=table):
+                t = table.replace([np.inf, -np.inf], np.nan)
+                return legacy_render({"result": t.replace({np.nan: None}).to_dict(orient="records")})
+
+            yield "adequacy", f"{items} items", legacy_table, lambda table=table: dumps({"result": frame_records(table)})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--r-sizes", default="1000,20000,200000")
+    ap.add_argument("--items", default="100,1000")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    r_sizes = [int(v) for v in args.r_sizes.split(",") if v]
+    item_counts = [int(v) for v in args.items.split(",") if v]
+    encoders = [serialization.orjson, None] if serialization.orjson is not None else [None]
+    if serialization.orjson is None:
+        print("orjson not installed: the fast path uses the stdlib fallback")
+
+    print(f"{'case':<9} {'size':>12} {'bytes':>12} {'legacy ms':>10} {'encoder':<7} {'new ms':>9} {'speedup':>8}")
+    for case, size, legacy, new in cases(r_sizes, item_counts):
+        expected = json.loads(legacy())
+        legacy_s = best_of(legacy, args.repeat)
+        for encoder in encoders:
+            serialization.orjson = encoder
+            body = new()
+            if json.loads(body) != expected:
+                print(f"{case:<9} {size:>12}  MISMATCH between legacy and {serialization.backend()} output")
+                continue
+            new_s = best_of(new, args.repeat)
+            speedup = legacy_s / new_s if new_s > 0 else float("inf")
+            speedup = f"{speedup:.1f}x" if speedup < 1000 else ">1000x"
+            print(f"{case:<9} {size:>12} {len(body):>12,} {legacy_s * 1000:>10.1f} {serialization.backend():<7} "
+                  f"{new_s * 1000:>9.2f} {speedup:>8}", flush=True)
+        serialization.orjson = encoders[0]
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
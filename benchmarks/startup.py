@@ -0,0 +1,217 @@
+"""Startup benchmark: import time of app.main, time until the server answers and is ready, and
+first-request latency with and without the background warm-up.
+
+Usage (from the repository root):
+    python benchmarks/startup.py [--repeat 5] [--top 15] [--with-r]
+                                 [--save benchmarks/baselines/startup.json]
+                                 [--compare benchmarks/baselines/startup.json] [--tolerance 0.25]
+
+import   `import main` in --repeat fresh interpreters (best and median seconds), plus the --top
+         modules by cumulative time from one `python -X importtime` run
+server   uvicorn in a subprocess, once per mode:
+           lazy  WARM_UP=0: the requests go out as soon as the port answers, so each one pays for
+                 the deferred imports it needs (scipy, pingouin, openai)
+           warm  WARM_UP=1: the requests wait until GET /ready returns 200
+         Each mode records the seconds until the port answers (and, warm, until /ready is 200) and
+         the first and second latency of each request:
+           anova          POST /api/analyze-anova, 40 items x 30 raters x 4 facets, numpy engine
+           anova_pandas   the same with the per-item pingouin engine
+           efa_python     POST /api/r/efa with "engine": "python", 1000 rows x 20 items
+The R preflight and the R pool are off unless --with-r is given, so R installs do not count.
+--compare exits 1 when the import time or a first request got slower than (1 + --tolerance) x
+baseline by more than --min-ms.
+"""
+
+from __future__ import annotations
+
+import argparse, datetime, json, os, platform, socket, statistics, subprocess, sys, time
+from typing import Any, Dict, List
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+APP = os.path.join(ROOT, "app")
+sys.path.insert(0, HERE)
+
+from datasets import likert_frame, rating_frame  # noqa: E402
+
+ENV = {"ENCRYPTION_SECRET": "benchmark", "R_CACHE_DISABLED": "1", "METRICS": "1"}
+
+
+def _env(**extra: str) -> Dict[str, str]:
+    env = {**os.environ, **ENV, **extra}
+    env["PYTHONPATH"] = os.pathsep.join([APP, env.get("PYTHONPATH", "")]).rstrip(os.pathsep)
+    return env
+
+
+def import_times(repeat: int) -> Dict[str, Any]:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(R_POOL_SIZE="0"),
+                             capture_output=True, text=True, check=True)
+        runs.append(float(out.stdout.strip().splitlines()[-1]))
+    return {"best_s": min(runs), "median_s": statistics.median(runs)}
+
+
+def import_profile(top: int) -> List[Dict[str, Any]]:
+    """Largest cumulative import times (microseconds) from `python -X importtime`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                         env=_env(R_POOL_SIZE="0"), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({"module": name.strip(), "cumulative_ms": int(parts[1]) / 1000, "depth": depth})
+    return sorted(rows, key=lambda r: -r["cumulative_ms"])[:top]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _requests() -> Dict[str, Dict[str, Any]]:
+    ratings, imap = rating_frame(40, 30, 4, seed=1)
+    rows = ratings.to_dict("records")
+    likert = likert_frame(1000, 20, 4, seed=1).to_dict("records")
+    return {
+        "anova": {"url": "/api/analyze-anova", "json": {"data": rows, "intendedMap": imap}},
+        "anova_pandas": {"url": "/api/analyze-anova",
+                         "json": {"data": rows, "intendedMap": imap, "options": {"engine": "pandas"}}},
+        "efa_python": {"url": "/api/r/efa", "json": {"data": likert, "n_factors": 4, "engine": "python"}},
+    }
+
+
+def server_run(mode: str, with_r: bool, timeout: float = 600) -> Dict[str, Any]:
+    port = _free_port()
+    env = _env(WARM_UP="1" if mode == "warm" else "0")
+    if not with_r:
+        env.update(R_PREFLIGHT="0", R_POOL_SIZE="0")
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level",
+                             "warning"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base = f"http://127.0.0.1:{port}"
+    out: Dict[str, Any] = {"mode": mode}
+    try:
+        with httpx.Client(base_url=base, timeout=timeout) as client:
+            ready = None
+            while time.perf_counter() - started < timeout:
+                if proc.poll() is not None:
+                    raise RuntimeError(proc.stderr.read().decode("utf-8", "replace")[-1000:])
+                try:
+                    ready = client.get("/ready")
+                except httpx.TransportError:
+                    time.sleep(0.02)
+                    continue
+                if "listen_s" not in out:
+                    out["listen_s"] = round(time.perf_counter() - started, 3)
+                if ready.status_code == 200:
+                    out["ready_s"] = round(time.perf_counter() - started, 3)
+                if mode == "lazy" or ready.status_code == 200:
+                    break
+                time.sleep(0.05)
+            requests = _requests()
+            for name, req in requests.items():
+                for attempt in ("first", "second"):
+                    t = time.perf_counter()
+                    r = client.post(req["url"], json=req["json"])
+                    out[f"{name}_{attempt}_ms"] = round((time.perf_counter() - t) * 1000, 1)
+                    if r.status_code != 200:
+                        out[f"{name}_error"] = f"{r.status_code} {r.text[:200]}"
+            report = client.get("/ready").json()
+            out["import_s"] = report.get("import_s")
+            out["steps"] = {k: {"status": v["status"], "seconds": v.get("seconds")} for k, v in report["steps"].items()}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return out
+
+
+def metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "repeat": args.repeat,
+        "with_r": args.with_r,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_ms: float) -> int:
+    pairs = [("import best", result["import"]["best_s"] * 1000, baseline["import"]["best_s"] * 1000)]
+    base_servers = {s["mode"]: s for s in baseline.get("server", [])}
+    for s in result["server"]:
+        b = base_servers.get(s["mode"], {})
+        for key in ("listen_s", "ready_s"):
+            if key in b and key in s:
+                pairs.append((f"{s['mode']} {key}", s[key] * 1000, b[key] * 1000))
+        for key in sorted(k for k in s if k.endswith("_first_ms")):
+            if key in b:
+                pairs.append((f"{s['mode']} {key[:-3]}", s[key], b[key]))
+    meta = baseline.get("meta", {})
+    print(f"\nAgainst baseline {meta.get('commit')} ({meta.get('date')}, {meta.get('platform')}):")
+    regressions = 0
+    for name, now, base in pairs:
+        ratio = now / base if base else float("inf")
+        slower = ratio > 1 + tolerance and now - base > min_ms
+        regressions += slower
+        print(f"{name:<28} {base:>10.1f} {now:>10.1f} {ratio:>7.2f}{'  REGRESSION' if slower else ''}")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--with-r", action="store_true", help="run the R preflight and pool during startup")
+    ap.add_argument("--save", default="")
+    ap.add_argument("--compare", default="")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--min-ms", type=float, default=50.0)
+    args = ap.parse_args()
+
+    imports = import_times(args.repeat)
+    print(f"import main: best {imports['best_s'] * 1000:.0f} ms, median {imports['median_s'] * 1000:.0f} ms")
+    top = import_profile(args.top)
+    for row in top:
+        print(f"  {row['cumulative_ms']:>8.1f} ms  {'  ' * row['depth']}{row['module']}")
+    servers = []
+    for mode in ("lazy", "warm"):
+        s = server_run(mode, args.with_r)
+        servers.append(s)
+        ready = f", ready after {s['ready_s']:.2f} s" if "ready_s" in s else ""
+        print(f"\n{mode}: port answers after {s['listen_s']:.2f} s{ready}")
+        for name in _requests():
+            err = f"  error {s[name + '_error']}" if name + "_error" in s else ""
+            print(f"  {name:<14} first {s[name + '_first_ms']:>8.1f} ms  second {s[name + '_second_ms']:>8.1f} ms{err}")
+    result = {"import": imports, "import_top": top, "server": servers}
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"meta": metadata(args), **result}, f, indent=1)
+        print(f"saved {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            return compare(result, json.load(f), args.tolerance, args.min_ms)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""Benchmark suite for the hot paths, with scaling curves and baseline comparison.
+
+Usage (from the repository root; app.main serves templates relative to it):
+    python benchmarks/suite.py [--scale quick|full] [--only csv_ingest,adequacy_numpy] [--repeat 3]
+                               [--save benchmarks/baselines/quick.json]
+                               [--compare benchmarks/baselines/quick.json] [--tolerance 0.25]
+                               [--pool]
+
+Benchmarks (each over a ladder of sizes, data from benchmarks/datasets.py with fixed seeds):
+  csv_ingest        API.datasets.frame_from_csv (chunked parse and dtype compaction) on a Likert
+                    CSV (n = rows, 20 items)
+  adequacy_numpy    analyze_content_adequacy, batched engine (n = items; 30 raters, 4 facets)
+  adequacy_pandas   the same with the per-item pingouin engine (smaller ladder)
+  analyze_upload    POST /analyze in-process: CSV upload, parse, dataset registration and the
+                    rendered Step 2 partial (n = rows, 20 items)
+  analyze_endpoint  POST /api/analyze-anova in-process, JSON in and out (n = items)
+  r_handoff         r_transport.write_input in the negotiated format (n = rows, 20 items)
+  efa_python        analysis.efa.run_efa with 4 factors (n = rows, 20 items)
+  efa_r / cfa_r     efa_analysis.R / custom_analysis.R end to end through run_r_subprocess
+                    (n = rows, 20 items); skipped without Rscript
+
+Each result records the best and median wall time over --repeat runs and the peak Python
+allocation (tracemalloc, one extra run kept out of the timings). R runs also record the
+peak RSS of the Rscript children. The R result cache is disabled. One-shot Rscript is used
+unless --pool is given, so R times include startup.
+
+Per benchmark, the slope of log(time) on log(n) is reported as the scaling exponent: about 1 is
+linear, 2 quadratic. --save writes the results with machine metadata. --compare prints time and
+memory ratios against a saved baseline. The script exits 1 when a size got slower than
+(1 + --tolerance) x baseline and the difference exceeds --min-ms.
+"""
+
+from __future__ import annotations
+
+import argparse, datetime, json, os, platform, shutil, statistics, subprocess, sys, time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: no child RSS
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+sys.path.insert(0, HERE)
+os.environ.setdefault("R_CACHE_DISABLED", "1")
+os.environ.setdefault("ENCRYPTION_SECRET", "benchmark")  # API.router refuses to import without it
+
+from datasets import csv_bytes, likert_frame, likert_model, rating_frame  # noqa: E402
+
+LADDERS = {
+    "quick": {
+        "csv_ingest": [1000, 10000, 50000],
+        "adequacy_numpy": [20, 80, 320],
+        "adequacy_pandas": [10, 40],
+        "analyze_upload": [1000, 10000, 50000],
+        "analyze_endpoint": [20, 80, 320],
+        "r_handoff": [1000, 10000, 50000],
+        "efa_python": [300, 1000, 5000],
+        "efa_r": [300, 1000, 5000],
+        "cfa_r": [300, 1000, 5000],
+    },
+    "full": {
+        "csv_ingest": [1000, 10000, 100000, 500000],
+        "adequacy_numpy": [20, 80, 320, 1280],
+        "adequacy_pandas": [10, 40, 160],
+        "analyze_upload": [1000, 10000, 100000, 500000],
+        "analyze_endpoint": [20, 80, 320, 1280],
+        "r_handoff": [1000, 10000, 100000, 500000],
+        "efa_python": [300, 1000, 5000, 20000],
+        "efa_r": [300, 1000, 5000, 20000],
+        "cfa_r": [300, 1000, 5000, 20000],
+    },
+}
+ITEMS, RATERS, FACETS, FACTORS = 20, 30, 4, 4
+
+
+# ---------- benchmark definitions: setup(n) -> state, run(state) ----------
+
+def _csv_ingest():
+    from API.datasets import frame_from_csv
+    return (lambda n: csv_bytes(likert_frame(n, ITEMS, FACTORS, missing=0.02)), frame_from_csv)
+
+
+def _adequacy(engine: str):
+    from API.functions import analyze_content_adequacy
+
+    def run(state):
+        df, intended = state
+        return analyze_content_adequacy(df, intended, decision_mode="ternary", engine=engine)
+    return (lambda n: rating_frame(n, RATERS, FACETS), run)
+
+
+def _post(path: str, **kwargs):
+    """One in-process request against app.main (no server, no lifespan, so no R pool)."""
+    import asyncio
+    import httpx
+    from main import app
+
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            r = await client.post(path, **kwargs)
+            r.raise_for_status()
+            return r.content
+    return asyncio.run(post())
+
+
+def _analyze_upload():
+    return (lambda n: csv_bytes(likert_frame(n, ITEMS, FACTORS, missing=0.02)),
+            lambda content: _post("/analyze", files={"file": ("bench.csv", content, "text/csv")}))
+
+
+def _analyze_endpoint():
+    def setup(n):
+        df, intended = rating_frame(n, RATERS, FACETS)
+        return json.dumps({"data": df.to_dict(orient="records"), "intendedMap": intended})
+    return (setup, lambda body: _post("/api/analyze-anova", content=body,
+                                      headers={"content-type": "application/json"}))
+
+
+def _r_handoff():
+    import tempfile
+    from analysis.r_transport import choose_format, write_input
+    from analysis.r_runner import resolve_script_path
+
+    script = resolve_script_path("analysis/scripts/custom_analysis.R")
+
+    def run(rows):
+        tmp = tempfile.mkdtemp(prefix="bench_handoff_")
+        try:
+            return write_input(rows, tmp, choose_format(script, rows))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return (lambda n: _rows(likert_frame(n, ITEMS, FACTORS, missing=0.02)), run)
+
+
+def _efa_python():
+    from analysis.efa import run_efa
+    return (lambda n: _rows(likert_frame(n, ITEMS, FACTORS)), lambda rows: run_efa(rows, FACTORS, "oblimin", "pa"))
+
+
+def _r_script(script: str, model: bool, extra_args: Optional[List[str]]):
+    from analysis.r_runner import run_r_subprocess
+
+    def run(rows):
+        result = run_r_subprocess(rows, script, likert_model(ITEMS, FACTORS) if model else None, extra_args,
+                                  use_cache=False)
+        if result.get("status") != "ok":
+            raise RuntimeError(result.get("error") or result.get("stderr") or result.get("status"))
+        return result
+    return (lambda n: _rows(likert_frame(n, ITEMS, FACTORS)), run)
+
+
+def _rows(df):
+    return [{k: (None if v != v else v) for k, v in row.items()} for row in df.to_dict(orient="records")]
+
+
+BENCHMARKS: Dict[str, Callable[[], Any]] = {
+    "csv_ingest": _csv_ingest,
+    "adequacy_numpy": lambda: _adequacy("numpy"),
+    "adequacy_pandas": lambda: _adequacy("pandas"),
+    "analyze_upload": _analyze_upload,
+    "analyze_endpoint": _analyze_endpoint,
+    "r_handoff": _r_handoff,
+    "efa_python": _efa_python,
+    "efa_r": lambda: _r_script("analysis/scripts/efa_analysis.R", False, [str(FACTORS), "oblimin", "pa"]),
+    "cfa_r": lambda: _r_script("analysis/scripts/custom_analysis.R", True, None),
+}
+NEEDS_R = {"efa_r", "cfa_r"}
+
+
+# ---------- measurement ----------
+
+def _child_maxrss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return kb / 1024 / (1024 if sys.platform == "darwin" else 1)  # bytes on macOS, KiB elsewhere
+
+
+def measure(run: Callable[[Any], Any], state: Any, repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"best_s": min(times), "median_s": statistics.median(times), "py_peak_mb": peak / 2 ** 20}
+
+
+def scaling_exponent(points: List[Dict[str, Any]]) -> Optional[float]:
+    xy = [(p["n"], p["best_s"]) for p in points if p.get("best_s")]
+    if len(xy) < 2:
+        return None
+    x, y = np.log([v[0] for v in xy]), np.log([v[1] for v in xy])
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                             text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def metadata(args) -> Dict[str, Any]:
+    import pandas as pd
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "pool": args.pool,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "rscript": shutil.which("Rscript") is not None,
+    }
+
+
+def run_suite(args) -> List[Dict[str, Any]]:
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"unknown benchmark(s): {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+    have_r = shutil.which("Rscript") is not None
+    results = []
+    print(f"{'benchmark':<17} {'n':>8} {'best ms':>10} {'median ms':>10} {'py peak MB':>10} {'R peak MB':>9}")
+    for name in names:
+        if name in NEEDS_R and not have_r:
+            print(f"{name:<17} skipped: Rscript not found")
+            results.append({"benchmark": name, "skipped": "Rscript not found"})
+            continue
+        setup, run = BENCHMARKS[name]()
+        try:
+            run(setup(LADDERS[args.scale][name][0]))  # warm-up: imports, caches, first R start
+        except Exception:
+            pass  # reported by the measured runs
+        points = []
+        for n in LADDERS[args.scale][name]:
+            state = setup(n)
+            try:
+                point = {"benchmark": name, "n": n, **measure(run, state, args.repeat)}
+            except Exception as e:  # an R failure should not end the suite
+                point = {"benchmark": name, "n": n, "error": str(e)[-300:]}
+            if name in NEEDS_R:
+                point["r_peak_mb"] = _child_maxrss_mb()
+            points.append(point)
+            if "error" in point:
+                print(f"{name:<17} {n:>8} error: {point['error']}")
+            else:
+                r_peak = f"{point['r_peak_mb']:>9.1f}" if point.get("r_peak_mb") is not None else f"{'':>9}"
+                print(f"{name:<17} {n:>8} {point['best_s'] * 1000:>10.1f} {point['median_s'] * 1000:>10.1f} "
+                      f"{point['py_peak_mb']:>10.1f} {r_peak}", flush=True)
+        exponent = scaling_exponent(points)
+        if exponent is not None:
+            print(f"{name:<17} scaling exponent {exponent:.2f}")
+        results.extend(points)
+        results.append({"benchmark": name, "scaling_exponent": exponent})
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float, min_ms: float) -> int:
+    base = {(r["benchmark"], r.get("n")): r for r in baseline.get("results", [])}
+    regressions = 0
+    meta = baseline.get("meta", {})
+    print(f"\nAgainst baseline {meta.get('commit')} ({meta.get('date')}, {meta.get('platform')}):")
+    print(f"{'benchmark':<17} {'n':>8} {'base ms':>10} {'now ms':>10} {'time x':>7} {'mem x':>7}")
+    for r in results:
+        b = base.get((r["benchmark"], r.get("n")))
+        if b is None or "best_s" not in r or "best_s" not in b:
+            if "scaling_exponent" in r and b and b.get("scaling_exponent") and r["scaling_exponent"]:
+                print(f"{r['benchmark']:<17} {'slope':>8} {b['scaling_exponent']:>10.2f} {r['scaling_exponent']:>10.2f}")
+            continue
+        ratio = r["best_s"] / b["best_s"] if b["best_s"] else float("inf")
+        mem = r["py_peak_mb"] / b["py_peak_mb"] if b.get("py_peak_mb") else float("nan")
+        slower = ratio > 1 + tolerance and (r["best_s"] - b["best_s"]) * 1000 > min_ms
+        regressions += slower
+        print(f"{r['benchmark']:<17} {r['n']:>8} {b['best_s'] * 1000:>10.1f} {r['best_s'] * 1000:>10.1f} "
+              f"{ratio:>7.2f} {mem:>7.2f}{'  REGRESSION' if slower else ''}")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scale", choices=list(LADDERS), default="quick")
+    ap.add_argument("--only", default="")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--save", default="")
+    ap.add_argument("--compare", default="")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--min-ms", type=float, default=10.0)
+    ap.add_argument("--pool", action="store_true", help="use the warm R worker pool for R benchmarks")
+    args = ap.parse_args()
+    if not args.pool:
+        os.environ["R_POOL_SIZE"] = "0"
+
+    results = run_suite(args)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"meta": metadata(args), "results": results}, f, indent=1)
+        print(f"saved {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            return compare(results, json.load(f), args.tolerance, args.min_ms)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import contextlib, os, sys, threading, time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# The app imports its packages as top-level modules (API.*, analysis.*), as under uvicorn;
+# the root makes benchmarks.* (stub server, dataset generators) importable
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(1, ROOT)
+os.environ.setdefault("ENCRYPTION_SECRET", "tests")
+
+
+def ratings_frame(items, raters, facets, seed=0):
+    """Seeded long-format content-adequacy ratings (1-5) plus the intended item -> facet map."""
+    rng = np.random.default_rng(seed)
+    item_ids = [f"item{i + 1}" for i in range(items)]
+    facet_ids = [f"facet{f + 1}" for f in range(facets)]
+    target = np.arange(items) % facets
+    base = 1.6 + np.zeros((items, 1, facets))
+    base[np.arange(items), 0, target] += rng.uniform(0.0, 2.5, items)
+    score = base + rng.normal(0, 0.4, raters)[None, :, None] + rng.normal(0, 0.8, (items, raters, facets))
+    ii, rr, ff = np.meshgrid(np.arange(items), np.arange(raters), np.arange(facets), indexing="ij")
+    df = pd.DataFrame({
+        "item": np.asarray(item_ids)[ii.ravel()],
+        "rater": np.char.add("r", (rr.ravel() + 1).astype(str)),
+        "facet": np.asarray(facet_ids)[ff.ravel()],
+        "rating": np.clip(np.rint(score), 1, 5).ravel(),
+    })
+    return df, {item_ids[i]: facet_ids[target[i]] for i in range(items)}
+
+
+@pytest.fixture
+def ratings():
+    return ratings_frame
+
+
+def assert_tables_equal(a, b, rtol=1e-7, atol=1e-9):
+    """Result tables equal column by column: numbers to rounding (NaN == NaN), the rest exactly."""
+    assert list(a.columns) == list(b.columns)
+    assert list(a["item"]) == list(b["item"])
+    for col in a.columns:
+        x, y = a[col].tolist(), b[col].tolist()
+        for item, u, v in zip(a["item"], x, y):
+            if isinstance(u, dict):
+                assert u.keys() == v.keys(), (col, item)
+                np.testing.assert_allclose(list(u.values()), [v[k] for k in u], rtol=rtol, atol=atol,
+                                           err_msg=f"{col} {item}")
+            elif isinstance(u, (float, np.floating)) or isinstance(v, (float, np.floating)):
+                np.testing.assert_allclose(float(u), float(v), rtol=rtol, atol=atol, equal_nan=True,
+                                           err_msg=f"{col} {item}")
+            else:
+                assert u == v, (col, item, u, v)
+
+
+@contextlib.contextmanager
+def stub_server(**options):
+    """benchmarks/openai_stub.py on a free port in a background thread; yields (base_url, stats())."""
+    import httpx, uvicorn
+    from benchmarks.openai_stub import build_app
+
+    server = uvicorn.Server(uvicorn.Config(build_app(**options), host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert thread.is_alive() and time.monotonic() < deadline, "stub server did not start"
+        time.sleep(0.01)
+    root = f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+    try:
+        yield f"{root}/v1", lambda: httpx.get(f"{root}/stats").json()
+    finally:
+        server.should_exit = True
+        thread.join(5)
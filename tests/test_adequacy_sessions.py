@@ -0,0 +1,66 @@
+"""AdequacySession.add() in waves against one analyze_content_adequacy() run on the rows so far."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from API.adequacy_sessions import AdequacySession
+from API.functions import analyze_content_adequacy
+from conftest import assert_tables_equal
+
+
+def waves_by_rater(df, n_waves, seed=0):
+    raters = np.random.default_rng(seed).permutation(df["rater"].unique())
+    return [df[df["rater"].isin(part)] for part in np.array_split(raters, n_waves)]
+
+
+def check_waves(waves, imap, rtol=1e-7, **options):
+    session = AdequacySession(imap, **options)
+    seen = []
+    for wave in waves:
+        changed = session.add(wave)
+        seen.append(wave)
+        expected = analyze_content_adequacy(pd.concat(seen, ignore_index=True), imap, engine="pandas", **options)
+        assert_tables_equal(session.table(), expected, rtol=rtol)
+        assert set(changed["item"]) <= set(wave["item"])
+    return session
+
+
+@pytest.mark.parametrize("sphericity", ["GG", "none"])
+def test_rater_waves_match_batch(ratings, sphericity):
+    df, imap = ratings(10, 24, 4, seed=2)
+    check_waves(waves_by_rater(df, 4), imap, sphericity=sphericity)
+
+
+def test_items_and_facets_arriving_later(ratings):
+    df, imap = ratings(8, 15, 4, seed=4)
+    late_facet = (df["item"] == "item2") & (df["facet"] == "facet4")
+    waves = [df[~df["item"].isin(["item7", "item8"]) & ~late_facet],  # item2 first seen with 3 facets
+             df[late_facet],
+             df[df["item"].isin(["item7", "item8"])]]
+    check_waves(waves, imap)
+
+
+@pytest.mark.parametrize("drop_incomplete", [True, False])
+def test_missing_duplicate_and_partial_ratings(ratings, drop_incomplete):
+    df, imap = ratings(8, 20, 3, seed=6)
+    rng = np.random.default_rng(1)
+    df.loc[rng.random(len(df)) < 0.06, "rating"] = np.nan
+    dup = df.sample(frac=0.1, random_state=2).assign(rating=lambda d: 6 - d["rating"])
+    # a rater's profile completed across waves: part of it comes first, the rest later
+    waves = waves_by_rater(df, 3, seed=3)
+    first, rest = waves[0], waves[1]
+    split = rest["rater"] == rest["rater"].iloc[0]
+    waves = [pd.concat([first, rest[split & (rest["facet"] == "facet1")]]),
+             pd.concat([rest[~(split & (rest["facet"] == "facet1"))], dup]),
+             waves[2]]
+    check_waves(waves, imap, drop_incomplete=drop_incomplete)
+
+
+def test_intended_map_update(ratings):
+    df, imap = ratings(6, 12, 3, seed=8)
+    session = check_waves(waves_by_rater(df, 2), imap)
+    moved = {"item1": "facet3"}
+    changed = session.add(df.iloc[:0], moved)
+    assert list(changed["item"]) == ["item1"]
+    assert_tables_equal(session.table(), analyze_content_adequacy(df, {**imap, **moved}, engine="pandas"))
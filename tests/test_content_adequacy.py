@@ -0,0 +1,70 @@
+"""Batched NumPy engine of analyze_content_adequacy against pingouin (engine="pandas" and pg.rm_anova)."""
+
+import numpy as np
+import pandas as pd
+import pingouin as pg
+import pytest
+
+from API.functions import analyze_content_adequacy
+from conftest import assert_tables_equal
+
+
+def both_engines(df, imap, **options):
+    return (analyze_content_adequacy(df, imap, engine="numpy", **options),
+            analyze_content_adequacy(df, imap, engine="pandas", **options))
+
+
+@pytest.mark.parametrize("sphericity", ["GG", "HF", "none"])
+@pytest.mark.parametrize("facets", [2, 3, 5])
+def test_batched_matches_pingouin_engine(ratings, sphericity, facets):
+    df, imap = ratings(12, 15, facets, seed=facets)
+    batched, reference = both_engines(df, imap, sphericity=sphericity)
+    assert_tables_equal(batched, reference)
+
+
+@pytest.mark.parametrize("facets", [3, 4])
+def test_anova_statistics_match_rm_anova(ratings, facets):
+    df, imap = ratings(8, 20, facets, seed=10 + facets)
+    table = analyze_content_adequacy(df, imap, engine="numpy", sphericity="GG").set_index("item")
+    for item, d in df.groupby("item"):
+        aov = pg.rm_anova(dv="rating", within="facet", subject="rater", data=d, detailed=True,
+                          correction=True, effsize="np2")
+        ref = aov.loc[aov["Source"] == "facet"].iloc[0]
+        row = table.loc[item]
+        np.testing.assert_allclose(row["F"], ref["F"], rtol=1e-9)
+        np.testing.assert_allclose(row["epsilon"], ref["eps"], rtol=1e-9)
+        np.testing.assert_allclose(row["p_omnibus"], ref["p-GG-corr"], rtol=1e-7, atol=1e-300)
+        np.testing.assert_allclose(row["eta_p2"], ref["np2"], rtol=1e-9)
+        assert row["df1"] == ref["DF"]
+
+
+@pytest.mark.parametrize("drop_incomplete", [True, False])
+def test_missing_and_incomplete_raters(ratings, drop_incomplete):
+    df, imap = ratings(10, 18, 4, seed=3)
+    rng = np.random.default_rng(7)
+    df.loc[rng.random(len(df)) < 0.08, "rating"] = np.nan              # scattered missing cells
+    df.loc[(df["item"] == "item2") & (df["rater"] == "r4"), "rating"] = np.nan  # an empty rater
+    df = df[~((df["item"] == "item3") & (df["rater"] == "r5") & (df["facet"] == "facet1"))]  # absent row
+    batched, reference = both_engines(df, imap, drop_incomplete=drop_incomplete)
+    assert_tables_equal(batched, reference)
+    assert "dropped 1 empty rater(s)" in batched.set_index("item").loc["item2", "notes"]
+
+
+def test_duplicate_ratings_are_averaged(ratings):
+    df, imap = ratings(6, 12, 3, seed=5)
+    extra = df.sample(frac=0.15, random_state=1).assign(rating=lambda d: 6 - d["rating"])
+    batched, reference = both_engines(pd.concat([df, extra], ignore_index=True), imap)
+    assert_tables_equal(batched, reference)
+
+
+def test_degenerate_items(ratings):
+    df, imap = ratings(6, 10, 3, seed=9)
+    imap = {**imap, "item1": None, "item2": "facet9"}        # no target, target never rated
+    df = df[~((df["item"] == "item3") & (df["facet"] != "facet1"))]   # a single facet
+    df = df[~((df["item"] == "item4") & ~df["rater"].isin(["r1", "r2"]))]  # two raters left
+    batched, reference = both_engines(df, imap, decision_mode="ternary")
+    assert_tables_equal(batched, reference)
+    notes = batched.set_index("item")["notes"]
+    assert notes["item1"] == "No intended facet provided"
+    assert notes["item3"] == "Fewer than 2 facets"
+    assert notes["item4"] == "Fewer than 3 raters after filtering"
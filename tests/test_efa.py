@@ -0,0 +1,124 @@
+"""In-process EFA (analysis/efa.py) for every extraction x rotation, without R.
+
+Two kinds of reference:
+  - exact factor structures: data whose correlation matrix is exactly L Phi L' + Psi. psych::fa
+    has to return these uniquenesses, and the rotations whose criterion is optimal at simple
+    structure have to return L and Phi themselves
+  - psych::fa output: tests/fixtures/efa_psych.json when it exists (stored by
+    `python benchmarks/efa_parity.py --write-fixtures tests/fixtures/efa_psych.json`), otherwise
+    written fresh by the same code when Rscript with psych is available. Without either the test
+    is skipped, or fails when REQUIRE_PSYCH_PARITY=1 (set it where R is part of the CI image)
+"""
+
+import json, os, shutil
+
+import numpy as np
+import pytest
+
+from analysis.efa import FM_PREFIX, run_efa
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "efa_psych.json")
+METHODS = ("pa", "minres", "ml")
+ROTATIONS = ("varimax", "promax", "oblimin")
+# psych's principal-axis loop stops once the total communality changes by less than 0.001
+TOL = {"pa": 5e-3, "minres": 1e-4, "ml": 1e-4}
+
+# Three factors with falling loadings, so the variance order (and the factor order) is fixed
+LOADINGS = np.zeros((9, 3))
+LOADINGS[0:3, 0] = [0.8, 0.75, 0.7]
+LOADINGS[3:6, 1] = [0.7, 0.65, 0.6]
+LOADINGS[6:9, 2] = [0.6, 0.55, 0.5]
+
+
+def exact_rows(L, Phi, n=240, seed=0):
+    """Rows whose sample correlation matrix is exactly L Phi L' with a unit diagonal."""
+    R = L @ Phi @ L.T
+    np.fill_diagonal(R, 1.0)
+    Z = np.random.default_rng(seed).standard_normal((n, len(R)))
+    Q, _ = np.linalg.qr(Z - Z.mean(0))
+    X = (Q * np.sqrt(n - 1)) @ np.linalg.cholesky(R).T + 3
+    items = [f"item{j + 1}" for j in range(len(R))]
+    return [dict(zip(items, map(float, row))) for row in X], R
+
+
+def phi(r):
+    return np.full((3, 3), r) + (1 - r) * np.eye(3)
+
+
+def matrices(efa):
+    names = [k for k in efa["loadings_matrix"][0] if k != "item"]
+    L = np.array([[row[f] for f in names] for row in efa["loadings_matrix"]])
+    fc = efa["factor_correlation"]
+    P = np.eye(len(names)) if fc is None else np.array([[row[f] for f in names] for row in fc])
+    return L, P, np.array(list(efa["uniquenesses"].values()))
+
+
+@pytest.mark.parametrize("rotation", ROTATIONS)
+@pytest.mark.parametrize("fm", METHODS)
+def test_orthogonal_simple_structure(fm, rotation):
+    rows, _ = exact_rows(LOADINGS, np.eye(3))
+    res = run_efa(rows, 3, rotation, fm)
+    assert res["status"] == "ok"
+    L, P, u = matrices(res["efa"])
+    np.testing.assert_allclose(u, 1 - (LOADINGS ** 2).sum(1), atol=TOL[fm])
+    np.testing.assert_allclose(L, LOADINGS, atol=TOL[fm])
+    np.testing.assert_allclose(P, np.eye(3), atol=TOL[fm])
+    assert [row["factor"] for row in res["efa"]["variance"]] == [f"{FM_PREFIX[fm]}{i}" for i in (1, 2, 3)]
+
+
+@pytest.mark.parametrize("rotation", ROTATIONS)
+@pytest.mark.parametrize("fm", METHODS)
+def test_correlated_simple_structure(fm, rotation):
+    rows, R = exact_rows(LOADINGS, phi(0.3))
+    L, P, u = matrices(run_efa(rows, 3, rotation, fm)["efa"])
+    # Any rotation reproduces the correlation matrix; oblimin (quartimin) recovers the pattern itself
+    np.testing.assert_allclose(u, 1 - np.diag(LOADINGS @ phi(0.3) @ LOADINGS.T), atol=TOL[fm])
+    np.testing.assert_allclose(L @ P @ L.T + np.diag(u), R, atol=2 * TOL[fm])
+    if rotation == "oblimin":
+        np.testing.assert_allclose(L, LOADINGS, atol=TOL[fm])
+        np.testing.assert_allclose(P, phi(0.3), atol=TOL[fm])
+    if rotation == "varimax":
+        np.testing.assert_allclose(P, np.eye(3))
+
+
+@pytest.fixture(scope="module")
+def psych_fixture(tmp_path_factory):
+    path = FIXTURE
+    if not os.path.exists(path) and shutil.which("Rscript") is not None:
+        from benchmarks.efa_parity import write_fixtures
+        path = str(tmp_path_factory.mktemp("psych") / "efa_psych.json")
+        if write_fixtures(path, [(300, 12), (500, 20)], 2) != 0:
+            path = FIXTURE
+    if not os.path.exists(path):
+        reason = "no psych::fa reference: tests/fixtures/efa_psych.json is missing and R with psych is not available"
+        if os.getenv("REQUIRE_PSYCH_PARITY") == "1":
+            pytest.fail(reason)
+        pytest.skip(reason)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_matches_psych(psych_fixture):
+    by_item = lambda efa: {row["item"]: row for row in efa["loadings_matrix"]}
+    for case in psych_fixture["cases"]:
+        data = psych_fixture["datasets"][case["dataset"]]
+        rows = [dict(zip(data["columns"], map(float, values))) for values in data["values"]]
+        py = run_efa(rows, case["n_factors"], case["rotation"], case["fm"])["efa"]
+        ref = case["efa"]
+        where = f"{case['dataset']} {case['fm']} {case['rotation']}"
+        for item, row in by_item(ref).items():
+            got = by_item(py)[item]
+            for factor, value in row.items():
+                if factor != "item":
+                    assert got[factor] == pytest.approx(value, abs=1e-3), (where, item, factor)
+        for key in ("uniquenesses", "communalities"):
+            for item, value in ref[key].items():
+                assert py[key][item] == pytest.approx(value, abs=1e-3), (where, key, item)
+        if ref["factor_correlation"] is None:
+            assert py["factor_correlation"] is None, where
+        else:
+            got = {row["_row"]: row for row in py["factor_correlation"]}
+            for row in ref["factor_correlation"]:
+                for factor, value in row.items():
+                    if factor != "_row":
+                        assert got[row["_row"]][factor] == pytest.approx(value, abs=1e-3), (where, factor)
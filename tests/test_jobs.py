@@ -0,0 +1,42 @@
+"""JobManager cancellation: cancel() stops one job, anything else (shutdown) stops the consumers."""
+
+import asyncio
+
+from API.jobs import JobManager
+
+
+async def slow(job):
+    await asyncio.sleep(30)
+
+
+async def quick(job):
+    return 1
+
+
+def test_cancelled_job_leaves_consumer_running():
+    async def main():
+        jobs = JobManager(1)
+        job = jobs.submit("test", slow)
+        await asyncio.sleep(0.05)
+        jobs.cancel(job.id)
+        await jobs.wait(job, 2)
+        assert job.status == "cancelled"
+        assert all(not t.done() for t in jobs._consumers)
+        after = jobs.submit("test", quick)
+        await jobs.wait(after, 2)
+        assert (after.status, after.result) == ("done", 1)
+
+    asyncio.run(main())
+
+
+def test_shutdown_cancels_consumers():
+    async def main():
+        jobs = JobManager(1)
+        job = jobs.submit("test", slow)
+        await asyncio.sleep(0.05)
+        return jobs, job
+
+    # asyncio.run cancels the remaining tasks on exit; a consumer that swallowed that would hang here
+    jobs, job = asyncio.run(asyncio.wait_for(main(), 5))
+    assert job.status == "cancelled"
+    assert all(t.done() for t in jobs._consumers)
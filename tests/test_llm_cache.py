@@ -0,0 +1,119 @@
+"""Completion cache (API/llm_cache.py): tenant isolation, key verification and the chat helpers."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from API import functions as F
+from API import llm_cache as C
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def key_for(api_key, messages=MESSAGES, temperature=0):
+    return C.make_key("gpt-4.1", messages, temperature, False, C.key_id(api_key))
+
+
+def test_tenants_do_not_share_entries():
+    cache = C.LLMCompletionCache(max_entries=10, ttl=60)
+    a, b = C.key_id("sk-a"), C.key_id("sk-b")
+    assert key_for("sk-a") != key_for("sk-b")
+    cache.put(key_for("sk-a"), a, "reply for a")
+    cache.put(key_for("sk-b"), b, "reply for b")
+    assert cache.get(key_for("sk-a"), a) == "reply for a"
+    assert cache.get(key_for("sk-b"), b) == "reply for b"
+    assert "sk-a" not in repr(cache._mem) and "sk-a" not in repr(cache._verified)
+
+
+def test_unverified_key_gets_no_hits(monkeypatch):
+    cache = C.LLMCompletionCache(max_entries=10, ttl=60, key_ttl=100)
+    a = C.key_id("sk-a")
+    assert cache.get(key_for("sk-a"), a) is None
+    assert cache.stats["unverified"] == 1 and cache.stats["misses"] == 0
+    cache.put(key_for("sk-a"), a, "reply")
+    assert cache.get(key_for("sk-a"), a) == "reply"
+    # the key's check expires (e.g. it was revoked): no more hits until a real request succeeds again
+    now = C.time.time()
+    monkeypatch.setattr(C.time, "time", lambda: now + 101)
+    assert cache.get(key_for("sk-a"), a) is None
+    assert cache.stats["unverified"] == 2
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    cache = C.LLMCompletionCache(max_entries=2, ttl=60, key_ttl=1000)
+    a = C.key_id("sk-a")
+    keys = [key_for("sk-a", [{"role": "user", "content": str(i)}]) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, a, f"reply {i}")
+    assert cache.get(keys[0], a) is None and cache.stats["evictions"] == 1
+    assert cache.get(keys[2], a) == "reply 2"
+    now = C.time.time()
+    monkeypatch.setattr(C.time, "time", lambda: now + 61)
+    assert cache.get(keys[2], a) is None
+
+
+def test_sqlite_tier_is_shared(tmp_path):
+    path = str(tmp_path / "llm.sqlite")
+    a = C.key_id("sk-a")
+    C.LLMCompletionCache(max_entries=10, ttl=60, db_path=path).put(key_for("sk-a"), a, "stored")
+    other = C.LLMCompletionCache(max_entries=10, ttl=60, db_path=path)  # another worker
+    assert other.get(key_for("sk-a"), a) is None  # the key is not verified in this process yet
+    other._mark_verified(a)
+    assert other.get(key_for("sk-a"), a) == "stored" and other.stats["hits_disk"] == 1
+    assert other.get(key_for("sk-b"), a) is None
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Install a fresh cache and an upstream that records which key each request used."""
+    calls = []
+
+    async def chat_completion(api_key, **params):
+        calls.append(api_key)
+        if api_key == "sk-invalid":
+            raise RuntimeError("401 invalid api key")
+        content = f"{api_key}: {params['messages'][-1]['content']} #{len(calls)}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(F, "llm_cache", C.LLMCompletionCache(max_entries=100, ttl=60))
+    monkeypatch.setattr(F.llm_clients, "chat_completion", chat_completion)
+    return calls
+
+
+def ask(api_key, temperature=0, use_cache=None):
+    reply, _ = asyncio.run(F.get_chatgpt_response("hello", [], temperature=temperature, api_key=api_key,
+                                                  use_cache=use_cache))
+    return reply
+
+
+def test_identical_requests_are_answered_per_key(upstream):
+    first = ask("sk-a")
+    assert ask("sk-a") == first and upstream == ["sk-a"]
+    # the same prompt under another key goes upstream and gets that key's own reply
+    assert ask("sk-b") == "sk-b: hello #2" and upstream == ["sk-a", "sk-b"]
+    assert ask("sk-a") == first and ask("sk-b") == "sk-b: hello #2" and len(upstream) == 2
+
+
+def test_failed_key_is_never_answered_from_cache(upstream):
+    ask("sk-a")
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            ask("sk-invalid")
+    assert upstream == ["sk-a", "sk-invalid", "sk-invalid"]
+
+
+def test_sampled_requests_skip_the_cache_by_default(upstream):
+    assert ask("sk-a", temperature=0.7) != ask("sk-a", temperature=0.7)
+    assert F.llm_cache.stats["bypassed"] == 2 and len(upstream) == 2
+    # replies are still stored, so a caller that opts in gets the latest sample
+    assert ask("sk-a", temperature=0.7, use_cache=True) == "sk-a: hello #2"
+    ask("sk-a", temperature=0)
+    assert ask("sk-a", temperature=0, use_cache=False) == "sk-a: hello #4"
+    assert len(upstream) == 4
+
+
+def test_use_cache_default():
+    assert F._use_cache(None, None) and F._use_cache(None, 0)
+    assert not F._use_cache(None, 0.7)
+    assert F._use_cache(True, 0.7) and not F._use_cache(False, 0)
@@ -0,0 +1,131 @@
+"""LLMClientPool (API/llm_client.py) against the local stub server (benchmarks/openai_stub.py)."""
+
+import asyncio, email.utils, time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from API.llm_client import LLMClientPool, _retry_after
+from conftest import stub_server
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def pool_for(base_url, **options):
+    return LLMClientPool(base_url=base_url, backoff_base=0, **options)
+
+
+def complete(pool, api_key="sk-a"):
+    return pool.chat_completion(api_key, model="gpt-4o-mini", messages=MESSAGES)
+
+
+def test_rate_limits_are_retried():
+    with stub_server(latency=0, rate_limit_every=3, retry_after=0.01) as (url, stats):
+        pool = pool_for(url)
+
+        async def main():
+            return [await complete(pool) for _ in range(6)]
+
+        replies = asyncio.run(main())
+        assert all(r.choices[0].message.content == "stub reply to: hello" for r in replies)
+        assert stats()["rate_limited"] == pool.stats["retries"] == 2  # requests 3 and 6
+        assert pool.stats["requests"] == stats()["requests"] == 8
+
+
+def test_retry_after_is_honoured():
+    with stub_server(latency=0, rate_limit_every=2, retry_after=0.3) as (url, stats):
+        pool = pool_for(url)
+
+        async def main():
+            await complete(pool)
+            started = time.perf_counter()
+            await complete(pool)  # the 2nd request is limited, the 3rd answers
+            return time.perf_counter() - started
+
+        assert asyncio.run(main()) >= 0.3
+        assert pool.stats["retries"] == 1
+
+
+def test_retries_are_bounded():
+    with stub_server(latency=0, rate_limit_every=1, retry_after=0) as (url, stats):
+        pool = pool_for(url, max_retries=2)
+        with pytest.raises(openai.RateLimitError):
+            asyncio.run(complete(pool))
+        assert stats()["requests"] == 3 and pool.stats["retries"] == 2
+
+
+def test_exhausted_quota_is_not_retried():
+    with stub_server(latency=0, quota_exhausted=True) as (url, stats):
+        pool = pool_for(url)
+        with pytest.raises(openai.RateLimitError) as error:
+            asyncio.run(complete(pool))
+        assert error.value.code == "insufficient_quota"
+        assert stats()["requests"] == 1 and pool.stats["retries"] == 0
+
+
+@pytest.mark.parametrize("keys, peak", [(["sk-a"], 2), (["sk-a", "sk-b"], 4)])
+def test_concurrency_is_limited_per_key(keys, peak):
+    with stub_server(latency=0.1) as (url, stats):
+        pool = pool_for(url, key_concurrency=2)
+
+        async def main():
+            await asyncio.gather(*(complete(pool, key) for key in keys for _ in range(6)))
+
+        asyncio.run(main())
+        assert stats()["peak_in_flight"] == peak
+        assert pool.stats["clients_created"] == len(keys)
+
+
+def test_clients_are_evicted_least_recently_used():
+    with stub_server(latency=0) as (url, stats):
+        pool = pool_for(url, max_clients=2)
+
+        async def main():
+            for key in ("sk-a", "sk-b", "sk-a", "sk-c", "sk-a", "sk-b"):
+                await complete(pool, key)
+
+        asyncio.run(main())
+        # sk-c evicts sk-b (sk-a was used more recently); sk-b then evicts sk-c
+        assert pool.stats["clients_created"] == 4
+        assert pool.stats["clients_evicted"] == 2
+        assert pool.describe()["clients"] == 2
+
+
+def test_stream_retries_before_the_first_delta():
+    long = "a longer message that the stub sends back in several chunks"
+    params = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": long}]}
+    with stub_server(latency=0, rate_limit_every=2, retry_after=0, chunk_delay=0) as (url, stats):
+        pool = pool_for(url)
+
+        async def main():
+            await complete(pool)
+            return "".join([d async for d in pool.stream_chat("sk-a", **params)])  # 2nd request is limited
+
+        assert asyncio.run(main()) == f"stub reply to: {long}"
+        assert pool.stats["streams"] == 1 and pool.stats["retries"] == 1
+
+    with stub_server(latency=0, rate_limit_every=1, retry_after=0) as (url, stats):
+        pool = pool_for(url, max_retries=1)
+
+        async def failing():
+            return [d async for d in pool.stream_chat("sk-a", **params)]
+
+        with pytest.raises(openai.RateLimitError):
+            asyncio.run(failing())
+        assert stats()["requests"] == 2 and pool.stats["streams"] == 0
+
+
+def response_error(headers):
+    return SimpleNamespace(response=SimpleNamespace(headers=httpx.Headers(headers)))
+
+
+def test_retry_after_headers():
+    assert _retry_after(response_error({"retry-after-ms": "250"})) == 0.25
+    assert _retry_after(response_error({"retry-after": "2"})) == 2.0
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= _retry_after(response_error({"retry-after": later})) <= 30
+    assert _retry_after(response_error({"retry-after": "soon"})) is None
+    assert _retry_after(response_error({})) is None
+    assert _retry_after(ValueError()) is None
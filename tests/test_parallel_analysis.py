@@ -0,0 +1,36 @@
+"""Null-eigenvalue tables (analysis/parallel_analysis.py): batching and the row grid."""
+
+import os
+
+import numpy as np
+import pytest
+
+from analysis import parallel_analysis as pa
+
+
+@pytest.mark.parametrize("method", pa.METHODS)
+def test_batching_does_not_change_the_simulation(monkeypatch, method):
+    whole = pa.simulate_null(120, 6, method, n_iter=30, seed=4)
+    monkeypatch.setattr(pa, "BATCH_BYTES", 8 * 120 * 6 * 4)  # 4 datasets per batch
+    np.testing.assert_array_equal(pa.simulate_null(120, 6, method, n_iter=30, seed=4), whole)
+
+
+def test_grid_bounds():
+    assert pa.grid_bounds(93, 1.25) == (93, 93)
+    assert pa.grid_bounds(100, 1.25) == (93, 116)
+    assert pa.grid_bounds(8, 1.25) == (8, 8)
+    assert pa.grid_bounds(317, 1.0) == (317, 317)
+    points = pa.grid_points(50, 2000, 1.25)
+    assert points[0] <= 50 and points[-1] >= 2000
+    assert all(b / a <= 1.3 for a, b in zip(points, points[1:]))
+
+
+def test_row_counts_share_grid_tables(tmp_path):
+    index = pa.NullEigenIndex(str(tmp_path), n_iter=25, seed=1)
+    tables = [index.get(n, 5) for n in (290, 301, 317, 333, 350)]
+    assert sorted(os.listdir(tmp_path)) == ["fa_p5_n284_s1.json", "fa_p5_n355_s1.json"]
+    assert index.stats["simulated"] == 2
+    assert all(t["interpolated_from"] == [284, 355] for t in tables)
+    # more rows, smaller null eigenvalues
+    firsts = [t["mean"][0] for t in tables]
+    assert firsts == sorted(firsts, reverse=True)
@@ -0,0 +1,96 @@
+"""Likert simulation (API/simulation.py): reply validation and a resumable job against the stub."""
+
+import asyncio, json, os
+
+import pytest
+
+from API import simulation as S
+from API.jobs import JobManager
+from API.llm_client import LLMClientPool
+from conftest import stub_server
+
+
+def spec(**extra):
+    payload = {"items": [{"id": "Q1", "text": "I like people"}, {"id": "Q2", "text": "I plan ahead"},
+                         {"id": "O1", "text": "Why?", "responseType": "open"}],
+               "n": 3, "scale_min": 1, "scale_max": 5, "personas": ["a nurse", "a farmer"]}
+    return S.likert_spec({**payload, **extra})
+
+
+@pytest.mark.parametrize("value, expected", [
+    (4, 4), (4.0, 4), ("4", 4), (" 4 - agree", 4), ("Agree (5)", 5), ("5.0", 5),
+    (1, 1), (5, 5), (0, None), (6, None), ("-2", None), (3.5, None), ("3.5", None),
+    ("agree", None), ("", None), (None, None), (True, None), ([4], None), ({"v": 4}, None),
+    (float("nan"), None), (float("inf"), None), (float("-inf"), None),
+])
+def test_coerce_likert(value, expected):
+    assert S.coerce_likert(value, 1, 5) == expected
+
+
+def test_coerce_likert_negative_scale():
+    assert S.coerce_likert("-3", -3, 3) == -3
+    assert S.coerce_likert(-4, -3, 3) is None
+
+
+@pytest.mark.parametrize("content", [
+    '{"Q1": 4}', '```json\n{"Q1": 4}\n```', 'Sure! Here it is: {"Q1": 4} Hope that helps.',
+])
+def test_parse_reply(content):
+    assert S.parse_reply(content) == {"Q1": 4}
+
+
+@pytest.mark.parametrize("content", [None, "", "no json here", "[4, 5]", "{broken", '{"Q1": 4'])
+def test_parse_reply_rejects(content):
+    assert S.parse_reply(content) is None
+
+
+def test_validate_answers():
+    s = spec()
+    answers, problems = S.validate_answers({"q1": "4", " Q2 ": 2.0, "O1": "  because  "}, s)
+    assert (answers, problems) == ({"Q1": 4, "Q2": 2, "O1": "because"}, [])
+    answers, problems = S.validate_answers({"Q1": 7, "O1": ["list"]}, s)
+    assert answers is None
+    assert problems == ["Q1 must be an integer from 1 to 5 (got 7)", "Q2 is missing"]
+    assert S.validate_answers({"Q1": 1, "Q2": 1, "O1": ["list"]}, s)[0]["O1"] == '["list"]'
+    assert S.validate_answers(S.parse_reply('{"Q1": Infinity, "Q2": NaN, "O1": ""}'), s)[0] is None
+    assert S.validate_answers(None, s) == (None, ["reply is not a JSON object"])
+
+
+def test_likert_spec_rejects_bad_input():
+    for bad in ({"items": []}, {"items": [{"text": "no id"}]},
+                {"items": [{"id": "Q1"}, {"id": "Q1"}]}, {"scale_max": 1}, {"n": "many"},
+                {"n": S.SIM_MAX_ROWS + 1}):
+        with pytest.raises(ValueError):
+            spec(**bad)
+    reversed_scale = spec(scale_min=7, scale_max=1)
+    assert (reversed_scale["scale_min"], reversed_scale["scale_max"]) == (1, 7)
+
+
+def test_simulation_retries_malformed_rows_and_resumes(monkeypatch, tmp_path):
+    monkeypatch.setattr(S, "SIM_CONCURRENCY", 1)  # sequential, so the stub's malformed replies are predictable
+    with stub_server(latency=0, malformed_every=3) as (url, stats):
+        monkeypatch.setattr(S, "llm_clients", LLMClientPool(base_url=url, backoff_base=0))
+
+        async def main():
+            store = S.SimulationStore(S._SimulationFiles(str(tmp_path), 3600), JobManager(1))
+            job = store.start(spec(n=9), "sk-test")
+            await store.jobs.wait(job, 30)
+            # a fresh store (e.g. after a restart) reads the rows back; resuming has nothing left to do
+            again = S.SimulationStore(S._SimulationFiles(str(tmp_path), 3600), JobManager(1))
+            resumed = again.resume(job.id, "sk-test")
+            await again.jobs.wait(resumed, 30)
+            return job, resumed
+
+        job, resumed = asyncio.run(main())
+        assert job.status == "done", job.error
+        rows = job.result["rows"]
+        assert job.result["complete"] and job.result["failed"] == []
+        assert [r["index"] for r in rows] == list(range(9))
+        assert [r["persona_index"] for r in rows] == [0, 1] * 4 + [0]
+        assert all(set(r["answers"]) == {"Q1", "Q2", "O1"} and 1 <= r["answers"]["Q1"] <= 5 for r in rows)
+        # replies 3, 6, 9 and 12 are malformed; each of those rows succeeds on its second attempt
+        assert [r["attempts"] for r in rows] == [1, 1, 2, 1, 2, 1, 2, 1, 2]
+        assert stats()["requests"] == 13
+        assert resumed.result["rows"] == rows and stats()["requests"] == 13
+        with open(os.path.join(tmp_path, job.id + ".jsonl"), encoding="utf-8") as f:
+            assert len([json.loads(line) for line in f]) == 9